@@ -1,3 +1,4 @@
+from services.boot import boot
 from flask import Flask, render_template, redirect, url_for, session, jsonify, request
 from config import Config
 import os
@@ -19,15 +20,21 @@ from flask_socketio import SocketIO
 
 # Configurar CORS baseado no ambiente
 ALLOWED_ORIGINS = os.getenv('SOCKETIO_CORS_ORIGINS', '*').split(',')
+# Fila de mensagens (ex.: redis://redis:6379/0) para que eventos emitidos em um
+# worker do gunicorn (progresso de exportações, conferência) cheguem aos sockets
+# conectados nos demais; sem ela cada worker só alcança os próprios clientes
+SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE') or None
 
 socketio = SocketIO(
     app,
     cors_allowed_origins=ALLOWED_ORIGINS,  # Controlado por variável de ambiente
     async_mode='gevent',  # Deve corresponder ao worker do Gunicorn (gevent)
+    message_queue=SOCKETIO_MESSAGE_QUEUE,
     manage_session=True,  # CRÍTICO: permite acesso à sessão Flask
     logger=False,
     engineio_logger=False
 )
+extensions.socketio = socketio
 
 # Configurar sessão para expirar após 12 horas (43200 segundos)
 from datetime import timedelta
@@ -41,9 +48,10 @@ app.config['SEND_FILE_MAX_AGE_DEFAULT'] = timedelta(seconds=31536000)  # Cache p
 
 # Configurar timeout para requests em produção - diferentes para diferentes operações
 import requests
-# Timeout padrão para operações normais
+# Timeout padrão para operações normais (vale apenas para a biblioteca requests)
 requests.adapters.DEFAULT_TIMEOUT = Config.QUERY_TIMEOUT
 # Note: Para operações específicas (como Gemini), usaremos timeouts personalizados no código
+# Note: Chamadas ao Supabase usam pool e timeouts por classe em services/supabase_transport.py
 
 # Inicializar manipulador de sessão
 init_session_handler(app)
@@ -54,14 +62,15 @@ print(f"[DEBUG] Diretório atual: {os.getcwd()}")
 print(f"[DEBUG] Arquivo .env existe: {os.path.exists('.env')}")
 print(f"[DEBUG] SUPABASE_URL: {app.config['SUPABASE_URL']}")
 print(f"[DEBUG] SUPABASE_SERVICE_KEY (primeiros 10 caracteres): {app.config['SUPABASE_SERVICE_KEY'][:10] if app.config['SUPABASE_SERVICE_KEY'] else 'None'}")
-print(f"[DEBUG] SECRET_KEY: {app.config['SECRET_KEY']}")
+print(f"[DEBUG] SECRET_KEY: {'definida' if app.config['SECRET_KEY'] else 'não definida'}")
 print(f"[DEBUG] DEBUG: {app.config['DEBUG']}")
 print("[DEBUG] ====================================\n")
 
 # Initialize extensions
 print("[DEBUG] Inicializando extensões...")
 try:
-    extensions.supabase, extensions.supabase_admin = extensions.init_supabase(app)
+    with boot.phase('extensions'):
+        extensions.supabase, extensions.supabase_admin = extensions.init_supabase(app)
     print("[DEBUG] Extensões inicializadas com sucesso")
     print(f"[DEBUG] supabase type: {type(extensions.supabase)}")
     print(f"[DEBUG] supabase_admin type: {type(extensions.supabase_admin)}")
@@ -69,122 +78,106 @@ except Exception as e:
     print(f"[DEBUG] ERRO ao inicializar extensões: {str(e)}")
     raise
 
+# Registrar WebSocket event handlers na importação (o gunicorn carrega app:app e
+# não passa pelo __main__); o connect coloca cada cliente na sala user:<id>
+# usada pelos avisos de progresso. Depende do supabase_admin inicializado acima.
+from websocket_events import register_events
+register_events(socketio, extensions.supabase_admin)
+print("[DEBUG] WebSocket events registrados com sucesso")
+
 # Import session handler
 from session_handler import init_session_handler
 
 # Import module color helpers
 from utils.module_colors import register_module_color_helpers
 
-# Import routes after app initialization to avoid circular imports
-from routes import dashboard, api
-from routes import background_tasks
-
-# Import modular users blueprint
-from modules.usuarios import routes as usuarios_modular
-
-# Import modular auth blueprint
-from modules.auth.routes import bp as auth_bp
-
-# Import modular config blueprint
-from modules.config.routes import config_bp
-
-# Import modular paginas blueprint
-from modules.paginas.routes import paginas_bp
-
-# Import modular menu blueprint
-from modules.menu.routes import bp as menu_bp
-
-# Import shared blueprint
-from modules.shared.routes import shared_bp
-
-# Import documents blueprint
-from routes.documents import documents_bp
-
-# Import importacoes blueprint and registration function (módulo consolidado)
-from modules.importacoes import register_importacoes_blueprints
-
-# Import financeiro blueprint and registration function
-from modules.financeiro.routes import register_financeiro_blueprints
-
-# Import RH blueprint and registration function
-from modules.rh import register_rh_blueprints
-
-# Import Carreiras blueprint (portal público de vagas)
-from modules.carreiras import carreiras_bp
-
-# Import analytics blueprint
-from modules.analytics.routes import bp as analytics_bp
-
-# Import portal contabilidade blueprint
-from modules.contabilidade_externa import contabilidade_externa_bp
-# Import i18n blueprint
-from modules.i18n import i18n_bp
-
-# Import usuarios_online blueprint (admin)
-from modules.usuarios_online.routes import bp as usuarios_online_bp
-
-# Register blueprints
-# app.register_blueprint(auth.bp)  # Comentado - usando versão modular
-app.register_blueprint(dashboard.bp)
-
-app.register_blueprint(api.bp, url_prefix='/api')  # Registrando o blueprint da API com prefixo
-app.register_blueprint(background_tasks.bp)  # Registrando o blueprint de Background Tasks
-
-# Register modular users blueprint
-app.register_blueprint(usuarios_modular.bp)  # Usuários modular
-
-# Register modular auth blueprint
-app.register_blueprint(auth_bp)  # Auth modular
-
-# Register modular config blueprint
-app.register_blueprint(config_bp)  # Config modular
-
-# Register modular paginas blueprint
-app.register_blueprint(paginas_bp)  # Páginas modular
-
-# Register shared blueprint
-app.register_blueprint(shared_bp)  # Shared static files
-
-# Register documents blueprint
-app.register_blueprint(documents_bp)  # Document management
-
-# Register modular menu blueprint
-app.register_blueprint(menu_bp)  # Menu modular
-
-# Register noticias COMEX API blueprint
-try:
+# -------------------------------------------------------------
+# Blueprints por componente (services/boot.py)
+# Componentes lazy só são adiados com BOOT_MODE=lazy; no padrão tudo carrega aqui.
+# -------------------------------------------------------------
+@boot.component('core', lazy=False)
+def _load_core(app):
+    # Import routes after app initialization to avoid circular imports
+    from routes import dashboard, api
+    from routes import background_tasks
+    from modules.usuarios import routes as usuarios_modular
+    from modules.auth.routes import bp as auth_bp
+    from modules.config.routes import config_bp
+    from modules.paginas.routes import paginas_bp
+    from modules.menu.routes import bp as menu_bp
+    from modules.shared.routes import shared_bp
+    from routes.documents import documents_bp
+
+    # app.register_blueprint(auth.bp)  # Comentado - usando versão modular
+    app.register_blueprint(dashboard.bp)
+    app.register_blueprint(api.bp, url_prefix='/api')  # Registrando o blueprint da API com prefixo
+    app.register_blueprint(background_tasks.bp)  # Registrando o blueprint de Background Tasks
+    app.register_blueprint(usuarios_modular.bp)  # Usuários modular
+    app.register_blueprint(auth_bp)  # Auth modular
+    app.register_blueprint(config_bp)  # Config modular
+    app.register_blueprint(paginas_bp)  # Páginas modular
+    app.register_blueprint(shared_bp)  # Shared static files
+    app.register_blueprint(documents_bp)  # Document management
+    app.register_blueprint(menu_bp)  # Menu modular
+
+@boot.component('noticias_comex', optional=True)
+def _load_noticias_comex(app):
     from routes.noticias_comex import bp as noticias_comex_bp
     app.register_blueprint(noticias_comex_bp)
     print("✅ Notícias COMEX API registrado")
-except Exception as e:
-    print(f"⚠️ Não foi possível registrar notícias COMEX API: {e}")
-
-# Register importacoes blueprints (módulo de importações completo)
-register_importacoes_blueprints(app)
-
-# Register financeiro blueprints (módulo financeiro completo)
-register_financeiro_blueprints(app)
-
-# Register RH blueprints (módulo de RH completo)
-register_rh_blueprints(app)
-
-# Register Carreiras blueprint (portal público de vagas)
-app.register_blueprint(carreiras_bp)
 
-# Register analytics blueprint
-app.register_blueprint(analytics_bp)
-print("✅ Analytics blueprint registrado")
-
-# Register external accounting portal blueprint
-app.register_blueprint(contabilidade_externa_bp)
-print("✅ Portal contabilidade externo registrado")
-# Register i18n blueprint
-app.register_blueprint(i18n_bp)
-print("✅ i18n blueprint registrado")
-
-# Register usuarios_online blueprint (admin)
-app.register_blueprint(usuarios_online_bp)
-print("✅ Usuários Online (Admin) blueprint registrado")
+@boot.component('importacoes')
+def _load_importacoes(app):
+    # Módulo de importações completo (conferência, dashboards, relatórios...)
+    from modules.importacoes import register_importacoes_blueprints
+    register_importacoes_blueprints(app)
+
+@boot.component('financeiro')
+def _load_financeiro(app):
+    from modules.financeiro.routes import register_financeiro_blueprints
+    register_financeiro_blueprints(app)
+
+@boot.component('rh')
+def _load_rh(app):
+    from modules.rh import register_rh_blueprints
+    register_rh_blueprints(app)
+
+@boot.component('carreiras')
+def _load_carreiras(app):
+    # Portal público de vagas
+    from modules.carreiras import carreiras_bp
+    app.register_blueprint(carreiras_bp)
+
+@boot.component('analytics')
+def _load_analytics(app):
+    from modules.analytics.routes import bp as analytics_bp
+    app.register_blueprint(analytics_bp)
+    print("✅ Analytics blueprint registrado")
+
+@boot.component('contabilidade_externa')
+def _load_contabilidade_externa(app):
+    from modules.contabilidade_externa import contabilidade_externa_bp
+    app.register_blueprint(contabilidade_externa_bp)
+    print("✅ Portal contabilidade externo registrado")
+
+@boot.component('i18n_usuarios_online', lazy=False)
+def _load_i18n_usuarios_online(app):
+    from modules.i18n import i18n_bp
+    from modules.usuarios_online.routes import bp as usuarios_online_bp
+    app.register_blueprint(i18n_bp)
+    print("✅ i18n blueprint registrado")
+    # Register usuarios_online blueprint (admin)
+    app.register_blueprint(usuarios_online_bp)
+    print("✅ Usuários Online (Admin) blueprint registrado")
+
+@boot.component('desempenho')
+def _load_desempenho(app):
+    from modules.desempenho.routes import bp as desempenho_bp
+    app.register_blueprint(desempenho_bp)
+    print("✅ Desempenho (Admin) blueprint registrado")
+
+# No modo eager todos os componentes carregam aqui, na ordem declarada
+boot.load_core(app)
 
 # Register module color helpers for templates
 register_module_color_helpers(app)
@@ -399,14 +392,10 @@ def test_menu_noticias():
     except FileNotFoundError:
         return "Arquivo de teste não encontrado", 404
 
+# Tempos do boot; no modo lazy agenda o aquecimento dos componentes adiados
+boot.finish(app)
+
 if __name__ == '__main__':   
-    # Registrar WebSocket event handlers
-    print("\n[DEBUG] ===== Registrando WebSocket Events =====")
-    from websocket_events import register_events
-    register_events(socketio, extensions.supabase_admin)
-    print("[DEBUG] WebSocket events registrados com sucesso")
-    print("[DEBUG] ======================================\n")
-    
     # Start server based on FLASK_ENV
     flask_env = os.getenv('FLASK_ENV', app.config.get('ENV', 'production'))
     if flask_env == 'development':
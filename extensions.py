@@ -1,56 +1,47 @@
 from supabase import create_client, Client
 from flask import current_app
+from log_config import log_print, log_printf
 
 supabase: Client = None
 supabase_admin: Client = None
+# Instância do Flask-SocketIO (definida em app.py) para emissões fora dos handlers
+socketio = None
 
 def init_supabase(app):
-    print("\n[DEBUG] ===== Iniciando configuração do Supabase =====")
+    log_print("\n[DEBUG] ===== Iniciando configuração do Supabase =====")
     
     # Check if required environment variables are set
     if not app.config['SUPABASE_URL']:
-        print("[DEBUG] ERRO: SUPABASE_URL não está configurado")
+        log_print("[DEBUG] ERRO: SUPABASE_URL não está configurado")
         raise ValueError("SUPABASE_URL environment variable is not set")
     if not app.config['SUPABASE_SERVICE_KEY']:
-        print("[DEBUG] ERRO: SUPABASE_SERVICE_KEY não está configurado")
+        log_print("[DEBUG] ERRO: SUPABASE_SERVICE_KEY não está configurado")
         raise ValueError("SUPABASE_SERVICE_KEY environment variable is not set")
     if not app.config['SUPABASE_SERVICE_KEY']:
-        print("[DEBUG] ERRO: SUPABASE_SERVICE_KEY não está configurado")
+        log_print("[DEBUG] ERRO: SUPABASE_SERVICE_KEY não está configurado")
         raise ValueError("SUPABASE_SERVICE_KEY environment variable is not set. This is required for admin operations.")
     
-    print(f"[DEBUG] SUPABASE_URL: {app.config['SUPABASE_URL']}")
-    print(f"[DEBUG] SUPABASE_SERVICE_KEY (primeiros 10 caracteres): {app.config['SUPABASE_SERVICE_KEY'][:10] if app.config['SUPABASE_SERVICE_KEY'] else 'None'}")
-    print(f"[DEBUG] SUPABASE_SERVICE_KEY (primeiros 10 caracteres): {app.config['SUPABASE_SERVICE_KEY'][:10] if app.config['SUPABASE_SERVICE_KEY'] else 'None'}")
+    log_printf("[DEBUG] SUPABASE_URL: %s", app.config['SUPABASE_URL'])
+    log_printf("[DEBUG] SUPABASE_SERVICE_KEY (primeiros 10 caracteres): %s", app.config['SUPABASE_SERVICE_KEY'][:10] if app.config['SUPABASE_SERVICE_KEY'] else 'None')
+    log_printf("[DEBUG] SUPABASE_SERVICE_KEY (primeiros 10 caracteres): %s", app.config['SUPABASE_SERVICE_KEY'][:10] if app.config['SUPABASE_SERVICE_KEY'] else 'None')
     
     try:
+        from services.supabase_transport import install as install_transport, transport
+
         # Regular client for normal operations
-        print("\n[DEBUG] Criando cliente regular do Supabase...")
-        print(f"[DEBUG] URL do cliente regular: {app.config['SUPABASE_URL']}")
-        print(f"[DEBUG] Chave do cliente regular (primeiros 10 caracteres): {app.config['SUPABASE_SERVICE_KEY'][:10]}")
-        supabase = create_client(app.config['SUPABASE_URL'], app.config['SUPABASE_SERVICE_KEY'])
-        
-        # Test the regular client
-        print("[DEBUG] Testando cliente regular...")
-        response = supabase.table('users').select("*").limit(1).execute()
-        print(f"[DEBUG] Resposta do teste do cliente regular: {response}")
-        print("[DEBUG] Cliente regular do Supabase criado e testado com sucesso")
+        log_print("\n[DEBUG] Criando cliente regular do Supabase...")
+        supabase = install_transport(create_client(app.config['SUPABASE_URL'], app.config['SUPABASE_SERVICE_KEY']))
         
         # Admin client for privileged operations
-        print("\n[DEBUG] Criando cliente admin do Supabase...")
-        print(f"[DEBUG] URL do cliente admin: {app.config['SUPABASE_URL']}")
-        print(f"[DEBUG] Chave do cliente admin (primeiros 10 caracteres): {app.config['SUPABASE_SERVICE_KEY'][:10]}")
-        supabase_admin = create_client(app.config['SUPABASE_URL'], app.config['SUPABASE_SERVICE_KEY'])
-        
-        # Test the admin client
-        print("[DEBUG] Testando cliente admin...")
-        response = supabase_admin.table('users').select("*").limit(1).execute()
-        print(f"[DEBUG] Resposta do teste do cliente admin: {response}")
-        print("[DEBUG] Cliente admin do Supabase criado e testado com sucesso")
+        log_print("[DEBUG] Criando cliente admin do Supabase...")
+        supabase_admin = install_transport(create_client(app.config['SUPABASE_URL'], app.config['SUPABASE_SERVICE_KEY']))
         
-        print("[DEBUG] ===== Configuração do Supabase concluída =====\n")
+        # Sem consultas de teste no boot: o health check é feito sob demanda (services.supabase_transport.check_health)
+        log_printf("[DEBUG] Clientes Supabase usando pool compartilhado (HTTP/2: %s)", transport.http2)
+        log_print("[DEBUG] ===== Configuração do Supabase concluída =====\n")
         return supabase, supabase_admin
     except Exception as e:
-        print(f"\n[DEBUG] ERRO ao criar/testar clientes Supabase:")
-        print(f"[DEBUG] Tipo do erro: {type(e)}")
-        print(f"[DEBUG] Mensagem do erro: {str(e)}")
+        log_print(f"\n[DEBUG] ERRO ao criar clientes Supabase:")
+        log_printf("[DEBUG] Tipo do erro: %s", type(e))
+        log_printf("[DEBUG] Mensagem do erro: %s", str(e))
         raise 
\ No newline at end of file
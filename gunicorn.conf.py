@@ -0,0 +1,21 @@
+"""
+Configuração do gunicorn (lida automaticamente a partir do diretório de trabalho).
+
+Os parâmetros de linha de comando do Dockerfile continuam valendo; aqui fica
+apenas o que depende de ambiente:
+
+- GUNICORN_PRELOAD=1: o master importa o app uma vez e os workers herdam a
+  memória por copy-on-write (boot dos workers praticamente instantâneo).
+  Use com BOOT_MODE=eager (padrão), para que tudo carregue antes do fork.
+  Conexões abertas no import (pool do Supabase) são recriadas em cada worker
+  via services.boot.register_after_fork.
+"""
+import os
+
+preload_app = os.getenv('GUNICORN_PRELOAD', '0').lower() in ('1', 'true', 'yes', 'on')
+
+if preload_app:
+    # Com preload o app é importado no master, antes do worker gevent aplicar
+    # o monkey patch; sem isso sockets/locks criados no import não cooperam.
+    from gevent import monkey
+    monkey.patch_all()
@@ -6,61 +6,280 @@ Níveis de log sugeridos:
 - Desenvolvimento: INFO (informações gerais + erros)
 - Debug: DEBUG (todos os logs, incluindo detalhes técnicos)
 
+Pipeline:
+- os registros vão para uma fila em memória e são formatados/escritos por
+  uma thread de escrita (thread real do SO mesmo com gevent), em lotes; a
+  requisição não faz I/O de stdout (LOG_ASYNC=0 volta ao handler síncrono)
+- LOG_FORMAT=json grava um objeto JSON por linha (ts, level, logger, tag,
+  msg, pid e campos extra); o padrão continua sendo texto
+- a mensagem só é montada na thread de escrita (use logger.debug("... %s", x)
+  em vez de f-strings para que a formatação também seja adiada)
+- eventos DEBUG de alta frequência podem ser amostrados por tag:
+  LOG_SAMPLE_RATES="CACHE=0.01,PRELOAD=0.1" (LOG_DEBUG_SAMPLE_RATE para o resto)
+- log_print / log_printf substituem print(...) com [TAG]: o nível vem do
+  conteúdo (erro/aviso) ou de LOG_PRINT_LEVEL (DEBUG em produção), e o
+  descarte acontece antes de qualquer formatação.
+  scripts/route_prints_to_logging.py faz a troca nos arquivos.
+
 Uso no app.py:
     import logging
     from log_config import configure_logging
-    
+
     configure_logging(level='WARNING')  # ou 'INFO', 'DEBUG'
+
+Uso no lugar de print:
+    from log_config import log_print, log_printf
+
+    log_print(f"[CACHE] Cache limpo para usuário: {user_id}")
+    log_printf("[PRELOAD] CNPJs únicos encontrados: %s", unique_cnpjs)  # formata só se for gravado
 """
 
+from collections import deque
+import atexit
+import json
 import logging
+import re
 import sys
 import os
+import time
+
+LOG_ASYNC = os.getenv('LOG_ASYNC', '1').lower() in ('1', 'true', 'yes', 'on')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()
+LOG_QUEUE_MAX = int(os.getenv('LOG_QUEUE_MAX', '10000'))
+LOG_FLUSH_INTERVAL = float(os.getenv('LOG_FLUSH_INTERVAL', '0.05'))
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv('LOG_DEBUG_SAMPLE_RATE', '1'))
+TEXT_FORMAT = '[%(levelname)s] %(name)s: %(message)s'
+
+# Atributos padrão de LogRecord (o resto vira campo extra no JSON)
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'tag'}
+
+
+def _parse_sample_rates(value):
+    rates = {}
+    for item in value.split(','):
+        tag, _, rate = item.partition('=')
+        if tag.strip() and rate.strip():
+            rates[tag.strip().upper()] = float(rate)
+    return rates
+
+
+LOG_SAMPLE_RATES = _parse_sample_rates(os.getenv('LOG_SAMPLE_RATES', ''))
+
+
+class DebugSampler:
+    """Mantém 1 a cada round(1/taxa) eventos DEBUG por tag (contador, sem random)"""
+
+    def __init__(self, rates=None, default_rate=LOG_DEBUG_SAMPLE_RATE):
+        self.rates = dict(rates or {})
+        self.default_rate = default_rate
+        self._counters = {}
+        self.sampled_out = 0
+
+    def keep(self, tag):
+        rate = self.rates.get(tag, self.default_rate) if tag else self.default_rate
+        if rate >= 1:
+            return True
+        if rate <= 0:
+            self.sampled_out += 1
+            return False
+        every = max(int(round(1 / rate)), 1)
+        count = self._counters.get(tag, 0) + 1
+        self._counters[tag] = count
+        if count % every == 1 or every == 1:
+            return True
+        self.sampled_out += 1
+        return False
+
+
+sampler = DebugSampler(LOG_SAMPLE_RATES)
+
+
+class SamplingFilter(logging.Filter):
+    """Aplica o DebugSampler aos registros DEBUG que passam pelo handler"""
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or getattr(record, '_sampled', False):
+            return True
+        return sampler.keep(getattr(record, 'tag', None) or _tag_of(record.msg))
+
+
+class JsonFormatter(logging.Formatter):
+    """Um objeto JSON por linha"""
+
+    def format(self, record):
+        payload = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'pid': record.process,
+        }
+        tag = getattr(record, 'tag', None)
+        if tag:
+            payload['tag'] = tag
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                payload[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload['exc'] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+def _original(module, name, default):
+    """Função original do módulo mesmo se o gevent aplicou monkey patch"""
+    try:
+        from gevent import monkey
+        return monkey.get_original(module, name)
+    except ImportError:
+        return default
+
+
+class AsyncLogHandler(logging.Handler):
+    """Enfileira registros; uma thread de escrita formata e grava em lotes.
+
+    A fila é limitada (LOG_QUEUE_MAX): em rajadas os registros excedentes
+    são descartados e contados em vez de bloquear a requisição.
+    """
+
+    def __init__(self, stream=None, max_size=LOG_QUEUE_MAX, flush_interval=LOG_FLUSH_INTERVAL):
+        super().__init__()
+        self.stream = stream or sys.stdout
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.dropped = 0
+        self._queue = deque()
+        self._running = False
+        self._start_writer()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+        atexit.register(self.drain)
+
+    def _start_writer(self):
+        # Thread real do SO: a escrita em stdout não bloqueia o hub do gevent
+        start_new_thread = _original('_thread', 'start_new_thread', None)
+        if start_new_thread is None:
+            import _thread
+            start_new_thread = _thread.start_new_thread
+        self._sleep = _original('time', 'sleep', time.sleep)
+        self._running = True
+        start_new_thread(self._writer, ())
+
+    def _after_fork(self):
+        # O processo filho não herda a thread de escrita; a fila herdada é do pai
+        self._queue.clear()
+        self._start_writer()
+
+    def emit(self, record):
+        if len(self._queue) >= self.max_size:
+            self.dropped += 1
+            return
+        if record.exc_info:
+            # Traceback formatado aqui: os frames não ficam presos na fila
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        self._queue.append(record)
+
+    def _writer(self):
+        while self._running:
+            if not self._queue:
+                self._sleep(self.flush_interval)
+                continue
+            self.drain()
+
+    def drain(self):
+        """Formata e grava tudo o que está na fila"""
+        lines = []
+        while self._queue:
+            try:
+                record = self._queue.popleft()
+            except IndexError:
+                break
+            try:
+                lines.append(self.format(record))
+            except Exception:
+                self.handleError(record)
+        if not lines:
+            return
+        try:
+            self.stream.write('\n'.join(lines) + '\n')
+            self.stream.flush()
+            self.written += len(lines)
+        except Exception:
+            pass
+
+    def stats(self):
+        return {
+            'queued': len(self._queue),
+            'written': self.written,
+            'dropped': self.dropped,
+            'sampled_out': sampler.sampled_out,
+        }
+
+
+_handler = None
+
 
 def configure_logging(level='INFO'):
     """
     Configura o sistema de logging da aplicação
-    
+
     Args:
         level (str): Nível de log ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
     """
+    global _handler
+
     # Converter string para nível de logging
     numeric_level = getattr(logging, level.upper(), logging.INFO)
-    
+
     # Configuração do formato de log
-    log_format = '[%(levelname)s] %(name)s: %(message)s'
-    
-    # Configurar logging básico
-    logging.basicConfig(
-        level=numeric_level,
-        format=log_format,
-        handlers=[
-            logging.StreamHandler(sys.stdout)
-        ]
-    )
-    
+    formatter = JsonFormatter() if LOG_FORMAT == 'json' else logging.Formatter(TEXT_FORMAT)
+
+    # Handler raiz: fila + thread de escrita (ou stdout síncrono com LOG_ASYNC=0)
+    root = logging.getLogger()
+    if _handler is not None:
+        root.removeHandler(_handler)
+    else:
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+    _handler = AsyncLogHandler(sys.stdout) if LOG_ASYNC else logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(formatter)
+    _handler.addFilter(SamplingFilter())
+    root.addHandler(_handler)
+    root.setLevel(numeric_level)
+
     # Configurar loggers específicos
-    
+
     # Silenciar logs muito verbosos de bibliotecas externas
     logging.getLogger('httpx').setLevel(logging.WARNING)
     logging.getLogger('werkzeug').setLevel(logging.INFO)
     logging.getLogger('urllib3').setLevel(logging.WARNING)
-    
+
     # Configurar loggers da aplicação
     logging.getLogger('services.perfil_access_service').setLevel(
         logging.DEBUG if numeric_level <= logging.DEBUG else logging.INFO
     )
-    
+
     logging.getLogger('modules.importacoes.dashboards.executivo').setLevel(
         logging.DEBUG if numeric_level <= logging.DEBUG else logging.INFO
     )
-    
+
     # Log da configuração
     logger = logging.getLogger(__name__)
-    logger.info(f"Logging configurado com nível: {level}")
-    
+    logger.info(f"Logging configurado com nível: {level} (formato: {LOG_FORMAT}, assíncrono: {LOG_ASYNC})")
+
     return logger
 
+
+def logging_stats():
+    """Contadores do pipeline (fila, gravados, descartados, amostrados)"""
+    if isinstance(_handler, AsyncLogHandler):
+        return _handler.stats()
+    return {'async': False, 'sampled_out': sampler.sampled_out}
+
+
 def get_log_level_from_env():
     """
     Obtém o nível de log da variável de ambiente LOG_LEVEL
@@ -68,6 +287,85 @@ def get_log_level_from_env():
     """
     return os.getenv('LOG_LEVEL', 'INFO')
 
+
+# -------------------------------------------------------------
+# Substituto de print(...) para as mensagens com [TAG]
+# -------------------------------------------------------------
+
+_TAG_RE = re.compile(r'^\s*\[([A-Za-z0-9_ -]+)\]')
+_ERROR_MARKERS = ('❌', 'ERRO', 'Erro', 'erro', 'ERROR', 'Error', 'Falha', 'falha', 'FALHA', 'Traceback')
+_WARNING_MARKERS = ('⚠️', 'WARN', 'Warn', 'AVISO', 'Aviso')
+_print_loggers = {}
+
+# Nível das mensagens comuns (sem marcador de erro/aviso)
+LOG_PRINT_LEVEL = getattr(logging, os.getenv(
+    'LOG_PRINT_LEVEL', 'INFO' if os.getenv('FLASK_ENV') == 'development' else 'DEBUG').upper(), logging.DEBUG)
+
+
+def _tag_of(message):
+    if not isinstance(message, str):
+        return None
+    match = _TAG_RE.match(message)
+    return match.group(1).strip().upper() if match else None
+
+
+def _print_level(head, tag):
+    if tag and ('ERRO' in tag or 'ERROR' in tag):
+        return logging.ERROR
+    if any(marker in head for marker in _ERROR_MARKERS):
+        return logging.ERROR
+    if any(marker in head for marker in _WARNING_MARKERS):
+        return logging.WARNING
+    return LOG_PRINT_LEVEL
+
+
+def _print_logger(tag):
+    logger = _print_loggers.get(tag)
+    if logger is None:
+        logger = _print_loggers[tag] = logging.getLogger(f"app.{(tag or 'print').lower().replace(' ', '_')}")
+    return logger
+
+
+class _PrintMessage:
+    """Mensagem de print montada só quando o registro é formatado"""
+
+    __slots__ = ('args', 'sep')
+
+    def __init__(self, args, sep):
+        self.args = args
+        self.sep = sep
+
+    def __str__(self):
+        return self.sep.join(str(arg) for arg in self.args).strip('\n')
+
+
+def _emit(level, tag, msg, args):
+    logger = _print_logger(tag)
+    if not logger.isEnabledFor(level):
+        return
+    if level <= logging.DEBUG and not sampler.keep(tag):
+        return
+    record = logger.makeRecord(logger.name, level, '(print)', 0, msg, args, None, extra={'tag': tag, '_sampled': True})
+    logger.handle(record)
+
+
+def log_print(*args, sep=' ', end='\n', file=None, flush=False):
+    """Mesma assinatura de print(); grava pelo logging com tag e nível inferidos"""
+    if file is not None and file not in (sys.stdout, sys.__stdout__):
+        print(*args, sep=sep, end=end, file=file, flush=flush)
+        return
+    if not args:
+        return
+    head = args[0] if isinstance(args[0], str) else str(args[0])
+    tag = _tag_of(head)
+    _emit(_print_level(head[:200], tag), tag, _PrintMessage(args, sep), ())
+
+
+def log_printf(template, *args):
+    """Como print(template % args), mas só formata se a mensagem for gravada"""
+    tag = _tag_of(template)
+    _emit(_print_level(template[:200], tag), tag, template.strip('\n'), args)
+
 # Exemplo de uso no app.py:
 # from log_config import configure_logging, get_log_level_from_env
 # configure_logging(level=get_log_level_from_env())
@@ -1,45 +1,45 @@
 """
 Middleware para rastreamento automático de navegação de páginas
 Injeta JavaScript em todas as páginas HTML para tracking via WebSocket
+
+O script é compilado uma única vez (bytes) e inserido antes do último
+</body> direto no corpo já codificado, sem decodificar/recodificar a página.
+Respostas em streaming, passthrough (send_file) ou acima de
+PAGE_TRACKING_MAX_BYTES não são alteradas. Quais rotas recebem o script é
+decidido por endpoint (registro de blueprints/endpoints excluídos ou o
+decorator no_page_tracking), com a decisão memorizada por endpoint.
+
+Usage:
+    from middleware.page_tracking import page_tracking, no_page_tracking
+
+    page_tracking.exclude_blueprint('contabilidade_externa')
+
+    @bp.route('/impressao')
+    @no_page_tracking
+    def impressao():
+        ...
+
+    page_tracking.stats()  # {'injected': ..., 'avg_ms': ..., 'over_budget': ...}
 """
 from flask import request, g, session
 import logging
+import os
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
-class PageTrackingMiddleware:
-    """Middleware para injetar script de tracking em páginas HTML"""
-    
-    def __init__(self, app=None):
-        self.app = app
-        if app is not None:
-            self.init_app(app)
-    
-    def init_app(self, app):
-        """Inicializa middleware com a aplicação Flask"""
-        app.after_request(self.inject_tracking_script)
-        logger.info("✅ PageTrackingMiddleware inicializado")
-    
-    def inject_tracking_script(self, response):
-        """
-        Injeta script de tracking em páginas HTML
-        """
-        # Só injeta em páginas HTML
-        if 'text/html' not in response.content_type:
-            return response
-        
-        # Não injeta em páginas de login, logout ou públicas
-        excluded_paths = ['/login', '/logout', '/auth/', '/static/', '/carreiras/']
-        if any(request.path.startswith(path) for path in excluded_paths):
-            return response
-        
-        # Verifica se usuário está autenticado
-        if 'user_id' not in session:
-            return response
-        
-        try:
-            # Script de tracking via Heartbeat (Substitui WebSocket)
-            tracking_script = """
+# Páginas maiores que isso são entregues sem o script (evita copiar corpos grandes)
+PAGE_TRACKING_MAX_BYTES = int(os.getenv('PAGE_TRACKING_MAX_BYTES', str(2 * 1024 * 1024)))
+# Orçamento de tempo por requisição para a injeção; acima dele é registrado aviso
+PAGE_TRACKING_BUDGET_MS = float(os.getenv('PAGE_TRACKING_BUDGET_MS', '2'))
+
+# Páginas de login/logout, públicas e arquivos estáticos
+DEFAULT_EXCLUDED_BLUEPRINTS = ('auth', 'carreiras')
+DEFAULT_EXCLUDED_ENDPOINTS = ('static',)
+
+# Script de tracking via Heartbeat (Substitui WebSocket)
+TRACKING_SCRIPT = """
 <script>
 // Page Tracking via Heartbeat
 (function() {
@@ -63,23 +63,154 @@ class PageTrackingMiddleware:
 
     // Configura intervalo
     setInterval(sendHeartbeat, HEARTBEAT_INTERVAL);
-    
+
     console.log('📊 Page tracking ativo (Heartbeat):', window.location.pathname);
 })();
 </script>
-</body>
 """
-            # Substitui </body> pelo script + </body>
-            data = response.get_data(as_text=True)
-            if '</body>' in data:
-                data = data.replace('</body>', tracking_script)
-                response.set_data(data)
-        
-        except Exception as e:
-            logger.error(f"Erro ao injetar tracking script: {str(e)}")
-        
+
+BODY_CLOSE = b'</body>'
+
+
+def no_page_tracking(view):
+    """Marca a view para não receber o script de tracking"""
+    view._no_page_tracking = True
+    return view
+
+
+class PageTrackingMiddleware:
+    """Middleware para injetar script de tracking em páginas HTML"""
+
+    def __init__(self, app=None):
+        self.app = app
+        self.excluded_blueprints = set(DEFAULT_EXCLUDED_BLUEPRINTS)
+        self.excluded_endpoints = set(DEFAULT_EXCLUDED_ENDPOINTS)
+        self.max_bytes = PAGE_TRACKING_MAX_BYTES
+        self.budget_ms = PAGE_TRACKING_BUDGET_MS
+        # Script já codificado, por charset (normalmente só utf-8)
+        self._compiled = {'utf-8': TRACKING_SCRIPT.encode('utf-8')}
+        # endpoint -> injeta? (calculado na primeira requisição de cada endpoint)
+        self._decisions = {}
+        self._stats = {'injected': 0, 'skipped': {}, 'total_ms': 0.0, 'max_ms': 0.0, 'over_budget': 0}
+        self._stats_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Inicializa middleware com a aplicação Flask"""
+        self.app = app
+        app.after_request(self.inject_tracking_script)
+        logger.info("✅ PageTrackingMiddleware inicializado")
+
+    # ---- registro por endpoint ----
+
+    def exclude_blueprint(self, *names):
+        self.excluded_blueprints.update(names)
+        self._decisions.clear()
+
+    def exclude_endpoint(self, *endpoints):
+        self.excluded_endpoints.update(endpoints)
+        self._decisions.clear()
+
+    def _tracks_endpoint(self, endpoint):
+        decision = self._decisions.get(endpoint)
+        if decision is None:
+            decision = self._resolve(endpoint)
+            self._decisions[endpoint] = decision
+        return decision
+
+    def _resolve(self, endpoint):
+        if not endpoint or endpoint in self.excluded_endpoints:
+            return False
+        blueprint, _, name = endpoint.rpartition('.')
+        # Arquivos estáticos dos blueprints (<bp>.static)
+        if name == 'static':
+            return False
+        if blueprint and blueprint.split('.')[0] in self.excluded_blueprints:
+            return False
+        view = self.app.view_functions.get(endpoint) if self.app is not None else None
+        return not getattr(view, '_no_page_tracking', False)
+
+    # ---- injeção ----
+
+    def _snippet(self, charset):
+        charset = (charset or 'utf-8').lower()
+        compiled = self._compiled.get(charset)
+        if compiled is None:
+            compiled = TRACKING_SCRIPT.encode(charset, errors='xmlcharrefreplace')
+            self._compiled[charset] = compiled
+        return compiled
+
+    def _skip_reason(self, response):
+        if response.mimetype != 'text/html':
+            return 'not_html'
+        if response.direct_passthrough or response.is_streamed:
+            return 'streamed'
+        if not self._tracks_endpoint(request.endpoint):
+            return 'endpoint'
+        # Verifica se usuário está autenticado
+        if 'user_id' not in session:
+            return 'anonymous'
+        if response.content_length is not None and response.content_length > self.max_bytes:
+            return 'too_large'
+        return None
+
+    def inject_tracking_script(self, response):
+        """
+        Injeta script de tracking em páginas HTML
+        """
+        started = time.perf_counter()
+        reason = self._skip_reason(response)
+        if reason is None:
+            try:
+                body = response.get_data()
+                position = body.rfind(BODY_CLOSE)
+                if position == -1:
+                    reason = 'no_body_tag'
+                else:
+                    response.set_data(b''.join((body[:position], self._snippet(response.mimetype_params.get('charset')), body[position:])))
+            except Exception as e:
+                reason = 'error'
+                logger.error(f"Erro ao injetar tracking script: {str(e)}")
+            self._record(reason, (time.perf_counter() - started) * 1000)
+        elif reason != 'not_html':
+            self._record(reason, None)
         return response
 
+    # ---- métricas ----
+
+    def _record(self, reason, elapsed_ms):
+        with self._stats_lock:
+            if reason is None:
+                self._stats['injected'] += 1
+            else:
+                self._stats['skipped'][reason] = self._stats['skipped'].get(reason, 0) + 1
+            if elapsed_ms is None:
+                return
+            self._stats['total_ms'] += elapsed_ms
+            self._stats['max_ms'] = max(self._stats['max_ms'], elapsed_ms)
+            over_budget = elapsed_ms > self.budget_ms
+            if over_budget:
+                self._stats['over_budget'] += 1
+        if over_budget:
+            logger.warning(f"Injeção do tracking em {request.endpoint} levou {elapsed_ms:.2f}ms "
+                           f"(orçamento {self.budget_ms:.2f}ms)")
+
+    def stats(self):
+        """Contadores de injeção e custo por requisição (em ms)"""
+        with self._stats_lock:
+            measured = self._stats['injected'] + sum(
+                count for reason, count in self._stats['skipped'].items() if reason in ('no_body_tag', 'error'))
+            return {
+                'injected': self._stats['injected'],
+                'skipped': dict(self._stats['skipped']),
+                'avg_ms': round(self._stats['total_ms'] / measured, 3) if measured else 0.0,
+                'max_ms': round(self._stats['max_ms'], 3),
+                'budget_ms': self.budget_ms,
+                'over_budget': self._stats['over_budget'],
+                'endpoints_resolved': len(self._decisions),
+            }
+
 
 # Instância global
 page_tracking = PageTrackingMiddleware()
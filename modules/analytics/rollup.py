@@ -0,0 +1,339 @@
+"""
+Agregados incrementais (rollups) dos acessos ao portal.
+
+Os endpoints de analytics respondiam baixando até 30 dias de linhas de
+`vw_analytics_portal` com select('*') e recontando tudo a cada requisição.
+Aqui os acessos são agregados uma única vez em baldes por (data, hora) com
+as dimensões usuário, perfil, módulo, página e dispositivo; a cada consulta
+apenas as linhas novas desde a marca d'água (access_timestamp_br) são lidas
+e somadas aos baldes. As dimensões são codificadas como inteiros
+(dicionário de strings), então cada combinação ocupa uma tupla curta.
+
+Linhas gravadas com atraso (transação confirmada depois de outras com
+timestamp maior) ficariam abaixo da marca d'água para sempre: cada incremento
+relê uma janela de sobreposição (ROLLUP_OVERLAP_SECONDS antes da marca) e
+descarta os log_id já somados, lembrados apenas dentro dessa janela. log_id é
+uuid (access_logs.id), então não serve como chave monotônica.
+
+Custo: o rollup é por processo. Cada worker do gunicorn faz a própria carga
+inicial da janela de retenção (ROLLUP_RETENTION_DAYS, ~N/1000 requisições
+paginadas para N acessos no período) no primeiro uso de analytics e mantém
+os baldes em memória; depois disso só os incrementos.
+
+Medidas por combinação: acessos, acessos com sucesso, soma e quantidade dos
+tempos de resposta válidos. Os agregados diários são derivados das horas.
+
+Usage:
+    from modules.analytics.rollup import get_analytics_rollup
+
+    rollup = get_analytics_rollup()
+    por_dia = rollup.count_by('date', start_date=inicio, end_date=fim, role='admin')
+    por_hora_usuario = rollup.count_by('hour', 'user', start_date=inicio, end_date=fim)
+"""
+
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+import logging
+import os
+import threading
+import time
+
+from extensions import supabase_admin
+from services.retry_utils import run_with_policy
+from services.supabase_transport import call_class
+from services.single_flight import single_flight
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_SOURCE = 'vw_analytics_portal'
+ROLLUP_COLUMNS = (
+    'log_id, user_id, user_name, user_email, user_role, module_name, page_name, '
+    'device_type, access_date, access_hour, access_timestamp_br, is_successful, response_time_ms'
+)
+ROLLUP_PAGE_SIZE = 1000
+ROLLUP_RETENTION_DAYS = int(os.getenv('ANALYTICS_ROLLUP_RETENTION_DAYS', '45'))
+ROLLUP_REFRESH_SECONDS = int(os.getenv('ANALYTICS_ROLLUP_REFRESH_SECONDS', '30'))
+# Janela relida antes da marca d'água a cada incremento (linhas confirmadas com atraso)
+ROLLUP_OVERLAP_SECONDS = int(os.getenv('ANALYTICS_ROLLUP_OVERLAP_SECONDS', '600'))
+
+# Posições das dimensões na chave de cada combinação
+_USER, _ROLE, _MODULE, _PAGE, _DEVICE = range(5)
+_DIMENSIONS = {'user': _USER, 'role': _ROLE, 'module': _MODULE, 'page': _PAGE, 'device': _DEVICE}
+# Dimensões derivadas do balde (não da combinação)
+_BUCKET_DIMENSIONS = ('date', 'hour', 'dow')
+
+
+def _parse_timestamp(value):
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return None
+
+
+def _day_of_week(day_str):
+    """Mesma convenção de day_of_week da view: 0=Domingo ... 6=Sábado"""
+    return (date.fromisoformat(day_str).weekday() + 1) % 7
+
+
+class AnalyticsRollup:
+    """Baldes horários de acessos com dimensões codificadas"""
+
+    def __init__(self, retention_days=ROLLUP_RETENTION_DAYS):
+        self.retention_days = retention_days
+        # {(access_date, access_hour): {(user, role, module, page, device): [acessos, sucessos, rt_soma, rt_qtd]}}
+        self.buckets = defaultdict(dict)
+        self.users = {}  # código do usuário -> {'user_id', 'user_name', 'user_email', 'user_role', 'last_access'}
+        self.watermark = None
+        self._recent_ids = {}  # log_id -> timestamp, dos acessos dentro da janela de sobreposição
+        self._values = [None]
+        self._codes = {None: 0}
+        self.last_sync = 0.0
+        self.rows_ingested = 0
+        self._lock = threading.Lock()
+
+    # ---- codificação das dimensões ----
+
+    def _encode(self, value):
+        if value == '':
+            value = None
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self._values)
+            self._values.append(value)
+            self._codes[value] = code
+        return code
+
+    def decode(self, code):
+        return self._values[code]
+
+    # ---- ingestão ----
+
+    def ingest(self, rows):
+        """Soma linhas da view aos baldes, avançando a marca d'água"""
+        added = 0
+        with self._lock:
+            for row in rows:
+                access_date = row.get('access_date')
+                hour = row.get('access_hour')
+                timestamp = row.get('access_timestamp_br')
+                log_id = row.get('log_id')
+                if not access_date or hour is None:
+                    continue
+                if log_id is not None and log_id in self._recent_ids:
+                    continue
+
+                user_code = self._encode(row.get('user_id'))
+                key = (
+                    user_code,
+                    self._encode(row.get('user_role')),
+                    self._encode(row.get('module_name')),
+                    self._encode(row.get('page_name')),
+                    self._encode(row.get('device_type')),
+                )
+                bucket = self.buckets[(access_date[:10], int(hour))]
+                measures = bucket.get(key)
+                if measures is None:
+                    measures = bucket[key] = [0, 0, 0, 0]
+                measures[0] += 1
+                if row.get('is_successful', True):
+                    measures[1] += 1
+                    response_time = row.get('response_time_ms')
+                    if response_time and response_time > 0:
+                        measures[2] += int(response_time)
+                        measures[3] += 1
+
+                if row.get('user_id'):
+                    user = self.users.get(user_code)
+                    if user is None:
+                        user = self.users[user_code] = {'user_id': row.get('user_id'), 'last_access': None}
+                    # Nome/e-mail/perfil mais recentes vencem
+                    for field in ('user_name', 'user_email', 'user_role'):
+                        if row.get(field):
+                            user[field] = row[field]
+                    if timestamp and (not user['last_access'] or timestamp > user['last_access']):
+                        user['last_access'] = timestamp
+
+                if timestamp:
+                    if self.watermark is None or timestamp > self.watermark:
+                        self.watermark = timestamp
+                    if log_id is not None:
+                        self._recent_ids[log_id] = timestamp
+                added += 1
+            self.rows_ingested += added
+            self._forget_old_ids()
+        return added
+
+    def _overlap_start(self):
+        """Início da releitura: marca d'água menos a janela de sobreposição"""
+        if self.watermark is None:
+            return None
+        parsed = _parse_timestamp(self.watermark)
+        if parsed is None:
+            return self.watermark
+        return (parsed - timedelta(seconds=ROLLUP_OVERLAP_SECONDS)).isoformat()
+
+    def _forget_old_ids(self):
+        """Chamado com self._lock adquirido: mantém só os log_id que ainda podem ser relidos"""
+        since = _parse_timestamp(self._overlap_start())
+        if since is None:
+            return
+        for log_id in [i for i, ts in self._recent_ids.items()
+                       if (_parse_timestamp(ts) or since) < since]:
+            del self._recent_ids[log_id]
+
+    def prune(self, today=None):
+        """Descarta baldes fora da janela de retenção"""
+        cutoff = ((today or date.today()) - timedelta(days=self.retention_days)).isoformat()
+        with self._lock:
+            for bucket_key in [k for k in self.buckets if k[0] < cutoff]:
+                del self.buckets[bucket_key]
+
+    def _fetch_page(self, since, offset):
+        query = supabase_admin.table(ROLLUP_SOURCE).select(ROLLUP_COLUMNS)
+        if since:
+            query = query.gte('access_timestamp_br', since)
+        else:
+            start = (date.today() - timedelta(days=self.retention_days)).isoformat()
+            query = query.gte('access_date', start)
+        query = query.order('access_timestamp_br').order('log_id')\
+            .range(offset, offset + ROLLUP_PAGE_SIZE - 1)
+        # Carga inicial (janela de retenção inteira) é leitura pesada
+        with call_class('report' if not since else 'read'):
+            response = run_with_policy('supabase.read', 'analytics.rollup.sync', query.execute)
+        return response.data or []
+
+    def sync(self):
+        """Lê da view as linhas a partir da marca d'água (menos a janela de sobreposição)"""
+        started = time.time()
+        with self._lock:
+            since = self._overlap_start()
+        full_load = since is None
+        offset = 0
+        added = 0
+        while True:
+            # O offset é relativo ao início da releitura calculado no começo da sincronização
+            page = self._fetch_page(since, offset)
+            added += self.ingest(page)
+            if len(page) < ROLLUP_PAGE_SIZE:
+                break
+            offset += ROLLUP_PAGE_SIZE
+        self.prune()
+        self.last_sync = time.time()
+        if added or full_load:
+            logger.info(
+                f"[ANALYTICS_ROLLUP] {'Carga inicial' if full_load else 'Incremento'}: "
+                f"{added} acessos em {time.time() - started:.2f}s (marca d'água: {self.watermark})"
+            )
+        return added
+
+    def is_stale(self):
+        return (time.time() - self.last_sync) >= ROLLUP_REFRESH_SECONDS
+
+    # ---- consultas ----
+
+    def _iter(self, start_date, end_date, role=None, module=None):
+        """(balde, chave, medidas) dentro do período e dos filtros"""
+        start = start_date.isoformat() if isinstance(start_date, date) else start_date
+        end = end_date.isoformat() if isinstance(end_date, date) else end_date
+        role_code = self._codes.get(role, -1) if role else None
+        module_code = self._codes.get(module, -1) if module else None
+        with self._lock:
+            selected = [(k, list(v.items())) for k, v in self.buckets.items() if start <= k[0] <= end]
+        for bucket_key, entries in selected:
+            for key, measures in entries:
+                if role_code is not None and key[_ROLE] != role_code:
+                    continue
+                if module_code is not None and key[_MODULE] != module_code:
+                    continue
+                yield bucket_key, key, measures
+
+    def _value(self, dimension, bucket_key, key):
+        if dimension == 'date':
+            return bucket_key[0]
+        if dimension == 'hour':
+            return bucket_key[1]
+        if dimension == 'dow':
+            return _day_of_week(bucket_key[0])
+        if dimension == 'user':
+            return key[_USER]
+        return self._values[key[_DIMENSIONS[dimension]]]
+
+    def count_by(self, *dimensions, start_date, end_date, role=None, module=None, known_users=False):
+        """Acessos agrupados por uma ou mais dimensões.
+
+        - dimensions: date, hour, dow, user (código, ver users), role, module, page, device
+        - known_users: considera apenas acessos de usuários identificados com nome
+        Com uma dimensão as chaves são valores; com várias, tuplas. Valores vazios são ignorados.
+        """
+        for dimension in dimensions:
+            if dimension not in _DIMENSIONS and dimension not in _BUCKET_DIMENSIONS:
+                raise ValueError(f"Dimensão desconhecida: {dimension}")
+        counts = Counter()
+        for bucket_key, key, measures in self._iter(start_date, end_date, role, module):
+            if known_users and not self.users.get(key[_USER], {}).get('user_name'):
+                continue
+            values = tuple(self._value(d, bucket_key, key) for d in dimensions)
+            if any(v is None or (d == 'user' and v == 0) for d, v in zip(dimensions, values)):
+                continue
+            counts[values[0] if len(values) == 1 else values] += measures[0]
+        return counts
+
+    def users_by(self, dimension, start_date, end_date, role=None, module=None):
+        """Usuários distintos por valor de uma dimensão ({valor: set(códigos)})"""
+        users = defaultdict(set)
+        for bucket_key, key, _ in self._iter(start_date, end_date, role, module):
+            if key[_USER]:
+                users[self._value(dimension, bucket_key, key)].add(key[_USER])
+        return users
+
+    def totals(self, start_date, end_date, role=None, module=None):
+        """Totais do período: acessos, sucessos, tempo médio de resposta e usuários distintos"""
+        access = success = rt_sum = rt_count = 0
+        users = set()
+        for _, key, measures in self._iter(start_date, end_date, role, module):
+            access += measures[0]
+            success += measures[1]
+            rt_sum += measures[2]
+            rt_count += measures[3]
+            if key[_USER]:
+                users.add(key[_USER])
+        return {
+            'access': access,
+            'success': success,
+            'avg_response_time_ms': int(rt_sum / rt_count) if rt_count else 0,
+            'unique_users': len(users),
+        }
+
+    def user(self, code):
+        return self.users.get(code, {})
+
+    def status(self):
+        with self._lock:
+            return {
+                'buckets': len(self.buckets),
+                'combinations': sum(len(b) for b in self.buckets.values()),
+                'dictionary_size': len(self._values),
+                'users': len(self.users),
+                'rows_ingested': self.rows_ingested,
+                'watermark': self.watermark,
+                'overlap_seconds': ROLLUP_OVERLAP_SECONDS,
+                'recent_ids': len(self._recent_ids),
+                'last_sync': datetime.fromtimestamp(self.last_sync).isoformat() if self.last_sync else None,
+                'retention_days': self.retention_days,
+            }
+
+
+_rollup = AnalyticsRollup()
+
+
+def get_analytics_rollup(force=False):
+    """Rollup global, sincronizado no máximo a cada ROLLUP_REFRESH_SECONDS"""
+    if force or _rollup.is_stale():
+        try:
+            single_flight.do('analytics_rollup:sync', _rollup.sync)
+        except Exception as e:
+            # Sem sincronizar ainda dá para responder com os agregados já carregados
+            if _rollup.watermark is None:
+                raise
+            logger.warning(f"[ANALYTICS_ROLLUP] Falha no incremento, usando agregados atuais: {e}")
+    return _rollup
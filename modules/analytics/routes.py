@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, jsonify, request, session
+from flask import Blueprint, render_template, jsonify, request, session, current_app
 from datetime import datetime, timedelta
 try:
     from zoneinfo import ZoneInfo  # Python 3.9+
@@ -8,9 +8,16 @@ import pytz  # Adicionar import do pytz
 from extensions import supabase_admin
 from modules.auth.routes import login_required
 from services.perfil_access_service import PerfilAccessService
+import hashlib
+import json
 import logging
 import os
-from services.retry_utils import run_with_retries
+import threading
+import time
+from collections import OrderedDict
+from services.retry_utils import run_with_policy
+from services.single_flight import single_flight
+from modules.analytics.rollup import get_analytics_rollup
 
 # Configurar logging
 logger = logging.getLogger(__name__)
@@ -54,6 +61,76 @@ bp = Blueprint('analytics', __name__,
                static_folder='static',
                template_folder='templates')
 
+def _filter_value(value):
+    """Converte o filtro 'all' dos endpoints em None para o rollup"""
+    return None if not value or value == 'all' else value
+
+# ======== PAINEL CONSOLIDADO (stats, charts, top-users, recent-activity, advanced-metrics) ========
+# A página dispara os cinco widgets em paralelo com os mesmos filtros; o painel é
+# montado uma única vez por (dateRange, userRole) e cada widget lê a sua parte.
+
+OVERVIEW_CACHE_TTL = int(os.getenv('ANALYTICS_OVERVIEW_TTL', '15'))
+OVERVIEW_CACHE_MAX_ENTRIES = 32
+OVERVIEW_WIDGETS = ('stats', 'charts', 'top_users', 'recent_activity', 'advanced_metrics')
+
+_overview_cache = OrderedDict()  # (dateRange, userRole) -> (expira_em, etag, payload)
+_overview_lock = threading.Lock()
+
+
+def _overview_params():
+    return request.args.get('dateRange', '30d'), request.args.get('userRole', 'all')
+
+
+def _build_overview(date_range, user_role):
+    """Monta todos os widgets a partir de uma única sincronização do rollup.
+
+    Falhas de um widget ficam registradas no próprio widget (a rota individual
+    devolve o seu payload de erro) e o painel com falhas não é guardado em cache.
+    """
+    started = time.time()
+    rollup = get_analytics_rollup()
+    builders = {
+        'stats': _build_stats,
+        'charts': _build_charts,
+        'top_users': _build_top_users,
+        'recent_activity': _build_recent_activity,
+        'advanced_metrics': _build_advanced_metrics,
+    }
+    payload, errors = {}, {}
+    for name in OVERVIEW_WIDGETS:
+        try:
+            payload[name] = builders[name](date_range, user_role, rollup)
+        except Exception as e:
+            logger.error(f"[ANALYTICS] Erro ao montar widget {name}: {e}")
+            errors[name] = e
+    etag = hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    if not errors:
+        with _overview_lock:
+            _overview_cache[(date_range, user_role)] = (time.time() + OVERVIEW_CACHE_TTL, etag, payload)
+            _overview_cache.move_to_end((date_range, user_role))
+            while len(_overview_cache) > OVERVIEW_CACHE_MAX_ENTRIES:
+                _overview_cache.popitem(last=False)
+    logger.info(f"[ANALYTICS] Painel {date_range}/{user_role} montado em {time.time() - started:.2f}s")
+    return etag, payload, errors
+
+
+def _get_overview(date_range, user_role):
+    """(etag, payload, erros) do painel, do cache de curta duração ou montado uma vez para chamadas concorrentes"""
+    key = (date_range, user_role)
+    with _overview_lock:
+        entry = _overview_cache.get(key)
+        if entry and entry[0] > time.time():
+            return entry[1], entry[2], {}
+    return single_flight.do(f'analytics_overview:{date_range}:{user_role}', lambda: _build_overview(date_range, user_role))
+
+
+def _overview_widget(name):
+    """Payload de um widget do painel para os filtros da requisição atual"""
+    _, payload, errors = _get_overview(*_overview_params())
+    if name in errors:
+        raise errors[name]
+    return payload[name]
+
 def _format_ts_with_policy(ts_value, policy: str = 'none'):
     """
     policy:
@@ -149,165 +226,166 @@ def analytics_agente_test():
         logger.error(f"Erro ao carregar página de teste: {e}")
         return f"Erro ao carregar página de teste: {str(e)}", 500
 
-@bp.route('/api/stats')
-@login_required
-def get_stats():
-    """
-    API para estatísticas básicas do Analytics
-    OTIMIZADO: Usa vw_analytics_portal para filtros otimizados
-    """
+def _build_stats(date_range, user_role, rollup):
+    """Payload de /api/stats (totais do rollup + logins e sessões)"""
+    # Calcular datas com timezone do Brasil (UTC-3)
     try:
-        # Obter parâmetros de filtro
-        date_range = request.args.get('dateRange', '30d')
-        user_role = request.args.get('userRole', 'all')
-        
-        # Calcular datas com timezone do Brasil (UTC-3)
-        try:
-            from zoneinfo import ZoneInfo
-            br_tz = ZoneInfo('America/Sao_Paulo')
-        except:
-            import pytz
-            br_tz = pytz.timezone('America/Sao_Paulo')
+        from zoneinfo import ZoneInfo
+        br_tz = ZoneInfo('America/Sao_Paulo')
+    except:
+        import pytz
+        br_tz = pytz.timezone('America/Sao_Paulo')
+    
+    end_date = datetime.now(br_tz).date()
+    if date_range == '1d':
+        start_date = end_date
+    elif date_range == '7d':
+        start_date = end_date - timedelta(days=7)
+    elif date_range == '30d':
+        start_date = end_date - timedelta(days=30)
+    else:
+        start_date = end_date - timedelta(days=30)
+    
+    # Totais a partir dos agregados incrementais (view já filtra page_access)
+    totals = rollup.totals(start_date, end_date, role=_filter_value(user_role))
+    total_access = totals['access']
+    unique_users = totals['unique_users']
+
+    # CORREÇÃO: Logins hoje - contar USUÁRIOS ÚNICOS que fizeram login hoje
+    today_start = datetime.now(br_tz).replace(hour=0, minute=0, second=0, microsecond=0)
+    # Converter para UTC corretamente
+    import pytz as tz_lib
+    today_start_utc = today_start.astimezone(tz_lib.UTC)
+    
+    try:
+        def _exec_today():
+            # Contar usuários ativos hoje (qualquer ação no log conta como "login/acesso" para o dia)
+            # Isso garante que mostre dados mesmo se o evento explícito de login não foi capturado
+            return supabase_admin.table('access_logs')\
+                .select('user_id, ip_address')\
+                .gte('created_at', today_start_utc.isoformat())\
+                .execute()
+        
+        logins_today_response = run_with_policy(
+            'supabase.read',
+            'analytics.get_stats.logins_today',
+            _exec_today
+        )
         
-        end_date = datetime.now(br_tz).date()
-        if date_range == '1d':
-            start_date = end_date
-        elif date_range == '7d':
-            start_date = end_date - timedelta(days=7)
-        elif date_range == '30d':
-            start_date = end_date - timedelta(days=30)
-        else:
-            start_date = end_date - timedelta(days=30)
+        logins_data = logins_today_response.data if logins_today_response.data else []
         
-        # Query base usando view otimizada (já filtra action_type='page_access' e exclui APIs/sistema)
-        query = supabase_admin.table('vw_analytics_portal').select('*')
-        query = query.gte('access_date', start_date.isoformat())
-        query = query.lte('access_date', end_date.isoformat())
+        # Contar USUÁRIOS ÚNICOS que fizeram login hoje
+        unique_users_today = set()
+        for log in logins_data:
+            # Filtrar localhost apenas se IP for explicitamente 127.0.0.1
+            # (Assumindo que o bug do IP foi corrigido e usuários reais terão IPs reais)
+            if log.get('ip_address') not in ['127.0.0.1', 'localhost', None]:
+                if log.get('user_id'):
+                    unique_users_today.add(log.get('user_id'))
         
-        if user_role != 'all':
-            query = query.eq('user_role', user_role)
-        
-        def _exec():
-            return query.execute()
-        response = run_with_retries(
-            'analytics.get_stats',
-            _exec,
-            max_attempts=3,
-            base_delay_seconds=0.8,
-            should_retry=lambda e: 'Server disconnected' in str(e) or 'timeout' in str(e).lower()
-        )
-        logs = response.data if response.data else []
+        logins_today = len(unique_users_today)
+        logger.info(f"[ANALYTICS] Logins hoje: {logins_today} usuários únicos de {len(logins_data)} registros de login")
+    except Exception as e:
+        logger.warning(f"Erro ao contar logins de hoje: {e}")
+        logins_today = 0
 
-        # Calcular estatísticas (view já filtra page_access)
-        total_access = len(logs)
-        unique_users = len(set(log.get('user_id') for log in logs if log.get('user_id')))
+    # CORREÇÃO: Total de logins (todos os tempos) - contagem no servidor em vez de baixar user_sessions
+    try:
+        def _exec_total():
+            return supabase_admin.table('user_sessions')\
+                .select('user_id', count='exact')\
+                .or_('ip_address.is.null,ip_address.neq.127.0.0.1')\
+                .limit(1)\
+                .execute()
+        total_sessions_response = run_with_policy(
+            'supabase.read',
+            'analytics.get_stats.total_logins',
+            _exec_total
+        )
+        total_logins = total_sessions_response.count or 0
+    except Exception as e:
+        logger.warning(f"Erro ao contar total de logins: {e}")
+        total_logins = 0
 
-        # CORREÇÃO: Logins hoje - contar USUÁRIOS ÚNICOS que fizeram login hoje
-        today_start = datetime.now(br_tz).replace(hour=0, minute=0, second=0, microsecond=0)
-        # Converter para UTC corretamente
-        import pytz as tz_lib
-        today_start_utc = today_start.astimezone(tz_lib.UTC)
+    # CORREÇÃO: Sessão média - calcular com base em sessões que têm disconnected_at
+    try:
+        def _exec_sessions():
+            return supabase_admin.table('user_sessions').select('*').not_.is_('disconnected_at', 'null').limit(500).execute()
+        sessions_response = run_with_policy(
+            'supabase.read',
+            'analytics.get_stats.avg_session',
+            _exec_sessions
+        )
+        sessions_with_duration = sessions_response.data if sessions_response.data else []
         
-        try:
-            def _exec_today():
-                # Contar usuários ativos hoje (qualquer ação no log conta como "login/acesso" para o dia)
-                # Isso garante que mostre dados mesmo se o evento explícito de login não foi capturado
-                return supabase_admin.table('access_logs')\
-                    .select('user_id, ip_address')\
-                    .gte('created_at', today_start_utc.isoformat())\
-                    .execute()
-            
-            logins_today_response = run_with_retries(
-                'analytics.get_stats.logins_today',
-                _exec_today,
-                max_attempts=3,
-                base_delay_seconds=0.8,
-                should_retry=lambda e: 'Server disconnected' in str(e) or 'timeout' in str(e).lower()
-            )
-            
-            logins_data = logins_today_response.data if logins_today_response.data else []
-            
-            # Contar USUÁRIOS ÚNICOS que fizeram login hoje
-            unique_users_today = set()
-            for log in logins_data:
-                # Filtrar localhost apenas se IP for explicitamente 127.0.0.1
-                # (Assumindo que o bug do IP foi corrigido e usuários reais terão IPs reais)
-                if log.get('ip_address') not in ['127.0.0.1', 'localhost', None]:
-                    if log.get('user_id'):
-                        unique_users_today.add(log.get('user_id'))
+        durations = []
+        for session in sessions_with_duration:
+            connected_at = session.get('connected_at')
+            disconnected_at = session.get('disconnected_at')
             
-            logins_today = len(unique_users_today)
-            logger.info(f"[ANALYTICS] Logins hoje: {logins_today} usuários únicos de {len(logins_data)} registros de login")
-        except Exception as e:
-            logger.warning(f"Erro ao contar logins de hoje: {e}")
-            logins_today = 0
+            if connected_at and disconnected_at:
+                try:
+                    dt_connected = datetime.fromisoformat(connected_at.replace('Z', '+00:00'))
+                    dt_disconnected = datetime.fromisoformat(disconnected_at.replace('Z', '+00:00'))
+                    duration_minutes = (dt_disconnected - dt_connected).total_seconds() / 60
+                    
+                    # Filtrar sessões muito longas (> 12 horas) ou muito curtas (< 1 minuto)
+                    if 1 <= duration_minutes <= 720:
+                        durations.append(duration_minutes)
+                except:
+                    pass
+        
+        if durations:
+            avg_session_minutes = int(sum(durations) / len(durations))
+        else:
+            avg_session_minutes = 0
+    except Exception as e:
+        logger.warning(f"Erro ao calcular sessão média: {e}")
+        avg_session_minutes = 0
 
-        # CORREÇÃO: Total de logins (todos os tempos) - usar user_sessions
-        try:
-            def _exec_total():
-                return supabase_admin.table('user_sessions').select('user_id', count='exact').execute()
-            total_sessions_response = run_with_retries(
-                'analytics.get_stats.total_logins',
-                _exec_total,
-                max_attempts=3,
-                base_delay_seconds=0.8,
-                should_retry=lambda e: 'Server disconnected' in str(e) or 'timeout' in str(e).lower()
-            )
-            all_sessions = total_sessions_response.data if total_sessions_response.data else []
-            # Filtrar localhost
-            all_sessions = [s for s in all_sessions if s.get('ip_address') != '127.0.0.1' and s.get('ip_address') != 'localhost']
-            total_logins = len(all_sessions)
-        except Exception as e:
-            logger.warning(f"Erro ao contar total de logins: {e}")
-            total_logins = 0
+    return {
+        'success': True,
+        'total_access': total_access,
+        'unique_users': unique_users,
+        'logins_today': logins_today,
+        'total_logins': total_logins,
+        'avg_session_minutes': avg_session_minutes
+    }
 
-        # CORREÇÃO: Sessão média - calcular com base em sessões que têm disconnected_at
-        try:
-            def _exec_sessions():
-                return supabase_admin.table('user_sessions').select('*').not_.is_('disconnected_at', 'null').limit(500).execute()
-            sessions_response = run_with_retries(
-                'analytics.get_stats.avg_session',
-                _exec_sessions,
-                max_attempts=3,
-                base_delay_seconds=0.8,
-                should_retry=lambda e: 'Server disconnected' in str(e) or 'timeout' in str(e).lower()
-            )
-            sessions_with_duration = sessions_response.data if sessions_response.data else []
-            
-            durations = []
-            for session in sessions_with_duration:
-                connected_at = session.get('connected_at')
-                disconnected_at = session.get('disconnected_at')
-                
-                if connected_at and disconnected_at:
-                    try:
-                        dt_connected = datetime.fromisoformat(connected_at.replace('Z', '+00:00'))
-                        dt_disconnected = datetime.fromisoformat(disconnected_at.replace('Z', '+00:00'))
-                        duration_minutes = (dt_disconnected - dt_connected).total_seconds() / 60
-                        
-                        # Filtrar sessões muito longas (> 12 horas) ou muito curtas (< 1 minuto)
-                        if 1 <= duration_minutes <= 720:
-                            durations.append(duration_minutes)
-                    except:
-                        pass
-            
-            if durations:
-                avg_session_minutes = int(sum(durations) / len(durations))
-            else:
-                avg_session_minutes = 0
-        except Exception as e:
-            logger.warning(f"Erro ao calcular sessão média: {e}")
-            avg_session_minutes = 0
+@bp.route('/api/overview')
+@login_required
+def get_overview():
+    """
+    API consolidada do painel de Analytics (todos os widgets em uma resposta).
+    Responde 304 quando o If-None-Match do navegador ainda corresponde aos dados.
+    """
+    try:
+        etag, payload, errors = _get_overview(*_overview_params())
+        if not errors and request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+        else:
+            response = jsonify({
+                'success': not errors,
+                **payload,
+                'errors': {name: str(e) for name, e in errors.items()}
+            })
+        if not errors:
+            response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    except Exception as e:
+        logger.error(f"Erro ao obter painel de analytics: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
 
-        return jsonify({
-            'success': True,
-            'total_access': total_access,
-            'unique_users': unique_users,
-            'logins_today': logins_today,
-            'total_logins': total_logins,
-            'avg_session_minutes': avg_session_minutes
-        })
-        
+@bp.route('/api/stats')
+@login_required
+def get_stats():
+    """
+    API para estatísticas básicas do Analytics
+    OTIMIZADO: Usa vw_analytics_portal para filtros otimizados
+    """
+    try:
+        return jsonify(_overview_widget('stats'))
     except Exception as e:
         logger.error(f"Erro ao obter estatísticas: {e}")
         return jsonify({
@@ -320,6 +398,93 @@ def get_stats():
             'error': str(e)
         })
 
+def _build_charts(date_range, user_role, rollup):
+    """Payload de /api/charts (séries diárias, páginas, usuários e mapa de calor)"""
+    # Calcular datas com timezone do Brasil (UTC-3)
+    try:
+        from zoneinfo import ZoneInfo
+        br_tz = ZoneInfo('America/Sao_Paulo')
+    except:
+        import pytz
+        br_tz = pytz.timezone('America/Sao_Paulo')
+    
+    end_date = datetime.now(br_tz).date()
+    if date_range == '1d':
+        start_date = end_date
+        days_back = 1
+    elif date_range == '7d':
+        start_date = end_date - timedelta(days=7)
+        days_back = 7
+    elif date_range == '30d':
+        start_date = end_date - timedelta(days=30)
+        days_back = 30
+    else:
+        start_date = end_date - timedelta(days=30)
+        days_back = 30
+    
+    # Agregados incrementais (view já filtra page_access e exclui APIs/sistema)
+    period = {'start_date': start_date, 'end_date': end_date, 'role': _filter_value(user_role)}
+    access_by_date = rollup.count_by('date', **period)
+    users_by_date = rollup.users_by('date', **period)
+    
+    # Processar todos os dias do período
+    daily_access = []
+    daily_users = []
+    today_br = datetime.now(br_tz).date()
+    
+    for i in range(days_back + 1):
+        day = start_date + timedelta(days=i)
+        if day > today_br:
+            break
+        
+        day_str = day.isoformat()
+        daily_access.append({
+            'date': day_str,
+            'count': access_by_date.get(day_str, 0)
+        })
+        daily_users.append({
+            'date': day_str,
+            'count': len(users_by_date.get(day_str, ()))
+        })
+    
+    logger.info(f"[ANALYTICS] Total de dias: {len(daily_access)} ({sum(access_by_date.values())} acessos)")
+    
+    # Top páginas
+    page_counts = rollup.count_by('page', known_users=True, **period)
+    top_pages = [
+        {'page_name': page, 'count': count}
+        for page, count in page_counts.most_common()
+    ]
+    
+    # Atividade de usuários
+    user_counts = rollup.count_by('user', known_users=True, **period)
+    users_activity = [
+        {'user_name': rollup.user(user)['user_name'], 'access_count': count}
+        for user, count in user_counts.most_common()
+    ]
+    
+    # Mapa de calor por horário usando access_hour da view
+    hourly_counts = rollup.count_by('hour', known_users=True, **period)
+    hourly_users = rollup.users_by('hour', **period)
+    
+    hourly_heatmap = [
+        {
+            'hour': hour,
+            'count': hourly_counts.get(hour, 0),
+            'unique_users': len(hourly_users.get(hour, ()))
+        }
+        for hour in range(24)
+    ]
+    
+    return {
+        'success': True,
+        'daily_access': daily_access,
+        'daily_users': daily_users,
+        'top_pages': top_pages,
+        'users_activity': users_activity,
+        'hourly_heatmap': hourly_heatmap
+    }
+
 @bp.route('/api/charts')
 @login_required
 def get_charts():
@@ -328,132 +493,7 @@ def get_charts():
     OTIMIZADO: Usa vw_analytics_portal com colunas access_date e access_hour
     """
     try:
-        # Obter parâmetros de filtro
-        date_range = request.args.get('dateRange', '30d')
-        user_role = request.args.get('userRole', 'all')
-        
-        # Calcular datas com timezone do Brasil (UTC-3)
-        try:
-            from zoneinfo import ZoneInfo
-            br_tz = ZoneInfo('America/Sao_Paulo')
-        except:
-            import pytz
-            br_tz = pytz.timezone('America/Sao_Paulo')
-        
-        end_date = datetime.now(br_tz).date()
-        if date_range == '1d':
-            start_date = end_date
-            days_back = 1
-        elif date_range == '7d':
-            start_date = end_date - timedelta(days=7)
-            days_back = 7
-        elif date_range == '30d':
-            start_date = end_date - timedelta(days=30)
-            days_back = 30
-        else:
-            start_date = end_date - timedelta(days=30)
-            days_back = 30
-        
-        # Query usando view otimizada (já filtra action_type='page_access' e exclui APIs/sistema)
-        query = supabase_admin.table('vw_analytics_portal').select('*')
-        query = query.gte('access_date', start_date.isoformat())
-        query = query.lte('access_date', end_date.isoformat())
-        
-        if user_role != 'all':
-            query = query.eq('user_role', user_role)
-        
-        def _exec():
-            return query.execute()
-        response = run_with_retries(
-            'analytics.get_charts',
-            _exec,
-            max_attempts=3,
-            base_delay_seconds=0.8,
-            should_retry=lambda e: 'Server disconnected' in str(e) or 'timeout' in str(e).lower()
-        )
-        logs = response.data if response.data else []
-        
-        # Acessos diários usando access_date da view
-        from collections import Counter, defaultdict
-        
-        logs_by_date = defaultdict(list)
-        for log in logs:
-            access_date = log.get('access_date')
-            if access_date:
-                logs_by_date[access_date].append(log)
-        
-        # Processar todos os dias do período
-        daily_access = []
-        daily_users = []
-        today_br = datetime.now(br_tz).date()
-        
-        for i in range(days_back + 1):
-            day = start_date + timedelta(days=i)
-            if day > today_br:
-                break
-            
-            day_str = day.isoformat()
-            logs_day = logs_by_date.get(day_str, [])
-            unique_users_day = set(log.get('user_id') for log in logs_day if log.get('user_id'))
-            
-            daily_access.append({
-                'date': day_str,
-                'count': len(logs_day)
-            })
-            daily_users.append({
-                'date': day_str,
-                'count': len(unique_users_day)
-            })
-        
-        logger.info(f"[ANALYTICS] Processando {len(logs)} logs para acessos diários")
-        logger.info(f"[ANALYTICS] Total de dias: {len(daily_access)}")
-        
-        # Top páginas
-        page_counts = Counter(log.get('page_name', 'Sem nome') for log in logs if log.get('user_name'))
-        top_pages = [
-            {'page_name': page, 'count': count}
-            for page, count in page_counts.most_common()
-        ]
-        
-        # Atividade de usuários
-        user_counts = Counter(log.get('user_name') for log in logs if log.get('user_name'))
-        users_activity = [
-            {'user_name': user, 'access_count': count}
-            for user, count in user_counts.most_common()
-        ]
-        
-        # Mapa de calor por horário usando access_hour da view
-        hourly_counts = Counter()
-        hourly_users = defaultdict(set)
-        
-        for log in logs:
-            if log.get('user_name'):
-                hour = log.get('access_hour')
-                if hour is not None:
-                    hour = int(hour)
-                    hourly_counts[hour] += 1
-                    user_id = log.get('user_id')
-                    if user_id:
-                        hourly_users[hour].add(user_id)
-        
-        hourly_heatmap = [
-            {
-                'hour': hour,
-                'count': hourly_counts.get(hour, 0),
-                'unique_users': len(hourly_users.get(hour, set()))
-            }
-            for hour in range(24)
-        ]
-        
-        return jsonify({
-            'success': True,
-            'daily_access': daily_access,
-            'daily_users': daily_users,
-            'top_pages': top_pages,
-            'users_activity': users_activity,
-            'hourly_heatmap': hourly_heatmap
-        })
-        
+        return jsonify(_overview_widget('charts'))
     except Exception as e:
         logger.error(f"Erro ao obter dados de gráficos: {e}")
         return jsonify({
@@ -465,6 +505,43 @@ def get_charts():
             'error': str(e)
         })
 
+def _build_top_users(date_range, user_role, rollup):
+    """Payload de /api/top-users (20 usuários com mais acessos)"""
+    # Calcular datas
+    end_date = datetime.now().date()
+    if date_range == '1d':
+        start_date = end_date
+    elif date_range == '7d':
+        start_date = end_date - timedelta(days=7)
+    elif date_range == '30d':
+        start_date = end_date - timedelta(days=30)
+    else:
+        start_date = end_date - timedelta(days=30)
+    
+    # Agregados incrementais (view já filtra page_access)
+    period = {'start_date': start_date, 'end_date': end_date, 'role': _filter_value(user_role)}
+    access_by_user = rollup.count_by('user', known_users=True, **period)
+    pages_by_user = rollup.count_by('user', 'page', known_users=True, **period)
+
+    favorite_pages = {}
+    for (user, page), count in pages_by_user.most_common():
+        favorite_pages.setdefault(user, []).append(page)
+
+    top_users = []
+    for user, total_access in access_by_user.most_common(20):
+        info = rollup.user(user)
+        top_users.append({
+            'user_id': info.get('user_id'),
+            'user_name': info.get('user_name'),
+            'user_email': info.get('user_email', 'N/A'),
+            'user_role': info.get('user_role', 'N/A'),
+            'total_access': total_access,
+            'last_access': info.get('last_access'),
+            'favorite_pages': ', '.join(favorite_pages.get(user, [])[:3])
+        })
+
+    return top_users[:20]
+
 @bp.route('/api/top-users')
 @login_required
 def get_top_users():
@@ -473,84 +550,64 @@ def get_top_users():
     OTIMIZADO: Usa vw_analytics_portal
     """
     try:
-        # Obter parâmetros de filtro
-        date_range = request.args.get('dateRange', '30d')
-        user_role = request.args.get('userRole', 'all')
-        
-        # Calcular datas
-        end_date = datetime.now().date()
-        if date_range == '1d':
-            start_date = end_date
-        elif date_range == '7d':
-            start_date = end_date - timedelta(days=7)
-        elif date_range == '30d':
-            start_date = end_date - timedelta(days=30)
-        else:
-            start_date = end_date - timedelta(days=30)
-        
-        # Query usando view otimizada (já filtra action_type='page_access')
-        query = supabase_admin.table('vw_analytics_portal').select('*')
-        query = query.gte('access_date', start_date.isoformat())
-        query = query.lte('access_date', end_date.isoformat())
-        
-        if user_role != 'all':
-            query = query.eq('user_role', user_role)
-        
-        def _exec():
-            return query.execute()
-        response = run_with_retries(
-            'analytics.get_top_users',
-            _exec,
-            max_attempts=3,
-            base_delay_seconds=0.8,
-            should_retry=lambda e: 'Server disconnected' in str(e) or 'timeout' in str(e).lower()
-        )
-        logs = response.data if response.data else []
-
-        # Agrupar por usuário (view já filtra page_access)
-        user_stats = {}
-        for log in logs:
-            user_id = log.get('user_id')
-            user_name = log.get('user_name')
-            
-            if not user_id or not user_name:
-                continue
-            
-            if user_id not in user_stats:
-                user_stats[user_id] = {
-                    'user_id': user_id,
-                    'user_name': user_name,
-                    'user_email': log.get('user_email', 'N/A'),
-                    'user_role': log.get('user_role', 'N/A'),
-                    'total_access': 0,
-                    'last_access': None,
-                    'favorite_pages': []
-                }
-            
-            user_stats[user_id]['total_access'] += 1
-            page_name = log.get('page_name', 'N/A')
-            if page_name not in user_stats[user_id]['favorite_pages']:
-                user_stats[user_id]['favorite_pages'].append(page_name)
-            
-            # Usar access_timestamp_br para último acesso
-            log_time = log.get('access_timestamp_br')
-            if log_time and (not user_stats[user_id]['last_access'] or log_time > user_stats[user_id]['last_access']):
-                user_stats[user_id]['last_access'] = log_time
-
-        # Converter para lista e ordenar
-        top_users = list(user_stats.values())
-        top_users.sort(key=lambda x: x['total_access'], reverse=True)
-
-        # Limitar páginas favoritas
-        for user in top_users:
-            user['favorite_pages'] = ', '.join(user['favorite_pages'][:3])
-
-        return jsonify(top_users[:20])
-        
+        return jsonify(_overview_widget('top_users'))
     except Exception as e:
         logger.error(f"Erro ao obter top usuários: {e}")
         return jsonify([])
 
+def _build_recent_activity(date_range, user_role, rollup):
+    """Payload de /api/recent-activity (últimos 150 acessos da view)"""
+    # Calcular datas - forçar pelo menos 7 dias para a tabela de atividades recentes
+    end_date = datetime.now().date()
+    if date_range == '1d':
+        start_date = end_date - timedelta(days=7)
+    elif date_range == '7d':
+        start_date = end_date - timedelta(days=7)
+    elif date_range == '30d':
+        start_date = end_date - timedelta(days=30)
+    else:
+        start_date = end_date - timedelta(days=7)
+    
+    # Query usando view otimizada (já filtra page_access e exclui sistema)
+    query = supabase_admin.table('vw_analytics_portal').select('*')
+    query = query.gte('access_date', start_date.isoformat())
+    query = query.lte('access_date', end_date.isoformat())
+    query = query.not_.is_('user_name', 'null')
+    query = query.order('access_timestamp_br', desc=True)
+    query = query.limit(150)
+    
+    if user_role != 'all':
+        query = query.eq('user_role', user_role)
+    
+    def _exec():
+        return query.execute()
+    response = run_with_policy(
+        'supabase.read.hedged',
+        'analytics.get_recent_activity',
+        _exec
+    )
+    logs = response.data if response.data else []
+    
+    # Formatar dados para o frontend
+    formatted_logs = []
+    for log in logs:
+        try:
+            formatted_log = {
+                'timestamp': log.get('access_timestamp_br'),
+                'user_name': log.get('user_name', 'N/A'),
+                'user_email': log.get('user_email', 'N/A'),
+                'action_type': log.get('action_type', 'page_access'),
+                'page_name': log.get('page_name', 'N/A'),
+                'module_name': log.get('module_name', 'N/A'),
+                'device_type': log.get('device_type', 'N/A'),
+                'browser': log.get('browser', 'N/A')
+            }
+            formatted_logs.append(formatted_log)
+        except Exception as format_error:
+            logger.warning(f"Erro ao formatar log: {format_error}")
+            continue
+    return formatted_logs
+
 @bp.route('/api/recent-activity')
 @login_required
 def get_recent_activity():
@@ -559,67 +616,157 @@ def get_recent_activity():
     OTIMIZADO: Usa vw_analytics_portal
     """
     try:
-        # Obter parâmetros de filtro
-        date_range = request.args.get('dateRange', '30d')
-        user_role = request.args.get('userRole', 'all')
-        
-        # Calcular datas - forçar pelo menos 7 dias para a tabela de atividades recentes
-        end_date = datetime.now().date()
-        if date_range == '1d':
-            start_date = end_date - timedelta(days=7)
-        elif date_range == '7d':
-            start_date = end_date - timedelta(days=7)
-        elif date_range == '30d':
-            start_date = end_date - timedelta(days=30)
-        else:
-            start_date = end_date - timedelta(days=7)
-        
-        # Query usando view otimizada (já filtra page_access e exclui sistema)
-        query = supabase_admin.table('vw_analytics_portal').select('*')
-        query = query.gte('access_date', start_date.isoformat())
-        query = query.lte('access_date', end_date.isoformat())
-        query = query.not_.is_('user_name', 'null')
-        query = query.order('access_timestamp_br', desc=True)
-        query = query.limit(150)
-        
-        if user_role != 'all':
-            query = query.eq('user_role', user_role)
-        
-        def _exec():
-            return query.execute()
-        response = run_with_retries(
-            'analytics.get_recent_activity',
-            _exec,
-            max_attempts=3,
-            base_delay_seconds=0.8,
-            should_retry=lambda e: 'Server disconnected' in str(e) or 'timeout' in str(e).lower()
-        )
-        logs = response.data if response.data else []
-        
-        # Formatar dados para o frontend
-        formatted_logs = []
-        for log in logs:
-            try:
-                formatted_log = {
-                    'timestamp': log.get('access_timestamp_br'),
-                    'user_name': log.get('user_name', 'N/A'),
-                    'user_email': log.get('user_email', 'N/A'),
-                    'action_type': log.get('action_type', 'page_access'),
-                    'page_name': log.get('page_name', 'N/A'),
-                    'module_name': log.get('module_name', 'N/A'),
-                    'device_type': log.get('device_type', 'N/A'),
-                    'browser': log.get('browser', 'N/A')
-                }
-                formatted_logs.append(formatted_log)
-            except Exception as format_error:
-                logger.warning(f"Erro ao formatar log: {format_error}")
-                continue
-        return jsonify(formatted_logs)
-        
+        return jsonify(_overview_widget('recent_activity'))
     except Exception as e:
         logger.error(f"Erro ao obter atividade recente: {e}")
         return jsonify([])
 
+def _build_advanced_metrics(date_range, user_role, rollup):
+    """Payload de /api/advanced-metrics (métricas temporais e de engajamento)"""
+    from collections import Counter, defaultdict
+    
+    # Calcular datas
+    try:
+        from zoneinfo import ZoneInfo
+        br_tz = ZoneInfo('America/Sao_Paulo')
+    except:
+        import pytz
+        br_tz = pytz.timezone('America/Sao_Paulo')
+    
+    end_date = datetime.now(br_tz).date()
+    if date_range == '1d':
+        start_date = end_date
+        days_in_period = 1
+    elif date_range == '7d':
+        start_date = end_date - timedelta(days=7)
+        days_in_period = 7
+    elif date_range == '30d':
+        start_date = end_date - timedelta(days=30)
+        days_in_period = 30
+    else:
+        start_date = end_date - timedelta(days=30)
+        days_in_period = 30
+    
+    # Agregados incrementais da view
+    period = {'start_date': start_date, 'end_date': end_date, 'role': _filter_value(user_role)}
+    acessos_por_data = rollup.count_by('date', **period)
+    
+    # ===== MÉTRICAS TEMPORAIS =====
+    
+    # Média diária de acessos
+    total_acessos = sum(acessos_por_data.values())
+    media_diaria = round(total_acessos / max(days_in_period, 1), 1)
+    
+    # Acessos por dia da semana (usando day_of_week: 0=Domingo, 1=Segunda, etc.)
+    dias_semana = ['Domingo', 'Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado']
+    acessos_por_dow = rollup.count_by('dow', **period)
+    
+    acessos_por_dia_semana = [
+        {'dia': dias_semana[i], 'acessos': acessos_por_dow.get(i, 0)}
+        for i in range(7)
+    ]
+    
+    # Dia mais ativo
+    if acessos_por_dow:
+        dia_mais_ativo_idx = max(acessos_por_dow, key=acessos_por_dow.get)
+        dia_mais_ativo = dias_semana[dia_mais_ativo_idx]
+    else:
+        dia_mais_ativo = 'N/A'
+    
+    # Horário de pico
+    acessos_por_hora = rollup.count_by('hour', **period)
+    
+    if acessos_por_hora:
+        hora_pico = max(acessos_por_hora, key=acessos_por_hora.get)
+        horario_pico = f"{hora_pico:02d}:00-{hora_pico+1:02d}:00"
+    else:
+        horario_pico = 'N/A'
+    
+    # Comparação semanal (esta semana vs anterior)
+    hoje = datetime.now(br_tz).date()
+    inicio_semana_atual = hoje - timedelta(days=hoje.weekday())  # Segunda-feira desta semana
+    inicio_semana_anterior = inicio_semana_atual - timedelta(days=7)
+    
+    acessos_semana_atual = sum(count for day, count in acessos_por_data.items()
+        if day >= inicio_semana_atual.isoformat())
+    acessos_semana_anterior = sum(count for day, count in acessos_por_data.items()
+        if inicio_semana_anterior.isoformat() <= day < inicio_semana_atual.isoformat())
+    
+    if acessos_semana_anterior > 0:
+        variacao_semanal = round(((acessos_semana_atual - acessos_semana_anterior) / acessos_semana_anterior) * 100, 1)
+    else:
+        variacao_semanal = 100.0 if acessos_semana_atual > 0 else 0.0
+    
+    comparacao_semanal = {
+        'atual': acessos_semana_atual,
+        'anterior': acessos_semana_anterior,
+        'variacao_percentual': variacao_semanal
+    }
+    
+    # ===== MÉTRICAS DE ENGAJAMENTO =====
+    
+    # Contar acessos por usuário
+    acessos_por_usuario = rollup.count_by('user', **period)
+    
+    # Usuários recorrentes (mais de 1 acesso) vs novos
+    usuarios_recorrentes = sum(1 for count in acessos_por_usuario.values() if count > 1)
+    usuarios_novos = sum(1 for count in acessos_por_usuario.values() if count == 1)
+    
+    # Frequência média (acessos por usuário)
+    total_usuarios = len(acessos_por_usuario)
+    frequencia_media = round(total_acessos / max(total_usuarios, 1), 1)
+    
+    # Top usuário por faixa horária
+    faixas_horarias = [
+        {'nome': '08-12h', 'inicio': 8, 'fim': 12},
+        {'nome': '12-14h', 'inicio': 12, 'fim': 14},
+        {'nome': '14-18h', 'inicio': 14, 'fim': 18},
+        {'nome': '18-22h', 'inicio': 18, 'fim': 22}
+    ]
+    
+    # Agrupar por faixa e usuário
+    acessos_por_faixa_usuario = defaultdict(Counter)
+    
+    for (hora, user), count in rollup.count_by('hour', 'user', **period).items():
+        for faixa in faixas_horarias:
+            if faixa['inicio'] <= hora < faixa['fim']:
+                acessos_por_faixa_usuario[faixa['nome']][user] += count
+                break
+    
+    top_usuario_por_hora = []
+    for faixa in faixas_horarias:
+        usuarios_faixa = acessos_por_faixa_usuario[faixa['nome']]
+        if usuarios_faixa:
+            top_user, acessos = usuarios_faixa.most_common(1)[0]
+            top_usuario_por_hora.append({
+                'hora': faixa['nome'],
+                'usuario': rollup.user(top_user).get('user_name') or 'N/A',
+                'acessos': acessos
+            })
+        else:
+            top_usuario_por_hora.append({
+                'hora': faixa['nome'],
+                'usuario': 'N/A',
+                'acessos': 0
+            })
+    
+    return {
+        'success': True,
+        'temporal': {
+            'media_diaria': media_diaria,
+            'dia_mais_ativo': dia_mais_ativo,
+            'horario_pico': horario_pico,
+            'comparacao_semanal': comparacao_semanal,
+            'acessos_por_dia_semana': acessos_por_dia_semana
+        },
+        'engajamento': {
+            'usuarios_recorrentes': usuarios_recorrentes,
+            'usuarios_novos': usuarios_novos,
+            'frequencia_media': frequencia_media,
+            'top_usuario_por_hora': top_usuario_por_hora
+        }
+    }
+
 @bp.route('/api/advanced-metrics')
 @login_required
 def get_advanced_metrics():
@@ -627,191 +774,7 @@ def get_advanced_metrics():
     API para métricas avançadas de engajamento e temporais
     """
     try:
-        from collections import Counter, defaultdict
-        
-        # Obter parâmetros de filtro
-        date_range = request.args.get('dateRange', '30d')
-        user_role = request.args.get('userRole', 'all')
-        
-        # Calcular datas
-        try:
-            from zoneinfo import ZoneInfo
-            br_tz = ZoneInfo('America/Sao_Paulo')
-        except:
-            import pytz
-            br_tz = pytz.timezone('America/Sao_Paulo')
-        
-        end_date = datetime.now(br_tz).date()
-        if date_range == '1d':
-            start_date = end_date
-            days_in_period = 1
-        elif date_range == '7d':
-            start_date = end_date - timedelta(days=7)
-            days_in_period = 7
-        elif date_range == '30d':
-            start_date = end_date - timedelta(days=30)
-            days_in_period = 30
-        else:
-            start_date = end_date - timedelta(days=30)
-            days_in_period = 30
-        
-        # Query usando view otimizada
-        query = supabase_admin.table('vw_analytics_portal').select('*')
-        query = query.gte('access_date', start_date.isoformat())
-        query = query.lte('access_date', end_date.isoformat())
-        
-        if user_role != 'all':
-            query = query.eq('user_role', user_role)
-        
-        def _exec():
-            return query.execute()
-        response = run_with_retries(
-            'analytics.get_advanced_metrics',
-            _exec,
-            max_attempts=3,
-            base_delay_seconds=0.8,
-            should_retry=lambda e: 'Server disconnected' in str(e) or 'timeout' in str(e).lower()
-        )
-        logs = response.data if response.data else []
-        
-        # ===== MÉTRICAS TEMPORAIS =====
-        
-        # Média diária de acessos
-        total_acessos = len(logs)
-        media_diaria = round(total_acessos / max(days_in_period, 1), 1)
-        
-        # Acessos por dia da semana (usando day_of_week: 0=Domingo, 1=Segunda, etc.)
-        dias_semana = ['Domingo', 'Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado']
-        acessos_por_dow = Counter()
-        for log in logs:
-            dow = log.get('day_of_week')
-            if dow is not None:
-                acessos_por_dow[int(dow)] += 1
-        
-        acessos_por_dia_semana = [
-            {'dia': dias_semana[i], 'acessos': acessos_por_dow.get(i, 0)}
-            for i in range(7)
-        ]
-        
-        # Dia mais ativo
-        if acessos_por_dow:
-            dia_mais_ativo_idx = max(acessos_por_dow, key=acessos_por_dow.get)
-            dia_mais_ativo = dias_semana[dia_mais_ativo_idx]
-        else:
-            dia_mais_ativo = 'N/A'
-        
-        # Horário de pico
-        acessos_por_hora = Counter()
-        for log in logs:
-            hora = log.get('access_hour')
-            if hora is not None:
-                acessos_por_hora[int(hora)] += 1
-        
-        if acessos_por_hora:
-            hora_pico = max(acessos_por_hora, key=acessos_por_hora.get)
-            horario_pico = f"{hora_pico:02d}:00-{hora_pico+1:02d}:00"
-        else:
-            horario_pico = 'N/A'
-        
-        # Comparação semanal (esta semana vs anterior)
-        hoje = datetime.now(br_tz).date()
-        inicio_semana_atual = hoje - timedelta(days=hoje.weekday())  # Segunda-feira desta semana
-        inicio_semana_anterior = inicio_semana_atual - timedelta(days=7)
-        
-        acessos_semana_atual = sum(1 for log in logs 
-            if log.get('access_date') and log['access_date'] >= inicio_semana_atual.isoformat())
-        acessos_semana_anterior = sum(1 for log in logs 
-            if log.get('access_date') and 
-               inicio_semana_anterior.isoformat() <= log['access_date'] < inicio_semana_atual.isoformat())
-        
-        if acessos_semana_anterior > 0:
-            variacao_semanal = round(((acessos_semana_atual - acessos_semana_anterior) / acessos_semana_anterior) * 100, 1)
-        else:
-            variacao_semanal = 100.0 if acessos_semana_atual > 0 else 0.0
-        
-        comparacao_semanal = {
-            'atual': acessos_semana_atual,
-            'anterior': acessos_semana_anterior,
-            'variacao_percentual': variacao_semanal
-        }
-        
-        # ===== MÉTRICAS DE ENGAJAMENTO =====
-        
-        # Contar acessos por usuário
-        acessos_por_usuario = Counter()
-        for log in logs:
-            user_id = log.get('user_id')
-            if user_id:
-                acessos_por_usuario[user_id] += 1
-        
-        # Usuários recorrentes (mais de 1 acesso) vs novos
-        usuarios_recorrentes = sum(1 for count in acessos_por_usuario.values() if count > 1)
-        usuarios_novos = sum(1 for count in acessos_por_usuario.values() if count == 1)
-        
-        # Frequência média (acessos por usuário)
-        total_usuarios = len(acessos_por_usuario)
-        frequencia_media = round(total_acessos / max(total_usuarios, 1), 1)
-        
-        # Top usuário por faixa horária
-        faixas_horarias = [
-            {'nome': '08-12h', 'inicio': 8, 'fim': 12},
-            {'nome': '12-14h', 'inicio': 12, 'fim': 14},
-            {'nome': '14-18h', 'inicio': 14, 'fim': 18},
-            {'nome': '18-22h', 'inicio': 18, 'fim': 22}
-        ]
-        
-        # Agrupar por faixa e usuário
-        acessos_por_faixa_usuario = defaultdict(lambda: defaultdict(lambda: {'count': 0, 'name': ''}))
-        
-        for log in logs:
-            hora = log.get('access_hour')
-            user_id = log.get('user_id')
-            user_name = log.get('user_name')
-            
-            if hora is None or not user_id:
-                continue
-            
-            hora = int(hora)
-            for faixa in faixas_horarias:
-                if faixa['inicio'] <= hora < faixa['fim']:
-                    acessos_por_faixa_usuario[faixa['nome']][user_id]['count'] += 1
-                    acessos_por_faixa_usuario[faixa['nome']][user_id]['name'] = user_name or 'N/A'
-                    break
-        
-        top_usuario_por_hora = []
-        for faixa in faixas_horarias:
-            usuarios_faixa = acessos_por_faixa_usuario[faixa['nome']]
-            if usuarios_faixa:
-                top_user_id = max(usuarios_faixa, key=lambda x: usuarios_faixa[x]['count'])
-                top_usuario_por_hora.append({
-                    'hora': faixa['nome'],
-                    'usuario': usuarios_faixa[top_user_id]['name'],
-                    'acessos': usuarios_faixa[top_user_id]['count']
-                })
-            else:
-                top_usuario_por_hora.append({
-                    'hora': faixa['nome'],
-                    'usuario': 'N/A',
-                    'acessos': 0
-                })
-        
-        return jsonify({
-            'success': True,
-            'temporal': {
-                'media_diaria': media_diaria,
-                'dia_mais_ativo': dia_mais_ativo,
-                'horario_pico': horario_pico,
-                'comparacao_semanal': comparacao_semanal,
-                'acessos_por_dia_semana': acessos_por_dia_semana
-            },
-            'engajamento': {
-                'usuarios_recorrentes': usuarios_recorrentes,
-                'usuarios_novos': usuarios_novos,
-                'frequencia_media': frequencia_media,
-                'top_usuario_por_hora': top_usuario_por_hora
-            }
-        })
-        
+        return jsonify(_overview_widget('advanced_metrics'))
     except Exception as e:
         logger.error(f"Erro ao obter métricas avançadas: {e}")
         return jsonify({
@@ -832,6 +795,22 @@ def get_advanced_metrics():
             }
         })
 
+@bp.route('/api/rollup-status')
+@login_required
+def get_rollup_status():
+    """
+    Estado dos agregados incrementais (baldes, marca d'água, última sincronização).
+    Com ?refresh=1 força a leitura dos acessos novos antes de responder.
+    """
+    if not check_api_auth():
+        return jsonify({'success': False, 'error': 'Acesso negado'}), 403
+    try:
+        rollup = get_analytics_rollup(force=request.args.get('refresh') == '1')
+        return jsonify({'success': True, 'data': rollup.status()})
+    except Exception as e:
+        logger.error(f"Erro ao obter estado do rollup: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 # ======== ANALYTICS DO AGENTE ========
 
 def calculate_response_time_from_log(log_data):
@@ -908,34 +887,20 @@ def get_portal_kpis():
         else:
             start_date = end_date - timedelta(days=30)
         
-        # Query base usando a view otimizada
-        query = supabase_admin.table('vw_analytics_portal').select('*')
-        query = query.gte('access_date', start_date.isoformat())
-        query = query.lte('access_date', end_date.isoformat())
-        query = query.eq('action_type', 'page_access')  # Apenas acessos a páginas
-        
-        if user_role_filter != 'all':
-            query = query.eq('user_role', user_role_filter)
-        if module_filter != 'all':
-            query = query.eq('module_name', module_filter)
-        
-        response = query.execute()
-        logs = response.data if response.data else []
-        
-        # Calcular KPIs
-        total_access = len(logs)
-        unique_users = len(set(log['user_id'] for log in logs if log.get('user_id')))
+        # KPIs a partir dos agregados incrementais
+        totals = get_analytics_rollup().totals(
+            start_date, end_date,
+            role=_filter_value(user_role_filter),
+            module=_filter_value(module_filter)
+        )
+        total_access = totals['access']
+        unique_users = totals['unique_users']
         
         # Tempo médio de resposta (apenas sucessos)
-        successful_logs = [log for log in logs if log.get('is_successful')]
-        if successful_logs and any(log.get('response_time_ms') for log in successful_logs):
-            valid_times = [log['response_time_ms'] for log in successful_logs if log.get('response_time_ms') and log['response_time_ms'] > 0]
-            avg_response_time = int(sum(valid_times) / len(valid_times)) if valid_times else 0
-        else:
-            avg_response_time = 0
+        avg_response_time = totals['avg_response_time_ms']
         
         # Taxa de sucesso
-        success_rate = round((len(successful_logs) / total_access * 100), 2) if total_access > 0 else 100.0
+        success_rate = round((totals['success'] / total_access * 100), 2) if total_access > 0 else 100.0
         
         return jsonify({
             'success': True,
@@ -981,22 +946,10 @@ def get_portal_timeline():
         else:
             start_date = end_date - timedelta(days=30)
         
-        query = supabase_admin.table('vw_analytics_portal').select('access_date')
-        query = query.gte('access_date', start_date.isoformat())
-        query = query.lte('access_date', end_date.isoformat())
-        query = query.eq('action_type', 'page_access')
-        
-        if user_role_filter != 'all':
-            query = query.eq('user_role', user_role_filter)
-        if module_filter != 'all':
-            query = query.eq('module_name', module_filter)
-        
-        response = query.execute()
-        logs = response.data if response.data else []
-        
-        # Agrupar por data
-        from collections import Counter
-        dates_count = Counter(log['access_date'] for log in logs if log.get('access_date'))
+        dates_count = get_analytics_rollup().count_by(
+            'date', start_date=start_date, end_date=end_date,
+            role=_filter_value(user_role_filter), module=_filter_value(module_filter)
+        )
         
         # Gerar todas as datas do período
         date_list = []
@@ -1045,20 +998,9 @@ def get_portal_top_modules():
         else:
             start_date = end_date - timedelta(days=30)
         
-        query = supabase_admin.table('vw_analytics_portal').select('module_name')
-        query = query.gte('access_date', start_date.isoformat())
-        query = query.lte('access_date', end_date.isoformat())
-        query = query.eq('action_type', 'page_access')
-        
-        if user_role_filter != 'all':
-            query = query.eq('user_role', user_role_filter)
-        
-        response = query.execute()
-        logs = response.data if response.data else []
-        
-        # Contar módulos
-        from collections import Counter
-        modules_count = Counter(log['module_name'] for log in logs if log.get('module_name'))
+        modules_count = get_analytics_rollup().count_by(
+            'module', start_date=start_date, end_date=end_date, role=_filter_value(user_role_filter)
+        )
         top_modules = modules_count.most_common(5)
         
         labels = [mod[0] for mod in top_modules]
@@ -1101,22 +1043,10 @@ def get_portal_device_breakdown():
         else:
             start_date = end_date - timedelta(days=30)
         
-        query = supabase_admin.table('vw_analytics_portal').select('device_type')
-        query = query.gte('access_date', start_date.isoformat())
-        query = query.lte('access_date', end_date.isoformat())
-        query = query.eq('action_type', 'page_access')
-        
-        if user_role_filter != 'all':
-            query = query.eq('user_role', user_role_filter)
-        if module_filter != 'all':
-            query = query.eq('module_name', module_filter)
-        
-        response = query.execute()
-        logs = response.data if response.data else []
-        
-        # Contar dispositivos
-        from collections import Counter
-        devices_count = Counter(log['device_type'] for log in logs if log.get('device_type'))
+        devices_count = get_analytics_rollup().count_by(
+            'device', start_date=start_date, end_date=end_date,
+            role=_filter_value(user_role_filter), module=_filter_value(module_filter)
+        )
         
         labels = list(devices_count.keys())
         values = list(devices_count.values())
@@ -1158,22 +1088,10 @@ def get_portal_top_pages():
         else:
             start_date = end_date - timedelta(days=30)
         
-        query = supabase_admin.table('vw_analytics_portal').select('page_name')
-        query = query.gte('access_date', start_date.isoformat())
-        query = query.lte('access_date', end_date.isoformat())
-        query = query.eq('action_type', 'page_access')
-        
-        if user_role_filter != 'all':
-            query = query.eq('user_role', user_role_filter)
-        if module_filter != 'all':
-            query = query.eq('module_name', module_filter)
-        
-        response = query.execute()
-        logs = response.data if response.data else []
-        
-        # Contar páginas
-        from collections import Counter
-        pages_count = Counter(log['page_name'] for log in logs if log.get('page_name'))
+        pages_count = get_analytics_rollup().count_by(
+            'page', start_date=start_date, end_date=end_date,
+            role=_filter_value(user_role_filter), module=_filter_value(module_filter)
+        )
         top_pages = pages_count.most_common(10)
         
         labels = [page[0] for page in top_pages]
@@ -1295,20 +1213,9 @@ def get_portal_user_profile_breakdown():
         else:
             start_date = end_date - timedelta(days=30)
         
-        query = supabase_admin.table('vw_analytics_portal').select('user_role')
-        query = query.gte('access_date', start_date.isoformat())
-        query = query.lte('access_date', end_date.isoformat())
-        query = query.eq('action_type', 'page_access')
-        
-        if module_filter != 'all':
-            query = query.eq('module_name', module_filter)
-        
-        response = query.execute()
-        logs = response.data if response.data else []
-        
-        # Contar perfis
-        from collections import Counter
-        roles_count = Counter(log['user_role'] for log in logs if log.get('user_role'))
+        roles_count = get_analytics_rollup().count_by(
+            'role', start_date=start_date, end_date=end_date, module=_filter_value(module_filter)
+        )
         
         labels = list(roles_count.keys())
         values = list(roles_count.values())
@@ -1350,37 +1257,26 @@ def get_portal_most_active_users():
         else:
             start_date = end_date - timedelta(days=30)
         
-        query = supabase_admin.table('vw_analytics_portal').select('user_name, user_email, user_role, access_timestamp_br')
-        query = query.gte('access_date', start_date.isoformat())
-        query = query.lte('access_date', end_date.isoformat())
-        query = query.eq('action_type', 'page_access')
-        
-        if module_filter != 'all':
-            query = query.eq('module_name', module_filter)
-        
-        response = query.execute()
-        logs = response.data if response.data else []
+        rollup = get_analytics_rollup()
+        access_by_user = rollup.count_by(
+            'user', start_date=start_date, end_date=end_date, module=_filter_value(module_filter)
+        )
         
-        # Agrupar por usuário
-        from collections import Counter
+        # Agrupar por e-mail (mesma chave usada antes dos agregados)
         user_access = {}
-        for log in logs:
-            user_key = log.get('user_email', 'N/A')
-            access_timestamp = log.get('access_timestamp_br', '')
-            
-            if user_key not in user_access:
-                user_access[user_key] = {
-                    'user_name': log.get('user_name', 'N/A'),
-                    'user_email': user_key,
-                    'user_role': log.get('user_role', 'N/A'),
-                    'access_count': 0,
-                    'last_access': access_timestamp
-                }
-            else:
-                user_access[user_key]['access_count'] += 1
-                # Atualizar último acesso se for mais recente
-                if access_timestamp > user_access[user_key]['last_access']:
-                    user_access[user_key]['last_access'] = access_timestamp
+        for user, count in access_by_user.items():
+            info = rollup.user(user)
+            user_key = info.get('user_email', 'N/A')
+            entry = user_access.setdefault(user_key, {
+                'user_name': info.get('user_name', 'N/A'),
+                'user_email': user_key,
+                'user_role': info.get('user_role', 'N/A'),
+                'access_count': 0,
+                'last_access': info.get('last_access') or ''
+            })
+            entry['access_count'] += count
+            if (info.get('last_access') or '') > entry['last_access']:
+                entry['last_access'] = info['last_access']
         
         # Ordenar e pegar top N
         sorted_users = sorted(user_access.values(), key=lambda x: x['access_count'], reverse=True)[:limit]
@@ -1792,12 +1688,10 @@ def get_inactive_users():
         
         # Buscar último acesso de cada usuário nos logs
         logs_query = supabase_admin.table('access_logs').select('user_id, user_name, user_email, user_role, created_at').order('created_at', desc=True)
-        logs_response = run_with_retries(
+        logs_response = run_with_policy(
+            'supabase.read',
             'analytics.get_inactive_users.logs',
-            lambda: logs_query.execute(),
-            max_attempts=3,
-            base_delay_seconds=0.8,
-            should_retry=lambda e: 'Server disconnected' in str(e) or 'timeout' in str(e).lower()
+            lambda: logs_query.execute()
         )
         all_logs = logs_response.data if logs_response.data else []
         logger.info(f"[INACTIVE_USERS] Total de logs encontrados: {len(all_logs)}")
@@ -85,39 +85,38 @@ async function loadAnalyticsStats() {
     try {
         console.log('[ANALYTICS] Fetching data - attempt', loadAttempts);
 
-        // Fazer requisições em paralelo
-        const [statsResponse, chartsResponse, usersResponse, activityResponse, inactiveUsersResponse, advancedMetricsResponse] = await Promise.all([
-            fetch('/analytics/api/stats?' + new URLSearchParams(currentFilters)),
-            fetch('/analytics/api/charts?' + new URLSearchParams(currentFilters)),
-            fetch('/analytics/api/top-users?' + new URLSearchParams(currentFilters)),
-            fetch('/analytics/api/recent-activity?' + new URLSearchParams(currentFilters)),
-            fetch('/analytics/api/inactive-users'),
-            fetch('/analytics/api/advanced-metrics?' + new URLSearchParams(currentFilters))
+        // Painel consolidado (um único carregamento no servidor) + usuários inativos em paralelo.
+        // O navegador revalida o painel com If-None-Match e reaproveita a resposta em caso de 304.
+        const [overviewResponse, inactiveUsersResponse] = await Promise.all([
+            fetch('/analytics/api/overview?' + new URLSearchParams(currentFilters), { cache: 'no-cache' }),
+            fetch('/analytics/api/inactive-users')
         ]);
 
         console.log('[ANALYTICS] Responses received:', {
-            stats: statsResponse.status,
-            charts: chartsResponse.status,
-            users: usersResponse.status,
-            activity: activityResponse.status,
-            inactiveUsers: inactiveUsersResponse.status,
-            advancedMetrics: advancedMetricsResponse.status
+            overview: overviewResponse.status,
+            inactiveUsers: inactiveUsersResponse.status
         });
 
-        if (!statsResponse.ok || !chartsResponse.ok || !usersResponse.ok || !activityResponse.ok || !inactiveUsersResponse.ok) {
+        if (!overviewResponse.ok || !inactiveUsersResponse.ok) {
             throw new Error('Erro ao carregar dados - Status codes: ' +
-                [statsResponse.status, chartsResponse.status, usersResponse.status, activityResponse.status, inactiveUsersResponse.status].join(','));
+                [overviewResponse.status, inactiveUsersResponse.status].join(','));
         }
 
-        const [stats, charts, users, activity, inactiveUsersData, advancedMetrics] = await Promise.all([
-            statsResponse.json(),
-            chartsResponse.json(),
-            usersResponse.json(),
-            activityResponse.json(),
-            inactiveUsersResponse.json(),
-            advancedMetricsResponse.json()
+        const [overview, inactiveUsersData] = await Promise.all([
+            overviewResponse.json(),
+            inactiveUsersResponse.json()
         ]);
 
+        if (overview.errors && Object.keys(overview.errors).length) {
+            console.warn('[ANALYTICS] Widgets com erro no painel:', overview.errors);
+        }
+
+        const stats = overview.stats || { total_access: 0, unique_users: 0, logins_today: 0, total_logins: 0, avg_session_minutes: 0 };
+        const charts = overview.charts || { daily_access: [], daily_users: [], top_pages: [], users_activity: [], hourly_heatmap: [] };
+        const users = overview.top_users || [];
+        const activity = overview.recent_activity || [];
+        const advancedMetrics = overview.advanced_metrics || { success: false };
+
         console.log('[ANALYTICS] Data parsed successfully');
         console.log('[ANALYTICS] Charts data received:', {
             daily_access_count: charts.daily_access?.length,
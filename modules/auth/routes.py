@@ -444,8 +444,11 @@ def login():
                 print(f"[AUTH] Login bem-sucedido via Supabase Auth para {email} com role {user['role']}")
                 
                 try:
-                    data_cache.preload_user_data(user['id'], user['role'])
-                    print(f"[AUTH] Dados precarregados para usuário {user['id']}")
+                    # Pré-carregamento assíncrono: o login retorna imediatamente com o ticket
+                    session['preload_ticket'] = data_cache.start_preload(
+                        user['id'], user['role'], user_data=session['user']
+                    )
+                    print(f"[AUTH] Pré-carregamento iniciado para usuário {user['id']}")
                 except Exception as cache_error:
                     print(f"[AUTH] Erro ao precarregar dados: {str(cache_error)}")
                 
@@ -508,6 +511,20 @@ def session_info():
             'error': str(e)
         }), 500
 
+@bp.route('/api/preload-status')
+@login_required
+def preload_status():
+    """Status do pré-carregamento disparado no login"""
+    ticket = session.get('preload_ticket')
+    status = data_cache.get_preload_status(ticket) if ticket else None
+    if not status:
+        return jsonify({'success': True, 'status': 'idle'})
+    if status['status'] != 'loading':
+        # Estado final do ticket refletido na sessão
+        session['data_loading_status'] = status['status']
+        session['cache_ready'] = status['status'] == 'completed'
+    return jsonify({'success': True, **status})
+
 @bp.route('/api/extend-session', methods=['POST'])
 @login_required
 def extend_session():
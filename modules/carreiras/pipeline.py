@@ -0,0 +1,447 @@
+"""
+Pipeline assíncrono de candidaturas do portal público.
+
+A rota de candidatura fazia tudo dentro da requisição pública: consulta de
+duplicidade, leitura do currículo inteiro em memória, upload para o bucket
+`curriculos`, insert do candidato e disparo do webhook de IA. Uma rajada de
+candidaturas após a divulgação de uma vaga prendia os workers.
+
+Aqui a requisição apenas valida o formulário, consulta um conjunto em cache
+de (vaga_id, email) já candidatados, grava o currículo em disco (streaming)
+junto com um manifesto JSON e responde. Um pool limitado de workers executa
+as etapas com retentativas, registrando o progresso no manifesto. Uma
+varredura periódica (a cada CARREIRAS_RECOVERY_INTERVAL segundos) retoma
+manifestos abandonados (ex.: worker reiniciado) ou com etapas pendentes. O
+spool fica em instance/carreiras_spool (ou CARREIRAS_SPOOL_DIR, de preferência
+um volume persistente), para sobreviver a reinícios do container.
+
+Se o upload do currículo falhar, o candidato é registrado sem currículo (como
+antes do pipeline) e o upload segue pendente no manifesto: as varreduras
+seguintes repetem o envio e então gravam curriculo_path/url_curriculo e
+disparam o webhook.
+
+Cada submissão em andamento mantém um flock em <id>.lock até o fim do
+processamento: a retomada só assume manifestos cujo lock está livre (dono
+encerrado), então os dois workers do gunicorn nunca processam a mesma
+candidatura. Depois de CARREIRAS_MAX_RECOVERIES execuções com falha o
+manifesto vai para <id>.failed (fila morta, tratada manualmente).
+
+Usage:
+    from modules.carreiras.pipeline import candidaturas_pipeline
+
+    if candidaturas_pipeline.ja_candidatou(vaga_id, email):
+        ...
+    candidaturas_pipeline.enviar(candidato_data, request.files.get('curriculo'))
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import glob
+import json
+import os
+import threading
+import time
+import traceback
+import uuid
+
+import requests
+
+try:
+    import fcntl
+except ImportError:  # Windows (desenvolvimento local, processo único)
+    fcntl = None
+
+from extensions import supabase_admin
+from services.retry_utils import run_with_retries
+
+CURRICULOS_BUCKET = 'curriculos'
+WEBHOOK_N8N_URL = os.getenv('WEBHOOK_N8N_URL')  # URL do webhook n8n
+_APP_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SPOOL_DIR = os.getenv('CARREIRAS_SPOOL_DIR', os.path.join(_APP_ROOT, 'instance', 'carreiras_spool'))
+PIPELINE_WORKERS = int(os.getenv('CARREIRAS_PIPELINE_WORKERS', '2'))
+PIPELINE_MAX_ATTEMPTS = int(os.getenv('CARREIRAS_PIPELINE_MAX_ATTEMPTS', '4'))
+# Manifestos sem atualização há mais tempo que isso são considerados abandonados
+RECOVERY_AGE_SECONDS = int(os.getenv('CARREIRAS_RECOVERY_AGE', '600'))
+# Intervalo entre varreduras do spool em busca de manifestos a retomar
+RECOVERY_INTERVAL_SECONDS = int(os.getenv('CARREIRAS_RECOVERY_INTERVAL', '60'))
+# Execuções completas com falha antes de mover o manifesto para a fila morta (.failed)
+MAX_RECOVERIES = int(os.getenv('CARREIRAS_MAX_RECOVERIES', '5'))
+DEDUP_REFRESH_SECONDS = int(os.getenv('CARREIRAS_DEDUP_REFRESH', '30'))
+DEDUP_PAGE_SIZE = 1000
+
+
+def _normalize_email(email):
+    return (email or '').strip().lower()
+
+
+class CandidaturasIndex:
+    """Conjunto (vaga_id, email) das candidaturas existentes, atualizado por created_at"""
+
+    def __init__(self):
+        self.pairs = set()
+        self.watermark = None
+        self.loaded = False
+        self.last_refresh = 0.0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def add(self, vaga_id, email):
+        with self._lock:
+            self.pairs.add((str(vaga_id), _normalize_email(email)))
+
+    def contains(self, vaga_id, email):
+        self.refresh()
+        with self._lock:
+            return (str(vaga_id), _normalize_email(email)) in self.pairs
+
+    def _fetch_page(self, watermark, offset):
+        query = supabase_admin.table('rh_candidatos').select('vaga_id, email, created_at')
+        if watermark:
+            query = query.gte('created_at', watermark)
+        query = query.order('created_at').order('id').range(offset, offset + DEDUP_PAGE_SIZE - 1)
+        return run_with_retries('carreiras.dedup.refresh', query.execute, max_attempts=2).data or []
+
+    def refresh(self, force=False):
+        """Lê apenas as candidaturas criadas desde a marca d'água"""
+        if not force and self.loaded and time.time() - self.last_refresh < DEDUP_REFRESH_SECONDS:
+            return
+        if not self._refresh_lock.acquire(blocking=not self.loaded):
+            # Outra requisição já está atualizando; o conjunto atual basta
+            return
+        try:
+            started = time.time()
+            watermark = self.watermark
+            offset = 0
+            added = 0
+            while True:
+                page = self._fetch_page(watermark, offset)
+                with self._lock:
+                    for row in page:
+                        self.pairs.add((str(row.get('vaga_id')), _normalize_email(row.get('email'))))
+                        created_at = row.get('created_at')
+                        if created_at and (self.watermark is None or created_at > self.watermark):
+                            self.watermark = created_at
+                added += len(page)
+                if len(page) < DEDUP_PAGE_SIZE:
+                    break
+                offset += DEDUP_PAGE_SIZE
+            if not self.loaded:
+                print(f"[CARREIRAS][DEDUP] Carga inicial: {len(self.pairs)} candidaturas em {time.time() - started:.2f}s")
+            self.loaded = True
+            self.last_refresh = time.time()
+        finally:
+            self._refresh_lock.release()
+
+
+class CandidaturasPipeline:
+    """Spool em disco + pool de workers para as etapas pesadas da candidatura"""
+
+    def __init__(self, max_workers=PIPELINE_WORKERS):
+        self.index = CandidaturasIndex()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='carreiras-pipeline')
+        self._recovery_started = False
+        self._recover_lock = threading.Lock()
+
+    # ---- requisição ----
+
+    def ja_candidatou(self, vaga_id, email):
+        """Duplicidade pelo conjunto em cache; sem cache disponível, consulta direta"""
+        self._start_recovery()
+        try:
+            return self.index.contains(vaga_id, email)
+        except Exception as e:
+            print(f"[CARREIRAS][DEDUP] Cache indisponível, consultando banco: {e}")
+            return self._existing_candidato(vaga_id, email) is not None
+
+    def enviar(self, candidato_data, curriculo=None):
+        """Grava o currículo e o manifesto no spool e agenda o processamento.
+
+        - candidato_data: registro de rh_candidatos (sem curriculo_path)
+        - curriculo: FileStorage já validado (ou None)
+        Retorna o id da submissão.
+        """
+        self._start_recovery()
+        os.makedirs(SPOOL_DIR, exist_ok=True)
+        submission_id = uuid.uuid4().hex
+        # Lock antes do manifesto existir: a retomada de outro worker nunca o assume
+        lock = self._acquire_lock(submission_id)
+        manifest = {
+            'submission_id': submission_id,
+            'candidato': candidato_data,
+            'arquivo': None,
+            'curriculo_path': None,
+            'content_type': None,
+            'curriculo_enviado': False,
+            'curriculo_registrado': False,
+            'candidato_id': None,
+            'webhook_enviado': False,
+            'tentativas': 0,
+        }
+        if curriculo is not None:
+            extension = curriculo.filename.rsplit('.', 1)[1].lower()
+            spool_path = os.path.join(SPOOL_DIR, f'{submission_id}.{extension}')
+            # FileStorage.save copia o stream em blocos, sem carregar o arquivo em memória
+            curriculo.save(spool_path)
+            manifest['arquivo'] = spool_path
+            manifest['curriculo_path'] = f'{uuid.uuid4()}.{extension}'
+            manifest['content_type'] = curriculo.content_type
+        self._write_manifest(manifest)
+        self.index.add(candidato_data['vaga_id'], candidato_data['email'])
+        self._executor.submit(self._run, manifest, lock)
+        print(f"[CARREIRAS][PIPELINE] Candidatura {submission_id} recebida para vaga {candidato_data['vaga_id']}")
+        return submission_id
+
+    # ---- manifesto ----
+
+    @staticmethod
+    def _manifest_path(submission_id):
+        return os.path.join(SPOOL_DIR, f'{submission_id}.json')
+
+    def _write_manifest(self, manifest):
+        path = self._manifest_path(manifest['submission_id'])
+        with open(path + '.part', 'w', encoding='utf-8') as fh:
+            json.dump(manifest, fh)
+        os.replace(path + '.part', path)
+
+    @staticmethod
+    def _lock_path(submission_id):
+        return os.path.join(SPOOL_DIR, f'{submission_id}.lock')
+
+    def _acquire_lock(self, submission_id):
+        """flock exclusivo da submissão; None se outro processo/execução já o detém"""
+        fh = open(self._lock_path(submission_id), 'a+')
+        if fcntl is None:
+            return fh
+        try:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            fh.close()
+            return None
+        return fh
+
+    @staticmethod
+    def _release_lock(lock, remove_path=None):
+        if lock is None:
+            return
+        if remove_path:
+            try:
+                os.remove(remove_path)
+            except OSError:
+                pass
+        lock.close()
+
+    def _discard(self, manifest):
+        for path in (manifest.get('arquivo'), self._manifest_path(manifest['submission_id'])):
+            try:
+                if path and os.path.exists(path):
+                    os.remove(path)
+            except OSError as e:
+                print(f"[CARREIRAS][PIPELINE] Erro ao remover {path}: {e}")
+
+    def _dead_letter(self, manifest):
+        """Tira o manifesto da retomada automática, mantendo currículo e dados para análise"""
+        path = self._manifest_path(manifest['submission_id'])
+        try:
+            os.replace(path, os.path.join(SPOOL_DIR, f"{manifest['submission_id']}.failed"))
+        except OSError as e:
+            print(f"[CARREIRAS][PIPELINE] Erro ao mover {path} para a fila morta: {e}")
+
+    def _start_recovery(self):
+        """Inicia (uma vez por processo) a varredura periódica do spool"""
+        if self._recovery_started:
+            return
+        with self._recover_lock:
+            if self._recovery_started:
+                return
+            self._recovery_started = True
+            threading.Thread(target=self._recovery_loop, name='carreiras-recovery', daemon=True).start()
+
+    def _recovery_loop(self):
+        while True:
+            try:
+                self._recover_pending()
+            except Exception as e:
+                print(f"[CARREIRAS][PIPELINE] Erro na varredura do spool: {e}")
+            time.sleep(RECOVERY_INTERVAL_SECONDS)
+
+    def _recover_pending(self):
+        """Reagenda manifestos abandonados ou com etapas pendentes (sem atualização recente)"""
+        with self._recover_lock:
+            cutoff = time.time() - RECOVERY_AGE_SECONDS
+            for path in glob.glob(os.path.join(SPOOL_DIR, '*.json')):
+                submission_id = os.path.basename(path)[:-len('.json')]
+                lock = None
+                try:
+                    if os.path.getmtime(path) > cutoff:
+                        continue
+                    # Lock livre = dono encerrado; só um worker do gunicorn o obtém
+                    lock = self._acquire_lock(submission_id)
+                    if lock is None:
+                        continue
+                    if not os.path.exists(path):
+                        # Concluído pelo dono entre o glob e o lock
+                        self._release_lock(lock)
+                        continue
+                    with open(path, encoding='utf-8') as fh:
+                        manifest = json.load(fh)
+                    print(f"[CARREIRAS][PIPELINE] Retomando candidatura {manifest['submission_id']}")
+                    self._executor.submit(self._run, manifest, lock)
+                except (OSError, ValueError) as e:
+                    self._release_lock(lock)
+                    print(f"[CARREIRAS][PIPELINE] Manifesto {path} ignorado: {e}")
+
+    # ---- worker ----
+
+    @staticmethod
+    def _existing_candidato(vaga_id, email):
+        response = supabase_admin.table('rh_candidatos')\
+            .select('id, curriculo_path')\
+            .eq('vaga_id', str(vaga_id))\
+            .eq('email', email)\
+            .limit(1)\
+            .execute()
+        return response.data[0] if response.data else None
+
+    def _retry(self, label, func):
+        return run_with_retries(f'carreiras.{label}', func,
+                                max_attempts=PIPELINE_MAX_ATTEMPTS, base_delay_seconds=2.0)
+
+    def _run(self, manifest, lock=None):
+        submission_id = manifest['submission_id']
+        candidato = manifest['candidato']
+        started = time.time()
+        try:
+            manifest['tentativas'] += 1
+            # Manifestos gravados antes dos campos de currículo pendente
+            manifest.setdefault('curriculo_enviado', not manifest['arquivo'] and manifest['curriculo_path'] is not None)
+            manifest.setdefault('curriculo_registrado', manifest['candidato_id'] is not None and manifest['curriculo_enviado'])
+
+            # 1. Upload do currículo (nome definido na recepção: retentativas sobrescrevem o mesmo objeto)
+            if manifest['arquivo'] and os.path.exists(manifest['arquivo']):
+                with open(manifest['arquivo'], 'rb') as fh:
+                    content = fh.read()
+                try:
+                    self._retry('upload', lambda: supabase_admin.storage
+                                .from_(CURRICULOS_BUCKET)
+                                .upload(manifest['curriculo_path'], content, {
+                                    'content-type': manifest['content_type'],
+                                    'x-upsert': 'true'
+                                }))
+                    os.remove(manifest['arquivo'])
+                    manifest['arquivo'] = None
+                    manifest['curriculo_enviado'] = True
+                    self._write_manifest(manifest)
+                    print(f"✅ Currículo salvo: {manifest['curriculo_path']}")
+                except Exception as storage_error:
+                    # Continua sem currículo; o arquivo fica no spool para nova tentativa
+                    print(f"❌ Erro ao fazer upload do currículo: {str(storage_error)}")
+            elif manifest['arquivo']:
+                # Spool perdido: segue sem currículo, como no upload com falha
+                manifest['arquivo'] = None
+                manifest['curriculo_path'] = None
+            curriculo_path = manifest['curriculo_path'] if manifest['curriculo_enviado'] else None
+
+            # 2. Registro do candidato (duplicidade conferida no banco, válida entre workers)
+            if not manifest['candidato_id']:
+                existing = self._retry('check', lambda: self._existing_candidato(candidato['vaga_id'], candidato['email']))
+                if existing and existing.get('curriculo_path') not in (curriculo_path, manifest['curriculo_path']):
+                    print(f"[CARREIRAS][PIPELINE] Candidatura {submission_id} duplicada para vaga {candidato['vaga_id']} - descartada")
+                    self._discard(manifest)
+                    self._release_lock(lock, self._lock_path(submission_id))
+                    return
+                if existing:
+                    # Insert de uma tentativa anterior que chegou ao banco
+                    manifest['candidato_id'] = existing['id']
+                    manifest['curriculo_registrado'] = existing.get('curriculo_path') is not None
+                else:
+                    payload = dict(candidato, curriculo_path=curriculo_path)
+                    response = self._retry('insert', lambda: supabase_admin.table('rh_candidatos').insert(payload).execute())
+                    if not response.data:
+                        raise RuntimeError('Insert do candidato não retornou dados')
+                    manifest['candidato_id'] = response.data[0]['id']
+                    manifest['curriculo_registrado'] = curriculo_path is not None
+                self._write_manifest(manifest)
+            candidato_id = manifest['candidato_id']
+
+            if manifest['arquivo']:
+                # Candidato registrado sem currículo; a varredura do spool repete o upload
+                raise RuntimeError('Upload do currículo pendente')
+            if curriculo_path and not manifest['curriculo_registrado']:
+                # Upload concluído depois do insert: associa o currículo ao candidato
+                self._retry('curriculo', lambda: supabase_admin.table('rh_candidatos')
+                            .update({'curriculo_path': curriculo_path})
+                            .eq('id', candidato_id)
+                            .execute())
+                manifest['curriculo_registrado'] = True
+                self._write_manifest(manifest)
+
+            # 3. URL pública permanente do currículo
+            curriculo_url_publica = None
+            if curriculo_path:
+                try:
+                    curriculo_url_publica = supabase_admin.storage\
+                        .from_(CURRICULOS_BUCKET)\
+                        .get_public_url(curriculo_path)
+                    self._retry('url', lambda: supabase_admin.table('rh_candidatos')
+                                .update({'url_curriculo': curriculo_url_publica})
+                                .eq('id', candidato_id)
+                                .execute())
+                    print(f"✅ URL salva no banco para candidato {candidato_id}")
+                except Exception as url_error:
+                    print(f"⚠️  Erro ao gerar URL pública: {str(url_error)}")
+
+            # 4. Webhook n8n (processamento com IA)
+            if WEBHOOK_N8N_URL and curriculo_path and not manifest['webhook_enviado']:
+                webhook_payload = {
+                    'candidato_id': candidato_id,
+                    'vaga_id': candidato['vaga_id'],
+                    'curriculo_path': curriculo_path,
+                    'curriculo_url': curriculo_url_publica,  # URL PÚBLICA PERMANENTE
+                    'email': candidato['email'],
+                    'nome_completo': candidato['nome_completo'],
+                    'telefone': candidato.get('telefone') or None,
+                    'linkedin_url': candidato.get('linkedin_url'),
+                    'pretensao_salarial': candidato.get('pretensao_salarial')
+                }
+
+                def _post_webhook():
+                    response = requests.post(WEBHOOK_N8N_URL, json=webhook_payload, timeout=5)
+                    if response.status_code >= 500:
+                        raise RuntimeError(f'Webhook n8n retornou status {response.status_code}')
+                    return response
+
+                try:
+                    webhook_response = self._retry('webhook', _post_webhook)
+                    if webhook_response.status_code == 200:
+                        print(f"✅ Webhook n8n disparado para candidato {candidato_id}")
+                        supabase_admin.table('rh_candidatos')\
+                            .update({'ai_status': 'Em Processamento'})\
+                            .eq('id', candidato_id)\
+                            .execute()
+                    else:
+                        print(f"⚠️ Webhook n8n retornou status {webhook_response.status_code}")
+                except Exception as webhook_error:
+                    # O processamento com IA pode ser feito manualmente
+                    print(f"⚠️ Erro ao disparar webhook: {str(webhook_error)}")
+                manifest['webhook_enviado'] = True
+
+            self._discard(manifest)
+            self._release_lock(lock, self._lock_path(submission_id))
+            print(f"[CARREIRAS][PIPELINE] Candidatura {submission_id} processada em {time.time() - started:.2f}s (candidato {candidato_id})")
+        except Exception as e:
+            print(f"❌ [CARREIRAS][PIPELINE] Falha na candidatura {submission_id} (tentativa {manifest['tentativas']}): {e}")
+            traceback.print_exc()
+            try:
+                self._write_manifest(manifest)
+                if manifest['tentativas'] >= MAX_RECOVERIES:
+                    print(f"[CARREIRAS][PIPELINE] Candidatura {submission_id} movida para a fila morta após {manifest['tentativas']} tentativas")
+                    self._dead_letter(manifest)
+                    self._release_lock(lock, self._lock_path(submission_id))
+                    return
+            except OSError:
+                pass
+            # Manifesto permanece no spool e é retomado pela varredura periódica
+            self._release_lock(lock)
+
+
+# Instância global usada pela rota pública de candidatura
+candidaturas_pipeline = CandidaturasPipeline()
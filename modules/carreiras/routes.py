@@ -7,9 +7,8 @@ from extensions import supabase_admin
 from werkzeug.utils import secure_filename
 import json
 import os
-import uuid
 from datetime import datetime
-import requests
+from modules.carreiras.pipeline import candidaturas_pipeline
 
 # Criar Blueprint PÚBLICO (sem url_prefix de módulo interno)
 carreiras_bp = Blueprint(
@@ -22,7 +21,6 @@ carreiras_bp = Blueprint(
 
 # Configurações
 ALLOWED_EXTENSIONS = {'pdf', 'doc', 'docx'}
-WEBHOOK_N8N_URL = os.getenv('WEBHOOK_N8N_URL')  # URL do webhook n8n
 API_SECRET_KEY = os.getenv('API_SECRET_KEY_IA')  # Chave para proteger endpoint de IA
 UNIQUE_EMPRESA_ID = 'dc984b7c-3156-43f7-a1bf-f7a0b77db535'  # Unique Aduaneira
 
@@ -155,47 +153,21 @@ def aplicar_vaga(vaga_id):
                 'message': 'Nome e e-mail são obrigatórios'
             }), 400
         
-        # 2. Verificar se já existe candidatura
-        check_response = supabase_admin.table('rh_candidatos')\
-            .select('id')\
-            .eq('vaga_id', str(vaga_id))\
-            .eq('email', email)\
-            .execute()
-        
-        if check_response.data and len(check_response.data) > 0:
+        # 2. Verificar se já existe candidatura (conjunto em cache, atualizado incrementalmente)
+        if candidaturas_pipeline.ja_candidatou(vaga_id, email):
             return jsonify({
                 'success': False,
                 'message': 'Você já se candidatou para esta vaga anteriormente'
             }), 409
         
-        # 3. Upload do currículo no Supabase Storage
-        curriculo_path = None
+        # 3. Currículo: gravado em disco; upload, insert e webhook de IA rodam em segundo plano
+        curriculo = None
         if 'curriculo' in request.files:
             file = request.files['curriculo']
-            
             if file and file.filename and allowed_file(file.filename):
-                # Gerar nome único para o arquivo
-                file_extension = file.filename.rsplit('.', 1)[1].lower()
-                unique_filename = f"{uuid.uuid4()}.{file_extension}"
-                
-                try:
-                    # Upload para Supabase Storage bucket 'curriculos'
-                    file_content = file.read()
-                    storage_response = supabase_admin.storage\
-                        .from_('curriculos')\
-                        .upload(unique_filename, file_content, {
-                            'content-type': file.content_type,
-                            'x-upsert': 'false'
-                        })
-                    
-                    curriculo_path = unique_filename
-                    print(f"✅ Currículo salvo: {curriculo_path}")
-                
-                except Exception as storage_error:
-                    print(f"❌ Erro ao fazer upload do currículo: {str(storage_error)}")
-                    # Continuar mesmo se o upload falhar
+                curriculo = file
         
-        # 4. Criar registro do candidato com status IA = 'Pendente'
+        # 4. Registro do candidato com status IA = 'Pendente'
         candidato_data = {
             'vaga_id': str(vaga_id),
             'nome_completo': nome_completo,
@@ -203,86 +175,15 @@ def aplicar_vaga(vaga_id):
             'telefone': telefone,
             'linkedin_url': linkedin_url if linkedin_url else None,
             'pretensao_salarial': pretensao_salarial_num,
-            'curriculo_path': curriculo_path,
             'status_processo': 'Triagem',
             'fonte_candidatura': 'Portal de Vagas',
             'ai_status': 'Pendente',
             'data_candidatura': datetime.now().isoformat(),
             'empresa_controladora_id': UNIQUE_EMPRESA_ID
         }
+        candidaturas_pipeline.enviar(candidato_data, curriculo)
         
-        insert_response = supabase_admin.table('rh_candidatos')\
-            .insert(candidato_data)\
-            .execute()
-        
-        if not insert_response.data or len(insert_response.data) == 0:
-            return jsonify({
-                'success': False,
-                'message': 'Erro ao processar candidatura'
-            }), 500
-        
-        candidato_id = insert_response.data[0]['id']
-        
-        # 5. Gerar URL PÚBLICA PERMANENTE do currículo (sem expiração)
-        curriculo_url_publica = None
-        if curriculo_path:
-            try:
-                # Gera URL pública PERMANENTE (sem expiração)
-                curriculo_url_publica = supabase_admin.storage\
-                    .from_('curriculos')\
-                    .get_public_url(curriculo_path)
-                
-                print(f"✅ URL pública permanente gerada: {curriculo_url_publica}")
-                
-                # ATUALIZAR o candidato com a URL permanente
-                supabase_admin.table('rh_candidatos')\
-                    .update({'url_curriculo': curriculo_url_publica})\
-                    .eq('id', candidato_id)\
-                    .execute()
-                
-                print(f"✅ URL salva no banco para candidato {candidato_id}")
-            
-            except Exception as url_error:
-                print(f"⚠️  Erro ao gerar URL pública: {str(url_error)}")
-        
-        # 6. Disparar webhook para n8n (processamento assíncrono com IA)
-        if WEBHOOK_N8N_URL and curriculo_path:
-            try:
-                webhook_payload = {
-                    'candidato_id': candidato_id,
-                    'vaga_id': str(vaga_id),
-                    'curriculo_path': curriculo_path,
-                    'curriculo_url': curriculo_url_publica,  # URL PÚBLICA PERMANENTE
-                    'email': email,
-                    'nome_completo': nome_completo,
-                    'telefone': telefone if telefone else None,
-                    'linkedin_url': linkedin_url if linkedin_url else None,
-                    'pretensao_salarial': pretensao_salarial_num
-                }
-                
-                webhook_response = requests.post(
-                    WEBHOOK_N8N_URL,
-                    json=webhook_payload,
-                    timeout=5
-                )
-                
-                if webhook_response.status_code == 200:
-                    print(f"✅ Webhook n8n disparado para candidato {candidato_id}")
-                    print(f"   URL pública enviada: {curriculo_url_publica[:80] if curriculo_url_publica else 'N/A'}...")
-                    
-                    # Atualizar status para 'Em Processamento'
-                    supabase_admin.table('rh_candidatos')\
-                        .update({'ai_status': 'Em Processamento'})\
-                        .eq('id', candidato_id)\
-                        .execute()
-                else:
-                    print(f"⚠️ Webhook n8n retornou status {webhook_response.status_code}")
-            
-            except Exception as webhook_error:
-                print(f"⚠️ Erro ao disparar webhook: {str(webhook_error)}")
-                # Não retornar erro para o usuário - o processamento pode ser feito manualmente
-        
-        # 7. Redirecionar para página de sucesso
+        # 5. Redirecionar para página de sucesso
         return redirect(url_for('carreiras.sucesso'))
     
     except Exception as e:
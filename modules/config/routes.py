@@ -1,7 +1,7 @@
 from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for, session
 from routes.auth import login_required, role_required
 from extensions import supabase_admin
-from services.retry_utils import run_with_retries
+from services.retry_utils import run_with_policy
 import os
 import uuid
 import re
@@ -181,12 +181,10 @@ def api_logos_clientes():
         def _query():
             return supabase_admin.table('cad_clientes_sistema').select('*').eq('ativo', True).order('nome_cliente').execute()
 
-        response = run_with_retries(
+        response = run_with_policy(
+            'supabase.read.hedged',
             'config.api_logos_clientes',
-            _query,
-            max_attempts=3,
-            base_delay_seconds=0.8,
-            should_retry=lambda e: 'Server disconnected' in str(e) or 'timeout' in str(e).lower()
+            _query
         )
 
         # Processar dados para o frontend
@@ -0,0 +1,4 @@
+"""
+Módulo de Desempenho - Apenas para Administradores
+Endpoints mais lentos, quebra de tempo por componente e perfis de amostragem
+"""
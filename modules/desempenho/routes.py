@@ -0,0 +1,83 @@
+"""
+Rotas do módulo de Desempenho (Admin)
+"""
+from flask import Blueprint, render_template, session, redirect, url_for, jsonify, request, send_file
+from services.profiling import profiler
+from services.query_tracing import query_tracer
+import logging
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint(
+    'desempenho',
+    __name__,
+    url_prefix='/desempenho',
+    template_folder='templates'
+)
+
+
+def _admin_error():
+    """Resposta de erro para usuário não autenticado/não admin (None se permitido)"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Não autenticado'}), 401
+    if session.get('user_role', '') != 'admin':
+        return jsonify({'error': 'Acesso negado. Apenas administradores.'}), 403
+    return None
+
+
+@bp.route('/')
+def index():
+    """Painel de endpoints mais lentos - Apenas para admins"""
+    if 'user_id' not in session:
+        return redirect(url_for('auth.login'))
+    if session.get('user_role', '') != 'admin':
+        return "Acesso negado. Apenas administradores podem visualizar esta página.", 403
+    return render_template('desempenho/desempenho.html')
+
+
+@bp.route('/api/endpoints')
+def api_endpoints():
+    """Endpoints mais lentos deste worker, com quebra em banco/Python/serialização"""
+    error = _admin_error()
+    if error:
+        return error
+    order_by = request.args.get('order_by', 'p95_ms')
+    if order_by not in ('p95_ms', 'p50_ms', 'avg_ms', 'max_ms', 'db_ms', 'python_ms', 'serialization_ms', 'count'):
+        order_by = 'p95_ms'
+    limit = min(request.args.get('limit', 30, type=int), 200)
+    return jsonify({
+        'endpoints': profiler.slowest(limit=limit, order_by=order_by),
+        'profiles': profiler.recent_profiles(),
+        'n_plus_one': query_tracer.offenders(),
+        'profiler': profiler.stats(),
+    })
+
+
+@bp.route('/api/endpoints/profiling', methods=['POST'])
+def api_toggle_profiling():
+    """Liga/desliga a amostragem de pilha de um endpoint"""
+    error = _admin_error()
+    if error:
+        return error
+    data = request.get_json(silent=True) or {}
+    endpoint = (data.get('endpoint') or '').strip()
+    if not endpoint:
+        return jsonify({'error': 'Endpoint não informado'}), 400
+    if data.get('enabled'):
+        profiler.enable_endpoint(endpoint)
+    else:
+        profiler.disable_endpoint(endpoint)
+    logger.info(f"Amostragem de {endpoint} {'habilitada' if data.get('enabled') else 'desabilitada'} por {session.get('user_id')}")
+    return jsonify({'success': True, 'endpoints_profiled': profiler.stats()['endpoints_profiled']})
+
+
+@bp.route('/api/profiles/<filename>')
+def api_download_profile(filename):
+    """Download de um perfil no formato folded (flamegraph.pl / speedscope)"""
+    error = _admin_error()
+    if error:
+        return error
+    path = profiler.profile_path(filename)
+    if path is None:
+        return jsonify({'error': 'Perfil não encontrado neste worker'}), 404
+    return send_file(path, mimetype='text/plain', as_attachment=True, download_name=filename)
@@ -9,6 +9,7 @@ import numpy as np
 import json
 from collections import defaultdict
 from services.data_cache import data_cache
+from services.named_queries import register_query, run_query, invalidate_query_cache
 
 # Blueprint para Categorização de Clientes
 categorizacao_clientes_bp = Blueprint(
@@ -20,6 +21,46 @@ categorizacao_clientes_bp = Blueprint(
     static_url_path='/financeiro/categorizacao/static'
 )
 
+# Consultas nomeadas (SQL declarado uma vez, valores sempre como parâmetros)
+register_query(
+    'categorizacao.clientes',
+    """
+    SELECT 
+        v.nome_original,
+        COALESCE(m.nome_padronizado, '') as nome_padronizado,
+        CASE WHEN m.nome_padronizado IS NOT NULL THEN true ELSE false END as categorizado,
+        m.created_at,
+        m.updated_at
+    FROM public.vw_clientes_distintos v
+    LEFT JOIN public.fin_clientes_mapeamento m ON v.nome_original = m.nome_original
+    {where}
+    ORDER BY v.nome_original
+    """,
+    params={'busca': str, 'categorizados': bool, 'nao_categorizados': bool},
+    filters={
+        'busca': "v.nome_original ILIKE %(busca)s",
+        'categorizados': "m.nome_padronizado IS NOT NULL",
+        'nao_categorizados': "m.nome_padronizado IS NULL",
+    },
+    ttl=60,
+    sql_arg='query',
+)
+
+register_query(
+    'categorizacao.popular_mapeamento',
+    """
+    INSERT INTO public.fin_clientes_mapeamento (nome_original, nome_padronizado)
+    SELECT
+        nome_original,
+        nome_original
+    FROM
+        public.vw_clientes_distintos
+    ON CONFLICT (nome_original) DO NOTHING
+    """,
+    ttl=0,
+    sql_arg='query',
+)
+
 @categorizacao_clientes_bp.route('/')
 @login_required
 @perfil_required('financeiro', 'categorizacao')
@@ -51,44 +92,14 @@ def api_clientes():
         
         print(f"[CATEGORIZACAO_API] Buscando clientes - Busca: '{busca}', Status: {status}")
         
-        # Buscar clientes da view e tabela de mapeamento
-        query = """
-        SELECT 
-            v.nome_original,
-            COALESCE(m.nome_padronizado, '') as nome_padronizado,
-            CASE WHEN m.nome_padronizado IS NOT NULL THEN true ELSE false END as categorizado,
-            m.created_at,
-            m.updated_at
-        FROM public.vw_clientes_distintos v
-        LEFT JOIN public.fin_clientes_mapeamento m ON v.nome_original = m.nome_original
-        """
-        
-        # Aplicar filtros
-        conditions = []
-        params = []
-        
-        if busca:
-            conditions.append("v.nome_original ILIKE %s")
-            params.append(f"%{busca}%")
-        
-        if status == 'categorizados':
-            conditions.append("m.nome_padronizado IS NOT NULL")
-        elif status == 'nao_categorizados':
-            conditions.append("m.nome_padronizado IS NULL")
-        
-        if conditions:
-            query += " WHERE " + " AND ".join(conditions)
-        
-        query += " ORDER BY v.nome_original"
-        
-        # Executar query
-        result = supabase_admin.table('vw_clientes_distintos').select('*').execute()
-        
-        # Como estamos usando uma view complexa, vamos fazer a query diretamente
+        # Buscar clientes da view e tabela de mapeamento (consulta nomeada com cache)
         try:
-            # Tentar executar a query complexa
-            clientes_raw = supabase_admin.rpc('execute_sql', {'query': query, 'params': params}).execute()
-            clientes = clientes_raw.data if clientes_raw.data else []
+            clientes = run_query(
+                'categorizacao.clientes',
+                busca=f"%{busca}%" if busca else None,
+                categorizados=status == 'categorizados',
+                nao_categorizados=status == 'nao_categorizados'
+            )
         except:
             # Fallback: buscar apenas da view
             clientes_raw = supabase_admin.table('vw_clientes_distintos').select('nome_original').execute()
@@ -198,6 +209,8 @@ def api_salvar_categorizacao():
                     'updated_at': 'now()'
                 }).eq('nome_original', nome_original).execute()
         
+        invalidate_query_cache('categorizacao.')
+        
         return jsonify({
             'success': True,
             'message': f'{len(categorizacoes)} categorizações salvas com sucesso'
@@ -218,20 +231,9 @@ def api_popular_tabelas():
     try:
         print("[CATEGORIZACAO_API] Populando tabelas de mapeamento...")
         
-        # Query para inserir clientes que ainda não existem na tabela de mapeamento
-        query = """
-        INSERT INTO public.fin_clientes_mapeamento (nome_original, nome_padronizado)
-        SELECT
-            nome_original,
-            nome_original
-        FROM
-            public.vw_clientes_distintos
-        ON CONFLICT (nome_original) DO NOTHING
-        """
-        
         # Executar via RPC ou diretamente
         try:
-            supabase_admin.rpc('execute_sql', {'query': query}).execute()
+            run_query('categorizacao.popular_mapeamento')
         except:
             # Fallback: buscar da view e inserir um por um
             clientes_raw = supabase_admin.table('vw_clientes_distintos').select('nome_original').execute()
@@ -246,6 +248,8 @@ def api_popular_tabelas():
                     # Já existe, pular
                     pass
         
+        invalidate_query_cache('categorizacao.')
+        
         return jsonify({
             'success': True,
             'message': 'Tabelas populadas com sucesso'
@@ -465,6 +469,7 @@ def api_salvar_categorizacoes():
                 del _dc.cache[cache_key]
             if cache_key in _dc.cache_timestamp:
                 del _dc.cache_timestamp[cache_key]
+            invalidate_query_cache('categorizacao.')
             print("[CATEGORIZACAO_API] Cache de mapeamento invalidado")
         except Exception:
             pass
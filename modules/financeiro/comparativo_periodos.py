@@ -0,0 +1,409 @@
+"""
+Motor de comparação de períodos (ano a ano) dos dashboards financeiros.
+
+O Dashboard Executivo, a Visão Geral de Faturamento e os KPIs de Despesas
+repetiam o mesmo padrão: um select do período atual, outro do período
+anterior (sequenciais, trazendo linhas inteiras e truncados no limite de
+linhas do PostgREST) e somas em Python, cada rota com suas próprias datas.
+
+Aqui cada base (medida) é lida uma vez por (filtros, dimensões, ano) com
+projeção mínima (data, valor e as dimensões pedidas), paginada até o fim e
+reduzida a um rollup diário. Os rollups ficam em cache com TTL e os anos
+que faltam são buscados em paralelo (chamadas idênticas concorrentes são
+coalescidas). Totais, séries mensais, agrupamentos e variações de qualquer
+janela - ano cheio, acumulado do ano, mês, trimestre, últimos 12 meses -
+saem do mesmo rollup: KPI, tabela mensal e gráfico comparativo do mesmo ano
+compartilham uma única leitura.
+
+Usage:
+    from modules.financeiro.comparativo_periodos import Periodo, comparar, comparar_muitos
+
+    comp = comparar('faturamento', Periodo.ano(2025))
+    comp['atual']['total'], comp['comparacao']['total'], comp['variacao'], comp['serie']
+
+    comps = comparar_muitos({
+        'faturamento': {'medida': 'faturamento', 'periodo': Periodo.ano(2025)},
+        'despesas': {'medida': 'despesas', 'periodo': Periodo.ano(2025)},
+    })
+"""
+
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import json
+import os
+import threading
+import time
+
+from services.single_flight import single_flight
+
+FIN_COMPARATIVO_TTL = int(os.getenv('FIN_COMPARATIVO_TTL', '300'))
+FIN_COMPARATIVO_CACHE_MAX_ENTRIES = int(os.getenv('FIN_COMPARATIVO_CACHE_MAX_ENTRIES', '128'))
+FIN_COMPARATIVO_MAX_WORKERS = int(os.getenv('FIN_COMPARATIVO_MAX_WORKERS', '6'))
+# Tamanho de página da leitura (limite de linhas do PostgREST)
+FIN_COMPARATIVO_PAGE_SIZE = int(os.getenv('FIN_COMPARATIVO_PAGE_SIZE', '1000'))
+
+_executor = ThreadPoolExecutor(max_workers=FIN_COMPARATIVO_MAX_WORKERS, thread_name_prefix='fin-comparativo')
+
+
+class Medida:
+    """Base somável: tabela/view, colunas de data e valor e restrição fixa opcional"""
+
+    def __init__(self, nome: str, tabela: str, coluna_data: str = 'data', coluna_valor: str = 'valor',
+                 restricao: Optional[Callable[[Any], Any]] = None):
+        self.nome = nome
+        self.tabela = tabela
+        self.coluna_data = coluna_data
+        self.coluna_valor = coluna_valor
+        self.restricao = restricao
+
+
+_medidas: Dict[str, Medida] = {}
+
+
+def registrar_medida(medida: Medida) -> Medida:
+    _medidas[medida.nome] = medida
+    return medida
+
+
+registrar_medida(Medida('faturamento', 'fin_faturamento_anual'))
+registrar_medida(Medida('faturamento_tratado', 'vw_fin_faturamento_anual_tratado'))
+registrar_medida(Medida('despesas', 'fin_despesa_anual',
+                        restricao=lambda query: query.neq('classe', 'TRANSFERENCIA DE CONTAS')))
+
+
+class Periodo:
+    """Janela fechada [inicio, fim] em dias"""
+
+    def __init__(self, inicio: date, fim: date):
+        self.inicio = inicio
+        self.fim = fim
+
+    @classmethod
+    def ano(cls, ano) -> 'Periodo':
+        ano = int(ano)
+        return cls(date(ano, 1, 1), date(ano, 12, 31))
+
+    @classmethod
+    def de_strings(cls, inicio: str, fim: str) -> 'Periodo':
+        return cls(datetime.strptime(inicio[:10], '%Y-%m-%d').date(), datetime.strptime(fim[:10], '%Y-%m-%d').date())
+
+    def deslocar_anos(self, anos: int) -> 'Periodo':
+        return Periodo(_somar_anos(self.inicio, anos), _somar_anos(self.fim, anos))
+
+    @property
+    def anos(self) -> List[int]:
+        return list(range(self.inicio.year, self.fim.year + 1))
+
+    def meses(self) -> List[str]:
+        """Meses (YYYY-MM) cobertos pela janela, em ordem"""
+        meses = []
+        ano, mes = self.inicio.year, self.inicio.month
+        while (ano, mes) <= (self.fim.year, self.fim.month):
+            meses.append(f'{ano}-{mes:02d}')
+            ano, mes = (ano + 1, 1) if mes == 12 else (ano, mes + 1)
+        return meses
+
+    def to_dict(self) -> Dict[str, str]:
+        return {'inicio': self.inicio.isoformat(), 'fim': self.fim.isoformat()}
+
+    def __repr__(self):
+        return f'Periodo({self.inicio.isoformat()}, {self.fim.isoformat()})'
+
+
+def _somar_anos(dia: date, anos: int) -> date:
+    try:
+        return dia.replace(year=dia.year + anos)
+    except ValueError:  # 29/02 em ano não bissexto
+        return dia.replace(year=dia.year + anos, day=28)
+
+
+def _deslocar_mes(mes: str, meses: int) -> str:
+    ano, numero = int(mes[:4]), int(mes[5:7])
+    total = ano * 12 + (numero - 1) + meses
+    return f'{total // 12}-{total % 12 + 1:02d}'
+
+
+# ---- períodos nomeados (filtro 'periodo' das telas de despesas) ----
+
+def periodo_nomeado(nome: str, hoje: Optional[datetime] = None) -> Periodo:
+    """Janela atual para 'mes_atual', 'trimestre_atual', 'ano_atual' e 'ultimos_12_meses'"""
+    hoje = (hoje or datetime.now()).date()
+    if nome == 'mes_atual':
+        return Periodo(hoje.replace(day=1), hoje)
+    if nome == 'trimestre_atual':
+        trimestre = (hoje.month - 1) // 3
+        return Periodo(hoje.replace(month=trimestre * 3 + 1, day=1), hoje)
+    if nome == 'ultimos_12_meses':
+        return Periodo(hoje - timedelta(days=365), hoje)
+    # 'ano_atual', 'personalizado' (ainda sem datas próprias) e padrão
+    return Periodo(hoje.replace(month=1, day=1), hoje)
+
+
+def periodo_anterior_nomeado(nome: str, hoje: Optional[datetime] = None) -> Periodo:
+    """Janela de comparação de periodo_nomeado: mês/trimestre anterior, ano anterior
+    completo ou os 12 meses anteriores aos últimos 12"""
+    hoje = (hoje or datetime.now()).date()
+    if nome == 'mes_atual':
+        fim = hoje.replace(day=1) - timedelta(days=1)
+        return Periodo(fim.replace(day=1), fim)
+    if nome == 'trimestre_atual':
+        trimestre = (hoje.month - 1) // 3
+        if trimestre == 0:
+            return Periodo(date(hoje.year - 1, 10, 1), date(hoje.year - 1, 12, 31))
+        return Periodo(hoje.replace(month=(trimestre - 1) * 3 + 1, day=1),
+                       hoje.replace(month=trimestre * 3 + 1, day=1) - timedelta(days=1))
+    if nome == 'ultimos_12_meses':
+        return Periodo(hoje - timedelta(days=730), hoje - timedelta(days=365))
+    return Periodo.ano(hoje.year - 1)
+
+
+# ---- variações ----
+
+def variacao_percentual(atual: float, anterior: float) -> float:
+    """Variação % sobre o anterior; sem base positiva: 0 se ambos zerados, senão 100"""
+    if anterior > 0:
+        return ((atual - anterior) / anterior) * 100
+    return 0 if atual == 0 else 100
+
+
+# ---- rollups em cache ----
+
+_cache: 'OrderedDict[str, Tuple[float, Dict[tuple, float]]]' = OrderedDict()
+_lock = threading.Lock()
+_metricas = {'hits': 0, 'misses': 0, 'fetches': 0, 'rows': 0, 'fetch_ms': 0.0}
+
+
+def _normalizar_filtros(filtros: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    return {coluna: valor for coluna, valor in sorted((filtros or {}).items()) if valor not in (None, '')}
+
+
+def _chave(medida: str, ano: int, filtros: Dict[str, Any], dimensoes: Tuple[str, ...]) -> str:
+    return json.dumps([medida, ano, filtros, list(dimensoes)], default=str)
+
+
+def _cache_get(chave: str):
+    with _lock:
+        entrada = _cache.get(chave)
+        if entrada is None or entrada[0] < time.time():
+            _cache.pop(chave, None)
+            _metricas['misses'] += 1
+            return None
+        _cache.move_to_end(chave)
+        _metricas['hits'] += 1
+        return entrada[1]
+
+
+def _cache_set(chave: str, rollup: Dict[tuple, float]):
+    with _lock:
+        _cache[chave] = (time.time() + FIN_COMPARATIVO_TTL, rollup)
+        _cache.move_to_end(chave)
+        while len(_cache) > FIN_COMPARATIVO_CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+
+
+def _buscar_rollup(medida: Medida, ano: int, filtros: Dict[str, Any], dimensoes: Tuple[str, ...]) -> Dict[tuple, float]:
+    """Lê o ano inteiro (paginado) e soma por (dia, *dimensões).
+
+    A ordenação usa todas as colunas projetadas: linhas empatadas são idênticas
+    e a paginação por offset não perde nem duplica valores na soma.
+    """
+    from extensions import supabase_admin
+
+    colunas = [medida.coluna_data, medida.coluna_valor] + [d for d in dimensoes if d not in (medida.coluna_data, medida.coluna_valor)]
+    rollup: Dict[tuple, float] = defaultdict(float)
+    inicio = time.perf_counter()
+    offset = 0
+    linhas = 0
+    while True:
+        query = supabase_admin.table(medida.tabela).select(','.join(colunas)) \
+            .gte(medida.coluna_data, f'{ano}-01-01') \
+            .lte(medida.coluna_data, f'{ano}-12-31')
+        for coluna, valor in filtros.items():
+            query = query.eq(coluna, valor)
+        if medida.restricao:
+            query = medida.restricao(query)
+        for coluna in colunas:
+            query = query.order(coluna)
+        pagina = query.range(offset, offset + FIN_COMPARATIVO_PAGE_SIZE - 1).execute().data or []
+        for item in pagina:
+            dia = item.get(medida.coluna_data)
+            valor = item.get(medida.coluna_valor)
+            if not dia or valor in (None, ''):
+                continue
+            try:
+                valor = float(valor)
+            except (TypeError, ValueError):
+                continue
+            rollup[(str(dia)[:10],) + tuple(item.get(d) for d in dimensoes)] += valor
+        linhas += len(pagina)
+        if len(pagina) < FIN_COMPARATIVO_PAGE_SIZE:
+            break
+        offset += FIN_COMPARATIVO_PAGE_SIZE
+    with _lock:
+        _metricas['fetches'] += 1
+        _metricas['rows'] += linhas
+        _metricas['fetch_ms'] += (time.perf_counter() - inicio) * 1000
+    return dict(rollup)
+
+
+def _rollups(pedidos: Iterable[Tuple[str, int, Dict[str, Any], Tuple[str, ...]]]) -> Dict[str, Dict[tuple, float]]:
+    """Rollups de vários (medida, ano, filtros, dimensões); os ausentes do cache são lidos em paralelo"""
+    resultados = {}
+    futuros = {}
+    for nome, ano, filtros, dimensoes in pedidos:
+        chave = _chave(nome, ano, filtros, dimensoes)
+        if chave in resultados or chave in futuros:
+            continue
+        rollup = _cache_get(chave)
+        if rollup is not None:
+            resultados[chave] = rollup
+            continue
+        medida = _medidas.get(nome)
+        if medida is None:
+            raise KeyError(f'Medida não registrada: {nome}')
+
+        def _executar(chave=chave, medida=medida, ano=ano, filtros=filtros, dimensoes=dimensoes):
+            rollup = _buscar_rollup(medida, ano, filtros, dimensoes)
+            _cache_set(chave, rollup)
+            return rollup
+
+        futuros[chave] = _executor.submit(single_flight.do, f'fin_comparativo:{chave}', _executar)
+    for chave, futuro in futuros.items():
+        resultados[chave] = futuro.result()
+    return resultados
+
+
+def _resumir(rollups: Dict[str, Dict[tuple, float]], nome: str, periodo: Periodo, filtros: Dict[str, Any],
+             dimensoes: Tuple[str, ...]) -> Dict[str, Any]:
+    """Total, meses e grupos (por dimensões) da janela"""
+    inicio, fim = periodo.inicio.isoformat(), periodo.fim.isoformat()
+    total = 0.0
+    meses: Dict[str, float] = defaultdict(float)
+    grupos: Dict[tuple, float] = defaultdict(float)
+    for ano in periodo.anos:
+        for chave, valor in rollups[_chave(nome, ano, filtros, dimensoes)].items():
+            dia = chave[0]
+            if dia < inicio or dia > fim:
+                continue
+            total += valor
+            meses[dia[:7]] += valor
+            if dimensoes:
+                grupos[chave[1:]] += valor
+    resumo = dict(periodo.to_dict(), total=total, meses=dict(meses))
+    if dimensoes:
+        resumo['grupos'] = [dict(zip(dimensoes, valores), valor=valor) for valores, valor in grupos.items()]
+    return resumo
+
+
+def _pedidos_da_comparacao(nome, periodo, comparacao, filtros, dimensoes):
+    return [(nome, ano, filtros, dimensoes) for janela in (periodo, comparacao) for ano in janela.anos]
+
+
+def _montar(rollups, nome, periodo, comparacao, filtros, dimensoes) -> Dict[str, Any]:
+    atual = _resumir(rollups, nome, periodo, filtros, dimensoes)
+    anterior = _resumir(rollups, nome, comparacao, filtros, dimensoes)
+    # Mês i do período atual contra o mês correspondente da comparação
+    deslocamento = (comparacao.inicio.year - periodo.inicio.year) * 12 + (comparacao.inicio.month - periodo.inicio.month)
+    serie = []
+    for mes in periodo.meses():
+        mes_comparacao = _deslocar_mes(mes, deslocamento)
+        valor_atual = atual['meses'].get(mes, 0)
+        valor_anterior = anterior['meses'].get(mes_comparacao, 0)
+        serie.append({
+            'mes': mes,
+            'mes_comparacao': mes_comparacao,
+            'atual': valor_atual,
+            'comparacao': valor_anterior,
+            'variacao': variacao_percentual(valor_atual, valor_anterior),
+        })
+    return {
+        'medida': nome,
+        'filtros': filtros,
+        'atual': atual,
+        'comparacao': anterior,
+        'diferenca': atual['total'] - anterior['total'],
+        'variacao': variacao_percentual(atual['total'], anterior['total']),
+        'serie': serie,
+    }
+
+
+def comparar(medida: str, periodo: Periodo, comparacao: Optional[Periodo] = None,
+             filtros: Optional[Dict[str, Any]] = None, dimensoes: Iterable[str] = ()) -> Dict[str, Any]:
+    """Compara a medida no período com a janela de comparação (padrão: mesmo período um ano antes).
+
+    - filtros: {coluna: valor} aplicados como igualdade (None/'' são ignorados)
+    - dimensoes: colunas para agrupar ('grupos' em atual/comparacao)
+    Retorna totais, meses, série mensal alinhada, diferença e variação %.
+    """
+    comparacao = comparacao or periodo.deslocar_anos(-1)
+    filtros = _normalizar_filtros(filtros)
+    dimensoes = tuple(dimensoes)
+    rollups = _rollups(_pedidos_da_comparacao(medida, periodo, comparacao, filtros, dimensoes))
+    return _montar(rollups, medida, periodo, comparacao, filtros, dimensoes)
+
+
+def comparar_muitos(pedidos: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Várias comparações com uma única rodada de leituras em paralelo.
+
+    pedidos: {alias: {'medida', 'periodo', 'comparacao'?, 'filtros'?, 'dimensoes'?}}
+    """
+    normalizados = {}
+    todos = []
+    for alias, pedido in pedidos.items():
+        periodo = pedido['periodo']
+        comparacao = pedido.get('comparacao') or periodo.deslocar_anos(-1)
+        filtros = _normalizar_filtros(pedido.get('filtros'))
+        dimensoes = tuple(pedido.get('dimensoes') or ())
+        normalizados[alias] = (pedido['medida'], periodo, comparacao, filtros, dimensoes)
+        todos.extend(_pedidos_da_comparacao(pedido['medida'], periodo, comparacao, filtros, dimensoes))
+    rollups = _rollups(todos)
+    return {alias: _montar(rollups, *args) for alias, args in normalizados.items()}
+
+
+def serie_por_ano(medida: str, periodo: Periodo, filtros: Optional[Dict[str, Any]] = None) -> Dict[str, Dict[str, float]]:
+    """{ano: {mes (MM): total}} da janela, apenas anos com lançamentos (gráfico comparativo de anos)"""
+    filtros = _normalizar_filtros(filtros)
+    rollups = _rollups([(medida, ano, filtros, ()) for ano in periodo.anos])
+    resumo = _resumir(rollups, medida, periodo, filtros, ())
+    anos: Dict[str, Dict[str, float]] = defaultdict(dict)
+    for mes, valor in resumo['meses'].items():
+        anos[mes[:4]][mes[5:7]] = valor
+    return dict(anos)
+
+
+def limites_datas(medida: str, filtros: Optional[Dict[str, Any]] = None) -> Optional[Periodo]:
+    """Primeira e última data com lançamento (para janelas sem data informada)"""
+    from extensions import supabase_admin
+
+    base = _medidas[medida]
+    filtros = _normalizar_filtros(filtros)
+
+    def _extremo(desc):
+        query = supabase_admin.table(base.tabela).select(base.coluna_data).not_.is_(base.coluna_data, 'null')
+        for coluna, valor in filtros.items():
+            query = query.eq(coluna, valor)
+        if base.restricao:
+            query = base.restricao(query)
+        linhas = query.order(base.coluna_data, desc=desc).limit(1).execute().data or []
+        return linhas[0][base.coluna_data] if linhas else None
+
+    primeiro, ultimo = _executor.submit(_extremo, False), _executor.submit(_extremo, True)
+    primeiro, ultimo = primeiro.result(), ultimo.result()
+    if not primeiro or not ultimo:
+        return None
+    return Periodo.de_strings(primeiro, ultimo)
+
+
+def invalidar(medida: Optional[str] = None):
+    """Descarta rollups em cache (todos ou da medida)"""
+    with _lock:
+        for chave in list(_cache.keys()):
+            if medida is None or json.loads(chave)[0] == medida:
+                _cache.pop(chave, None)
+
+
+def estatisticas() -> Dict[str, Any]:
+    with _lock:
+        return dict(_metricas, fetch_ms=round(_metricas['fetch_ms'], 1), entries=len(_cache))
@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, session, jsonify, request
 from modules.auth.routes import login_required
 from decorators.perfil_decorators import perfil_required
 from extensions import supabase_admin
+from modules.financeiro.comparativo_periodos import Periodo, comparar, comparar_muitos
 import pandas as pd
 from datetime import datetime
 from collections import defaultdict
@@ -31,56 +32,17 @@ def api_kpis():
     try:
         ano = request.args.get('ano', datetime.now().year)
         
-        # Buscar dados de faturamento
-        response_faturamento = supabase_admin.table('fin_faturamento_anual') \
-            .select('valor') \
-            .gte('data', f'{ano}-01-01') \
-            .lte('data', f'{ano}-12-31') \
-            .execute()
-        
-        faturamento_atual = sum(float(item['valor']) for item in response_faturamento.data) if response_faturamento.data else 0
-        
-        # Buscar dados de faturamento do ano anterior para comparação
-        ano_anterior = int(ano) - 1
-        response_faturamento_anterior = supabase_admin.table('fin_faturamento_anual') \
-            .select('valor') \
-            .gte('data', f'{ano_anterior}-01-01') \
-            .lte('data', f'{ano_anterior}-12-31') \
-            .execute()
-        
-        faturamento_anterior = sum(float(item['valor']) for item in response_faturamento_anterior.data) if response_faturamento_anterior.data else 0
-        
-        # Calcular variação percentual do faturamento
-        if faturamento_anterior > 0:
-            faturamento_variacao = ((faturamento_atual - faturamento_anterior) / faturamento_anterior) * 100
-        else:
-            faturamento_variacao = 0 if faturamento_atual == 0 else 100
-        
-        # Buscar dados de despesas
-        response_despesas = supabase_admin.table('fin_despesa_anual') \
-            .select('valor') \
-            .gte('data', f'{ano}-01-01') \
-            .lte('data', f'{ano}-12-31') \
-            .neq('classe', 'TRANSFERENCIA DE CONTAS') \
-            .execute()
-        
-        despesas_atual = sum(float(item['valor']) for item in response_despesas.data) if response_despesas.data else 0
-        
-        # Buscar dados de despesas do ano anterior para comparação
-        response_despesas_anterior = supabase_admin.table('fin_despesa_anual') \
-            .select('valor') \
-            .gte('data', f'{ano_anterior}-01-01') \
-            .lte('data', f'{ano_anterior}-12-31') \
-            .neq('classe', 'TRANSFERENCIA DE CONTAS') \
-            .execute()
-        
-        despesas_anterior = sum(float(item['valor']) for item in response_despesas_anterior.data) if response_despesas_anterior.data else 0
-        
-        # Calcular variação percentual das despesas
-        if despesas_anterior > 0:
-            despesas_variacao = ((despesas_atual - despesas_anterior) / despesas_anterior) * 100
-        else:
-            despesas_variacao = 0 if despesas_atual == 0 else 100
+        # Faturamento e despesas do ano contra o ano anterior (leituras em paralelo e em cache)
+        comparacoes = comparar_muitos({
+            'faturamento': {'medida': 'faturamento', 'periodo': Periodo.ano(ano)},
+            'despesas': {'medida': 'despesas', 'periodo': Periodo.ano(ano)},
+        })
+        faturamento_atual = comparacoes['faturamento']['atual']['total']
+        faturamento_anterior = comparacoes['faturamento']['comparacao']['total']
+        faturamento_variacao = comparacoes['faturamento']['variacao']
+        despesas_atual = comparacoes['despesas']['atual']['total']
+        despesas_anterior = comparacoes['despesas']['comparacao']['total']
+        despesas_variacao = comparacoes['despesas']['variacao']
         
         # Calcular resultado líquido
         resultado_atual = faturamento_atual - despesas_atual
@@ -658,35 +620,15 @@ def api_top_clientes():
     """API para top 10 clientes por faturamento"""
     try:
         ano = request.args.get('ano', datetime.now().year)
-        ano_anterior = int(ano) - 1
-        
-        # Buscar dados de faturamento por cliente do ano atual
-        response_faturamento = supabase_admin.table('fin_faturamento_anual') \
-            .select('cliente, valor') \
-            .gte('data', f'{ano}-01-01') \
-            .lte('data', f'{ano}-12-31') \
-            .execute()
-        
-        # Buscar dados de faturamento por cliente do ano anterior
-        response_faturamento_anterior = supabase_admin.table('fin_faturamento_anual') \
-            .select('cliente, valor') \
-            .gte('data', f'{ano_anterior}-01-01') \
-            .lte('data', f'{ano_anterior}-12-31') \
-            .execute()
         
-        # Agrupar por cliente - ano atual
+        # Faturamento por cliente - ano atual e ano anterior
+        comparacao = comparar('faturamento', Periodo.ano(ano), dimensoes=('cliente',))
         faturamento_por_cliente = defaultdict(float)
-        for item in response_faturamento.data:
-            cliente = item.get('cliente', 'Não identificado')
-            valor = float(item['valor']) if item['valor'] else 0
-            faturamento_por_cliente[cliente] += valor
-        
-        # Agrupar por cliente - ano anterior
+        for grupo in comparacao['atual']['grupos']:
+            faturamento_por_cliente[grupo['cliente']] += grupo['valor']
         faturamento_anterior_por_cliente = defaultdict(float)
-        for item in response_faturamento_anterior.data:
-            cliente = item.get('cliente', 'Não identificado')
-            valor = float(item['valor']) if item['valor'] else 0
-            faturamento_anterior_por_cliente[cliente] += valor
+        for grupo in comparacao['comparacao']['grupos']:
+            faturamento_anterior_por_cliente[grupo['cliente']] += grupo['valor']
         
         # Ordenar e pegar top 10
         top_clientes = sorted(faturamento_por_cliente.items(), key=lambda x: x[1], reverse=True)[:10]
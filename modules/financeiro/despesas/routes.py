@@ -3,6 +3,7 @@ from extensions import supabase, supabase_admin
 from routes.auth import login_required, role_required
 from decorators.perfil_decorators import perfil_required
 from permissions import check_permission
+from modules.financeiro.comparativo_periodos import comparar, periodo_anterior_nomeado, periodo_nomeado
 from datetime import datetime, timedelta
 import pandas as pd
 import numpy as np
@@ -39,20 +40,19 @@ def api_kpis():
     try:
         # Obter parâmetros de período
         periodo = request.args.get('periodo', 'ano_atual')
-        data_inicio, data_fim = _get_periodo_dates(periodo)
+        periodo_atual = periodo_nomeado(periodo)
+        periodo_anterior = periodo_anterior_nomeado(periodo)
+        data_inicio, data_fim = periodo_atual.inicio.isoformat(), periodo_atual.fim.isoformat()
         
-        # Buscar despesas do período atual
+        # Despesas (período atual x anterior, por categoria/classe)
         print(f"Debug - Querying despesas from fin_despesa_anual table for period {data_inicio} to {data_fim}")
-        response_atual = supabase_admin.table('fin_despesa_anual') \
-            .select('categoria, classe, valor') \
-            .gte('data', data_inicio) \
-            .lte('data', data_fim) \
-            .neq('classe', 'TRANSFERENCIA DE CONTAS') \
-            .execute()
-        print(f"Debug - Found {len(response_atual.data) if response_atual.data else 0} records in despesas data")
+        comparacao_despesas = comparar('despesas', periodo_atual, periodo_anterior, dimensoes=('categoria', 'classe'))
+        grupos_atual = comparacao_despesas['atual']['grupos']
+        grupos_anterior = comparacao_despesas['comparacao']['grupos']
+        print(f"Debug - Found {len(grupos_atual)} categoria/classe groups in despesas data")
         
-        if response_atual.data:
-            df_atual = pd.DataFrame(response_atual.data)
+        if grupos_atual:
+            df_atual = pd.DataFrame(grupos_atual)
             
             # Calcular KPIs
             total_despesas = df_atual['valor'].sum()
@@ -144,20 +144,10 @@ def api_kpis():
             
             print(f"Debug - Final KPIs: Total={total_despesas}, Funcionários={despesas_funcionarios}, Folha={folha_liquida}, Impostos={impostos}")
             
-            # Buscar período anterior para comparação
-            data_inicio_anterior, data_fim_anterior = _get_periodo_anterior_dates(periodo)
-            
-            response_anterior = supabase_admin.table('fin_despesa_anual') \
-                .select('categoria, classe, valor') \
-                .gte('data', data_inicio_anterior) \
-                .lte('data', data_fim_anterior) \
-                .neq('classe', 'TRANSFERENCIA DE CONTAS') \
-                .execute()
-            
             # Calcular variações
             variacoes = {}
-            if response_anterior.data:
-                df_anterior = pd.DataFrame(response_anterior.data)
+            if grupos_anterior:
+                df_anterior = pd.DataFrame(grupos_anterior)
                 
                 total_anterior = df_anterior['valor'].sum()
                 funcionarios_anterior = df_anterior[
@@ -200,26 +190,10 @@ def api_kpis():
                     'impostos': _calcular_variacao(impostos, impostos_anterior)
                 }
             
-            # Buscar faturamento para % Folha sobre Faturamento
+            # % Folha sobre Faturamento (falha no faturamento não derruba os KPIs de despesas)
             try:
-                # Buscar dados de faturamento da tabela correta
-                response_faturamento = supabase_admin.table('fin_faturamento_anual') \
-                    .select('valor') \
-                    .gte('data', data_inicio) \
-                    .lte('data', data_fim) \
-                    .execute()
-                
-                faturamento_total = 0
-                if response_faturamento.data:
-                    # Somar todos os valores de faturamento do período
-                    faturamento_total = sum(float(item['valor']) for item in response_faturamento.data)
-                    print(f"Debug - Faturamento total found: {faturamento_total}")
-                else:
-                    print("Debug - No faturamento data found")
-                
+                faturamento_total = comparar('faturamento', periodo_atual, periodo_atual)['atual']['total']
                 percentual_folha = (folha_liquida / faturamento_total * 100) if faturamento_total > 0 else 0
-                
-                # Debug logging
                 print(f"Debug - Folha Líquida: {folha_liquida}, Faturamento Total: {faturamento_total}, Percentual: {percentual_folha}")
             except Exception as faturamento_error:
                 percentual_folha = 0
@@ -637,65 +611,13 @@ def api_filtros_opcoes():
 # Funções auxiliares
 def _get_periodo_dates(periodo):
     """Retorna as datas de início e fim baseado no período"""
-    hoje = datetime.now()
-    
-    if periodo == 'mes_atual':
-        inicio = hoje.replace(day=1)
-        fim = hoje
-    elif periodo == 'trimestre_atual':
-        trimestre = (hoje.month - 1) // 3
-        inicio = hoje.replace(month=trimestre * 3 + 1, day=1)
-        fim = hoje
-    elif periodo == 'ano_atual':
-        inicio = hoje.replace(month=1, day=1)
-        fim = hoje
-    elif periodo == 'ultimos_12_meses':
-        inicio = hoje - timedelta(days=365)
-        fim = hoje
-    elif periodo == 'personalizado':
-        # Implementar lógica para período personalizado
-        inicio = hoje.replace(month=1, day=1)
-        fim = hoje
-    else:
-        # Padrão: ano atual
-        inicio = hoje.replace(month=1, day=1)
-        fim = hoje
-    
-    return inicio.strftime('%Y-%m-%d'), fim.strftime('%Y-%m-%d')
+    janela = periodo_nomeado(periodo)
+    return janela.inicio.isoformat(), janela.fim.isoformat()
 
 def _get_periodo_anterior_dates(periodo):
     """Retorna as datas do período anterior para comparação"""
-    hoje = datetime.now()
-    
-    if periodo == 'mes_atual':
-        # Mês anterior
-        mes_anterior = hoje.replace(day=1) - timedelta(days=1)
-        inicio = mes_anterior.replace(day=1)
-        fim = mes_anterior
-    elif periodo == 'trimestre_atual':
-        # Trimestre anterior
-        trimestre_atual = (hoje.month - 1) // 3
-        if trimestre_atual == 0:
-            # Se estamos no primeiro trimestre, pegar o último do ano anterior
-            inicio = hoje.replace(year=hoje.year-1, month=10, day=1)
-            fim = hoje.replace(year=hoje.year-1, month=12, day=31)
-        else:
-            inicio = hoje.replace(month=(trimestre_atual-1) * 3 + 1, day=1)
-            fim = hoje.replace(month=trimestre_atual * 3, day=1) - timedelta(days=1)
-    elif periodo == 'ano_atual':
-        # Ano anterior
-        inicio = hoje.replace(year=hoje.year-1, month=1, day=1)
-        fim = hoje.replace(year=hoje.year-1, month=12, day=31)
-    elif periodo == 'ultimos_12_meses':
-        # 12 meses anteriores aos últimos 12
-        inicio = hoje - timedelta(days=730)  # 2 anos atrás
-        fim = hoje - timedelta(days=365)     # 1 ano atrás
-    else:
-        # Padrão: ano anterior
-        inicio = hoje.replace(year=hoje.year-1, month=1, day=1)
-        fim = hoje.replace(year=hoje.year-1, month=12, day=31)
-    
-    return inicio.strftime('%Y-%m-%d'), fim.strftime('%Y-%m-%d')
+    janela = periodo_anterior_nomeado(periodo)
+    return janela.inicio.isoformat(), janela.fim.isoformat()
 
 def _calcular_variacao(valor_atual, valor_anterior):
     """Calcula a variação percentual entre dois valores"""
@@ -1,9 +1,13 @@
-from flask import Blueprint, render_template, session, jsonify, request, make_response
+from flask import Blueprint, render_template, session, jsonify, request, Response, stream_with_context
 from modules.auth.routes import login_required
 from decorators.perfil_decorators import perfil_required
 from extensions import supabase_admin
-import csv
-import io
+from modules.financeiro.export_bases.streaming import (
+    ExportMeter, csv_chunks, gzip_chunks, iter_base_pages, parquet_available, parquet_chunks
+)
+from services.export_jobs import export_jobs
+from log_config import log_printf
+import itertools
 from datetime import datetime
 
 # Blueprint para Export de Bases Financeiras
@@ -31,14 +35,22 @@ COLUNAS_OTIMIZADAS = {
     ]
 }
 
+# Tipos das colunas no Parquet (schema_atual.sql: id bigint, valor numeric); as demais
+# (texto, data e timestamp) seguem como texto, como no CSV
+TIPOS_COLUNAS = {
+    'id': 'int64',
+    'valor': 'float64',
+}
+
 @export_bases_financeiro_bp.route('/')
 @login_required
 @perfil_required('financeiro', 'export_bases')
 def index():
     """Tela de Exportação de Bases Financeiras"""
     # Log de acesso à página
-    print(f"[EXPORT_BASES] Usuário {session.get('user_id')} acessou página de exportação de bases")
-    return render_template('export_bases_financeiro.html')
+    log_printf("[EXPORT_BASES] Usuário %s acessou página de exportação de bases", session.get('user_id'))
+    # A opção Parquet só aparece quando o pyarrow está instalado
+    return render_template('export_bases_financeiro.html', parquet_disponivel=parquet_available())
 
 @export_bases_financeiro_bp.route('/api/bases-disponiveis')
 @login_required
@@ -79,7 +91,7 @@ def api_bases_disponiveis():
                 response = supabase_admin.table(base['id']).select('id', count='exact').execute()
                 base['total_registros'] = response.count if hasattr(response, 'count') else 0
             except Exception as e:
-                print(f"Erro ao buscar registros da base {base['id']}: {e}")
+                log_printf("[EXPORT_BASES] Erro ao buscar registros da base %s: %s", base['id'], e)
                 base['total_registros'] = 0
                 
         return jsonify({
@@ -96,7 +108,7 @@ def api_bases_disponiveis():
 @login_required
 @perfil_required('financeiro', 'export_bases')
 def api_exportar_base(base_id):
-    """API para exportar base específica em CSV"""
+    """API para exportar base específica em CSV (ou Parquet) via streaming"""
     try:
         # Validar se a base é válida
         bases_validas = ['fin_despesa_anual', 'fin_faturamento_anual', 'fin_resultado_anual']
@@ -118,57 +130,64 @@ def api_exportar_base(base_id):
         # Parâmetros de filtro opcionais
         ano = request.args.get('ano')
         limite = request.args.get('limite', type=int)
+        formato = (request.args.get('formato') or 'csv').lower()
+        usar_gzip = request.args.get('gzip') == '1' and 'gzip' in request.headers.get('Accept-Encoding', '')
         
-        # Construir query com apenas as colunas otimizadas
-        query = supabase_admin.table(base_id).select(','.join(colunas_base))
-        
-        # Aplicar filtros se fornecidos
-        if ano:
-            query = query.gte('data', f'{ano}-01-01').lte('data', f'{ano}-12-31')
-            
-        if limite:
-            query = query.limit(limite)
-            
-        # Ordenar por data decrescente
-        query = query.order('data', desc=True)
+        if formato not in ('csv', 'parquet'):
+            return jsonify({
+                'success': False,
+                'message': 'Formato inválido (use csv ou parquet)'
+            }), 400
+        if formato == 'parquet' and not parquet_available():
+            return jsonify({
+                'success': False,
+                'message': 'Exportação Parquet indisponível neste servidor'
+            }), 501
         
-        # Executar query
-        response = query.execute()
+        # Páginas por cursor (data desc, id desc); a primeira é lida antes de responder
+        # para que uma base vazia ainda retorne 404
+        pages = iter_base_pages(base_id, colunas_base, ano=ano, limite=limite)
+        primeira_pagina = next(pages, None)
         
-        if not response.data:
+        if not primeira_pagina:
             return jsonify({
                 'success': False,
                 'message': 'Nenhum dado encontrado para exportação'
             }), 404
         
-        # Criar CSV em memória
-        output = io.StringIO()
+        meter = ExportMeter()
+        todas_paginas = meter.count_rows(itertools.chain([primeira_pagina], pages))
+        if formato == 'parquet':
+            chunks = parquet_chunks(todas_paginas, colunas_base, TIPOS_COLUNAS)
+            mimetype = 'application/vnd.apache.parquet'
+        else:
+            chunks = csv_chunks(todas_paginas, colunas_base)
+            mimetype = 'text/csv; charset=utf-8'
+            if usar_gzip:
+                chunks = gzip_chunks(chunks)
         
-        if response.data:
-            # Usar as colunas otimizadas definidas para esta base
-            writer = csv.DictWriter(output, fieldnames=colunas_base)
-            writer.writeheader()
-            
-            for row in response.data:
-                writer.writerow(row)
+        user_id = session.get('user_id')
         
-        # Criar resposta de download
-        output.seek(0)
+        def _stream():
+            try:
+                yield from meter.count_bytes(chunks)
+            finally:
+                # Log da exportação (ao fim do envio, com vazão)
+                log_printf("[EXPORT_BASES] Usuário %s exportou base %s (%s%s) - %s - Filtros: ano=%s, limite=%s",
+                           user_id, base_id, formato, ', gzip' if usar_gzip else '', meter.summary(), ano, limite)
         
         # Nome do arquivo com timestamp
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         nome_base = base_id.replace('_', '-')
-        filename = f'export-{nome_base}-{timestamp}.csv'
+        filename = f'export-{nome_base}-{timestamp}.{formato}'
         
-        # Configurar resposta para download
-        response = make_response(output.getvalue())
-        response.headers['Content-Type'] = 'text/csv; charset=utf-8'
+        # Configurar resposta para download em streaming
+        response = Response(stream_with_context(_stream()), mimetype=mimetype)
         response.headers['Content-Disposition'] = f'attachment; filename={filename}'
-        
-        # Log da exportação
-        print(f"[EXPORT_BASES] Usuário {session.get('user_id')} exportou base {base_id} com {len(response.data)} registros - Filtros: ano={ano}, limite={limite}")
-        
-        print(f"[EXPORT] Usuário {session.get('user_id')} exportou base {base_id} com {len(response.data)} registros")
+        response.headers['X-Accel-Buffering'] = 'no'
+        if usar_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+            response.headers['Vary'] = 'Accept-Encoding'
         
         return response
         
@@ -178,6 +197,57 @@ def api_exportar_base(base_id):
             'message': f'Erro ao exportar base: {str(e)}'
         }), 500
 
+@export_bases_financeiro_bp.route('/api/exportar/<base_id>/job', methods=['POST'])
+@login_required
+@perfil_required('financeiro', 'export_bases')
+def api_exportar_base_job(base_id):
+    """API para gerar a exportação da base em segundo plano (retorna o job)"""
+    if base_id not in COLUNAS_OTIMIZADAS:
+        return jsonify({
+            'success': False,
+            'message': 'Base não encontrada ou não autorizada'
+        }), 400
+    
+    colunas_base = COLUNAS_OTIMIZADAS[base_id]
+    ano = request.args.get('ano')
+    limite = request.args.get('limite', type=int)
+    formato = (request.args.get('formato') or 'csv').lower()
+    
+    if formato not in ('csv', 'parquet'):
+        return jsonify({
+            'success': False,
+            'message': 'Formato inválido (use csv ou parquet)'
+        }), 400
+    if formato == 'parquet' and not parquet_available():
+        return jsonify({
+            'success': False,
+            'message': 'Exportação Parquet indisponível neste servidor'
+        }), 501
+    
+    def _build(path, progress):
+        meter = ExportMeter()
+        pages = meter.count_rows(iter_base_pages(base_id, colunas_base, ano=ano, limite=limite))
+        chunks = parquet_chunks(pages, colunas_base, TIPOS_COLUNAS) if formato == 'parquet' else csv_chunks(pages, colunas_base)
+        with open(path, 'wb') as output:
+            for chunk in meter.count_bytes(chunks):
+                output.write(chunk)
+                progress(meter.rows, limite)
+        log_printf("[EXPORT_BASES] Job da base %s (%s) - %s", base_id, formato, meter.summary())
+        return {'rows': meter.rows, 'bytes': meter.bytes}
+    
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    try:
+        job, reused = export_jobs.submit(
+            session.get('user_id'), f'export_bases.{base_id}',
+            {'formato': formato, 'ano': ano, 'limite': limite}, _build,
+            filename=f"export-{base_id.replace('_', '-')}-{timestamp}.{formato}",
+            mimetype='application/vnd.apache.parquet' if formato == 'parquet' else 'text/csv; charset=utf-8'
+        )
+    except RuntimeError as e:
+        return jsonify({'success': False, 'message': str(e)}), 503
+    
+    return jsonify({'success': True, 'job': job.to_dict(reused)}), (200 if reused else 202)
+
 @export_bases_financeiro_bp.route('/api/preview/<base_id>')
 @login_required
 @perfil_required('financeiro', 'export_bases')
@@ -209,7 +279,8 @@ def api_preview_base(base_id):
             .execute()
         
         # Log de preview
-        print(f"[EXPORT_BASES] Usuário {session.get('user_id')} visualizou preview da base {base_id} - {len(response.data) if response.data else 0} registros de amostra")
+        log_printf("[EXPORT_BASES] Usuário %s visualizou preview da base %s - %s registros de amostra",
+                   session.get('user_id'), base_id, len(response.data) if response.data else 0)
         
         return jsonify({
             'success': True,
@@ -7,7 +7,8 @@ const ExportBasesState = {
     previewData: null,
     filters: {
         ano: '',
-        limite: ''
+        limite: '',
+        formato: 'csv'
     }
 };
 
@@ -63,6 +64,11 @@ function setupEventListeners() {
         limitFilter.addEventListener('change', handleFilterChange);
     }
     
+    const formatFilter = document.getElementById('formato-filter');
+    if (formatFilter) {
+        formatFilter.addEventListener('change', handleFilterChange);
+    }
+    
     // Refresh button
     const refreshBtn = document.getElementById('refresh-bases');
     if (refreshBtn) {
@@ -95,6 +101,8 @@ function handleFilterChange() {
     // Update filter state
     ExportBasesState.filters.ano = document.getElementById('ano-filter').value;
     ExportBasesState.filters.limite = document.getElementById('limite-filter').value;
+    const formatFilter = document.getElementById('formato-filter');
+    ExportBasesState.filters.formato = formatFilter ? formatFilter.value : 'csv';
     
     console.log('Filters updated:', ExportBasesState.filters);
 }
@@ -209,6 +217,12 @@ function exportBase(baseId) {
     if (ExportBasesState.filters.limite) {
         params.append('limite', ExportBasesState.filters.limite);
     }
+    if (ExportBasesState.filters.formato === 'parquet') {
+        params.append('formato', 'parquet');
+    } else {
+        // CSV trafega comprimido; o navegador descompacta ao salvar
+        params.append('gzip', '1');
+    }
     
     const url = `/financeiro/export-bases/api/exportar/${baseId}?${params.toString()}`;
     
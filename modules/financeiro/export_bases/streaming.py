@@ -0,0 +1,218 @@
+"""
+Exportação em streaming das bases financeiras.
+
+As bases são percorridas em páginas com cursor (data desc, id desc) em vez de
+um único select - que além de carregar tudo em memória era truncado no limite
+de linhas do PostgREST - e cada página vira um pedaço do arquivo assim que
+chega. Formatos: CSV (opcionalmente com gzip na transferência) e Parquet
+(requer pyarrow).
+"""
+
+import csv
+import io
+import os
+import time
+import zlib
+
+from extensions import supabase_admin
+from services.supabase_transport import call_class
+
+EXPORT_PAGE_SIZE = int(os.getenv('EXPORT_BASES_PAGE_SIZE', '1000'))
+CURSOR_COLUMN = 'id'
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+def parquet_available():
+    return pa is not None
+
+
+def _cursor_value(value):
+    """Valor entre aspas para uso em filtros or() do PostgREST"""
+    return '"' + str(value).replace('"', '\\"') + '"'
+
+
+def iter_base_pages(base_id, colunas, ano=None, limite=None, page_size=EXPORT_PAGE_SIZE):
+    """Percorre a base em páginas ordenadas por data desc, id desc.
+
+    Primeiro as linhas com data (cursor composto data/id); sem filtro de ano,
+    depois as linhas sem data (cursor por id). Cada página é uma lista de dicts.
+    """
+    select_cols = list(colunas) + ([CURSOR_COLUMN] if CURSOR_COLUMN not in colunas else [])
+    restante = limite
+
+    def _page_limit():
+        return min(page_size, restante) if restante else page_size
+
+    # Fase 1: linhas com data
+    cursor = None
+    while restante is None or restante > 0:
+        query = supabase_admin.table(base_id).select(','.join(select_cols))
+        if ano:
+            query = query.gte('data', f'{ano}-01-01').lte('data', f'{ano}-12-31')
+        else:
+            query = query.not_.is_('data', 'null')
+        if cursor:
+            data, row_id = cursor
+            query = query.or_(
+                f"data.lt.{_cursor_value(data)},"
+                f"and(data.eq.{_cursor_value(data)},{CURSOR_COLUMN}.lt.{_cursor_value(row_id)})"
+            )
+        size = _page_limit()
+        # Classe definida por página: o gerador é consumido aos poucos pela resposta em streaming
+        with call_class('export'):
+            page = query.order('data', desc=True).order(CURSOR_COLUMN, desc=True).limit(size).execute().data or []
+        if page:
+            cursor = (page[-1]['data'], page[-1][CURSOR_COLUMN])
+            if restante is not None:
+                restante -= len(page)
+            yield page
+        if len(page) < size:
+            break
+
+    if ano:
+        return
+
+    # Fase 2: linhas sem data (ficavam no início da ordenação desc original)
+    last_id = None
+    while restante is None or restante > 0:
+        query = supabase_admin.table(base_id).select(','.join(select_cols)).is_('data', 'null')
+        if last_id is not None:
+            query = query.lt(CURSOR_COLUMN, last_id)
+        size = _page_limit()
+        with call_class('export'):
+            page = query.order(CURSOR_COLUMN, desc=True).limit(size).execute().data or []
+        if page:
+            last_id = page[-1][CURSOR_COLUMN]
+            if restante is not None:
+                restante -= len(page)
+            yield page
+        if len(page) < size:
+            break
+
+
+class ExportMeter:
+    """Contadores de linhas e bytes de uma exportação"""
+
+    def __init__(self):
+        self.started = time.time()
+        self.rows = 0
+        self.bytes = 0
+
+    def count_rows(self, pages):
+        for page in pages:
+            self.rows += len(page)
+            yield page
+
+    def count_bytes(self, chunks):
+        for chunk in chunks:
+            self.bytes += len(chunk)
+            yield chunk
+
+    def summary(self):
+        elapsed = max(time.time() - self.started, 1e-6)
+        return (f"{self.rows} linhas, {self.bytes} bytes em {elapsed:.2f}s "
+                f"({self.rows / elapsed:.0f} linhas/s, {self.bytes / elapsed / 1024:.0f} KiB/s)")
+
+
+def csv_chunks(pages, colunas):
+    """Cabeçalho e uma fatia de CSV (utf-8) por página"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=colunas, extrasaction='ignore')
+    writer.writeheader()
+    yield buffer.getvalue().encode('utf-8')
+    for page in pages:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(page)
+        yield buffer.getvalue().encode('utf-8')
+
+
+def gzip_chunks(chunks, level=6):
+    """Comprime um fluxo de bytes em formato gzip incrementalmente"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Arquivo somente-escrita cujos bytes são drenados a cada row group"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+# Tipos Parquet por nome de tipo declarado; colunas sem tipo declarado são texto
+_PARQUET_TYPES = {
+    'string': (lambda: pa.string(), str),
+    'int64': (lambda: pa.int64(), int),
+    'float64': (lambda: pa.float64(), float),
+}
+
+
+def parquet_schema(colunas, tipos=None):
+    """Esquema declarado a partir das colunas da base (não inferido dos dados)"""
+    tipos = tipos or {}
+    return pa.schema([pa.field(col, _PARQUET_TYPES[tipos.get(col, 'string')][0]()) for col in colunas])
+
+
+def _coerce(value, kind):
+    if value is None:
+        return None
+    try:
+        return _PARQUET_TYPES[kind][1](value)
+    except (TypeError, ValueError):
+        # Valor fora do tipo declarado: vazio em vez de interromper um arquivo já em transferência
+        return None
+
+
+def parquet_chunks(pages, colunas, tipos=None):
+    """Um row group Parquet por página, todos com o esquema declarado em parquet_schema.
+
+    Inferir o esquema da primeira página quebrava a exportação no meio (HTTP 200
+    e arquivo truncado) quando uma página seguinte trazia outro tipo na mesma
+    coluna (ex.: valor inteiro e depois decimal, ou nulos e depois texto).
+    """
+    if pa is None:
+        raise RuntimeError('Exportação Parquet indisponível: pyarrow não instalado')
+    tipos = tipos or {}
+    kinds = [(col, tipos.get(col, 'string')) for col in colunas]
+    schema = parquet_schema(colunas, tipos)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    for page in pages:
+        rows = [{col: _coerce(row.get(col), kind) for col, kind in kinds} for row in page]
+        writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+        chunk = sink.drain()
+        if chunk:
+            yield chunk
+    writer.close()
+    chunk = sink.drain()
+    if chunk:
+        yield chunk
@@ -1,5 +1,6 @@
 from flask import Blueprint, render_template, session, jsonify, request
 from extensions import supabase, supabase_admin
+from modules.financeiro.comparativo_periodos import Periodo, comparar, limites_datas, serie_por_ano
 from routes.auth import login_required
 from decorators.perfil_decorators import perfil_required
 from datetime import datetime
@@ -168,76 +169,25 @@ def api_geral_mensal():
         centro_resultado = request.args.get('centro_resultado', '')
         cliente = request.args.get('cliente', '')
         
-        # Buscar dados de faturamento do ano atual usando a nova tabela
-        query_atual = supabase_admin.table('vw_fin_faturamento_anual_tratado').select('*').gte('data', f'{ano}-01-01').lte('data', f'{ano}-12-31')
+        filtros = {'centro_resultado': centro_resultado, 'cliente': cliente}
         if empresa and empresa.strip() and empresa != 'ambos':
             if empresa == 'consultoria':
-                query_atual = query_atual.eq('meta_grupo', 'Consultoria')
+                filtros['meta_grupo'] = 'Consultoria'
             elif empresa == 'imp_exp':
-                query_atual = query_atual.eq('meta_grupo', 'IMP/EXP')
+                filtros['meta_grupo'] = 'IMP/EXP'
         
-        if centro_resultado:
-            query_atual = query_atual.eq('centro_resultado', centro_resultado)
-            
-        if cliente:
-            query_atual = query_atual.eq('cliente', cliente)
-            
-        response_atual = query_atual.execute()
-        dados_atual = response_atual.data
-        
-        # Buscar dados de faturamento do ano anterior
-        ano_anterior = int(ano) - 1
-        query_anterior = supabase_admin.table('vw_fin_faturamento_anual_tratado').select('*').gte('data', f'{ano_anterior}-01-01').lte('data', f'{ano_anterior}-12-31')
-        if empresa and empresa.strip() and empresa != 'ambos':
-            if empresa == 'consultoria':
-                query_anterior = query_anterior.eq('meta_grupo', 'Consultoria')
-            elif empresa == 'imp_exp':
-                query_anterior = query_anterior.eq('meta_grupo', 'IMP/EXP')
-                
-        if centro_resultado:
-            query_anterior = query_anterior.eq('centro_resultado', centro_resultado)
-            
-        if cliente:
-            query_anterior = query_anterior.eq('cliente', cliente)
-            
-        response_anterior = query_anterior.execute()
-        dados_anterior = response_anterior.data
-        
-        # Agrupar por mês para o ano atual
-        faturamento_atual = defaultdict(float)
-        for item in dados_atual:
-            data_item = datetime.strptime(item['data'], '%Y-%m-%d')
-            mes_key = data_item.strftime('%Y-%m')
-            faturamento_atual[mes_key] += float(item['valor'])
-        
-        # Agrupar por mês para o ano anterior
-        faturamento_anterior = defaultdict(float)
-        for item in dados_anterior:
-            data_item = datetime.strptime(item['data'], '%Y-%m-%d')
-            mes_key = data_item.strftime('%Y-%m')
-            faturamento_anterior[mes_key] += float(item['valor'])
+        # Ano atual contra o ano anterior, mês a mês
+        comparacao = comparar('faturamento_tratado', Periodo.ano(ano), filtros=filtros)
         
         # Preparar dados para a tabela
         meses = []
-        for mes in range(1, 13):
-            mes_atual = f"{ano}-{mes:02d}"
-            mes_anterior = f"{ano_anterior}-{mes:02d}"
-            
-            faturamento_mes = faturamento_atual.get(mes_atual, 0)
-            faturamento_mes_anterior = faturamento_anterior.get(mes_anterior, 0)
-            
-            # Calcular variação percentual
-            if faturamento_mes_anterior > 0:
-                variacao = ((faturamento_mes - faturamento_mes_anterior) / faturamento_mes_anterior) * 100
-            else:
-                variacao = 0 if faturamento_mes == 0 else 100
-            
+        for mes, item in enumerate(comparacao['serie'], start=1):
             meses.append({
                 'ano': ano,
                 'mes': mes,
-                'faturamento_total': faturamento_mes,
-                'faturamento_anterior': faturamento_mes_anterior,
-                'variacao': variacao
+                'faturamento_total': item['atual'],
+                'faturamento_anterior': item['comparacao'],
+                'variacao': item['variacao']
             })
         
         return jsonify({
@@ -322,52 +272,27 @@ def api_geral_comparativo_anos():
         centro_resultado = request.args.get('centro_resultado', '')
         cliente = request.args.get('cliente', '')
         
-        # Usar a view atualizada com meta_grupo
-        query = supabase_admin.table('vw_fin_faturamento_anual_tratado').select('data, valor, meta_grupo, centro_resultado, cliente')
-        
-        # Aplicar filtro de data
-        if start_date:
-            query = query.gte('data', start_date)
-        if end_date:
-            query = query.lte('data', end_date)
+        filtros = {'centro_resultado': centro_resultado, 'cliente': cliente}
         
         # Aplicar filtro baseado no meta_grupo se especificado
         if empresa and empresa.strip() and empresa != 'ambos':
             if empresa.lower() in ['consultoria']:
-                query = query.eq('meta_grupo', 'Consultoria')
+                filtros['meta_grupo'] = 'Consultoria'
             elif empresa.lower() in ['imp/exp', 'imp_exp', 'importacao', 'exportacao']:
-                query = query.eq('meta_grupo', 'IMP/EXP')
+                filtros['meta_grupo'] = 'IMP/EXP'
         
-        # Aplicar filtro de centro de resultado
-        if centro_resultado:
-            query = query.eq('centro_resultado', centro_resultado)
-        
-        # Aplicar filtro de cliente
-        if cliente:
-            query = query.eq('cliente', cliente)
+        # Sem datas informadas, a janela vai do primeiro ao último lançamento
+        if not start_date or not end_date:
+            limites = limites_datas('faturamento_tratado', filtros)
+            if limites is None:
+                return jsonify({'success': True, 'data': {}})
+            start_date = start_date or limites.inicio.isoformat()
+            end_date = end_date or limites.fim.isoformat()
         
-        response = query.execute()
-        dados = response.data
-        
-        # Log para debug
-        print(f"📊 Comparativo anos - Empresa: {empresa}, Start: {start_date}, End: {end_date}, CR: {centro_resultado}, Cliente: {cliente}, Registros: {len(dados)}")
-        
-        # Agrupar dados por ano e mês
-        anos_data = defaultdict(lambda: defaultdict(float))
+        # Totais por ano e mês (rollups por ano compartilhados com a tabela mensal)
+        anos_data = serie_por_ano('faturamento_tratado', Periodo.de_strings(start_date, end_date), filtros)
         
-        for item in dados:
-            if item.get('data') and item.get('valor'):
-                try:
-                    data_str = item['data']
-                    # Assumindo formato YYYY-MM-DD
-                    ano = data_str[:4]
-                    mes = data_str[5:7]
-                    valor = float(item['valor'])
-                    
-                    anos_data[ano][mes] += valor
-                except Exception as e:
-                    print(f"Erro ao processar data {item.get('data')}: {e}")
-                    continue
+        print(f"📊 Comparativo anos - Empresa: {empresa}, Start: {start_date}, End: {end_date}, CR: {centro_resultado}, Cliente: {cliente}, Anos: {len(anos_data)}")
         
         # Formatar dados para o frontend
         resultado = {}
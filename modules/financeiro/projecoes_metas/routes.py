@@ -3,6 +3,7 @@ from extensions import supabase, supabase_admin
 from routes.auth import login_required, role_required
 from decorators.perfil_decorators import perfil_required
 from services.access_logger import access_logger
+from services.bulk_write import bulk_write
 from datetime import datetime, timedelta
 import pandas as pd
 import numpy as np
@@ -180,67 +181,57 @@ def api_criar():
             'error': 'Erro ao criar item'
         }), 500
 
+TIPOS_VALIDOS = ['financeiro', 'financeiro_solucoes', 'financeiro_consultoria', 'operacional', 'projecao']
+
+def _validar_item_lote(item):
+    """Valida um item do lote e devolve (linha normalizada, erro)"""
+    meta_value = item.get('meta') or item.get('valor_meta')
+    tipo = item.get('tipo')
+    ano = item.get('ano')
+    mes = item.get('mes')
+    
+    if not ano or not meta_value or not tipo or not mes:
+        return None, 'Cada item deve ter: ano, mes, meta/valor_meta, tipo'
+    
+    if tipo not in TIPOS_VALIDOS:
+        return None, f'Tipo deve ser um dos seguintes: {", ".join(TIPOS_VALIDOS)}'
+    
+    # Normalizar mês
+    try:
+        mes_int = int(mes)
+    except (TypeError, ValueError):
+        return None, 'Mês deve ser um número válido'
+    if mes_int < 1 or mes_int > 12:
+        return None, 'Mês deve estar entre 1 e 12'
+    
+    try:
+        return {
+            'ano': int(ano),
+            'meta': int(meta_value),
+            'mes': f"{mes_int:02d}",
+            'tipo': tipo
+        }, None
+    except (TypeError, ValueError):
+        return None, 'Ano e meta devem ser números válidos'
+
 @projecoes_metas_bp.route('/api/criar-lote', methods=['POST'])
 @login_required
 @perfil_required('financeiro', 'projecoes')
 def api_criar_lote():
-    """API para criar múltiplas metas/projeções de uma vez"""
+    """API para criar múltiplas metas/projeções de uma vez.
+    
+    Metas já cadastradas para o mesmo ano/mês/tipo têm o valor atualizado.
+    """
     try:
         dados = request.get_json()
         
         # Opção 1: Lista de itens completos
         if 'itens' in dados and isinstance(dados['itens'], list):
-            itens_para_inserir = []
-            
-            for item in dados['itens']:
-                # Validação de cada item
-                meta_value = item.get('meta') or item.get('valor_meta')
-                tipo = item.get('tipo')
-                ano = item.get('ano')
-                mes = item.get('mes')
-                
-                if not ano or not meta_value or not tipo or not mes:
-                    return jsonify({
-                        'success': False,
-                        'error': 'Cada item deve ter: ano, mes, meta/valor_meta, tipo'
-                    }), 400
-                
-                # Validação de tipos aceitos
-                tipos_validos = ['financeiro', 'financeiro_solucoes', 'financeiro_consultoria', 'operacional', 'projecao']
-                if tipo not in tipos_validos:
-                    return jsonify({
-                        'success': False,
-                        'error': f'Tipo deve ser um dos seguintes: {", ".join(tipos_validos)}'
-                    }), 400
-                
-                # Normalizar mês
-                try:
-                    mes_int = int(mes)
-                    if mes_int < 1 or mes_int > 12:
-                        return jsonify({
-                            'success': False,
-                            'error': 'Mês deve estar entre 1 e 12'
-                        }), 400
-                    mes_normalizado = f"{mes_int:02d}"
-                except ValueError:
-                    return jsonify({
-                        'success': False,
-                        'error': 'Mês deve ser um número válido'
-                    }), 400
-                
-                itens_para_inserir.append({
-                    'ano': int(ano),
-                    'meta': int(meta_value),
-                    'mes': mes_normalizado,
-                    'tipo': tipo
-                })
+            itens = dados['itens']
         
         # Opção 2: Ano + meses + meta + tipo (para criar vários meses do mesmo ano/tipo/valor)
         elif all(key in dados for key in ['ano', 'meses', 'meta', 'tipo']):
-            ano = dados.get('ano')
             meses = dados.get('meses')  # Lista de meses
-            meta_value = dados.get('meta')
-            tipo = dados.get('tipo')
             
             if not isinstance(meses, list) or len(meses) == 0:
                 return jsonify({
@@ -248,37 +239,10 @@ def api_criar_lote():
                     'error': 'Meses deve ser uma lista não vazia'
                 }), 400
             
-            # Validação de tipos aceitos
-            tipos_validos = ['financeiro', 'financeiro_solucoes', 'financeiro_consultoria', 'operacional', 'projecao']
-            if tipo not in tipos_validos:
-                return jsonify({
-                    'success': False,
-                    'error': f'Tipo deve ser um dos seguintes: {", ".join(tipos_validos)}'
-                }), 400
-            
-            itens_para_inserir = []
-            for mes in meses:
-                # Normalizar mês
-                try:
-                    mes_int = int(mes)
-                    if mes_int < 1 or mes_int > 12:
-                        return jsonify({
-                            'success': False,
-                            'error': 'Mês deve estar entre 1 e 12'
-                        }), 400
-                    mes_normalizado = f"{mes_int:02d}"
-                except ValueError:
-                    return jsonify({
-                        'success': False,
-                        'error': 'Mês deve ser um número válido'
-                    }), 400
-                
-                itens_para_inserir.append({
-                    'ano': int(ano),
-                    'meta': int(meta_value),
-                    'mes': mes_normalizado,
-                    'tipo': tipo
-                })
+            itens = [
+                {'ano': dados.get('ano'), 'mes': mes, 'meta': dados.get('meta'), 'tipo': dados.get('tipo')}
+                for mes in meses
+            ]
         
         else:
             return jsonify({
@@ -286,27 +250,45 @@ def api_criar_lote():
                 'error': 'Envie "itens" (lista) ou "ano", "meses", "meta", "tipo"'
             }), 400
         
-        if not itens_para_inserir:
+        if not itens:
             return jsonify({
                 'success': False,
                 'error': 'Nenhum item válido para inserir'
             }), 400
         
-        print(f"[PROJECOES_API] Criando {len(itens_para_inserir)} itens em lote")
+        print(f"[PROJECOES_API] Gravando {len(itens)} itens em lote")
         
-        # Inserir todos os itens de uma vez
-        result = supabase_admin.table('fin_metas_projecoes').insert(itens_para_inserir).execute()
+        # Validação do lote inteiro antes de gravar; existentes (ano/mês/tipo) numa única consulta
+        resultado = bulk_write(
+            'fin_metas_projecoes', itens, _validar_item_lote,
+            key_fields=('ano', 'mes', 'tipo'),
+            on_existing='update', update_fields=('meta',),
+            all_or_nothing=True,
+            label='projecoes.criar_lote'
+        )
         
-        if result.data:
+        invalidos = resultado.by_status('invalido')
+        if invalidos:
+            return jsonify({
+                'success': False,
+                'error': invalidos[0]['error'],
+                'resultados': resultado.items
+            }), 400
+        
+        contagem = resultado.counts()
+        gravados = resultado.written()
+        if gravados:
             return jsonify({
                 'success': True,
-                'message': f'{len(result.data)} itens criados com sucesso',
-                'data': result.data
+                'message': f"{contagem.get('criado', 0)} itens criados e {contagem.get('atualizado', 0)} atualizados com sucesso",
+                'data': gravados,
+                'resultados': resultado.items
             })
         else:
             return jsonify({
                 'success': False,
-                'error': 'Erro ao inserir dados em lote'
+                'error': 'Erro ao inserir dados em lote',
+                'resultados': resultado.items
             }), 500
         
     except Exception as e:
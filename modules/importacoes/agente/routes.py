@@ -3,12 +3,13 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from extensions import supabase, supabase_admin
 from routes.auth import login_required, role_required
 import json
-import requests
 import traceback
 from datetime import datetime
 import re
 import os
-from services.webhook_service import notify_new_whatsapp_number
+from services.webhook_service import notify_new_whatsapp_number, webhook_service
+from services.webhook_dispatcher import webhook_dispatcher
+from modules.usuarios.directory import notify_user_changed
 
 def verificar_numero_whatsapp_unico_agente(numero, user_id_excluir=None):
     """
@@ -17,7 +18,6 @@ def verificar_numero_whatsapp_unico_agente(numero, user_id_excluir=None):
     """
     try:
         # Normalizar número para E.164
-        from services.webhook_service import webhook_service
         phone_numbers = webhook_service._normalize_phone_number(numero)
         numero_e164 = phone_numbers['e164']
         
@@ -161,17 +161,10 @@ def notificar_cadastro_n8n(numero_zap):
             numero_zap_evo = numero
 
         payload = {'numero_zap_evo': numero_zap_evo}
-        headers = {'Content-Type': 'application/json'}
 
-        # Usar json= para serialização automática e definir timeout
-        response = requests.post(url, json=payload, headers=headers, timeout=10)
-        if response.status_code == 200:
-            print(f"[INFO] Webhook N8N acionado com sucesso para o número {numero_zap} (EVO: {numero_zap_evo})")
-            return True
-        else:
-            print(f"[ERROR] Falha ao acionar webhook N8N. Status code: {response.status_code}")
-            print(f"[ERROR] Resposta: {response.text}")
-            return False
+        # Entrega em segundo plano (retry, coalescência e outbox em services/webhook_dispatcher.py)
+        return webhook_dispatcher.enqueue(url, payload, key=f"whatsapp:{numero_zap_evo}",
+                                          context=f"Cadastro N8N ({numero_zap_evo})")
     except Exception as e:
         print(f"[ERROR] Erro ao acionar webhook N8N: {str(e)}")
         return False
@@ -528,6 +521,7 @@ def index():
             }
             
             result = supabase.table('user_whatsapp').insert(data).execute()
+            notify_user_changed(user_id)
             print(f"[AGENTE] ✅ Novo WhatsApp adicionado via formulário para usuário {user_id}: {formatted_numero}")
             
             # Enviar webhook para N8N
@@ -540,7 +534,7 @@ def index():
                 )
                 
                 if webhook_success:
-                    print(f"[AGENTE] ✅ Webhook N8N enviado com sucesso para número {formatted_numero}")
+                    print(f"[AGENTE] ✅ Webhook N8N enfileirado para número {formatted_numero}")
                 else:
                     print(f"[AGENTE] ⚠️ Falha ao enviar webhook N8N para número {formatted_numero}")
                     
@@ -664,6 +658,7 @@ def ajax_add_numero():
         }
         
         result = supabase.table('user_whatsapp').insert(data_insert).execute()
+        notify_user_changed(user_id)
         
         print(f"[AGENTE] ✅ Novo WhatsApp adicionado via AJAX para usuário {user_id}: {formatted_numero}")
         
@@ -677,7 +672,7 @@ def ajax_add_numero():
             )
             
             if webhook_success:
-                print(f"[AGENTE] ✅ Webhook N8N enviado com sucesso para número {formatted_numero}")
+                print(f"[AGENTE] ✅ Webhook N8N enfileirado para número {formatted_numero}")
             else:
                 print(f"[AGENTE] ⚠️ Falha ao enviar webhook N8N para número {formatted_numero}")
                 
@@ -725,6 +720,7 @@ def ajax_remove_numero():
             candidato = supabase.table('user_whatsapp').select('id').eq('user_id', user_id).eq('ativo', True).order('created_at').limit(1).execute()
             if candidato.data:
                 supabase.table('user_whatsapp').update({'principal': True}).eq('id', candidato.data[0]['id']).execute()
+        notify_user_changed(user_id)
 
         return jsonify({'success': True, 'message': f'Número {numero_whatsapp} deletado com sucesso!'})
             
@@ -747,6 +743,7 @@ def ajax_cancelar_adesao():
         supabase.table('user_whatsapp').update({
             'ativo': False
         }).eq('user_id', user_id).execute()
+        notify_user_changed(user_id)
         
         return jsonify({'success': True, 'message': 'Adesão cancelada com sucesso! Todos os números foram removidos.'})
         
@@ -785,6 +782,7 @@ def ajax_set_principal():
         supabase.table('user_whatsapp').update({
             'principal': True
         }).eq('id', numero_id).execute()
+        notify_user_changed(user_id)
         
         return jsonify({'success': True, 'message': 'Número principal definido com sucesso!'})
             
@@ -824,6 +822,7 @@ def ajax_edit_numero():
             'nome_contato': nome_contato,
             'tipo_numero': tipo_numero
         }).eq('id', numero_id).execute()
+        notify_user_changed(user_id)
         
         return jsonify({'success': True, 'message': 'Número atualizado com sucesso!'})
             
@@ -990,6 +989,22 @@ def admin_data():
             'error': str(e)
         }), 500
 
+def notificar_status_numeros(numeros_atualizados, ativo):
+    """Enfileira um 'whatsapp_updated' por número ativado/desativado.
+
+    Não espera o n8n: os eventos saem pelo despacho em segundo plano e
+    alternâncias rápidas do mesmo número são combinadas em um só envio.
+    """
+    for registro in numeros_atualizados or []:
+        numero = registro.get('numero')
+        if not numero:
+            continue
+        try:
+            webhook_service.notify_whatsapp_updated(numero, {'ativo': ativo},
+                                                    user_data={'id': registro.get('user_id')})
+        except Exception as webhook_error:
+            print(f"[AGENTE ADMIN] Erro ao enfileirar webhook para {numero}: {str(webhook_error)}")
+
 @bp.route('/admin/toggle-user', methods=['POST'])
 @login_required
 @role_required(['admin'])
@@ -1004,9 +1019,11 @@ def admin_toggle_user():
             return jsonify({'success': False, 'message': 'ID do usuário é obrigatório'})
         
         # Ativar/desativar todos os números do usuário
-        supabase_admin.table('user_whatsapp').update({
+        result = supabase_admin.table('user_whatsapp').update({
             'ativo': ativo
         }).eq('user_id', user_id).execute()
+        notify_user_changed(user_id)
+        notificar_status_numeros(result.data, ativo)
         
         status = 'ativado' if ativo else 'desativado'
         return jsonify({'success': True, 'message': f'Usuário {status} com sucesso!'})
@@ -1073,6 +1090,7 @@ def admin_add_numero():
         }
         
         result = supabase_admin.table('user_whatsapp').insert(data_insert).execute()
+        notify_user_changed(user_id)
         
         print(f"[AGENTE ADMIN] ✅ Novo WhatsApp adicionado via admin para usuário {user_id}: {formatted_numero}")
         
@@ -1089,7 +1107,7 @@ def admin_add_numero():
             )
             
             if webhook_success:
-                print(f"[AGENTE ADMIN] Webhook N8N enviado com sucesso para número {formatted_numero}")
+                print(f"[AGENTE ADMIN] Webhook N8N enfileirado para número {formatted_numero}")
             else:
                 print(f"[AGENTE ADMIN] Falha ao enviar webhook N8N para número {formatted_numero}")
                 
@@ -1142,6 +1160,7 @@ def admin_remove_numero():
                 supabase_admin.table('user_whatsapp').update({
                     'principal': True
                 }).eq('id', outros_numeros.data[0]['id']).execute()
+        notify_user_changed(user_id)
         
         return jsonify({'success': True, 'message': f'Número {numero_whatsapp} removido com sucesso!'})
             
@@ -1301,18 +1320,22 @@ def admin_bulk_actions():
         if action == 'activate':
             # Ativar todos os números dos usuários
             for user_id in user_ids:
-                supabase_admin.table('user_whatsapp').update({
+                result = supabase_admin.table('user_whatsapp').update({
                     'ativo': True
                 }).eq('user_id', user_id).execute()
+                notify_user_changed(user_id)
+                notificar_status_numeros(result.data, True)
             
             return jsonify({'success': True, 'message': f'{len(user_ids)} usuários ativados com sucesso!'})
             
         elif action == 'deactivate':
             # Desativar todos os números dos usuários
             for user_id in user_ids:
-                supabase_admin.table('user_whatsapp').update({
+                result = supabase_admin.table('user_whatsapp').update({
                     'ativo': False
                 }).eq('user_id', user_id).execute()
+                notify_user_changed(user_id)
+                notificar_status_numeros(result.data, False)
             
             return jsonify({'success': True, 'message': f'{len(user_ids)} usuários desativados com sucesso!'})
             
@@ -0,0 +1,131 @@
+"""
+Cache local (em disco, com TTL) dos resultados da conferência de invoices.
+
+Reenviar a mesma invoice repetia o parse do Lexoid (LLM_PARSE) e a chamada
+ao Gemini. As entradas são chaveadas pelo SHA-256 do conteúdo do arquivo
+(nome e data do upload não importam) e ficam em disco para serem
+compartilhadas entre os workers do gunicorn e sobreviverem a restarts.
+
+O conteúdo das invoices fica em CONFERENCIA_CACHE_DIR (padrão em /tmp):
+diretórios são criados com permissão 0700 e arquivos com 0600, visíveis
+apenas ao usuário do processo.
+
+Namespaces usados pela conferência:
+- 'markdown': markdown extraído do PDF via LLM_PARSE (por hash do arquivo)
+- 'llm': JSON retornado pelo Gemini (por hash do arquivo + prompt + modelo)
+
+Usage:
+	from modules.importacoes.conferencia.analysis_cache import analysis_cache, file_sha256
+
+	digest = file_sha256(path)
+	cached = analysis_cache.get('markdown', digest)
+	if cached is None:
+		analysis_cache.set('markdown', digest, {'markdown': md, 'parse_mode': mode})
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+CONFERENCIA_CACHE_DIR = os.getenv('CONFERENCIA_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'portal_conferencia_cache'))
+CONFERENCIA_CACHE_TTL = int(os.getenv('CONFERENCIA_CACHE_TTL', str(7 * 24 * 3600)))
+# A cada N gravações as entradas expiradas são removidas
+PRUNE_EVERY = 50
+
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+	digest = hashlib.sha256()
+	with open(path, 'rb') as fh:
+		for chunk in iter(lambda: fh.read(chunk_size), b''):
+			digest.update(chunk)
+	return digest.hexdigest()
+
+
+def text_sha256(*parts: str) -> str:
+	digest = hashlib.sha256()
+	for part in parts:
+		digest.update((part or '').encode('utf-8'))
+		digest.update(b'\0')
+	return digest.hexdigest()
+
+
+class AnalysisCache:
+	"""Arquivos JSON por namespace/chave; a idade é o mtime do arquivo"""
+
+	def __init__(self, directory: str = CONFERENCIA_CACHE_DIR, ttl: int = CONFERENCIA_CACHE_TTL):
+		self.directory = directory
+		self.ttl = ttl
+		self._writes = 0
+		self._secured = False
+		self.hits = 0
+		self.misses = 0
+
+	def _ensure_directory(self, folder: str):
+		os.makedirs(folder, mode=0o700, exist_ok=True)
+		if not self._secured:
+			# Diretório criado antes (ou por outro umask): restringe ao dono
+			os.chmod(self.directory, 0o700)
+			self._secured = True
+		os.chmod(folder, 0o700)
+
+	def _path(self, namespace: str, key: str) -> str:
+		return os.path.join(self.directory, namespace, f'{key}.json')
+
+	def get(self, namespace: str, key: str):
+		path = self._path(namespace, key)
+		try:
+			if time.time() - os.path.getmtime(path) > self.ttl:
+				os.remove(path)
+				raise FileNotFoundError(path)
+			with open(path, encoding='utf-8') as fh:
+				value = json.load(fh)
+		except (OSError, ValueError):
+			self.misses += 1
+			return None
+		self.hits += 1
+		return value
+
+	def set(self, namespace: str, key: str, value) -> None:
+		path = self._path(namespace, key)
+		try:
+			self._ensure_directory(os.path.dirname(path))
+			partial = f'{path}.{os.getpid()}.part'
+			fd = os.open(partial, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+			with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+				json.dump(value, fh, ensure_ascii=False)
+			os.replace(partial, path)
+		except OSError as e:
+			print(f"[CONFERENCIA_CACHE] Erro ao gravar {namespace}/{key}: {e}")
+			return
+		self._writes += 1
+		if self._writes % PRUNE_EVERY == 0:
+			self.prune()
+
+	def prune(self) -> int:
+		"""Remove entradas expiradas; retorna quantas foram removidas"""
+		removed = 0
+		now = time.time()
+		if not os.path.isdir(self.directory):
+			return 0
+		for namespace in os.listdir(self.directory):
+			folder = os.path.join(self.directory, namespace)
+			if not os.path.isdir(folder):
+				continue
+			for name in os.listdir(folder):
+				path = os.path.join(folder, name)
+				try:
+					if now - os.path.getmtime(path) > self.ttl:
+						os.remove(path)
+						removed += 1
+				except OSError:
+					pass
+		return removed
+
+	def stats(self) -> dict:
+		return {'directory': self.directory, 'ttl': self.ttl, 'hits': self.hits, 'misses': self.misses}
+
+
+# Instância única do processo (o conteúdo é compartilhado via disco)
+analysis_cache = AnalysisCache()
@@ -1,9 +1,12 @@
 import os, uuid, json, re, io, base64, threading
 from datetime import datetime
-from flask import Blueprint, render_template, request, jsonify, current_app, session
+from flask import Blueprint, render_template, request, jsonify, current_app, session, send_file
 from routes.auth import login_required
 from werkzeug.utils import secure_filename
 from extensions import supabase_admin
+from log_config import log_printf
+from services.export_jobs import ExportJobQueue
+from modules.importacoes.conferencia.analysis_cache import analysis_cache, file_sha256, text_sha256
 
 # Dependências opcionais
 try:
@@ -20,6 +23,18 @@ except Exception:
 
 UPLOAD_FOLDER = 'static/uploads/conferencia'
 ALLOWED_EXTENSIONS = {'pdf'}
+# Lexoid: páginas por parte e partes processadas em paralelo
+CONFERENCIA_PAGES_PER_SPLIT = int(os.getenv('CONFERENCIA_PAGES_PER_SPLIT', '1'))
+CONFERENCIA_PARSE_PROCESSES = int(os.getenv('CONFERENCIA_PARSE_PROCESSES', '4'))
+
+# Fila própria (não disputa os workers das exportações); resultados expiram como os artefatos de exportação
+conferencia_jobs = ExportJobQueue(
+	max_workers=int(os.getenv('CONFERENCIA_JOB_WORKERS', '2')),
+	max_pending=int(os.getenv('CONFERENCIA_JOB_MAX_PENDING', '50')),
+	base_url='/conferencia/simple/jobs',
+	event='conferencia_job_progress',
+	name='conferencia'
+)
 
 conferencia_bp = Blueprint(
 	'conferencia', __name__,
@@ -165,77 +180,139 @@ def safe_parse_json(raw: str):
 		return None
 
 # =========================
-# Rotas
+# Pipeline de análise (cache por hash do arquivo + jobs em lote)
 # =========================
 
-@conferencia_bp.route('/')
-@login_required
-def index():
-	return render_template('conferencia.html')
+class AnaliseError(Exception):
+	"""Falha que impede a análise (Lexoid indisponível, retorno vazio...)"""
 
-@conferencia_bp.route('/simple')
-@login_required
-def simple_page():
-	return render_template('conferencia.html')
 
-@conferencia_bp.route('/simple/analyze', methods=['POST'])
-@login_required
-def simple_analyze():
-	if not LEXOID_AVAILABLE:
-		return jsonify({'success': False, 'error': 'Lexoid não instalado'}), 500
-	if 'file' not in request.files:
-		return jsonify({'success': False, 'error': 'Arquivo não enviado'}), 400
-	f = request.files['file']
-	if f.filename == '' or not allowed_file(f.filename):
-		return jsonify({'success': False, 'error': 'Envie um PDF .pdf'}), 400
+def save_upload(file_storage):
+	"""Grava o upload em UPLOAD_FOLDER; retorna (nome seguro, caminho, nome gravado)"""
 	ensure_upload_folder()
-	filename = secure_filename(f.filename)
+	filename = secure_filename(file_storage.filename)
 	saved_name = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}_{filename}"
 	path = os.path.join(UPLOAD_FOLDER, saved_name)
-	f.save(path)
-	start = datetime.now()
-	current_app.logger.info(f"[SIMPLE] Arquivo salvo {path}")
-	# Garante chave esperada pelo Lexoid
-	ensure_google_key()
-	md = None
-	parse_mode = None
+	file_storage.save(path)
+	return filename, path, saved_name
+
+
+def remove_upload(path: str):
+	# Não armazenar o PDF permanentemente
+	try:
+		os.remove(path)
+	except Exception:
+		pass
+
+
+def parse_invoice_markdown(path: str):
+	"""Extrai o markdown do PDF com o Lexoid (LLM_PARSE, fallback STATIC_PARSE).
+	O Lexoid divide o PDF em partes de CONFERENCIA_PAGES_PER_SPLIT páginas e processa
+	as partes em paralelo (até CONFERENCIA_PARSE_PROCESSES). Retorna (markdown, modo, páginas).
+	"""
+	options = {'pages_per_split': CONFERENCIA_PAGES_PER_SPLIT, 'max_processes': CONFERENCIA_PARSE_PROCESSES}
 	try:
 		try:
-			md = lexoid_parse(path, parser_type='LLM_PARSE').get('raw')
+			result = lexoid_parse(path, parser_type='LLM_PARSE', **options)
 			parse_mode = 'LLM_PARSE'
 		except Exception:
-			md = lexoid_parse(path, parser_type='STATIC_PARSE').get('raw')
+			result = lexoid_parse(path, parser_type='STATIC_PARSE', **options)
 			parse_mode = 'STATIC_PARSE'
 	except Exception as e:
-		return jsonify({'success': False, 'error': f'Falha Lexoid: {e}'}), 500
-	if not md:
-		return jsonify({'success': False, 'error': 'Retorno vazio do Lexoid'}), 500
+		raise AnaliseError(f'Falha Lexoid: {e}')
+	segments = result.get('segments') or []
+	md = result.get('raw')
+	if not md and segments:
+		ordered = sorted(segments, key=lambda seg: (seg.get('metadata') or {}).get('page') or 0)
+		md = '\n\n'.join(seg.get('content') or '' for seg in ordered)
+	pages = len({(seg.get('metadata') or {}).get('page') for seg in segments}) or None
+	return md, parse_mode, pages
+
+
+def extract_invoice_json(md_trunc: str):
+	"""Chama o Gemini com o prompt ativo; o JSON válido fica em cache por
+	(markdown, prompt, modelo). Retorna (json, erro, veio_do_cache).
+	"""
+	api_key = os.getenv('GEMINI_API_KEY')
+	if not (api_key and GEMINI_AVAILABLE):
+		return None, 'GEMINI_API_KEY ausente ou lib indisponível', False
+	model_name = os.getenv('GEMINI_MODEL','gemini-1.5-flash')
+	base_prompt = get_prompt_from_db('invoice')
+	cache_key = text_sha256(md_trunc, base_prompt, model_name)
+	cached = analysis_cache.get('llm', cache_key)
+	if cached is not None:
+		return cached, None, True
+	try:
+		genai.configure(api_key=api_key)
+		model = genai.GenerativeModel(model_name)
+		prompt = base_prompt + "\n\nMARKDOWN_INICIO\n" + md_trunc + "\nMARKDOWN_FIM"
+		resp = model.generate_content([{ 'text': prompt }])
+		llm_json = safe_parse_json(resp.text)
+	except Exception as e:
+		return None, str(e), False
+	if not isinstance(llm_json, dict):
+		return None, 'Falha ao parsear JSON', False
+	analysis_cache.set('llm', cache_key, llm_json)
+	return llm_json, None, False
+
+
+def analyze_invoice(path: str, filename: str, user_id=None, progress=None, digest: str | None = None) -> dict:
+	"""Pipeline completo de uma invoice: hash -> markdown (cache) -> Gemini (cache) ->
+	pós-processamento -> log em conferencia_jobs. Usado pela rota síncrona e pelos jobs.
+	progress(done, total, message) é opcional (jobs em segundo plano).
+	"""
+	def step(done, message):
+		if progress:
+			progress(done, 4, message)
+
+	start = datetime.now()
+	step(0, 'Calculando hash do arquivo')
+	digest = digest or file_sha256(path)
+	step(1, 'Extraindo texto do PDF')
+	cached_md = analysis_cache.get('markdown', digest)
+	if cached_md is not None:
+		md, parse_mode, pages = cached_md['markdown'], cached_md['parse_mode'], cached_md.get('pages')
+	else:
+		# Garante chave esperada pelo Lexoid
+		ensure_google_key()
+		md, parse_mode, pages = parse_invoice_markdown(path)
+		if not md:
+			raise AnaliseError('Retorno vazio do Lexoid')
+		# O fallback STATIC_PARSE (falha momentânea do LLM) não vai para o cache: o próximo
+		# envio da mesma invoice tenta o LLM_PARSE de novo
+		if parse_mode == 'LLM_PARSE':
+			analysis_cache.set('markdown', digest, {'markdown': md, 'parse_mode': parse_mode, 'pages': pages})
 
 	md_trunc = md[:45000]
 	palavras = len(re.findall(r'\w+', md_trunc))
-	paginas = md_trunc.count('\n\n')//40 + 1  # heurística simples
+	paginas = pages or (md_trunc.count('\n\n')//40 + 1)  # heurística quando o Lexoid não informa páginas
 
-	llm_json = None
-	llm_error = None
-	api_key = os.getenv('GEMINI_API_KEY')
-	if api_key and GEMINI_AVAILABLE:
-		try:
-			genai.configure(api_key=api_key)
-			model = genai.GenerativeModel(os.getenv('GEMINI_MODEL','gemini-1.5-flash'))
-			base_prompt = get_prompt_from_db('invoice')
-			prompt = base_prompt + "\n\nMARKDOWN_INICIO\n" + md_trunc + "\nMARKDOWN_FIM"
-			resp = model.generate_content([{ 'text': prompt }])
-			llm_json = safe_parse_json(resp.text)
-			if not isinstance(llm_json, dict):
-				llm_error = 'Falha ao parsear JSON'
-		except Exception as e:
-			llm_error = str(e)
-	else:
-		llm_error = 'GEMINI_API_KEY ausente ou lib indisponível'
+	step(2, 'Analisando com Gemini')
+	llm_json, llm_error, llm_cached = extract_invoice_json(md_trunc)
 
+	step(3, 'Pós-processamento')
 	elapsed_ms = int((datetime.now() - start).total_seconds()*1000)
 	processed = enrich_full_invoice_json(md_trunc, llm_json)
-	# Log em tabela conferencia_jobs (analytics)
+	log_conferencia_job(filename, user_id, elapsed_ms, parse_mode, processed, llm_error)
+	step(4, None)
+
+	return {
+		'success': True,
+		'file': filename,
+		'sha256': digest,
+		'elapsed_ms': elapsed_ms,
+		'lexoid_mode': parse_mode,
+		'markdown_preview': md_trunc[:1200],
+		'palavras': palavras,
+		'paginas_estimado': paginas,
+		'json': processed,
+		'llm_error': llm_error,
+		'cache': {'markdown': cached_md is not None, 'llm': llm_cached}
+	}
+
+
+def log_conferencia_job(filename, user_id, elapsed_ms, parse_mode, processed, llm_error):
+	"""Log em tabela conferencia_jobs (analytics); falhas são ignoradas"""
 	try:
 		if supabase_admin and processed:
 			campos = processed.get('campos', {})
@@ -244,11 +321,6 @@ def simple_analyze():
 			incoterm = campos.get('incoterm',{}).get('valor_extraido')
 			status = sumario.get('status')
 			checks = sumario.get('checks',{})
-			user_id = None
-			try:
-				user_id = session.get('user', {}).get('id')
-			except Exception:
-				user_id = None
 			created_iso = datetime.utcnow().isoformat()
 			year_month = created_iso[:7]  # YYYY-MM
 			insert_payload = {
@@ -274,28 +346,117 @@ def simple_analyze():
 			try:
 				supabase_admin.table('conferencia_jobs').insert(insert_payload).execute()
 			except Exception as e:
-				current_app.logger.warning(f"[CONF_LOG] Falha ao inserir log conferencia_jobs: {e}")
+				log_printf("[CONF_LOG] Falha ao inserir log conferencia_jobs: %s", e)
 	except Exception as e:
-		current_app.logger.warning(f"[CONF_LOG] Erro inesperado logging: {e}")
+		log_printf("[CONF_LOG] Erro inesperado logging: %s", e)
+
+# =========================
+# Rotas
+# =========================
+
+@conferencia_bp.route('/')
+@login_required
+def index():
+	return render_template('conferencia.html')
+
+@conferencia_bp.route('/simple')
+@login_required
+def simple_page():
+	return render_template('conferencia.html')
 
-	# Opcional: deletar arquivo após processamento (não armazenar permanentemente)
+@conferencia_bp.route('/simple/analyze', methods=['POST'])
+@login_required
+def simple_analyze():
+	if not LEXOID_AVAILABLE:
+		return jsonify({'success': False, 'error': 'Lexoid não instalado'}), 500
+	if 'file' not in request.files:
+		return jsonify({'success': False, 'error': 'Arquivo não enviado'}), 400
+	f = request.files['file']
+	if f.filename == '' or not allowed_file(f.filename):
+		return jsonify({'success': False, 'error': 'Envie um PDF .pdf'}), 400
+	filename, path, saved_name = save_upload(f)
+	current_app.logger.info(f"[SIMPLE] Arquivo salvo {path}")
 	try:
-		os.remove(path)
-	except Exception:
-		pass
+		result = analyze_invoice(path, filename, session.get('user', {}).get('id'))
+	except AnaliseError as e:
+		return jsonify({'success': False, 'error': str(e)}), 500
+	finally:
+		remove_upload(path)
+	result['saved_name'] = saved_name
+	return jsonify(result)
+
+@conferencia_bp.route('/simple/jobs', methods=['POST'])
+@login_required
+def simple_jobs_submit():
+	"""Enfileira um lote de invoices (campo 'files', vários PDFs) para análise em segundo plano.
+	O progresso chega pelo evento SocketIO 'conferencia_job_progress' e por GET /simple/jobs/<job_id>;
+	reenviar um arquivo idêntico reaproveita o job em andamento ou o resultado recente.
+	"""
+	if not LEXOID_AVAILABLE:
+		return jsonify({'success': False, 'error': 'Lexoid não instalado'}), 500
+	files = [f for f in (request.files.getlist('files') or request.files.getlist('file')) if f and f.filename]
+	if not files:
+		return jsonify({'success': False, 'error': 'Arquivo não enviado'}), 400
+	invalid = [f.filename for f in files if not allowed_file(f.filename)]
+	if invalid:
+		return jsonify({'success': False, 'error': f"Envie apenas PDFs: {', '.join(invalid)}"}), 400
+	user_id = session.get('user', {}).get('id')
+	jobs = []
+	for f in files:
+		filename, path, saved_name = save_upload(f)
+		digest = file_sha256(path)
+
+		def _build(artifact_path, progress, path=path, filename=filename, digest=digest):
+			try:
+				result = analyze_invoice(path, filename, user_id, progress, digest=digest)
+			finally:
+				remove_upload(path)
+			with open(artifact_path, 'w', encoding='utf-8') as fh:
+				json.dump(result, fh, ensure_ascii=False)
+			sumario = (result.get('json') or {}).get('sumario', {})
+			return {'file': filename, 'status': sumario.get('status'), 'elapsed_ms': result['elapsed_ms'],
+					'llm_error': result['llm_error'], 'cache': result['cache']}
 
-	return jsonify({
-		'success': True,
-		'file': filename,
-		'saved_name': saved_name,
-		'elapsed_ms': elapsed_ms,
-		'lexoid_mode': parse_mode,
-		'markdown_preview': md_trunc[:1200],
-		'palavras': palavras,
-		'paginas_estimado': paginas,
-		'json': processed,
-		'llm_error': llm_error
-	})
+		try:
+			job, reused = conferencia_jobs.submit(
+				user_id, 'conferencia.invoice', {'sha256': digest}, _build,
+				filename=f"conferencia_{os.path.splitext(filename)[0]}.json", mimetype='application/json'
+			)
+		except RuntimeError:
+			remove_upload(path)
+			jobs.append({'file': filename, 'status': 'error', 'error': 'Fila de conferência cheia, tente novamente em alguns minutos'})
+			continue
+		if reused:
+			remove_upload(path)
+		jobs.append(dict(job.to_dict(reused), file=filename))
+	return jsonify({'success': True, 'jobs': jobs}), 202
+
+@conferencia_bp.route('/simple/jobs')
+@login_required
+def simple_jobs_list():
+	"""Jobs de conferência do usuário (mais recentes primeiro)"""
+	jobs = conferencia_jobs.list_for_user(session.get('user', {}).get('id'))
+	return jsonify({'success': True, 'jobs': [job.to_dict() for job in jobs]})
+
+@conferencia_bp.route('/simple/jobs/<job_id>')
+@login_required
+def simple_job_status(job_id):
+	job = conferencia_jobs.get(job_id, user_id=session.get('user', {}).get('id'))
+	if job is None:
+		return jsonify({'success': False, 'error': 'Job não encontrado'}), 404
+	return jsonify({'success': True, 'job': job.to_dict()})
+
+@conferencia_bp.route('/simple/jobs/<job_id>/download')
+@login_required
+def simple_job_download(job_id):
+	"""Resultado completo (mesmo formato de /simple/analyze) enquanto não expirar"""
+	job = conferencia_jobs.get(job_id, user_id=session.get('user', {}).get('id'))
+	if job is None or job.is_expired():
+		return jsonify({'success': False, 'error': 'Job não encontrado ou expirado'}), 404
+	if job.status != 'done' or not os.path.exists(job.artifact_path):
+		return jsonify({'success': False, 'error': 'Análise ainda não concluída', 'job': job.to_dict()}), 409
+	return send_file(job.artifact_path, mimetype=job.mimetype, as_attachment=request.args.get('inline') != '1',
+					 download_name=job.filename)
 
 # (Opcional) endpoint de saúde
 @conferencia_bp.route('/simple/health')
@@ -303,7 +464,8 @@ def simple_health():
 	return jsonify({
 		'lexoid': LEXOID_AVAILABLE,
 		'gemini': GEMINI_AVAILABLE,
-		'has_key': bool(os.getenv('GEMINI_API_KEY'))
+		'has_key': bool(os.getenv('GEMINI_API_KEY')),
+		'cache': analysis_cache.stats()
 	})
 
 @conferencia_bp.route('/simple/prompt')
@@ -210,6 +210,22 @@ modal?.addEventListener('click', (e)=>{
   if(e.target === modal){ modal.style.display = 'none'; }
 });
 
+function renderAnalysis(data){
+  const cacheInfo = data.cache && (data.cache.markdown || data.cache.llm) ? ' - resultado em cache' : '';
+  statusDiv.innerHTML = `<span class='status-ok'>${esc(data.file||'')} processado em ${data.elapsed_ms} ms (Lexoid: ${esc(data.lexoid_mode)})${cacheInfo}</span>`;
+  previewDiv.textContent = 'Markdown preview (1.2k chars)\n\n' + (data.markdown_preview || '');
+  const jsonData = data.json || { aviso: 'Sem JSON retornado', llm_error: data.llm_error };
+  jsonDiv.textContent = JSON.stringify(jsonData, null, 2);
+  // Summary only first
+  renderResumo(jsonData.sumario);
+  resumoWrapper.style.display = 'block';
+  toggleDetailsBtn.style.display = 'inline-block';
+  // Pre-render detailed in hidden modal container
+  renderCampos(jsonData.campos || {});
+  renderItens(jsonData.itens_da_fatura || []);
+  painelEstruturado.style.display = 'none';
+}
+
 form.addEventListener('submit', async (e) => {
   e.preventDefault();
   statusDiv.textContent = 'Enviando...';
@@ -224,25 +240,88 @@ form.addEventListener('submit', async (e) => {
     const resp = await fetch('/conferencia/simple/analyze', { method: 'POST', body: fd });
     const data = await resp.json();
     if(!data.success){
-      statusDiv.innerHTML = `<span class='status-err'>Erro: ${data.error||'desconhecido'}</span>`;
+      statusDiv.innerHTML = `<span class='status-err'>Erro: ${esc(data.error||'desconhecido')}</span>`;
     } else {
-  statusDiv.innerHTML = `<span class='status-ok'>Processado em ${data.elapsed_ms} ms (Lexoid: ${data.lexoid_mode})</span>`;
-  previewDiv.textContent = 'Markdown preview (1.2k chars)\n\n' + (data.markdown_preview || '');
-      const jsonData = data.json || { aviso: 'Sem JSON retornado', llm_error: data.llm_error };
-      jsonDiv.textContent = JSON.stringify(jsonData, null, 2);
-      // Render estruturado
-      renderResumo(jsonData.sumario);
-  // Summary only first
-  resumoWrapper.style.display = 'block';
-  toggleDetailsBtn.style.display = 'inline-block';
-  // Pre-render detailed in hidden modal container
-  renderCampos(jsonData.campos || {});
-  renderItens(jsonData.itens_da_fatura || []);
-  painelEstruturado.style.display = 'none';
+      renderAnalysis(data);
     }
   } catch(err){
-    statusDiv.innerHTML = `<span class='status-err'>Falha inesperada: ${err}</span>`;
+    statusDiv.innerHTML = `<span class='status-err'>Falha inesperada: ${esc(err)}</span>`;
   } finally {
     btn.disabled = false;
   }
 });
+
+// ===== Fila de análise em lote =====
+const batchForm = document.getElementById('batchForm');
+const batchStatus = document.getElementById('batchStatus');
+const batchTable = document.getElementById('batchTable');
+const JOB_STATUS_LABEL = { queued: 'Na fila', running: 'Processando', done: 'Concluído', error: 'Erro' };
+let batchPollTimer = null;
+
+function renderJobs(jobs){
+  if(!jobs.length){ batchTable.style.display = 'none'; return; }
+  batchTable.style.display = 'table';
+  batchTable.querySelector('tbody').innerHTML = jobs.map(job => {
+    const nome = (job.result && job.result.file) || job.filename || '';
+    const progresso = job.status === 'done' ? '100%' : (job.progress !== null && job.progress !== undefined ? `${job.progress}%` : '-');
+    const detalhe = job.status === 'error' ? esc(job.error || '') : esc(job.message || '');
+    const acao = job.status === 'done' ? `<button type="button" class="text-sm" data-job="${esc(job.job_id)}">Ver</button>` : '';
+    return `<tr><td>${esc(nome)}</td><td>${esc(JOB_STATUS_LABEL[job.status] || job.status)}</td><td>${progresso} <small>${detalhe}</small></td><td>${acao}</td></tr>`;
+  }).join('');
+}
+
+async function refreshJobs(){
+  try {
+    const resp = await fetch('/conferencia/simple/jobs');
+    const data = await resp.json();
+    const jobs = data.jobs || [];
+    renderJobs(jobs);
+    const active = jobs.some(job => job.status === 'queued' || job.status === 'running');
+    clearTimeout(batchPollTimer);
+    if(active){ batchPollTimer = setTimeout(refreshJobs, 2000); }
+  } catch(err){
+    batchStatus.innerHTML = `<span class='status-err'>Falha ao consultar a fila: ${esc(err)}</span>`;
+  }
+}
+
+batchTable?.addEventListener('click', async (e) => {
+  const jobId = e.target.dataset && e.target.dataset.job;
+  if(!jobId) return;
+  try {
+    const resp = await fetch(`/conferencia/simple/jobs/${encodeURIComponent(jobId)}/download?inline=1`);
+    const data = await resp.json();
+    if(!data.success){
+      statusDiv.innerHTML = `<span class='status-err'>Erro: ${esc(data.error||'desconhecido')}</span>`;
+      return;
+    }
+    renderAnalysis(data);
+    window.scrollTo({ top: 0, behavior: 'smooth' });
+  } catch(err){
+    statusDiv.innerHTML = `<span class='status-err'>Falha inesperada: ${esc(err)}</span>`;
+  }
+});
+
+batchForm?.addEventListener('submit', async (e) => {
+  e.preventDefault();
+  const btn = batchForm.querySelector('button');
+  btn.disabled = true;
+  batchStatus.textContent = 'Enviando...';
+  try {
+    const resp = await fetch('/conferencia/simple/jobs', { method: 'POST', body: new FormData(batchForm) });
+    const data = await resp.json();
+    if(!data.success){
+      batchStatus.innerHTML = `<span class='status-err'>Erro: ${esc(data.error||'desconhecido')}</span>`;
+    } else {
+      const reaproveitados = data.jobs.filter(job => job.reused).length;
+      batchStatus.innerHTML = `<span class='status-ok'>${data.jobs.length} arquivo(s) enfileirado(s)${reaproveitados ? ` (${reaproveitados} já analisado(s) recentemente)` : ''}</span>`;
+      batchForm.reset();
+    }
+    refreshJobs();
+  } catch(err){
+    batchStatus.innerHTML = `<span class='status-err'>Falha inesperada: ${esc(err)}</span>`;
+  } finally {
+    btn.disabled = false;
+  }
+});
+
+refreshJobs();
@@ -10,6 +10,8 @@ from flask import Blueprint, jsonify, render_template, request, session
 from extensions import supabase_admin
 from routes.auth import login_required, role_required
 from services.data_cache import data_cache
+from services.single_flight import copy_rows, query_fingerprint, single_flight
+from services.supabase_transport import call_class
 
 
 def _get_exchange_rates_safe() -> Dict[str, Optional[float]]:
@@ -42,6 +44,13 @@ dashboard_interno_mapa_bp = Blueprint(
 
 CACHE_DATA_TYPE = "dashboard_interno_mapa_view"
 SESSION_CACHE_KEY = "dashboard_interno_mapa_processos"
+MAPA_PROJECTION = (
+    "id, ref_unique, ref_importador, cnpj_importador, importador, modal, container, "
+    "data_embarque, data_chegada, transit_time_real, pais_procedencia, urf_despacho, "
+    "exportador_fornecedor, numero_di, data_registro, canal, peso_bruto, data_desembaraco, "
+    "mercadoria, data_abertura, data_fechamento, status_sistema, status_timeline, url_bandeira, "
+    "despesas_processo"
+)
 
 
 def _is_api_bypass() -> bool:
@@ -199,13 +208,7 @@ def _load_processes(
 
     logger.info("[DASH MAPA] Buscando dados no Supabase - role=%s, companies=%s", user_role, user_companies)
     try:
-        query = supabase_admin.table("vw_importacoes_6_meses_abertos_dash").select(
-            "id, ref_unique, ref_importador, cnpj_importador, importador, modal, container, "
-            "data_embarque, data_chegada, transit_time_real, pais_procedencia, urf_despacho, "
-            "exportador_fornecedor, numero_di, data_registro, canal, peso_bruto, data_desembaraco, "
-            "mercadoria, data_abertura, data_fechamento, status_sistema, status_timeline, url_bandeira, "
-            "despesas_processo"
-        )
+        query = supabase_admin.table("vw_importacoes_6_meses_abertos_dash").select(MAPA_PROJECTION)
 
         if user_role == "cliente_unique":
             if not user_companies:
@@ -220,8 +223,15 @@ def _load_processes(
             logger.info("[DASH MAPA] SEM filtro de empresas (acesso total)")
 
         logger.info("[DASH MAPA] Executando query no Supabase...")
-        response = query.order("data_abertura", desc=True).limit(3000).execute()
-        records = response.data or []
+        query = query.order("data_abertura", desc=True).limit(3000)
+        fingerprint = query_fingerprint(
+            "vw_importacoes_6_meses_abertos_dash",
+            {"cnpj_importador": user_companies if user_role in ("cliente_unique", "interno_unique") and user_companies else None},
+            projection=MAPA_PROJECTION,
+            order="data_abertura.desc",
+            limit=3000,
+        )
+        records = single_flight.do(fingerprint, call_class('report')(lambda: query.execute().data or []), copy=copy_rows)
         logger.info("[DASH MAPA] Query retornou %s registros brutos", len(records))
         
         if records:
@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, session, jsonify, request
+from flask import Blueprint, render_template, session, jsonify, request, has_request_context
 from extensions import supabase, supabase_admin
 from routes.auth import login_required, role_required
 from decorators.perfil_decorators import perfil_required
@@ -12,89 +12,127 @@ import re
 import json
 import logging
 from decimal import Decimal, InvalidOperation
-from services.data_cache import DataCacheService
-from services.retry_utils import run_with_retries
-from threading import Lock
+from services.data_cache import DataCacheService, register_preload_stage
+from services.data_cache import data_cache as shared_data_cache
+from services.retry_utils import run_with_policy
+from services.supabase_transport import call_class
+from services.single_flight import single_flight, query_fingerprint, copy_rows
+from services.datasets import dataset_cache, IMPORTACOES_ABERTOS_ENRIQUECIDO
+from log_config import log_print, log_printf
 
 # Configurar logger
 logger = logging.getLogger(__name__)
 
 # Instanciar o serviço de cache
 data_cache = DataCacheService()
-_dashboard_load_locks = {}
-
-def _get_user_lock(user_id):
-    if user_id not in _dashboard_load_locks:
-        _dashboard_load_locks[user_id] = Lock()
-    return _dashboard_load_locks[user_id]
 
 def fetch_and_cache_dashboard_data(user_data, force=False):
     """Garantir que os dados base do dashboard estejam no cache.
     - Se já existir no cache e não for force: retorna direto.
+    - Se o pré-carregamento do login ainda estiver rodando: aguarda o ticket.
     - Caso contrário, executa a query, enriquece e armazena.
     Essa função elimina dependência da ordem de chamadas (race entre /load-data e /kpis,/charts,...)
     """
     user_id = user_data.get('id')
-    role = user_data.get('role')
     if not user_id:
         return []
-    existing = data_cache.get_cache(user_id, 'dashboard_v2_data')
+    existing = dataset_cache.get(user_id, IMPORTACOES_ABERTOS_ENRIQUECIDO)
     if existing and not force:
         return existing
-    lock = _get_user_lock(user_id)
-    with lock:
-        # Re-checar dentro do lock
-        existing_inside = data_cache.get_cache(user_id, 'dashboard_v2_data')
+    if not force:
+        # Aguardar o pré-carregamento do login em vez de disparar uma carga duplicada
+        ticket = session.get('preload_ticket') if has_request_context() else None
+        if shared_data_cache.wait_for_preload(user_id, ticket=ticket) is not None:
+            existing = dataset_cache.get(user_id, IMPORTACOES_ABERTOS_ENRIQUECIDO)
+            if existing:
+                return existing
+    return _load_and_cache_dashboard_data(user_data, force=force)
+
+def _load_and_cache_dashboard_data(user_data, force=False):
+    """Executa a query base, enriquece e armazena no cache.
+    Cargas concorrentes do mesmo usuário são coalescidas (single-flight) e a
+    query da view é compartilhada entre usuários com o mesmo filtro de empresas.
+    """
+    user_id = user_data.get('id')
+
+    def _load():
+        # Re-checar dentro da carga coalescida
+        existing_inside = dataset_cache.get(user_id, IMPORTACOES_ABERTOS_ENRIQUECIDO)
         if existing_inside and not force:
             return existing_inside
-        logger.debug(f"[DASHBOARD_EXECUTIVO] (Helper) Carregando dados fresh para user {user_id} (force={force})")
-        query = supabase_admin.table('vw_importacoes_6_meses_abertos_dash').select('*')
-        
-        # Verificar se usuário precisa de filtragem por empresa
-        perfil_principal = user_data.get('perfil_principal', '')
-        
-        # REGRA CORRIGIDA: admin_operacao deve ver TODAS as empresas, não apenas as associadas
-        if role == 'cliente_unique':
-            user_cnpjs = get_user_companies(user_data)
-            if user_cnpjs:
-                query = query.in_('cnpj_importador', user_cnpjs)
-                logger.debug(f"[DASHBOARD_EXECUTIVO] (Helper) Cliente filtrando por CNPJs: {len(user_cnpjs)} empresas")
-            else:
-                logger.debug(f"[DASHBOARD_EXECUTIVO] (Helper) Cliente sem CNPJs vinculados -> dados vazios")
-                data_cache.set_cache(user_id, 'dashboard_v2_data', [])
-                return []
-        elif role == 'interno_unique' and perfil_principal not in ['admin_operacao', 'master_admin']:
-            # Interno não-admin deve ver apenas suas empresas associadas
-            user_cnpjs = get_user_companies(user_data)
-            if user_cnpjs:
-                query = query.in_('cnpj_importador', user_cnpjs)
-                logger.debug(f"[DASHBOARD_EXECUTIVO] (Helper) Interno filtrando por CNPJs: {len(user_cnpjs)} empresas")
-            else:
-                logger.debug(f"[DASHBOARD_EXECUTIVO] (Helper) Interno sem CNPJs vinculados -> dados vazios")
-                data_cache.set_cache(user_id, 'dashboard_v2_data', [])
-                return []
+        return _query_and_enrich_dashboard_data(user_data, force)
+
+    data = single_flight.do(f'dashboard_executivo:user:{user_id}', _load)
+    if data and has_request_context():
+        session['dashboard_v2_loaded'] = True
+    return data
+
+def _query_and_enrich_dashboard_data(user_data, force=False):
+    user_id = user_data.get('id')
+    role = user_data.get('role')
+    logger.debug(f"[DASHBOARD_EXECUTIVO] (Helper) Carregando dados fresh para user {user_id} (force={force})")
+    query = supabase_admin.table('vw_importacoes_6_meses_abertos_dash').select('*')
+    user_cnpjs = None
+    
+    # Verificar se usuário precisa de filtragem por empresa
+    perfil_principal = user_data.get('perfil_principal', '')
+    
+    # REGRA CORRIGIDA: admin_operacao deve ver TODAS as empresas, não apenas as associadas
+    if role == 'cliente_unique':
+        user_cnpjs = get_user_companies(user_data)
+        if user_cnpjs:
+            query = query.in_('cnpj_importador', user_cnpjs)
+            logger.debug(f"[DASHBOARD_EXECUTIVO] (Helper) Cliente filtrando por CNPJs: {len(user_cnpjs)} empresas")
         else:
-            logger.debug(f"[DASHBOARD_EXECUTIVO] (Helper) Admin vê todos os dados (perfil: {perfil_principal})")
-        def _run_main_query():
-            return query.execute()
-        result = run_with_retries('dashboard_executivo.helper_load_data', _run_main_query, max_attempts=3, base_delay_seconds=0.8,
-                                  should_retry=lambda e: 'Server disconnected' in str(e) or 'timeout' in str(e).lower())
-        raw = result.data or []
-        if not raw:
-            print('[DASHBOARD_EXECUTIVO] (Helper) Nenhum dado retornado da view')
-            data_cache.set_cache(user_id, 'dashboard_v2_data', [])
+            logger.debug(f"[DASHBOARD_EXECUTIVO] (Helper) Cliente sem CNPJs vinculados -> dados vazios")
+            dataset_cache.set(user_id, IMPORTACOES_ABERTOS_ENRIQUECIDO, [], scope=user_cnpjs)
             return []
-        
-        # Enriquecer com despesas
-        enriched = enrich_data_with_despesas_view(raw)
-        
-        # Enriquecer com dados de armazenagem Kingspan (se aplicável)
-        enriched_with_armazenagem = enrich_data_with_armazenagem_kingspan(enriched, user_data)
-        enriched_with_produtos = enrich_data_with_produtos_detalhados(enriched_with_armazenagem)
-        
-        data_cache.set_cache(user_id, 'dashboard_v2_data', enriched_with_produtos)
-        session['dashboard_v2_loaded'] = True
-        return enriched_with_produtos
+    elif role == 'interno_unique' and perfil_principal not in ['admin_operacao', 'master_admin']:
+        # Interno não-admin deve ver apenas suas empresas associadas
+        user_cnpjs = get_user_companies(user_data)
+        if user_cnpjs:
+            query = query.in_('cnpj_importador', user_cnpjs)
+            logger.debug(f"[DASHBOARD_EXECUTIVO] (Helper) Interno filtrando por CNPJs: {len(user_cnpjs)} empresas")
+        else:
+            logger.debug(f"[DASHBOARD_EXECUTIVO] (Helper) Interno sem CNPJs vinculados -> dados vazios")
+            dataset_cache.set(user_id, IMPORTACOES_ABERTOS_ENRIQUECIDO, [], scope=user_cnpjs)
+            return []
+    else:
+        logger.debug(f"[DASHBOARD_EXECUTIVO] (Helper) Admin vê todos os dados (perfil: {perfil_principal})")
+    @call_class('report')
+    def _run_main_query():
+        result = run_with_policy('supabase.read', 'dashboard_executivo.helper_load_data', query.execute)
+        return result.data or []
+    # Mesma view + mesmo filtro de empresas => uma única query em andamento entre usuários
+    fingerprint = query_fingerprint('vw_importacoes_6_meses_abertos_dash', {'cnpj_importador': user_cnpjs})
+    raw = single_flight.do(fingerprint, _run_main_query, copy=copy_rows)
+    if not raw:
+        log_print('[DASHBOARD_EXECUTIVO] (Helper) Nenhum dado retornado da view')
+        dataset_cache.set(user_id, IMPORTACOES_ABERTOS_ENRIQUECIDO, [], scope=user_cnpjs)
+        return []
+    
+    # Enriquecer com despesas
+    enriched = enrich_data_with_despesas_view(raw)
+    
+    # Enriquecer com dados de armazenagem Kingspan (se aplicável)
+    enriched_with_armazenagem = enrich_data_with_armazenagem_kingspan(enriched, user_data)
+    enriched_with_produtos = enrich_data_with_produtos_detalhados(enriched_with_armazenagem)
+    
+    dataset_cache.set(user_id, IMPORTACOES_ABERTOS_ENRIQUECIDO, enriched_with_produtos, scope=user_cnpjs)
+    return enriched_with_produtos
+
+def _user_has_importacoes_access(user_data):
+    """Predicado do pré-carregamento: só carrega o dashboard para quem acessa importações"""
+    if user_data.get('role') == 'admin':
+        return True
+    for perfil in user_data.get('user_perfis_info') or []:
+        for modulo in perfil.get('modulos') or []:
+            if modulo.get('codigo') == 'importacoes':
+                return True
+    return False
+
+# Etapa do pré-carregamento de login: aquece o cache do dashboard executivo em background
+register_preload_stage('dashboard_executivo', _load_and_cache_dashboard_data, applies_to=_user_has_importacoes_access)
 
 def calculate_custo_from_despesas_processo(despesas_processo):
     """
@@ -133,7 +171,7 @@ def calculate_custo_from_despesas_processo(despesas_processo):
         return total_custo
         
     except Exception as e:
-        print(f"[CUSTO_CALCULATION] Erro ao calcular custo: {str(e)}")
+        log_printf("[CUSTO_CALCULATION] Erro ao calcular custo: %s", str(e))
         return 0.0
 
 def calculate_custo_from_vw_despesas(ref_unique):
@@ -145,14 +183,14 @@ def calculate_custo_from_vw_despesas(ref_unique):
         if not ref_unique:
             return 0.0
         
-        print(f"[DESPESAS_VIEW] Consultando vw_despesas_6_meses para ref_unique: {ref_unique}")
+        log_printf("[DESPESAS_VIEW] Consultando vw_despesas_6_meses para ref_unique: %s", ref_unique)
         
         # Consultar view de despesas com filtros aplicados
         query = supabase_admin.table('vw_despesas_6_meses').select('valor_custo').eq('ref_unique', ref_unique)
         result = query.execute()
         
         if not result.data:
-            print(f"[DESPESAS_VIEW] Nenhuma despesa encontrada para {ref_unique}")
+            log_printf("[DESPESAS_VIEW] Nenhuma despesa encontrada para %s", ref_unique)
             return 0.0
         
         total_custo = 0.0
@@ -169,11 +207,11 @@ def calculate_custo_from_vw_despesas(ref_unique):
                 except (ValueError, TypeError):
                     continue
         
-        print(f"[DESPESAS_VIEW] {ref_unique}: {count_items} itens, Total: R$ {total_custo:,.2f}")
+        log_print(f"[DESPESAS_VIEW] {ref_unique}: {count_items} itens, Total: R$ {total_custo:,.2f}")
         return total_custo
         
     except Exception as e:
-        print(f"[DESPESAS_VIEW] Erro ao consultar despesas para {ref_unique}: {str(e)}")
+        log_printf("[DESPESAS_VIEW] Erro ao consultar despesas para %s: %s", ref_unique, str(e))
         return 0.0
 
 def enrich_data_with_armazenagem_kingspan(data, user_data):
@@ -189,16 +227,16 @@ def enrich_data_with_armazenagem_kingspan(data, user_data):
         
         tem_acesso, kingspan_cnpjs, can_edit = is_kingspan_user(user_data)
         
-        print(f"[ARMAZENAGEM] ===== DEBUG ENRIQUECIMENTO =====")
-        print(f"[ARMAZENAGEM] Usuário: {user_data.get('email')}")
-        print(f"[ARMAZENAGEM] Tem acesso Kingspan: {tem_acesso}")
-        print(f"[ARMAZENAGEM] CNPJs Kingspan: {kingspan_cnpjs}")
-        print(f"[ARMAZENAGEM] Pode editar: {can_edit}")
+        log_print(f"[ARMAZENAGEM] ===== DEBUG ENRIQUECIMENTO =====")
+        log_printf("[ARMAZENAGEM] Usuário: %s", user_data.get('email'))
+        log_printf("[ARMAZENAGEM] Tem acesso Kingspan: %s", tem_acesso)
+        log_printf("[ARMAZENAGEM] CNPJs Kingspan: %s", kingspan_cnpjs)
+        log_printf("[ARMAZENAGEM] Pode editar: %s", can_edit)
         
         if not tem_acesso:
             # Usuário não tem acesso - mas ainda precisa adicionar campos da view
-            print(f"[ARMAZENAGEM] Usuário não tem acesso aos dados Kingspan")
-            print(f"[ARMAZENAGEM] MAS: Adicionando campos que já vêm da view...")
+            log_print(f"[ARMAZENAGEM] Usuário não tem acesso aos dados Kingspan")
+            log_print(f"[ARMAZENAGEM] MAS: Adicionando campos que já vêm da view...")
             
             # IMPORTANTE: Mesmo sem acesso, os campos da view precisam ser copiados
             for item in data:
@@ -211,7 +249,7 @@ def enrich_data_with_armazenagem_kingspan(data, user_data):
                 is_kingspan_process = cnpj.startswith('00289348')  # CNPJ Kingspan
                 
                 if is_kingspan_process:
-                    print(f"[ARMAZENAGEM] Processo {item.get('ref_unique')} é Kingspan - copiando campos da view")
+                    log_printf("[ARMAZENAGEM] Processo %s é Kingspan - copiando campos da view", item.get('ref_unique'))
                     # Campos de produto que já vêm da view
                     item['po_cliente'] = item.get('po_cliente')
                     item['referencia_exportador'] = item.get('referencia_exportador')
@@ -236,9 +274,9 @@ def enrich_data_with_armazenagem_kingspan(data, user_data):
             
             return data
         
-        print(f"[ARMAZENAGEM] Enriquecendo {len(data)} processos com dados de armazenagem Kingspan...")
-        print(f"[ARMAZENAGEM] CNPJs Kingspan do usuário: {kingspan_cnpjs}")
-        print(f"[ARMAZENAGEM] Permissão de edição: {can_edit}")
+        log_printf("[ARMAZENAGEM] Enriquecendo %s processos com dados de armazenagem Kingspan...", len(data))
+        log_printf("[ARMAZENAGEM] CNPJs Kingspan do usuário: %s", kingspan_cnpjs)
+        log_printf("[ARMAZENAGEM] Permissão de edição: %s", can_edit)
         
         # Filtrar apenas processos Kingspan
         kingspan_ref_uniques = []
@@ -246,7 +284,7 @@ def enrich_data_with_armazenagem_kingspan(data, user_data):
             if item.get('cnpj_importador') in kingspan_cnpjs:
                 kingspan_ref_uniques.append(item.get('ref_unique'))
         
-        print(f"[ARMAZENAGEM] {len(kingspan_ref_uniques)} processos Kingspan encontrados")
+        log_printf("[ARMAZENAGEM] %s processos Kingspan encontrados", len(kingspan_ref_uniques))
         
         # Buscar dados de armazenagem em batch
         armazenagem_map = {}
@@ -260,7 +298,7 @@ def enrich_data_with_armazenagem_kingspan(data, user_data):
                 batch_size = 1000
                 for i in range(0, len(kingspan_ref_uniques), batch_size):
                     batch = kingspan_ref_uniques[i:i + batch_size]
-                    print(f"[ARMAZENAGEM] Processando lote {i//batch_size + 1}: {len(batch)} registros")
+                    log_printf("[ARMAZENAGEM] Processando lote %s: %s registros", i // batch_size + 1, len(batch))
                     table_used = None
                     result = None
 
@@ -276,13 +314,13 @@ def enrich_data_with_armazenagem_kingspan(data, user_data):
                                 table_used = table_name
                                 break
                         except Exception as inner_exc:
-                            print(f"[ARMAZENAGEM] Falha ao consultar tabela {table_name}: {inner_exc}")
+                            log_printf("[ARMAZENAGEM] Falha ao consultar tabela %s: %s", table_name, inner_exc)
                             continue
 
                     if table_used:
-                        print(f"[ARMAZENAGEM] Dados obtidos da tabela {table_used}")
+                        log_printf("[ARMAZENAGEM] Dados obtidos da tabela %s", table_used)
                     else:
-                        print('[ARMAZENAGEM] Nenhuma tabela de armazenagem retornou dados para este lote')
+                        log_print('[ARMAZENAGEM] Nenhuma tabela de armazenagem retornou dados para este lote')
 
                     if result and result.data:
                         for armazenagem in result.data:
@@ -295,14 +333,14 @@ def enrich_data_with_armazenagem_kingspan(data, user_data):
                                             date_obj = datetime.fromisoformat(armazenagem[date_field].replace('Z', '+00:00'))
                                             armazenagem[date_field] = date_obj.strftime('%d/%m/%Y')
                                         except Exception as parse_error:
-                                            print(f"[ARMAZENAGEM] Erro ao converter data {date_field}: {parse_error}")
+                                            log_printf("[ARMAZENAGEM] Erro ao converter data %s: %s", date_field, parse_error)
                                 
                                 armazenagem_map[ref_unique] = armazenagem
                 
-                print(f"[ARMAZENAGEM] Encontrados dados de armazenagem para {len(armazenagem_map)} processos")
+                log_printf("[ARMAZENAGEM] Encontrados dados de armazenagem para %s processos", len(armazenagem_map))
                 
             except Exception as e:
-                print(f"[ARMAZENAGEM] Erro na consulta batch: {str(e)}")
+                log_printf("[ARMAZENAGEM] Erro na consulta batch: %s", str(e))
                 armazenagem_map = {}
         
         # Enriquecer dados originais
@@ -324,13 +362,13 @@ def enrich_data_with_armazenagem_kingspan(data, user_data):
                 
                 # DEBUG CRÍTICO: Log do processo US25/0136
                 if ref_unique == 'US25/0136':
-                    print(f"[ARMAZENAGEM] ===== DEBUG PROCESSO US25/0136 =====")
-                    print(f"[ARMAZENAGEM] Campos originais da view:")
-                    print(f"[ARMAZENAGEM] - po_cliente: {item.get('po_cliente')}")
-                    print(f"[ARMAZENAGEM] - moeda: {item.get('moeda')}")
-                    print(f"[ARMAZENAGEM] - ptax: {item.get('ptax')}")
-                    print(f"[ARMAZENAGEM] - licenca_importacao: {item.get('licenca_importacao')}")
-                    print(f"[ARMAZENAGEM] =====================================")
+                    log_print(f"[ARMAZENAGEM] ===== DEBUG PROCESSO US25/0136 =====")
+                    log_print(f"[ARMAZENAGEM] Campos originais da view:")
+                    log_printf("[ARMAZENAGEM] - po_cliente: %s", item.get('po_cliente'))
+                    log_printf("[ARMAZENAGEM] - moeda: %s", item.get('moeda'))
+                    log_printf("[ARMAZENAGEM] - ptax: %s", item.get('ptax'))
+                    log_printf("[ARMAZENAGEM] - licenca_importacao: %s", item.get('licenca_importacao'))
+                    log_print(f"[ARMAZENAGEM] =====================================")
                 
                 # CAMPOS DE PRODUTO - SEMPRE copiar da view (independente de ter armazenagem)
                 # Esses campos já vêm de vw_importacoes_6_meses_abertos_dash
@@ -387,12 +425,12 @@ def enrich_data_with_armazenagem_kingspan(data, user_data):
             
             enriched_data.append(enriched_item)
         
-        print(f"[ARMAZENAGEM] Enriquecimento concluído: {total_enriquecidos}/{len(kingspan_ref_uniques)} processos Kingspan com dados de armazenagem")
-        print(f"[ARMAZENAGEM] Permissão de edição: {can_edit}")
+        log_printf("[ARMAZENAGEM] Enriquecimento concluído: %s/%s processos Kingspan com dados de armazenagem", total_enriquecidos, len(kingspan_ref_uniques))
+        log_printf("[ARMAZENAGEM] Permissão de edição: %s", can_edit)
         return enriched_data
         
     except Exception as e:
-        print(f"[ARMAZENAGEM] Erro no enriquecimento: {str(e)}")
+        log_printf("[ARMAZENAGEM] Erro no enriquecimento: %s", str(e))
         import traceback
         traceback.print_exc()
         # Retornar dados originais em caso de erro
@@ -478,7 +516,7 @@ def enrich_data_with_produtos_detalhados(data):
                     .in_('ref_unique', batch)
                 result = query.execute()
             except Exception as batch_error:
-                print(f"[PRODUTOS_DETALHADOS] Erro na consulta batch {index // batch_size + 1}: {batch_error}")
+                log_printf("[PRODUTOS_DETALHADOS] Erro na consulta batch %s: %s", index // batch_size + 1, batch_error)
                 continue
 
             if not result or not getattr(result, 'data', None):
@@ -519,11 +557,11 @@ def enrich_data_with_produtos_detalhados(data):
 
             enriched_data.append(enriched_item)
 
-        print(f"[PRODUTOS_DETALHADOS] Produtos detalhados aplicados em {total_aplicados} processos")
+        log_printf("[PRODUTOS_DETALHADOS] Produtos detalhados aplicados em %s processos", total_aplicados)
         return enriched_data
 
     except Exception as e:
-        print(f"[PRODUTOS_DETALHADOS] Erro no enriquecimento: {str(e)}")
+        log_printf("[PRODUTOS_DETALHADOS] Erro no enriquecimento: %s", str(e))
         import traceback
         traceback.print_exc()
         return data
@@ -534,11 +572,11 @@ def enrich_data_with_despesas_view(data):
     OTIMIZAÇÃO: Uma única consulta batch em vez de consultas individuais
     """
     try:
-        print(f"[DESPESAS_VIEW] Enriquecendo {len(data)} processos com dados da view de despesas...")
+        log_printf("[DESPESAS_VIEW] Enriquecendo %s processos com dados da view de despesas...", len(data))
         
         # Extrair todos os ref_unique de uma vez
         ref_uniques = [item.get('ref_unique') for item in data if item.get('ref_unique')]
-        print(f"[DESPESAS_VIEW] Consultando custos para {len(ref_uniques)} ref_unique únicos...")
+        log_printf("[DESPESAS_VIEW] Consultando custos para %s ref_unique únicos...", len(ref_uniques))
         
         # OTIMIZAÇÃO: Uma única consulta para todos os ref_unique
         despesas_map = {}
@@ -548,7 +586,7 @@ def enrich_data_with_despesas_view(data):
                 batch_size = 1000
                 for i in range(0, len(ref_uniques), batch_size):
                     batch = ref_uniques[i:i + batch_size]
-                    print(f"[DESPESAS_VIEW] Processando lote {i//batch_size + 1}: {len(batch)} registros")
+                    log_printf("[DESPESAS_VIEW] Processando lote %s: %s registros", i // batch_size + 1, len(batch))
                     
                     try:
                         # Consulta batch
@@ -578,17 +616,17 @@ def enrich_data_with_despesas_view(data):
                         # Tratar erro específico de view não encontrada
                         error_str = str(batch_error)
                         if '42P01' in error_str or 'does not exist' in error_str.lower():
-                            print(f"[DESPESAS_VIEW] ⚠️ View vw_despesas_6_meses não existe - usando fallback para JSON")
+                            log_print(f"[DESPESAS_VIEW] ⚠️ View vw_despesas_6_meses não existe - usando fallback para JSON")
                             # Marcar que a view não existe para evitar tentativas futuras
                             break
                         else:
-                            print(f"[DESPESAS_VIEW] Erro na consulta batch: {batch_error}")
+                            log_printf("[DESPESAS_VIEW] Erro na consulta batch: %s", batch_error)
                             continue
                 
-                print(f"[DESPESAS_VIEW] Encontrados custos para {len(despesas_map)} processos")
+                log_printf("[DESPESAS_VIEW] Encontrados custos para %s processos", len(despesas_map))
                 
             except Exception as e:
-                print(f"[DESPESAS_VIEW] Erro na consulta batch: {str(e)}")
+                log_printf("[DESPESAS_VIEW] Erro na consulta batch: %s", str(e))
                 despesas_map = {}
         
         # Enriquecer dados originais
@@ -623,15 +661,15 @@ def enrich_data_with_despesas_view(data):
             
             # Log para processo 6555 especificamente
             if ref_unique and '6555' in str(ref_unique):
-                print(f"[DESPESAS_VIEW] Processo 6555 -> View: R$ {custo_view:,.2f}, Original: R$ {custo_original:,.2f}")
+                log_print(f"[DESPESAS_VIEW] Processo 6555 -> View: R$ {custo_view:,.2f}, Original: R$ {custo_original:,.2f}")
             
             enriched_data.append(enriched_item)
         
-        print(f"[DESPESAS_VIEW] Enriquecimento concluído: {total_encontrados}/{len(data)} processos com custos encontrados na view | Fallback JSON: {fallback_original}")
+        log_printf("[DESPESAS_VIEW] Enriquecimento concluído: %s/%s processos com custos encontrados na view | Fallback JSON: %s", total_encontrados, len(data), fallback_original)
         return enriched_data
         
     except Exception as e:
-        print(f"[DESPESAS_VIEW] Erro no enriquecimento: {str(e)}")
+        log_printf("[DESPESAS_VIEW] Erro no enriquecimento: %s", str(e))
         return data  # Retornar dados originais em caso de erro
 
 # Blueprint com configuração para templates e static locais
@@ -894,7 +932,7 @@ def user_can_view_materials(user_data):
                         if any(cnpj in user_companies for cnpj in cnpjs_normalizados):
                             user_company_names.append(empresa.get('nome_cliente', '').upper())
                 
-                print(f"[MATERIALS_PERMISSION] Usuário {user_data.get('id')} vinculado às empresas: {user_company_names}")
+                log_printf("[MATERIALS_PERMISSION] Usuário %s vinculado às empresas: %s", user_data.get('id'), user_company_names)
                 
                 # Verificar se o usuário pertence a KINGSPAN ou CISER
                 allowed_companies = ['KINGSPAN', 'CISER']
@@ -903,17 +941,17 @@ def user_can_view_materials(user_data):
                     for company_name in user_company_names
                 )
                 
-                print(f"[MATERIALS_PERMISSION] Usuário pode ver materiais: {has_material_permission}")
+                log_printf("[MATERIALS_PERMISSION] Usuário pode ver materiais: %s", has_material_permission)
                 return has_material_permission
                 
             except Exception as e:
-                print(f"[MATERIALS_PERMISSION] Erro ao verificar empresas: {str(e)}")
+                log_printf("[MATERIALS_PERMISSION] Erro ao verificar empresas: %s", str(e))
                 return False
         
         return False
         
     except Exception as e:
-        print(f"[MATERIALS_PERMISSION] Erro na verificação de permissão: {str(e)}")
+        log_printf("[MATERIALS_PERMISSION] Erro na verificação de permissão: %s", str(e))
         return False
 
 @bp.route('/')
@@ -961,7 +999,7 @@ def index():
 def load_data():
     """Carregar dados da tabela importacoes_processos_aberta"""
     try:
-        print("[DASHBOARD_EXECUTIVO] Iniciando carregamento de dados da tabela...")
+        log_print("[DASHBOARD_EXECUTIVO] Iniciando carregamento de dados da tabela...")
         
         # Obter dados do usuário
         user_data = session.get('user', {})
@@ -987,7 +1025,7 @@ def load_data():
         try:
             user_data = session.get('user', {})
             user_id = user_data.get('id')
-            cached = data_cache.get_cache(user_id, 'dashboard_v2_data')
+            cached = dataset_cache.get(user_id, IMPORTACOES_ABERTOS_ENRIQUECIDO)
             if cached:
                 logger.debug(f"[DASHBOARD_EXECUTIVO] Retornando dados do cache após erro ({len(cached)} registros)")
                 return jsonify({'success': True, 'data': cached, 'total_records': len(cached), 'source': 'server_cache_fallback'})
@@ -1315,7 +1353,7 @@ def dashboard_charts():
         status_chart = {'labels': [], 'data': []}
         try:
             if 'status_timeline' in df.columns:
-                print('[DEBUG_CHARTS] Usando coluna status_timeline para Status Chart')
+                log_print('[DEBUG_CHARTS] Usando coluna status_timeline para Status Chart')
                 # Criar coluna display removendo números da frente
                 df_status_display = df.copy()
                 
@@ -1356,25 +1394,25 @@ def dashboard_charts():
                 }
                 
                 total_chart = sum(sorted_counts)
-                print(f'[DEBUG_CHARTS] Status Timeline (sem números): {sorted_labels}')
-                print(f'[DEBUG_CHARTS] Contagens: {sorted_counts}')
-                print(f'[DEBUG_CHARTS] Total no gráfico: {total_chart}')
+                log_printf("[DEBUG_CHARTS] Status Timeline (sem números): %s", sorted_labels)
+                log_printf("[DEBUG_CHARTS] Contagens: %s", sorted_counts)
+                log_printf("[DEBUG_CHARTS] Total no gráfico: %s", total_chart)
             elif 'status_macro_sistema' in df.columns:
-                print('[DEBUG_CHARTS] Usando coluna status_macro_sistema (fallback)')
+                log_print('[DEBUG_CHARTS] Usando coluna status_macro_sistema (fallback)')
                 status_counts = df['status_macro_sistema'].fillna('Sem Info').value_counts().head(10)
                 status_chart = {
                     'labels': status_counts.index.tolist(),
                     'data': status_counts.values.tolist()
                 }
             elif 'status_processo' in df.columns:
-                print('[DEBUG_CHARTS] Usando coluna status_processo (fallback 2)')
+                log_print('[DEBUG_CHARTS] Usando coluna status_processo (fallback 2)')
                 status_counts = df['status_processo'].fillna('Sem Info').value_counts().head(10)
                 status_chart = {
                     'labels': status_counts.index.tolist(),
                     'data': status_counts.values.tolist()
                 }
             else:
-                print('[DEBUG_CHARTS] Nenhuma coluna de status encontrada para o Status Chart')
+                log_print('[DEBUG_CHARTS] Nenhuma coluna de status encontrada para o Status Chart')
         except Exception as e:
             logger.debug(f"[DEBUG_CHARTS] Erro ao montar Status Chart: {e}")
 
@@ -1553,15 +1591,15 @@ def monthly_chart():
         # Debug para verificar filtro de datas
         data_inicio = request.args.get('data_inicio')
         data_fim = request.args.get('data_fim')
-        print(f"[MONTHLY_CHART] Filtro de datas: {data_inicio} até {data_fim}")
-        print(f"[MONTHLY_CHART] Dados após filtro: {len(df)} registros")
+        log_printf("[MONTHLY_CHART] Filtro de datas: %s até %s", data_inicio, data_fim)
+        log_printf("[MONTHLY_CHART] Dados após filtro: %s registros", len(df))
         
         # USAR CUSTO DA VIEW ENRIQUECIDA (custo_total_view calculado pelo enriquecimento)
-        print("[MONTHLY_CHART] Usando custos da view vw_despesas_6_meses via enriquecimento...")
+        log_print("[MONTHLY_CHART] Usando custos da view vw_despesas_6_meses via enriquecimento...")
         
         # Usar o custo_total_view que foi calculado durante o enriquecimento dos dados
         if 'custo_total_view' not in df.columns:
-            print("[MONTHLY_CHART] ERRO: Campo custo_total_view não encontrado! Usando fallback.")
+            log_print("[MONTHLY_CHART] ERRO: Campo custo_total_view não encontrado! Usando fallback.")
             df['custo_total_view'] = 0.0
         
         df['custo_calculado'] = df['custo_total_view'].astype(float)
@@ -1574,7 +1612,7 @@ def monthly_chart():
                 v = calculate_custo_from_despesas_processo(df.at[idx, 'despesas_processo'])
                 if v > 0:
                     df.at[idx, 'custo_calculado'] = v
-        print(f"[MONTHLY_CHART] Total custo calculado (com fallback): {df['custo_calculado'].sum():,.2f}")
+        log_print(f"[MONTHLY_CHART] Total custo calculado (com fallback): {df['custo_calculado'].sum():,.2f}")
         
         # Garantir colunas necessárias
         if 'data_abertura' not in df.columns:
@@ -1725,25 +1763,25 @@ def recent_operations():
         for op in operations_table_data:
             ref_unique = str(op.get('ref_unique', ''))
             if '6555' in ref_unique:
-                print(f"[RECENT_OPERATIONS] *** PROCESSO 6555 DADOS PARA FRONTEND (TABELA) ***")
-                print(f"[RECENT_OPERATIONS] ref_unique: {op.get('ref_unique', 'N/A')}")
-                print(f"[RECENT_OPERATIONS] custo_total (enviado): {op.get('custo_total', 'N/A')}")
-                print(f"[RECENT_OPERATIONS] custo_total_view: {op.get('custo_total_view', 'N/A')}")
-                print(f"[RECENT_OPERATIONS] custo_total_original: {op.get('custo_total_original', 'N/A')}")
+                log_print(f"[RECENT_OPERATIONS] *** PROCESSO 6555 DADOS PARA FRONTEND (TABELA) ***")
+                log_printf("[RECENT_OPERATIONS] ref_unique: %s", op.get('ref_unique', 'N/A'))
+                log_printf("[RECENT_OPERATIONS] custo_total (enviado): %s", op.get('custo_total', 'N/A'))
+                log_printf("[RECENT_OPERATIONS] custo_total_view: %s", op.get('custo_total_view', 'N/A'))
+                log_printf("[RECENT_OPERATIONS] custo_total_original: %s", op.get('custo_total_original', 'N/A'))
                 break
         
         # Log específico para o processo 5360 - verificar data_fechamento
         for op in operations_all_data:
             ref_unique = str(op.get('ref_unique', ''))
             if '5360' in ref_unique:
-                print(f"[RECENT_OPERATIONS] *** PROCESSO 5360 DADOS PARA FRONTEND (COMPLETO) ***")
-                print(f"[RECENT_OPERATIONS] ref_unique: {op.get('ref_unique', 'N/A')}")
-                print(f"[RECENT_OPERATIONS] data_abertura: {op.get('data_abertura', 'N/A')}")
-                print(f"[RECENT_OPERATIONS] data_embarque: {op.get('data_embarque', 'N/A')}")
-                print(f"[RECENT_OPERATIONS] data_chegada: {op.get('data_chegada', 'N/A')}")
-                print(f"[RECENT_OPERATIONS] data_fechamento: {op.get('data_fechamento', 'N/A')}")
-                print(f"[RECENT_OPERATIONS] data_registro: {op.get('data_registro', 'N/A')}")
-                print(f"[RECENT_OPERATIONS] Campos disponíveis: {list(op.keys())}")
+                log_print(f"[RECENT_OPERATIONS] *** PROCESSO 5360 DADOS PARA FRONTEND (COMPLETO) ***")
+                log_printf("[RECENT_OPERATIONS] ref_unique: %s", op.get('ref_unique', 'N/A'))
+                log_printf("[RECENT_OPERATIONS] data_abertura: %s", op.get('data_abertura', 'N/A'))
+                log_printf("[RECENT_OPERATIONS] data_embarque: %s", op.get('data_embarque', 'N/A'))
+                log_printf("[RECENT_OPERATIONS] data_chegada: %s", op.get('data_chegada', 'N/A'))
+                log_printf("[RECENT_OPERATIONS] data_fechamento: %s", op.get('data_fechamento', 'N/A'))
+                log_printf("[RECENT_OPERATIONS] data_registro: %s", op.get('data_registro', 'N/A'))
+                log_printf("[RECENT_OPERATIONS] Campos disponíveis: %s", list(op.keys()))
                 break
         
         return jsonify({
@@ -1837,7 +1875,7 @@ def force_refresh_dashboard():
     VERSÃO OTIMIZADA: Consulta batch de despesas
     """
     try:
-        print("[DASHBOARD_EXECUTIVO] === INICIANDO FORCE REFRESH OTIMIZADO ===")
+        log_print("[DASHBOARD_EXECUTIVO] === INICIANDO FORCE REFRESH OTIMIZADO ===")
         
         # Obter dados do usuário
         user_data = session.get('user', {})
@@ -1847,19 +1885,21 @@ def force_refresh_dashboard():
         # 1. Limpar cache do usuário
         logger.debug(f"[DASHBOARD_EXECUTIVO] Limpando cache para user_id: {user_id}")
         data_cache.clear_user_cache(user_id)
+        dataset_cache.invalidate(user_id)
         
         # 2. Limpar cache da sessão também
         if 'dashboard_v2_loaded' in session:
             del session['dashboard_v2_loaded']
         
         # 3. Buscar dados frescos do banco
-        print("[DASHBOARD_EXECUTIVO] Buscando dados frescos do banco...")
+        log_print("[DASHBOARD_EXECUTIVO] Buscando dados frescos do banco...")
         
         # Query base da view com dados de despesas - SEMPRE buscar dados frescos (já filtrada)
         query = supabase_admin.table('vw_importacoes_6_meses_abertos_dash').select('*')
         
         # REGRA CORRIGIDA: Filtrar por CNPJs apenas para clientes e internos não-admin
         perfil_principal = user_data.get('perfil_principal', '')
+        user_cnpjs = None
         
         if user_role == 'cliente_unique' or (user_role == 'interno_unique' and perfil_principal not in ['admin_operacao', 'master_admin']):
             user_cnpjs = get_user_companies(user_data)
@@ -1875,8 +1915,9 @@ def force_refresh_dashboard():
         else:
             logger.debug(f"[DASHBOARD_EXECUTIVO] Admin operacional ({perfil_principal}) - visualizando todos os dados")
         
-        # Executar query
-        result = query.execute()
+        # Executar query (view inteira: leitura pesada)
+        with call_class('report'):
+            result = query.execute()
         
         if not result.data:
             return jsonify({
@@ -1888,13 +1929,13 @@ def force_refresh_dashboard():
         logger.debug(f"[DASHBOARD_EXECUTIVO] Dados frescos carregados: {len(result.data)} registros")
         
         # 4. Enriquecer dados com custos da view vw_despesas_6_meses (VERSÃO OTIMIZADA)
-        print("[DASHBOARD_EXECUTIVO] Force refresh - Enriquecendo dados com custos (versão otimizada)...")
+        log_print("[DASHBOARD_EXECUTIVO] Force refresh - Enriquecendo dados com custos (versão otimizada)...")
         enriched_data = enrich_data_with_despesas_view(result.data)
         enriched_data = enrich_data_with_armazenagem_kingspan(enriched_data, user_data)
         enriched_data = enrich_data_with_produtos_detalhados(enriched_data)
         
         # 5. Armazenar dados frescos ENRIQUECIDOS no cache
-        data_cache.set_cache(user_id, 'dashboard_v2_data', enriched_data)
+        dataset_cache.set(user_id, IMPORTACOES_ABERTOS_ENRIQUECIDO, enriched_data, scope=user_cnpjs)
         session['dashboard_v2_loaded'] = True
         
         logger.debug(f"[DASHBOARD_EXECUTIVO] Cache atualizado com dados frescos para user_id: {user_id}")
@@ -2097,7 +2138,7 @@ def bootstrap_dashboard():
         charts = {}
         # Debug: Verificar colunas disponíveis para diagnóstico de charts vazios
         if not df.empty:
-            print(f"[DEBUG_BOOTSTRAP] Colunas disponíveis no DF: {df.columns.tolist()}")
+            log_printf("[DEBUG_BOOTSTRAP] Colunas disponíveis no DF: %s", df.columns.tolist())
 
         if 'data_abertura' in df.columns:
             df['data_abertura_dt'] = pd.to_datetime(df['data_abertura'], format='%d/%m/%Y', errors='coerce')
@@ -2114,29 +2155,29 @@ def bootstrap_dashboard():
         # Alinhar com a coluna usada na tabela: status_macro_sistema (fallback para status_processo)
         try:
             if 'status_macro_sistema' in df.columns:
-                print('[DEBUG_BOOTSTRAP] Usando coluna para Status Chart: status_macro_sistema')
+                log_print('[DEBUG_BOOTSTRAP] Usando coluna para Status Chart: status_macro_sistema')
                 status_counts = df['status_macro_sistema'].fillna('Sem Info').value_counts().head(10)
                 charts['status'] = {'labels': status_counts.index.tolist(),'data': status_counts.values.tolist()}
             elif 'status_sistema' in df.columns: # Fallback prioritário (baseado no dashboard.js)
-                print('[DEBUG_BOOTSTRAP] Usando coluna para Status Chart: status_sistema')
+                log_print('[DEBUG_BOOTSTRAP] Usando coluna para Status Chart: status_sistema')
                 status_counts = df['status_sistema'].fillna('Sem Info').value_counts().head(10)
                 charts['status'] = {'labels': status_counts.index.tolist(),'data': status_counts.values.tolist()}
             elif 'status_processo' in df.columns:
-                print('[DEBUG_BOOTSTRAP] Usando coluna para Status Chart: status_processo (fallback)')
+                log_print('[DEBUG_BOOTSTRAP] Usando coluna para Status Chart: status_processo (fallback)')
                 status_counts = df['status_processo'].fillna('Sem Info').value_counts().head(10)
                 charts['status'] = {'labels': status_counts.index.tolist(),'data': status_counts.values.tolist()}
             elif 'Status' in df.columns: # Fallback extra
-                print('[DEBUG_BOOTSTRAP] Usando coluna para Status Chart: Status (fallback extra)')
+                log_print('[DEBUG_BOOTSTRAP] Usando coluna para Status Chart: Status (fallback extra)')
                 status_counts = df['Status'].fillna('Sem Info').value_counts().head(10)
                 charts['status'] = {'labels': status_counts.index.tolist(),'data': status_counts.values.tolist()}
             elif 'fase_atual' in df.columns: # Outro possível nome
-                print('[DEBUG_BOOTSTRAP] Usando coluna para Status Chart: fase_atual (fallback extra)')
+                log_print('[DEBUG_BOOTSTRAP] Usando coluna para Status Chart: fase_atual (fallback extra)')
                 status_counts = df['fase_atual'].fillna('Sem Info').value_counts().head(10)
                 charts['status'] = {'labels': status_counts.index.tolist(),'data': status_counts.values.tolist()}
             else:
-                print('[DEBUG_BOOTSTRAP] Nenhuma coluna de status encontrada para o Status Chart')
+                log_print('[DEBUG_BOOTSTRAP] Nenhuma coluna de status encontrada para o Status Chart')
         except Exception as e:
-            print(f"[DEBUG_BOOTSTRAP] Erro ao montar Status Chart: {e}")
+            log_printf("[DEBUG_BOOTSTRAP] Erro ao montar Status Chart: %s", e)
         # Países de Procedência (Adicionado para corrigir chart faltante)
         # Países de Procedência (Adicionado para corrigir chart faltante)
         if 'pais_procedencia' in df.columns:
@@ -0,0 +1,223 @@
+"""
+Cubo em memória do dashboard operacional.
+
+`importacoes_processos_operacional` é carregada uma vez por janela de
+atualização e indexada por período (ano/mês/dia). Cada endpoint do dashboard
+fatia este cubo em vez de baixar a tabela inteira e reagrupá-la.
+
+Dimensões: cliente, analista, modal, canal, day (AAAA-MM-DD), month (AAAA-MM)
+Medidas:   count, sla_dias (média), desempenho (média), lead_time_dias (média)
+
+Filtro só por mês (sem ano) considera o mesmo mês em todos os anos carregados.
+"""
+
+from collections import defaultdict
+from datetime import datetime
+import logging
+import os
+import threading
+import time
+
+from extensions import supabase_admin
+from services.single_flight import single_flight
+from services.supabase_transport import call_class
+
+logger = logging.getLogger(__name__)
+
+CUBE_TABLE = 'importacoes_processos_operacional'
+CUBE_TTL_SECONDS = int(os.getenv('OPERACIONAL_CUBE_TTL', '300'))
+CUBE_PAGE_SIZE = 1000
+
+
+def _parse_date(value):
+    """Converte data_registro/data_fechamento (data ISO, timestamp ISO ou DD/MM/AAAA)"""
+    if not value or not isinstance(value, str):
+        return None
+    for fmt, size in (('%Y-%m-%d', 10), ('%d/%m/%Y', 10)):
+        try:
+            return datetime.strptime(value[:size], fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _avg(values, digits=1):
+    return round(sum(values) / len(values), digits) if values else None
+
+
+class OperacionalCube:
+    """Fatos da tabela operacional indexados por período para fatiamento barato"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.built_at = time.time()
+        self.by_day = defaultdict(list)
+        self.by_month = defaultdict(list)
+        self.by_year = defaultdict(list)
+        self.lead_time = {}
+
+        for idx, row in enumerate(rows):
+            data_registro = row.get('data_registro')
+            if not data_registro or not isinstance(data_registro, str) or len(data_registro) < 10:
+                continue
+            try:
+                year = int(data_registro[:4])
+                month = int(data_registro[5:7])
+            except (ValueError, TypeError):
+                continue
+            self.by_year[year].append(idx)
+            self.by_month[(year, month)].append(idx)
+            self.by_day[data_registro[:10]].append(idx)
+
+            reg_date = _parse_date(data_registro)
+            close_date = _parse_date(row.get('data_fechamento'))
+            if reg_date and close_date:
+                self.lead_time[idx] = (close_date - reg_date).days
+
+    def is_fresh(self):
+        return (time.time() - self.built_at) < CUBE_TTL_SECONDS
+
+    def _period_indexes(self, year=None, month=None, day=None):
+        if day:
+            return self.by_day.get(day[:10], [])
+        if year and month:
+            return self.by_month.get((int(year), int(month)), [])
+        if year:
+            return self.by_year.get(int(year), [])
+        if month:
+            # Mesmo mês em todos os anos carregados
+            return [idx for (_, m), idxs in sorted(self.by_month.items()) if m == int(month) for idx in idxs]
+        return range(len(self.rows))
+
+    def slice_indexes(self, year=None, month=None, day=None, companies=None, company_field='cliente', **filters):
+        """Índices das linhas de um período, com filtros de igualdade por dimensão.
+
+        - companies: lista opcional de valores permitidos em company_field
+        - filters: cliente=..., analista=..., modal=..., canal=... (None é ignorado)
+        """
+        indexes = self._period_indexes(year, month, day)
+        active = {dim: value for dim, value in filters.items() if value is not None}
+        if not active and companies is None:
+            return list(indexes)
+        allowed = set(companies) if companies is not None else None
+        result = []
+        for idx in indexes:
+            row = self.rows[idx]
+            if allowed is not None and row.get(company_field) not in allowed:
+                continue
+            if any(row.get(dim) != value for dim, value in active.items()):
+                continue
+            result.append(idx)
+        return result
+
+    def slice(self, **kwargs):
+        """Linhas de uma fatia (ver slice_indexes)"""
+        return [self.rows[idx] for idx in self.slice_indexes(**kwargs)]
+
+    def count_by(self, dimension, indexes, default=None, skip_blank=False):
+        """Contagem das linhas de uma fatia agrupadas por uma dimensão"""
+        counts = {}
+        for idx in indexes:
+            row = self.rows[idx]
+            if dimension == 'day':
+                value = (row.get('data_registro') or '')[:10]
+            elif dimension == 'month':
+                value = (row.get('data_registro') or '')[:7]
+            else:
+                value = row.get(dimension)
+            if skip_blank and not (value and isinstance(value, str) and value.strip()):
+                continue
+            if not value:
+                if default is None:
+                    continue
+                value = default
+            counts[value] = counts.get(value, 0) + 1
+        return counts
+
+    def group_indexes(self, dimension, indexes):
+        """Divide uma fatia por uma dimensão, ignorando valores em branco"""
+        groups = {}
+        for idx in indexes:
+            value = self.rows[idx].get(dimension)
+            if not (value and isinstance(value, str) and value.strip()):
+                continue
+            groups.setdefault(value, []).append(idx)
+        return groups
+
+    def measures(self, indexes):
+        """Medidas agregadas de uma fatia"""
+        sla = [self.rows[idx]['sla_dias'] for idx in indexes if self.rows[idx].get('sla_dias') is not None]
+        desempenho = [int(self.rows[idx]['desempenho']) for idx in indexes if self.rows[idx].get('desempenho') is not None]
+        lead = [self.lead_time[idx] for idx in indexes if idx in self.lead_time]
+        return {
+            'count': len(indexes),
+            'sla_medio': _avg(sla),
+            'desempenho_medio': _avg(desempenho),
+            'lead_time_medio': _avg(lead),
+            'sla_values': sla,
+            'desempenho_values': desempenho,
+        }
+
+    @staticmethod
+    def previous_year_period(year, month=None):
+        """Mesmo período um ano antes (Set/2025 -> Set/2024, 2025 -> 2024)"""
+        return int(year) - 1, (int(month) if month else None)
+
+    @staticmethod
+    def previous_month_period(year, month=None):
+        """Mês anterior (ou ano anterior quando não há mês)"""
+        if not month:
+            return int(year) - 1, None
+        prev_month = int(month) - 1
+        if prev_month == 0:
+            return int(year) - 1, 12
+        return int(year), prev_month
+
+
+_cube = None
+_cube_lock = threading.Lock()
+
+
+@call_class('report')
+def _load_rows():
+    """Percorre a tabela inteira em páginas (um select único é truncado no limite de linhas do PostgREST)"""
+    rows = []
+    offset = 0
+    while True:
+        response = supabase_admin.table(CUBE_TABLE).select('*')\
+            .order('id_processo')\
+            .range(offset, offset + CUBE_PAGE_SIZE - 1)\
+            .execute()
+        page = response.data or []
+        rows.extend(page)
+        if len(page) < CUBE_PAGE_SIZE:
+            break
+        offset += CUBE_PAGE_SIZE
+    return rows
+
+
+def _build_cube():
+    started = time.time()
+    cube = OperacionalCube(_load_rows())
+    logger.info(f"[OPERACIONAL_CUBE] Cubo construído: {len(cube.rows)} registros em {time.time() - started:.2f}s")
+    return cube
+
+
+def get_operacional_cube(force=False):
+    """Cubo atual, reconstruído uma vez por janela de atualização"""
+    global _cube
+    cube = _cube
+    if cube is not None and cube.is_fresh() and not force:
+        return cube
+    cube = single_flight.do(f'{CUBE_TABLE}:cube', _build_cube)
+    with _cube_lock:
+        if _cube is None or cube.built_at >= _cube.built_at:
+            _cube = cube
+    return cube
+
+
+def invalidate_operacional_cube():
+    """Descarta o cubo para a próxima requisição reconstruí-lo"""
+    global _cube
+    with _cube_lock:
+        _cube = None
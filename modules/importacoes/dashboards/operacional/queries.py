@@ -0,0 +1,168 @@
+"""
+Consultas analíticas nomeadas do dashboard operacional.
+
+Cada consulta é declarada uma única vez com parâmetros tipados (ver
+services.named_queries); período e empresas são filtros opcionais, então o
+texto SQL é estável para cada combinação e os valores seguem sempre como
+parâmetros.
+
+Todas leem `importacoes_processos_operacional`, a mesma tabela carregada pelo
+cubo do dashboard (cube.CUBE_TABLE): cliente, analista, sla_dias e desempenho
+só existem nela, não em `importacoes_processos_aberta`.
+"""
+
+from services.named_queries import register_query
+
+OPERACIONAL_QUERY_TTL = 120
+
+PERIOD_FILTERS = {
+    'year': "EXTRACT(year FROM data_registro::date) = %(year)s",
+    'month': "EXTRACT(month FROM data_registro::date) = %(month)s",
+    'companies': "cliente IN ({companies})",
+}
+PERIOD_PARAMS = {'year': int, 'month': int, 'companies': list}
+
+# Colunas permitidas nos totais agrupados (antes interpoladas direto no SQL)
+TOTALS_GROUP_COLUMNS = ('cliente', 'analista', 'modal')
+
+for _column in TOTALS_GROUP_COLUMNS:
+    register_query(
+        f'operacional.totals_by_{_column}',
+        f"""
+            SELECT
+                {_column},
+                COUNT(*) as total_registros
+            FROM importacoes_processos_operacional
+            {{where}}
+            GROUP BY {_column}
+            ORDER BY total_registros DESC
+        """,
+        params=PERIOD_PARAMS,
+        filters=PERIOD_FILTERS,
+        ttl=OPERACIONAL_QUERY_TTL,
+    )
+
+register_query(
+    'operacional.analyst_performance',
+    """
+        SELECT
+            analista,
+            COUNT(*) as total_registros,
+            AVG(CASE WHEN data_fechamento IS NOT NULL THEN sla_dias END) as sla_medio
+        FROM importacoes_processos_operacional
+        WHERE analista IS NOT NULL {and_filters}
+        GROUP BY analista
+        ORDER BY total_registros DESC
+    """,
+    params=PERIOD_PARAMS,
+    filters=PERIOD_FILTERS,
+    ttl=OPERACIONAL_QUERY_TTL,
+)
+
+register_query(
+    'operacional.modal_distribution',
+    """
+        SELECT
+            modal,
+            COUNT(*) as total
+        FROM importacoes_processos_operacional
+        WHERE modal IS NOT NULL {and_filters}
+        GROUP BY modal
+        ORDER BY total DESC
+    """,
+    params=PERIOD_PARAMS,
+    filters=PERIOD_FILTERS,
+    ttl=OPERACIONAL_QUERY_TTL,
+)
+
+register_query(
+    'operacional.canal_distribution',
+    """
+        SELECT
+            COALESCE(canal, 'Não informado') as canal,
+            COUNT(*) as total
+        FROM importacoes_processos_operacional
+        {where}
+        GROUP BY canal
+        ORDER BY total DESC
+    """,
+    params=PERIOD_PARAMS,
+    filters=PERIOD_FILTERS,
+    ttl=OPERACIONAL_QUERY_TTL,
+)
+
+register_query(
+    'operacional.calendar',
+    """
+        SELECT
+            data_registro::date as date,
+            COUNT(*) as count
+        FROM importacoes_processos_operacional
+        {where}
+        GROUP BY data_registro::date
+        ORDER BY date
+    """,
+    params=PERIOD_PARAMS,
+    filters=PERIOD_FILTERS,
+    ttl=OPERACIONAL_QUERY_TTL,
+)
+
+register_query(
+    'operacional.alert_processes',
+    """
+        SELECT
+            ref_unique,
+            cliente,
+            analista,
+            data_registro,
+            ABS(desempenho) as dias_aberto
+        FROM importacoes_processos_operacional
+        WHERE data_fechamento IS NULL
+        {and_filters}
+        ORDER BY dias_aberto DESC
+        LIMIT 10
+    """,
+    params={'companies': list},
+    filters={'companies': PERIOD_FILTERS['companies']},
+    ttl=OPERACIONAL_QUERY_TTL,
+)
+
+register_query(
+    'operacional.sla_comparison',
+    """
+        SELECT
+            analista,
+            MIN(sla_dias) as min_sla,
+            PERCENTILE_CONT(0.25) WITHIN GROUP (ORDER BY sla_dias) as q1_sla,
+            PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY sla_dias) as median_sla,
+            PERCENTILE_CONT(0.75) WITHIN GROUP (ORDER BY sla_dias) as q3_sla,
+            MAX(sla_dias) as max_sla
+        FROM importacoes_processos_operacional
+        WHERE analista IS NOT NULL
+        AND data_fechamento IS NOT NULL
+        AND sla_dias IS NOT NULL
+        {and_filters}
+        GROUP BY analista
+        HAVING COUNT(*) >= 3
+        ORDER BY median_sla
+    """,
+    params=PERIOD_PARAMS,
+    filters=PERIOD_FILTERS,
+    ttl=OPERACIONAL_QUERY_TTL,
+)
+
+register_query(
+    'operacional.client_modals',
+    """
+        SELECT
+            modal,
+            COUNT(*) as total_registros
+        FROM importacoes_processos_operacional
+        WHERE cliente = %(client)s AND modal IS NOT NULL
+        {and_filters}
+        GROUP BY modal
+    """,
+    params={'client': str, 'year': int, 'month': int},
+    filters={'year': PERIOD_FILTERS['year'], 'month': PERIOD_FILTERS['month']},
+    ttl=OPERACIONAL_QUERY_TTL,
+)
@@ -8,6 +8,10 @@ from datetime import datetime, timedelta
 import logging
 from functools import wraps
 import os
+import time
+from modules.importacoes.dashboards.operacional.cube import get_operacional_cube, invalidate_operacional_cube, OperacionalCube
+from modules.importacoes.dashboards.operacional.queries import TOTALS_GROUP_COLUMNS
+from services.named_queries import run_query, run_queries, invalidate_query_cache
 
 # Create blueprint
 dashboard_operacional = Blueprint('dashboard_operacional', __name__,
@@ -86,39 +90,13 @@ def get_dashboard_data():
         year = request.args.get('year', type=int)
         month = request.args.get('month', type=int)
         
-        # Get all data from correct table
-        response = supabase_admin.table('importacoes_processos_operacional').select('*').execute()
-        all_data = response.data
-        
-        # Filter by date using Python (data_registro is in YYYY-MM-DD format)
-        filtered_data = all_data
-        if year or month:
-            filtered_data = []
-            for record in all_data:
-                data_registro_str = record.get('data_registro', '')
-                if data_registro_str and isinstance(data_registro_str, str):
-                    try:
-                        # Parse YYYY-MM-DD format
-                        if len(data_registro_str) >= 10:  # YYYY-MM-DD
-                            year_str = data_registro_str[:4]
-                            month_str = data_registro_str[5:7]
-                            
-                            if year_str and month_str:
-                                record_year = int(year_str)
-                                record_month = int(month_str)
-                                
-                                # Apply filters
-                                if year and month:
-                                    if record_year == year and record_month == month:
-                                        filtered_data.append(record)
-                                elif year:
-                                    if record_year == year:
-                                        filtered_data.append(record)
-                    except (ValueError, TypeError):
-                        continue  # Skip invalid dates
+        # Slice the precomputed cube (data_registro is in YYYY-MM-DD format)
+        cube = get_operacional_cube()
+        period_indexes = cube.slice_indexes(year=year, month=month)
+        period_measures = cube.measures(period_indexes)
         
         # Calculate KPIs
-        total_processos = len(filtered_data)
+        total_processos = period_measures['count']
         
         # Get meta from fin_metas_projecoes table
         meta_mensal = 0
@@ -138,73 +116,22 @@ def get_dashboard_data():
         meta_a_realizar = max(0, meta_mensal - total_processos) if meta_mensal > 0 else 0
         
         # Calculate average SLA
-        sla_values = [record.get('sla_dias') for record in filtered_data if record.get('sla_dias') is not None]
-        sla_medio = round(sum(sla_values) / len(sla_values), 1) if sla_values else None
-        
-        # Get unique clients
-        unique_clients = {}
-        for record in filtered_data:
-            cliente = record.get('cliente', '')
-            if cliente and isinstance(cliente, str) and cliente.strip():
-                if cliente not in unique_clients:
-                    unique_clients[cliente] = {
-                        'nome': cliente,
-                        'total_processos': 0,
-                        'sla_medio': [],
-                        'canais': {}
-                    }
-                unique_clients[cliente]['total_processos'] += 1
-                
-                # Add SLA for average calculation
-                sla = record.get('sla_dias')
-                if sla is not None:
-                    unique_clients[cliente]['sla_medio'].append(sla)
-                
-                # Count canais
-                canal = record.get('canal', 'N/A')
-                if not canal:
-                    canal = 'N/A'
-                if canal not in unique_clients[cliente]['canais']:
-                    unique_clients[cliente]['canais'][canal] = 0
-                unique_clients[cliente]['canais'][canal] += 1
+        sla_medio = period_measures['sla_medio']
         
         # Get data from same period in previous year for comparison
         previous_year_data = {}
         if year:
             try:
-                if month:
-                    # Same month in previous year
-                    prev_year = int(year) - 1
-                    prev_month = int(month)
-                    prev_year_records = [r for r in all_data 
-                                       if r.get('data_registro', '')[:4] == str(prev_year) 
-                                       and r.get('data_registro', '')[5:7] == f"{prev_month:02d}"]
-                else:
-                    # Previous year (all months)
-                    prev_year = int(year) - 1
-                    prev_year_records = [r for r in all_data 
-                                       if r.get('data_registro', '')[:4] == str(prev_year)]
-                
-                # Count by client in previous period
-                for record in prev_year_records:
-                    cliente = record.get('cliente', '')
-                    if cliente and isinstance(cliente, str) and cliente.strip():
-                        if cliente not in previous_year_data:
-                            previous_year_data[cliente] = 0
-                        previous_year_data[cliente] += 1
-                        
+                prev_year, prev_month = OperacionalCube.previous_year_period(year, month)
+                prev_indexes = cube.slice_indexes(year=prev_year, month=prev_month)
+                previous_year_data = cube.count_by('cliente', prev_indexes, skip_blank=True)
             except Exception as e:
                 logger.error(f"Erro ao obter dados do período anterior: {str(e)}")
         
-        # Convert to list and calculate averages with period comparison
+        # Clients with period comparison
         clients_list = []
-        for cliente_data in unique_clients.values():
-            sla_values = cliente_data['sla_medio']
-            avg_sla = round(sum(sla_values) / len(sla_values), 1) if sla_values else None
-            
-            # Get previous year data for this client
-            cliente_nome = cliente_data['nome']
-            total_atual = cliente_data['total_processos']
+        for cliente_nome, cliente_indexes in cube.group_indexes('cliente', period_indexes).items():
+            total_atual = len(cliente_indexes)
             total_anterior = previous_year_data.get(cliente_nome, 0)
             
             # Calculate variation percentage
@@ -218,98 +145,35 @@ def get_dashboard_data():
                 'total_processos': total_atual,
                 'periodo_anterior': total_anterior,
                 'variacao_percent': variacao_percent,
-                'sla_medio': avg_sla,
-                'canais': cliente_data['canais']
+                'sla_medio': cube.measures(cliente_indexes)['sla_medio'],
+                'canais': cube.count_by('canal', cliente_indexes, default='N/A')
             })
         
         clients_list.sort(key=lambda x: x['total_processos'], reverse=True)
         
-        # Get unique analysts
-        unique_analysts = {}
-        for record in filtered_data:
-            analista = record.get('analista', '')
-            if analista and isinstance(analista, str) and analista.strip():
-                if analista not in unique_analysts:
-                    unique_analysts[analista] = {
-                        'nome': analista,
-                        'total_processos': 0,
-                        'sla_medio': [],
-                        'desempenho_medio': []
-                    }
-                unique_analysts[analista]['total_processos'] += 1
-                
-                # Add SLA and performance for averages
-                sla = record.get('sla_dias')
-                if sla is not None:
-                    unique_analysts[analista]['sla_medio'].append(sla)
-                
-                desempenho = record.get('desempenho')
-                if desempenho is not None:
-                    unique_analysts[analista]['desempenho_medio'].append(int(desempenho))
-        
-        # Convert analysts to list
+        # Analysts
         analysts_list = []
-        for analyst_data in unique_analysts.values():
-            sla_values = analyst_data['sla_medio']
-            perf_values = analyst_data['desempenho_medio']
-            
-            avg_sla = round(sum(sla_values) / len(sla_values), 1) if sla_values else None
-            avg_perf = round(sum(perf_values) / len(perf_values), 1) if perf_values else None
-            
+        for analista_nome, analista_indexes in cube.group_indexes('analista', period_indexes).items():
+            analista_measures = cube.measures(analista_indexes)
             analysts_list.append({
-                'nome': analyst_data['nome'],
-                'total_processos': analyst_data['total_processos'],
-                'sla_medio': avg_sla,
-                'desempenho_medio': avg_perf
+                'nome': analista_nome,
+                'total_processos': analista_measures['count'],
+                'sla_medio': analista_measures['sla_medio'],
+                'desempenho_medio': analista_measures['desempenho_medio']
             })
         
         analysts_list.sort(key=lambda x: x['total_processos'], reverse=True)
         
-        # Calculate distribution by modal
-        modal_distribution = {}
-        for record in filtered_data:
-            modal = record.get('modal', 'N/A')
-            if not modal:
-                modal = 'N/A'
-            if modal not in modal_distribution:
-                modal_distribution[modal] = 0
-            modal_distribution[modal] += 1
-        
-        modal_dist_list = [{'label': k, 'value': v} for k, v in modal_distribution.items()]
-        
-        # Calculate distribution by canal
-        canal_distribution = {}
-        for record in filtered_data:
-            canal = record.get('canal', 'N/A')
-            if not canal:
-                canal = 'N/A'
-            if canal not in canal_distribution:
-                canal_distribution[canal] = 0
-            canal_distribution[canal] += 1
-        
-        canal_dist_list = [{'label': k, 'value': v} for k, v in canal_distribution.items()]
+        # Distribution by modal and canal
+        modal_dist_list = [{'label': k, 'value': v} for k, v in cube.count_by('modal', period_indexes, default='N/A').items()]
+        canal_dist_list = [{'label': k, 'value': v} for k, v in cube.count_by('canal', period_indexes, default='N/A').items()]
         
         # Calendar data - group by date
-        calendar_data = []
-        date_counts = {}
-        for record in filtered_data:
-            data_str = record.get('data_registro', '')
-            if data_str and isinstance(data_str, str) and len(data_str) >= 10:
-                # Already in YYYY-MM-DD format
-                date_key = data_str[:10]  # Take only YYYY-MM-DD part
-                if date_key not in date_counts:
-                    date_counts[date_key] = 0
-                date_counts[date_key] += 1
-        
-        for date, count in date_counts.items():
-            calendar_data.append({
-                'date': date,
-                'count': count
-            })
+        calendar_data = [{'date': date, 'count': count} for date, count in cube.count_by('day', period_indexes).items()]
         
         # Alerts - processes with high SLA or performance issues
         alerts = []
-        for record in filtered_data:
+        for record in (cube.rows[idx] for idx in period_indexes):
             sla = record.get('sla_dias')
             if sla and sla > 30:  # SLA above 30 days
                 alerts.append({
@@ -443,164 +307,109 @@ def get_meta_data(year, month):
         logger.error(f"Erro ao obter meta: {str(e)}")
         return 0
 
-def get_client_performance_data(year, month, where_clause, params):
+def _companies_param(user_companies):
+    """Company restriction for named queries (None = no restriction)"""
+    return list(user_companies) if user_companies else None
+
+def _format_client_performance(current_rows, previous_rows):
+    previous_data = {row['cliente']: row['total_registros'] for row in previous_rows}
+    clients = []
+    for row in current_rows:
+        clients.append({
+            'cliente': row['cliente'],
+            'total_registros': row['total_registros'],
+            'periodo_anterior': previous_data.get(row['cliente'], 0)
+        })
+    return sorted(clients, key=lambda x: x['total_registros'], reverse=True)[:20]  # Top 20
+
+def _format_analyst_performance(rows):
+    return [{
+        'analista': row['analista'],
+        'total_registros': row['total_registros'],
+        'sla_medio': float(row['sla_medio']) if row['sla_medio'] else None
+    } for row in rows]
+
+def _format_calendar(rows):
+    return [{'date': row['date'], 'count': row['count']} for row in rows]
+
+def _format_alerts(rows):
+    return [{
+        'ref_unique': row['ref_unique'],
+        'cliente': row['cliente'],
+        'analista': row['analista'],
+        'data_registro': row['data_registro'],
+        'dias_aberto': row['dias_aberto']
+    } for row in rows]
+
+def _format_sla_comparison(rows):
+    return [{
+        'analista': row['analista'],
+        'min_sla': float(row['min_sla']),
+        'q1_sla': float(row['q1_sla']),
+        'median_sla': float(row['median_sla']),
+        'q3_sla': float(row['q3_sla']),
+        'max_sla': float(row['max_sla'])
+    } for row in rows]
+
+def _previous_year_params(year, month, companies):
+    """Same period in the previous year (Sep 2025 vs Sep 2024, or 2025 vs 2024)"""
+    return {'year': int(year) - 1, 'month': month, 'companies': companies}
+
+def _calendar_params(year, month, companies):
+    """Calendar always focuses on one month (current month when not specified)"""
+    return {
+        'year': year or datetime.now().year,
+        'month': month or datetime.now().month,
+        'companies': companies
+    }
+
+def get_client_performance_data(year, month, user_companies=None):
     """Get client performance data with comparison to previous period"""
     try:
-        # Current period data
-        query = f"""
-            SELECT 
-                cliente,
-                COUNT(*) as total_registros
-            FROM importacoes_processos_aberta
-            {where_clause}
-            GROUP BY cliente
-            ORDER BY total_registros DESC
-        """
-        
-        result = supabase_admin.rpc('execute_sql', {'sql_query': query, 'params': params}).execute()
-        current_data = {row['cliente']: row['total_registros'] for row in result.data}
-        
-        # Previous period data for comparison
-        previous_data = get_previous_period_data(year, month, 'cliente', params)
-        
-        # Combine data
-        clients = []
-        for cliente, total_registros in current_data.items():
-            periodo_anterior = previous_data.get(cliente, 0)
-            
-            clients.append({
-                'cliente': cliente,
-                'total_registros': total_registros,
-                'periodo_anterior': periodo_anterior
-            })
-        
-        return sorted(clients, key=lambda x: x['total_registros'], reverse=True)[:20]  # Top 20
+        companies = _companies_param(user_companies)
+        current_rows = run_query('operacional.totals_by_cliente', year=year, month=month, companies=companies)
+        previous_rows = []
+        if year:
+            previous_rows = run_query('operacional.totals_by_cliente', **_previous_year_params(year, month, companies))
+        return _format_client_performance(current_rows, previous_rows)
         
     except Exception as e:
         logger.error(f"Erro ao obter dados de clientes: {str(e)}")
         return []
 
-def get_analyst_performance_data(year, month, where_clause, params):
+def get_analyst_performance_data(year, month, user_companies=None):
     """Get analyst performance data"""
     try:
-        query = f"""
-            SELECT 
-                analista,
-                COUNT(*) as total_registros,
-                AVG(CASE WHEN data_fechamento IS NOT NULL THEN sla_dias END) as sla_medio
-            FROM importacoes_processos_aberta
-            {where_clause} AND analista IS NOT NULL
-            GROUP BY analista
-            ORDER BY total_registros DESC
-        """
-        
-        result = supabase_admin.rpc('execute_sql', {'sql_query': query, 'params': params}).execute()
-        
-        analysts = []
-        for row in result.data:
-            analysts.append({
-                'analista': row['analista'],
-                'total_registros': row['total_registros'],
-                'sla_medio': float(row['sla_medio']) if row['sla_medio'] else None
-            })
-        
-        return analysts
+        rows = run_query('operacional.analyst_performance', year=year, month=month,
+                         companies=_companies_param(user_companies))
+        return _format_analyst_performance(rows)
         
     except Exception as e:
         logger.error(f"Erro ao obter dados de analistas: {str(e)}")
         return []
 
-def get_distribution_data(where_clause, params):
-    """Get distribution data for modal and canal"""
+def get_distribution_data(year, month, user_companies=None):
+    """Get distribution data for modal and canal (both queries dispatched concurrently)"""
     try:
-        # Modal distribution
-        modal_query = f"""
-            SELECT 
-                modal,
-                COUNT(*) as total
-            FROM importacoes_processos_aberta
-            {where_clause} AND modal IS NOT NULL
-            GROUP BY modal
-            ORDER BY total DESC
-        """
-        
-        modal_result = supabase_admin.rpc('execute_sql', {'sql_query': modal_query, 'params': params}).execute()
-        modal_data = [{'modal': row['modal'], 'total': row['total']} for row in modal_result.data]
-        
-        # Canal distribution
-        canal_query = f"""
-            SELECT 
-                COALESCE(canal, 'Não informado') as canal,
-                COUNT(*) as total
-            FROM importacoes_processos_aberta
-            {where_clause}
-            GROUP BY canal
-            ORDER BY total DESC
-        """
-        
-        canal_result = supabase_admin.rpc('execute_sql', {'sql_query': canal_query, 'params': params}).execute()
-        canal_data = [{'canal': row['canal'], 'total': row['total']} for row in canal_result.data]
-        
+        params = {'year': year, 'month': month, 'companies': _companies_param(user_companies)}
+        results = run_queries({
+            'modal': ('operacional.modal_distribution', params),
+            'canal': ('operacional.canal_distribution', params),
+        })
         return {
-            'modal': modal_data,
-            'canal': canal_data
+            'modal': [{'modal': row['modal'], 'total': row['total']} for row in results['modal']],
+            'canal': [{'canal': row['canal'], 'total': row['total']} for row in results['canal']]
         }
         
     except Exception as e:
         logger.error(f"Erro ao obter dados de distribuição: {str(e)}")
         return {'modal': [], 'canal': []}
 
-def get_calendar_data(year, month, where_clause, params):
+def get_calendar_data(year, month, user_companies=None):
     """Get calendar data showing registrations per day"""
     try:
-        # If no specific month, use current month
-        if not month:
-            month = str(datetime.now().month).zfill(2)
-        if not year:
-            year = str(datetime.now().year)
-        
-        # Modify where clause to focus on specific month
-        month_filters = []
-        month_params = params.copy()
-        
-        month_filters.append("EXTRACT(year FROM data_registro::date) = %(cal_year)s")
-        month_filters.append("EXTRACT(month FROM data_registro::date) = %(cal_month)s")
-        month_params['cal_year'] = int(year)
-        month_params['cal_month'] = int(month)
-        
-        # Add existing filters but replace date filters
-        original_where = where_clause.replace("WHERE ", "") if where_clause else ""
-        date_independent_filters = []
-        
-        if "cliente IN" in original_where:
-            # Extract company filter
-            start = original_where.find("cliente IN")
-            end = original_where.find(")", start) + 1
-            date_independent_filters.append(original_where[start:end])
-        
-        all_filters = month_filters + date_independent_filters
-        calendar_where = f"WHERE {' AND '.join(all_filters)}" if all_filters else ""
-        
-        query = f"""
-            SELECT 
-                data_registro::date as date,
-                COUNT(*) as count
-            FROM importacoes_processos_aberta
-            {calendar_where}
-            GROUP BY data_registro::date
-            ORDER BY date
-        """
-        
-        result = supabase_admin.rpc('execute_sql', {'sql_query': query, 'params': month_params}).execute()
-        
-        calendar_data = []
-        for row in result.data:
-            calendar_data.append({
-                'date': row['date'],
-                'count': row['count']
-            })
-        
-        return calendar_data
+        rows = run_query('operacional.calendar', **_calendar_params(year, month, _companies_param(user_companies)))
+        return _format_calendar(rows)
         
     except Exception as e:
         logger.error(f"Erro ao obter dados do calendário: {str(e)}")
@@ -609,132 +418,35 @@ def get_calendar_data(year, month, where_clause, params):
 def get_alert_processes(user_companies):
     """Get processes that require attention (open for too long)"""
     try:
-        # Company filter
-        company_filter = ""
-        params = {}
-        
-        if user_companies is not None and len(user_companies) > 0:
-            placeholders = ','.join([f"%(company_{i})s" for i in range(len(user_companies))])
-            company_filter = f"AND cliente IN ({placeholders})"
-            for i, company in enumerate(user_companies):
-                params[f'company_{i}'] = company
-        
-        query = f"""
-            SELECT 
-                ref_unique,
-                cliente,
-                analista,
-                data_registro,
-                ABS(desempenho) as dias_aberto
-            FROM importacoes_processos_aberta
-            WHERE data_fechamento IS NULL 
-            {company_filter}
-            ORDER BY dias_aberto DESC
-            LIMIT 10
-        """
-        
-        result = supabase_admin.rpc('execute_sql', {'sql_query': query, 'params': params}).execute()
-        
-        alerts = []
-        for row in result.data:
-            alerts.append({
-                'ref_unique': row['ref_unique'],
-                'cliente': row['cliente'],
-                'analista': row['analista'],
-                'data_registro': row['data_registro'],
-                'dias_aberto': row['dias_aberto']
-            })
-        
-        return alerts
+        rows = run_query('operacional.alert_processes', companies=_companies_param(user_companies))
+        return _format_alerts(rows)
         
     except Exception as e:
         logger.error(f"Erro ao obter processos em alerta: {str(e)}")
         return []
 
-def get_sla_comparison_data(where_clause, params):
+def get_sla_comparison_data(year, month, user_companies=None):
     """Get SLA comparison data by analyst (for box plot)"""
     try:
-        query = f"""
-            SELECT 
-                analista,
-                MIN(sla_dias) as min_sla,
-                PERCENTILE_CONT(0.25) WITHIN GROUP (ORDER BY sla_dias) as q1_sla,
-                PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY sla_dias) as median_sla,
-                PERCENTILE_CONT(0.75) WITHIN GROUP (ORDER BY sla_dias) as q3_sla,
-                MAX(sla_dias) as max_sla
-            FROM importacoes_processos_aberta
-            {where_clause} AND analista IS NOT NULL 
-            AND data_fechamento IS NOT NULL 
-            AND sla_dias IS NOT NULL
-            GROUP BY analista
-            HAVING COUNT(*) >= 3
-            ORDER BY median_sla
-        """
-        
-        result = supabase_admin.rpc('execute_sql', {'sql_query': query, 'params': params}).execute()
-        
-        sla_data = []
-        for row in result.data:
-            sla_data.append({
-                'analista': row['analista'],
-                'min_sla': float(row['min_sla']),
-                'q1_sla': float(row['q1_sla']),
-                'median_sla': float(row['median_sla']),
-                'q3_sla': float(row['q3_sla']),
-                'max_sla': float(row['max_sla'])
-            })
-        
-        return sla_data
+        rows = run_query('operacional.sla_comparison', year=year, month=month,
+                         companies=_companies_param(user_companies))
+        return _format_sla_comparison(rows)
         
     except Exception as e:
         logger.error(f"Erro ao obter dados de comparação SLA: {str(e)}")
         return []
 
-def get_previous_period_data(year, month, group_by, params):
+def get_previous_period_data(year, month, group_by, user_companies=None):
     """Get data from same period in previous year for comparison"""
     try:
         if not year:
             return {}
+        if group_by not in TOTALS_GROUP_COLUMNS:
+            raise ValueError(f"Agrupamento não suportado: {group_by}")
         
-        # Always compare to same period in previous year
-        # Example: Sep 2025 vs Sep 2024, or Year 2025 vs Year 2024
-        if month:
-            # Same month in previous year
-            prev_year = int(year) - 1
-            prev_month = int(month)
-            
-            prev_filters = [
-                "EXTRACT(year FROM data_registro::date) = %(prev_year)s",
-                "EXTRACT(month FROM data_registro::date) = %(prev_month)s"
-            ]
-            prev_params = {'prev_year': prev_year, 'prev_month': prev_month}
-        else:
-            # Previous year (same as before)
-            prev_filters = ["EXTRACT(year FROM data_registro::date) = %(prev_year)s"]
-            prev_params = {'prev_year': int(year) - 1}
-        
-        # Add company filters if present
-        if 'company_0' in params:
-            company_count = sum(1 for key in params.keys() if key.startswith('company_'))
-            placeholders = ','.join([f"%(company_{i})s" for i in range(company_count)])
-            prev_filters.append(f"cliente IN ({placeholders})")
-            for i in range(company_count):
-                prev_params[f'company_{i}'] = params[f'company_{i}']
-        
-        where_clause = f"WHERE {' AND '.join(prev_filters)}"
-        
-        query = f"""
-            SELECT 
-                {group_by},
-                COUNT(*) as total_registros
-            FROM importacoes_processos_aberta
-            {where_clause}
-            GROUP BY {group_by}
-        """
-        
-        result = supabase_admin.rpc('execute_sql', {'sql_query': query, 'params': prev_params}).execute()
-        
-        return {row[group_by]: row['total_registros'] for row in result.data}
+        rows = run_query(f'operacional.totals_by_{group_by}',
+                         **_previous_year_params(year, month, _companies_param(user_companies)))
+        return {row[group_by]: row['total_registros'] for row in rows}
         
     except Exception as e:
         logger.error(f"Erro ao obter dados do período anterior: {str(e)}")
@@ -757,68 +469,19 @@ def get_client_modals():
         if user_companies is not None and client not in user_companies:
             return jsonify({'success': False, 'message': 'Acesso negado'}), 403
         
-        # Use the main data source - same as get_dashboard_data
-        response = supabase_admin.table('importacoes_processos_operacional').select('*').execute()
-        all_data = response.data
-        
-        # Filter data by client and period
-        filtered_data = []
-        for record in all_data:
-            # Filter by client
-            if record.get('cliente') != client:
-                continue
-                
-            # Filter by period if specified
-            data_registro_str = record.get('data_registro', '')
-            if data_registro_str and isinstance(data_registro_str, str):
-                if year and len(data_registro_str) >= 4:
-                    record_year = data_registro_str[:4]
-                    if record_year != str(year):
-                        continue
-                
-                if month and len(data_registro_str) >= 7:
-                    record_month = data_registro_str[5:7]
-                    if record_month != f"{int(month):02d}":
-                        continue
-            
-            filtered_data.append(record)
+        # Slice the operational cube (same source as get_dashboard_data)
+        cube = get_operacional_cube()
+        year_int = int(year) if year else None
+        month_int = int(month) if month else None
         
-        # Count by modal
-        modal_counts = {}
-        for record in filtered_data:
-            modal = record.get('modal')
-            if modal:
-                modal_counts[modal] = modal_counts.get(modal, 0) + 1
+        # Count by modal for client and period
+        modal_counts = cube.count_by('modal', cube.slice_indexes(year=year_int, month=month_int, cliente=client))
         
-        # Get previous period data for comparison
+        # Get previous period data for comparison (previous month, or previous year)
         previous_modal_counts = {}
         if year:
-            prev_year = int(year) - 1 if not month else int(year)
-            prev_month = int(month) - 1 if month else None
-            
-            if prev_month == 0:
-                prev_month = 12
-                prev_year = int(year) - 1
-            
-            for record in all_data:
-                if record.get('cliente') != client:
-                    continue
-                    
-                data_registro_str = record.get('data_registro', '')
-                if data_registro_str and isinstance(data_registro_str, str):
-                    if len(data_registro_str) >= 4:
-                        record_year = data_registro_str[:4]
-                        if record_year != str(prev_year):
-                            continue
-                    
-                    if prev_month and len(data_registro_str) >= 7:
-                        record_month = data_registro_str[5:7]
-                        if record_month != f"{prev_month:02d}":
-                            continue
-                
-                modal = record.get('modal')
-                if modal:
-                    previous_modal_counts[modal] = previous_modal_counts.get(modal, 0) + 1
+            prev_year, prev_month = OperacionalCube.previous_month_period(year_int, month_int)
+            previous_modal_counts = cube.count_by('modal', cube.slice_indexes(year=prev_year, month=prev_month, cliente=client))
         
         # Combine data and calculate variations
         modals = []
@@ -853,43 +516,12 @@ def get_client_modals():
 def get_previous_period_client_modals(client, year, month):
     """Get previous period modal data for a client"""
     try:
-        if not year:
+        if not year or not client:
             return {}
         
-        if month:
-            prev_year = int(year)
-            prev_month = int(month) - 1
-            if prev_month == 0:
-                prev_month = 12
-                prev_year -= 1
-            
-            filters = [
-                "cliente = %(client)s",
-                "EXTRACT(year FROM data_registro::date) = %(prev_year)s",
-                "EXTRACT(month FROM data_registro::date) = %(prev_month)s"
-            ]
-            params = {'client': client, 'prev_year': prev_year, 'prev_month': prev_month}
-        else:
-            filters = [
-                "cliente = %(client)s",
-                "EXTRACT(year FROM data_registro::date) = %(prev_year)s"
-            ]
-            params = {'client': client, 'prev_year': int(year) - 1}
-        
-        where_clause = f"WHERE {' AND '.join(filters)}"
-        
-        query = f"""
-            SELECT 
-                modal,
-                COUNT(*) as total_registros
-            FROM importacoes_processos_aberta
-            {where_clause} AND modal IS NOT NULL
-            GROUP BY modal
-        """
-        
-        result = supabase_admin.rpc('execute_sql', {'sql_query': query, 'params': params}).execute()
-        
-        return {row['modal']: row['total_registros'] for row in result.data}
+        prev_year, prev_month = OperacionalCube.previous_month_period(year, month)
+        rows = run_query('operacional.client_modals', client=client, year=prev_year, month=prev_month)
+        return {row['modal']: row['total_registros'] for row in rows}
         
     except Exception as e:
         logger.error(f"Erro ao obter dados anteriores de modais: {str(e)}")
@@ -913,66 +545,30 @@ def get_client_processes():
         if user_companies is not None and client not in user_companies:
             return jsonify({'success': False, 'message': 'Acesso negado'}), 403
         
-        # Use the main data source
-        response = supabase_admin.table('importacoes_processos_operacional').select('*').execute()
-        all_data = response.data
-        
-        logger.info(f"[DEBUG] Searching for client '{client}' and modal '{modal}' in {len(all_data)} total records")
-        
-        # Debug: show first few records to understand structure
-        if all_data and len(all_data) > 0:
-            sample_record = all_data[0]
-            logger.info(f"[DEBUG] Sample record keys: {list(sample_record.keys())}")
-            logger.info(f"[DEBUG] Sample client: '{sample_record.get('cliente', 'N/A')}'")
-            logger.info(f"[DEBUG] Sample modal: '{sample_record.get('modal', 'N/A')}'")
+        # Slice the operational cube
+        cube = get_operacional_cube()
+        records = cube.slice(
+            year=int(year) if year else None,
+            month=int(month) if month else None,
+            cliente=client,
+            modal=modal
+        )
         
-        # Filter data
         filtered_processes = []
-        client_matches = 0
-        modal_matches = 0
-        
-        for record in all_data:
-            # Debug: check client matches
-            record_client = record.get('cliente', '')
-            if record_client == client:
-                client_matches += 1
-                
-                # Debug: check modal matches for this client
-                record_modal = record.get('modal', '')
-                if record_modal == modal:
-                    modal_matches += 1
-                    
-                    # Filter by period if specified
-                    data_registro_str = record.get('data_registro', '')
-                    include_record = True
-                    
-                    if data_registro_str and isinstance(data_registro_str, str):
-                        if year and len(data_registro_str) >= 4:
-                            record_year = data_registro_str[:4]
-                            if record_year != str(year):
-                                include_record = False
-                        
-                        if month and len(data_registro_str) >= 7 and include_record:
-                            record_month = data_registro_str[5:7]
-                            if record_month != f"{int(month):02d}":
-                                include_record = False
-                    
-                    if include_record:
-                        # Try different possible column names for reference
-                        ref_unique = (record.get('ref_unique') or 
-                                    record.get('referencia') or 
-                                    record.get('numero_processo') or 
-                                    record.get('id') or 
-                                    f"PROC_{modal_matches}")
-                        
-                        filtered_processes.append({
-                            'ref_unique': str(ref_unique),
-                            'data_registro': data_registro_str or 'N/A'
-                        })
-        
-        logger.info(f"[DEBUG] Found {client_matches} records for client '{client}'")
-        logger.info(f"[DEBUG] Found {modal_matches} records for modal '{modal}' in that client")
-        logger.info(f"[DEBUG] Final filtered processes after date filter: {len(filtered_processes)}")
+        for position, record in enumerate(records, start=1):
+            # Try different possible column names for reference
+            ref_unique = (record.get('ref_unique') or 
+                        record.get('referencia') or 
+                        record.get('numero_processo') or 
+                        record.get('id') or 
+                        f"PROC_{position}")
+            
+            filtered_processes.append({
+                'ref_unique': str(ref_unique),
+                'data_registro': record.get('data_registro') or 'N/A'
+            })
+        
+        logger.info(f"[DEBUG] Found {len(filtered_processes)} processes for client '{client}' and modal '{modal}'")
         
         # Sort by data_registro desc and limit to 50
         filtered_processes.sort(key=lambda x: x['data_registro'], reverse=True)
@@ -1002,63 +598,20 @@ def get_analyst_clients():
         
         logger.info(f"[Analyst Clients] Loading clients for analyst: {analyst}, year: {year}, month: {month}")
         
-        # Get all data and filter in Python (same approach as main endpoint)
-        response = supabase_admin.table('importacoes_processos_operacional').select('*').execute()
-        all_data = response.data
-        
-        # Filter by analyst
-        analyst_data = [record for record in all_data if record.get('analista') == analyst]
-        
-        # Filter by date using Python
-        filtered_data = analyst_data
-        if year or month:
-            filtered_data = []
-            for record in analyst_data:
-                data_registro_str = record.get('data_registro', '')
-                if data_registro_str and isinstance(data_registro_str, str):
-                    try:
-                        if len(data_registro_str) >= 10:  # YYYY-MM-DD
-                            year_str = data_registro_str[:4]
-                            month_str = data_registro_str[5:7]
-                            
-                            if year_str and month_str:
-                                record_year = int(year_str)
-                                record_month = int(month_str)
-                                
-                                # Apply filters
-                                if year and month:
-                                    if record_year == year and record_month == month:
-                                        filtered_data.append(record)
-                                elif year:
-                                    if record_year == year:
-                                        filtered_data.append(record)
-                    except (ValueError, TypeError):
-                        continue
-        
-        # Apply company filter if needed
-        if user_companies is not None and len(user_companies) > 0:
-            filtered_data = [record for record in filtered_data if record.get('cliente') in user_companies]
+        # Slice the operational cube (analyst + period + company restriction)
+        cube = get_operacional_cube()
+        companies = user_companies if user_companies else None
+        filtered_indexes = cube.slice_indexes(year=year, month=month, analista=analyst, companies=companies)
         
         # Count by client
-        client_counts = {}
-        for record in filtered_data:
-            cliente = record.get('cliente', '')
-            if cliente and isinstance(cliente, str) and cliente.strip():
-                if cliente not in client_counts:
-                    client_counts[cliente] = 0
-                client_counts[cliente] += 1
-        
-        # Convert to list and sort
-        clients = []
-        for cliente, count in client_counts.items():
-            clients.append({
-                'cliente': cliente,
-                'total_registros': count
-            })
+        clients = [
+            {'cliente': cliente, 'total_registros': count}
+            for cliente, count in cube.count_by('cliente', filtered_indexes, skip_blank=True).items()
+        ]
         
         clients.sort(key=lambda x: x['total_registros'], reverse=True)
         
-        logger.info(f"[Analyst Clients] Found {len(clients)} clients for {analyst}, total records: {len(filtered_data)}")
+        logger.info(f"[Analyst Clients] Found {len(clients)} clients for {analyst}, total records: {len(filtered_indexes)}")
         
         return jsonify({
             'success': True,
@@ -1069,6 +622,32 @@ def get_analyst_clients():
         logger.error(f"Erro ao obter clientes do analista: {str(e)}")
         return jsonify({'success': False, 'message': str(e)}), 500
 
+# Intervalo mínimo entre reconstruções forçadas do cubo (a carga lê a tabela inteira)
+CUBE_REFRESH_MIN_INTERVAL = int(os.getenv('OPERACIONAL_CUBE_REFRESH_MIN_INTERVAL', '60'))
+
+@dashboard_operacional.route('/api/refresh', methods=['POST'])
+@login_required
+def refresh_cube():
+    """Discard the operational cube so the next request rebuilds it from the table (admin/interno only)"""
+    if session.get('user', {}).get('role') not in ('admin', 'interno_unique'):
+        return jsonify({'success': False, 'message': 'Acesso negado'}), 403
+    
+    cube = get_operacional_cube()
+    age = time.time() - cube.built_at
+    if age >= CUBE_REFRESH_MIN_INTERVAL:
+        invalidate_operacional_cube()
+        invalidate_query_cache('operacional.')
+        cube = get_operacional_cube(force=True)
+    else:
+        logger.info(f"[OPERACIONAL_CUBE] Refresh ignorado: cubo construído há {age:.0f}s "
+                    f"(mínimo {CUBE_REFRESH_MIN_INTERVAL}s)")
+    return jsonify({
+        'success': True,
+        'total_registros': len(cube.rows),
+        'built_at': datetime.fromtimestamp(cube.built_at).isoformat(),
+        'timestamp': datetime.now().isoformat()
+    })
+
 # API Bypass for testing (using environment variable)
 @dashboard_operacional.route('/api/test-data')
 def test_dashboard_data():
@@ -1130,48 +709,21 @@ def get_operations_monthly():
     try:
         year = request.args.get('year', type=int, default=datetime.now().year)
         
-        # Get all data from correct table
-        response = supabase_admin.table('importacoes_processos_operacional').select('*').execute()
-        all_data = response.data
+        # Group data by month for the specified year from the cube
+        cube = get_operacional_cube()
+        monthly_data = cube.count_by('month', cube.slice_indexes(year=year))
         
-        # Group data by month for the specified year
-        monthly_data = {}
-        for record in all_data:
-            data_registro_str = record.get('data_registro', '')
-            if data_registro_str and isinstance(data_registro_str, str):
-                try:
-                    if len(data_registro_str) >= 10:  # YYYY-MM-DD
-                        year_str = data_registro_str[:4]
-                        month_str = data_registro_str[5:7]
-                        
-                        if year_str and month_str:
-                            record_year = int(year_str)
-                            record_month = int(month_str)
-                            
-                            if record_year == year:
-                                month_key = f"{year}-{month_str}"
-                                if month_key not in monthly_data:
-                                    monthly_data[month_key] = 0
-                                monthly_data[month_key] += 1
-                except (ValueError, TypeError):
-                    continue
-        
-        # Get monthly targets from fin_metas_projecoes
-        monthly_targets = {}
-        for month in range(1, 13):
-            meta_response = supabase_admin.table('fin_metas_projecoes')\
-                .select('meta')\
-                .eq('ano', str(year))\
-                .eq('mes', f"{month:02d}")\
-                .eq('tipo', 'operacional')\
-                .execute()
-            
-            if meta_response.data:
-                month_key = f"{year}-{month:02d}"
-                monthly_targets[month_key] = int(meta_response.data[0]['meta'])
-            else:
-                month_key = f"{year}-{month:02d}"
-                monthly_targets[month_key] = 0
+        # Get monthly targets from fin_metas_projecoes (single query for the year)
+        monthly_targets = {f"{year}-{month:02d}": 0 for month in range(1, 13)}
+        meta_response = supabase_admin.table('fin_metas_projecoes')\
+            .select('mes, meta')\
+            .eq('ano', str(year))\
+            .eq('tipo', 'operacional')\
+            .execute()
+        for meta_row in meta_response.data or []:
+            month_key = f"{year}-{str(meta_row.get('mes')).zfill(2)}"
+            if month_key in monthly_targets and monthly_targets[month_key] == 0:
+                monthly_targets[month_key] = int(meta_row['meta'])
         
         # Prepare chart data
         months = []
@@ -1215,33 +767,9 @@ def get_operations_daily():
         year = request.args.get('year', type=int, default=datetime.now().year)
         month = request.args.get('month', type=int, default=datetime.now().month)
         
-        # Get all data from correct table
-        response = supabase_admin.table('importacoes_processos_operacional').select('*').execute()
-        all_data = response.data
-        
-        # Group data by day for the specified year/month
-        daily_data = {}
-        for record in all_data:
-            data_registro_str = record.get('data_registro', '')
-            if data_registro_str and isinstance(data_registro_str, str):
-                try:
-                    if len(data_registro_str) >= 10:  # YYYY-MM-DD
-                        year_str = data_registro_str[:4]
-                        month_str = data_registro_str[5:7]
-                        day_str = data_registro_str[8:10]
-                        
-                        if year_str and month_str and day_str:
-                            record_year = int(year_str)
-                            record_month = int(month_str)
-                            record_day = int(day_str)
-                            
-                            if record_year == year and record_month == month:
-                                day_key = f"{year}-{month:02d}-{record_day:02d}"
-                                if day_key not in daily_data:
-                                    daily_data[day_key] = 0
-                                daily_data[day_key] += 1
-                except (ValueError, TypeError):
-                    continue
+        # Group data by day for the specified year/month from the cube
+        cube = get_operacional_cube()
+        daily_data = cube.count_by('day', cube.slice_indexes(year=year, month=month))
         
         # Get number of days in the month
         from calendar import monthrange
@@ -1324,31 +852,19 @@ def get_day_details():
         canal_filter = request.args.get('canal')
         modal_filter = request.args.get('modal')
         
-        # Base query
-        query = supabase_admin.table('importacoes_processos_operacional').select('*')
-        
-        # Filter by date - data_registro is already in YYYY-MM-DD format
-        query = query.eq('data_registro', date_str)
-        
-        # Apply filters
-        if user_companies:
-            query = query.in_('cnpj_importador', user_companies)
-        
-        if analista_filter:
-            query = query.eq('analista', analista_filter)
-        
-        if cliente_filter:
-            query = query.eq('cliente', cliente_filter)
-        
-        if canal_filter:
-            query = query.eq('canal', canal_filter)
-        
-        if modal_filter:
-            query = query.eq('modal', modal_filter)
-        
-        # Execute query
-        response = query.execute()
-        processes = response.data if response.data else []
+        # Slice the cube by day and filters (copies: records are annotated below)
+        cube = get_operacional_cube()
+        processes = [
+            dict(record) for record in cube.slice(
+                day=date_str,
+                companies=user_companies or None,
+                company_field='cnpj_importador',
+                analista=analista_filter or None,
+                cliente=cliente_filter or None,
+                canal=canal_filter or None,
+                modal=modal_filter or None
+            )
+        ]
         
         logger.info(f"[Day Details] Found {len(processes)} processes for {date_str}")
         
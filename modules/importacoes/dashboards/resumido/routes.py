@@ -11,8 +11,12 @@ import requests
 import traceback
 import os
 from services.data_cache import DataCacheService
-from services.retry_utils import run_with_retries
+from services.retry_utils import run_with_policy
+from services.supabase_transport import call_class
+from services.single_flight import single_flight, query_fingerprint, copy_rows
+from services.datasets import dataset_cache, IMPORTACOES_ABERTOS
 from services.client_branding import get_client_branding
+from log_config import log_print, log_printf
 
 # Instanciar o serviço de cache
 data_cache = DataCacheService()
@@ -111,7 +115,7 @@ def get_exchange_rates():
         }
     
     except Exception as e:
-        print(f"Erro ao obter cotações: {e}")
+        log_printf("Erro ao obter cotações: %s", e)
         return {'dolar': None, 'euro': None}
 
 @dash_importacoes_resumido_bp.route('/')
@@ -130,13 +134,13 @@ def dashboard():
     
     # Admin operação tem acesso a todas as empresas - nunca mostrar warning
     if perfil_principal in ['admin_operacao', 'master_admin']:
-        print(f"[DASH_RESUMIDO] Admin {user_data.get('email')} - acesso total, sem warning")
+        log_printf("[DASH_RESUMIDO] Admin %s - acesso total, sem warning", user_data.get('email'))
         return render_template('dash_importacoes_resumido/dash_importacoes_resumido.html', show_company_warning=False)
     
     if user_role == 'cliente_unique':
         user_cnpjs = get_user_companies(user_data)
         if not user_cnpjs:
-            print(f"[DASH_RESUMIDO] Cliente {user_data.get('email')} sem empresas vinculadas - exibindo aviso")
+            log_printf("[DASH_RESUMIDO] Cliente %s sem empresas vinculadas - exibindo aviso", user_data.get('email'))
             # Passar flag para o template indicar que deve mostrar aviso
             return render_template('dash_importacoes_resumido/dash_importacoes_resumido.html', show_company_warning=True)
     
@@ -144,7 +148,7 @@ def dashboard():
     if user_role == 'interno_unique':
         user_cnpjs = get_user_companies(user_data)
         if not user_cnpjs:
-            print(f"[DASH_RESUMIDO] Usuário interno {user_data.get('email')} sem empresas vinculadas - exibindo aviso")
+            log_printf("[DASH_RESUMIDO] Usuário interno %s sem empresas vinculadas - exibindo aviso", user_data.get('email'))
             # Passar flag para o template indicar que deve mostrar aviso
             return render_template('dash_importacoes_resumido/dash_importacoes_resumido.html', show_company_warning=True)
     
@@ -166,7 +170,7 @@ def get_dashboard_data():
         if not user_id:
             return jsonify({'error': 'Usuário não autenticado'}), 401
 
-        print(f"[DEBUG] Dashboard API chamada por user_id: {user_id}, role: {user_role}, perfil: {perfil_principal}")
+        log_printf("[DEBUG] Dashboard API chamada por user_id: %s, role: %s, perfil: %s", user_id, user_role, perfil_principal)
 
         # Obter filtros da requisição
         page = int(request.args.get('page', 1))
@@ -174,7 +178,7 @@ def get_dashboard_data():
         filtro_embarque = request.args.get('filtro_embarque', '')
         company_filter = request.args.get('company_filter', '')
 
-        print(f"[DEBUG] Parâmetros: page={page}, per_page={per_page}, filtro_embarque={filtro_embarque}, company_filter={company_filter}")
+        log_printf("[DEBUG] Parâmetros: page=%s, per_page=%s, filtro_embarque=%s, company_filter=%s", page, per_page, filtro_embarque, company_filter)
 
         # NOVA LÓGICA: Verificar se deve exigir filtro de empresa antes de carregar dados
         api_bypass_key = os.getenv('API_BYPASS_KEY')
@@ -185,7 +189,7 @@ def get_dashboard_data():
             if perfil_principal == 'admin_operacao':
                 # Admin com acesso a todas as empresas - exigir filtro
                 if not company_filter:
-                    print("[DEBUG] Admin operação sem filtro - retornando mensagem de seleção obrigatória")
+                    log_print("[DEBUG] Admin operação sem filtro - retornando mensagem de seleção obrigatória")
                     return jsonify({
                         'success': False,
                         'require_filter': True,
@@ -211,7 +215,7 @@ def get_dashboard_data():
                 
                 if company_count > 1 and not company_filter:
                     # Múltiplas empresas - exigir filtro
-                    print(f"[DEBUG] Usuário com {company_count} empresas sem filtro - retornando mensagem de seleção obrigatória")
+                    log_printf("[DEBUG] Usuário com %s empresas sem filtro - retornando mensagem de seleção obrigatória", company_count)
                     return jsonify({
                         'success': False,
                         'require_filter': True,
@@ -233,9 +237,9 @@ def get_dashboard_data():
                 elif company_count == 1:
                     # Uma empresa - carregar automaticamente
                     company_filter = user_cnpjs[0]
-                    print(f"[DEBUG] Usuário com 1 empresa - carregando automaticamente: {company_filter}")
+                    log_printf("[DEBUG] Usuário com 1 empresa - carregando automaticamente: %s", company_filter)
         else:
-            print("[DEBUG] Bypass ativo - pulando verificação de filtro obrigatório")
+            log_print("[DEBUG] Bypass ativo - pulando verificação de filtro obrigatório")
 
         # Buscar branding (logo e nome da empresa do usuário) usando função compartilhada
         client_branding = get_client_branding(user_email)
@@ -250,19 +254,20 @@ def get_dashboard_data():
         if not is_bypass:
             # Verificar cache primeiro apenas se não estiver usando bypass
             cached_data = session.get('cached_data')
-            print(f"[DEBUG] Cache session: {type(cached_data)} com {len(cached_data) if cached_data else 0} registros")
+            log_printf("[DEBUG] Cache session: %s com %s registros", type(cached_data), len(cached_data) if cached_data else 0)
 
             if not cached_data:
                 cached_data = data_cache.get_cache(user_id, 'raw_data')
-                print(f"[DEBUG] Cache service: {type(cached_data)} com {len(cached_data) if cached_data else 0} registros")
+                log_printf("[DEBUG] Cache service: %s com %s registros", type(cached_data), len(cached_data) if cached_data else 0)
         else:
-            print(f"[DEBUG] BYPASS ATIVO - Ignorando cache e indo direto para a view")
+            log_print(f"[DEBUG] BYPASS ATIVO - Ignorando cache e indo direto para a view")
 
         # Se ainda não há dados, tentar buscar direto da view
         if not cached_data or not isinstance(cached_data, list):
-            print(f"[DEBUG] Buscando dados direto da view vw_importacoes_6_meses_abertos_dash... (is_bypass: {is_bypass})")
+            log_printf("[DEBUG] Buscando dados direto da view vw_importacoes_6_meses_abertos_dash... (is_bypass: %s)", is_bypass)
             try:
                 query = supabase_admin.table('vw_importacoes_6_meses_abertos_dash').select('*')
+                query_cnpjs = None
 
                 # Verificar se usuário tem perfil admin_operacao - se sim, pode ver todos os dados
                 perfil_principal = user.get('perfil_principal', '')
@@ -270,12 +275,13 @@ def get_dashboard_data():
 
                 if user_role == 'cliente_unique' or (user_role == 'interno_unique' and not is_admin_operacao):
                     user_cnpjs = get_user_companies(user)
-                    print(f"[DEBUG] Role: {user_role}, CNPJs encontrados: {user_cnpjs}")
+                    log_printf("[DEBUG] Role: %s, CNPJs encontrados: %s", user_role, user_cnpjs)
                     if user_cnpjs:
                         query = query.in_('cnpj_importador', user_cnpjs)
-                        print(f"[DEBUG] Query filtrada por CNPJs das empresas vinculadas: {user_cnpjs}")
+                        query_cnpjs = user_cnpjs
+                        log_printf("[DEBUG] Query filtrada por CNPJs das empresas vinculadas: %s", user_cnpjs)
                     else:
-                        print(f"[DEBUG] Usuário {user_role} sem CNPJs vinculados - retornando aviso de segurança")
+                        log_printf("[DEBUG] Usuário %s sem CNPJs vinculados - retornando aviso de segurança", user_role)
                         return jsonify({
                             'success': False,
                             'error': 'no_companies', 
@@ -295,39 +301,47 @@ def get_dashboard_data():
                             'pagination': {'total': 0, 'pages': 0, 'current_page': 1, 'per_page': per_page}
                         })
                 elif is_admin_operacao:
-                    print(f"[DEBUG] Usuário admin_operacao -> carregando TODOS os dados (sem filtro de CNPJ)")
+                    log_print(f"[DEBUG] Usuário admin_operacao -> carregando TODOS os dados (sem filtro de CNPJ)")
                 elif user_role == 'admin':
-                    print(f"[DEBUG] Usuário admin -> carregando TODOS os dados (sem filtro de CNPJ)")
+                    log_print(f"[DEBUG] Usuário admin -> carregando TODOS os dados (sem filtro de CNPJ)")
 
+                @call_class('report')
                 def _run_query():
-                    print(f"[DEBUG] Executando query na view sem limite...")
+                    log_print(f"[DEBUG] Executando query na view sem limite...")
                     result = query.execute()
-                    print(f"[DEBUG] Query executada, resultado: {result}")
+                    log_printf("[DEBUG] Query executada, resultado: %s", result)
                     return result
-                result = run_with_retries(
-                    'dash_resumido.main_query',
-                    _run_query,
-                    max_attempts=3,
-                    base_delay_seconds=0.8,
-                    should_retry=lambda e: 'Server disconnected' in str(e) or 'timeout' in str(e).lower()
-                )
-                cached_data = result.data or []
-                print(f"[DEBUG] Dados obtidos direto da view: {len(cached_data)} registros")
+                def _run_query_with_retries():
+                    result = run_with_policy(
+                        'supabase.read',
+                        'dash_resumido.main_query',
+                        _run_query
+                    )
+                    return result.data or []
+                # Dataset já carregado (ex.: pelo dashboard executivo, que é superconjunto) evita a query
+                cached_data = None if is_bypass else dataset_cache.get(user_id, IMPORTACOES_ABERTOS, scope=query_cnpjs)
+                if cached_data is None:
+                    # Cargas concorrentes com o mesmo filtro (inclusive de usuários diferentes) compartilham a query
+                    fingerprint = query_fingerprint('vw_importacoes_6_meses_abertos_dash', {'cnpj_importador': query_cnpjs})
+                    cached_data = single_flight.do(fingerprint, _run_query_with_retries, copy=copy_rows)
+                    if cached_data and not is_bypass:
+                        dataset_cache.set(user_id, IMPORTACOES_ABERTOS, cached_data, scope=query_cnpjs)
+                log_printf("[DEBUG] Dados obtidos direto da view: %s registros", len(cached_data))
                 if cached_data and len(cached_data) > 0:
-                    print(f"[DEBUG] Primeiro registro da view: {cached_data[0]}")
-                    print(f"[DEBUG] Campos do primeiro registro: {list(cached_data[0].keys())}")
+                    log_printf("[DEBUG] Primeiro registro da view: %s", cached_data[0])
+                    log_printf("[DEBUG] Campos do primeiro registro: %s", list(cached_data[0].keys()))
                     # Verificar se há dados com o CNPJ filtrado
                     if company_filter:
                         matching_records = [r for r in cached_data if r.get('cnpj_importador') == company_filter]
-                        print(f"[DEBUG] Registros com CNPJ {company_filter}: {len(matching_records)}")
+                        log_printf("[DEBUG] Registros com CNPJ %s: %s", company_filter, len(matching_records))
                 else:
-                    print(f"[DEBUG] ATENÇÃO: View retornou dados vazios!")
+                    log_print(f"[DEBUG] ATENÇÃO: View retornou dados vazios!")
             except Exception as e:
-                print(f"[DEBUG] Erro ao buscar da view: {e}")
+                log_printf("[DEBUG] Erro ao buscar da view: %s", e)
 
         # Se ainda não há dados, retornar dados de exemplo
         if not cached_data or not isinstance(cached_data, list) or len(cached_data) == 0:
-            print(f"[DEBUG] DADOS DE EXEMPLO ATIVADOS - cached_data: {type(cached_data)}, len: {len(cached_data) if cached_data else 'None'}, is_bypass: {is_bypass}")
+            log_printf("[DEBUG] DADOS DE EXEMPLO ATIVADOS - cached_data: %s, len: %s, is_bypass: %s", type(cached_data), len(cached_data) if cached_data else 'None', is_bypass)
             return jsonify({
                 'success': True,
                 'message': 'Dados de exemplo - cache vazio',
@@ -360,30 +374,30 @@ def get_dashboard_data():
                 'pagination': {'total': 0, 'pages': 0, 'current_page': 1}
             }), 404
 
-        print(f"[DEBUG] DataFrame criado com {len(df)} registros")
-        print(f"[DEBUG] Colunas disponíveis: {list(df.columns)}")
-        print(f"[DEBUG] Filtros ativos: user_role={user_role}, company_filter={company_filter}, filtro_embarque={filtro_embarque}")
+        log_printf("[DEBUG] DataFrame criado com %s registros", len(df))
+        log_printf("[DEBUG] Colunas disponíveis: %s", list(df.columns))
+        log_printf("[DEBUG] Filtros ativos: user_role=%s, company_filter=%s, filtro_embarque=%s", user_role, company_filter, filtro_embarque)
 
         # Aplicar filtro adicional por empresa se necessário (apenas para clientes específicos)
         if user_role in ['cliente_unique', 'interno_unique'] and 'cnpj_importador' in df.columns:
             # Para admin_operacao, não aplicar este filtro restritivo quando há company_filter específico
             perfil_principal = user.get('perfil_principal', '')
             if perfil_principal == 'admin_operacao' and company_filter:
-                print(f"[DEBUG] Admin operação com filtro específico - pulando filtro restritivo de CNPJs")
+                log_print(f"[DEBUG] Admin operação com filtro específico - pulando filtro restritivo de CNPJs")
             else:
                 user_cnpjs = get_user_companies(user)
                 if user_cnpjs:
                     before = len(df)
                     df = df[df['cnpj_importador'].isin(user_cnpjs)]
-                    print(f"[DEBUG] Filtrado por CNPJs do usuário: {before} -> {len(df)} registros")
+                    log_printf("[DEBUG] Filtrado por CNPJs do usuário: %s -> %s registros", before, len(df))
                 else:
-                    print(f"[DEBUG] Usuário sem CNPJs - zerando dataset")
+                    log_print(f"[DEBUG] Usuário sem CNPJs - zerando dataset")
                     df = df.iloc[0:0]
 
         # Filtro de data de embarque
         if filtro_embarque == 'preenchida' and 'data_embarque' in df.columns:
             df = df[df['data_embarque'].notna() & (df['data_embarque'] != '')]
-            print(f"[DEBUG] Filtrado por data embarque: {len(df)} registros")
+            log_printf("[DEBUG] Filtrado por data embarque: %s registros", len(df))
 
         # Filtro por empresa específica (quando selecionada no dropdown) - suporte múltiplas empresas
         if company_filter and 'cnpj_importador' in df.columns:
@@ -393,20 +407,20 @@ def get_dashboard_data():
             if ',' in company_filter:
                 company_list = [cnpj.strip() for cnpj in company_filter.split(',') if cnpj.strip()]
                 df = df[df['cnpj_importador'].isin(company_list)]
-                print(f"[DEBUG] Filtrado por múltiplas empresas {company_list}: {before_filter} -> {len(df)} registros")
+                log_printf("[DEBUG] Filtrado por múltiplas empresas %s: %s -> %s registros", company_list, before_filter, len(df))
             else:
                 # Uma empresa apenas (compatibilidade com versão anterior)
                 df = df[df['cnpj_importador'] == company_filter]
-                print(f"[DEBUG] Filtrado por empresa {company_filter}: {before_filter} -> {len(df)} registros")
+                log_printf("[DEBUG] Filtrado por empresa %s: %s -> %s registros", company_filter, before_filter, len(df))
 
         # Métricas
         if 'modal' in df.columns:
-            print(f"[DEBUG] Valores originais únicos de modal: {sorted({str(m) for m in df['modal'].dropna().unique()})}")
+            log_printf("[DEBUG] Valores originais únicos de modal: %s", sorted({str(m) for m in df['modal'].dropna().unique()}))
             # Criar coluna normalizada para evitar inconsistências (ex: '4.0', 'AÉREO', etc.)
             df['modal_normalizado'] = df['modal'].apply(normalize_modal)
             # Substituir coluna principal para simplificar downstream
             df['modal'] = df['modal_normalizado']
-            print(f"[DEBUG] Valores normalizados únicos de modal: {sorted({str(m) for m in df['modal'].dropna().unique()})}")
+            log_printf("[DEBUG] Valores normalizados únicos de modal: %s", sorted({str(m) for m in df['modal'].dropna().unique()}))
         else:
             df['modal_normalizado'] = ''
 
@@ -421,7 +435,7 @@ def get_dashboard_data():
             elif modal == '7':
                 count_terrestre += int(count)
 
-        print(f"[DEBUG] Contagem normalizada -> Marítimo: {count_maritimo}, Aéreo: {count_aereo}, Terrestre: {count_terrestre}")
+        log_printf("[DEBUG] Contagem normalizada -> Marítimo: %s, Aéreo: %s, Terrestre: %s", count_maritimo, count_aereo, count_terrestre)
 
         # Padronização de colunas
         column_mapping = {
@@ -509,11 +523,11 @@ def get_dashboard_data():
             }
         }
 
-        print(f"[DEBUG] Retornando {len(table_data)} registros para página {page}")
+        log_printf("[DEBUG] Retornando %s registros para página %s", len(table_data), page)
         return jsonify(response_data)
 
     except Exception as e:
-        print(f"[ERROR] Erro ao obter dados do dashboard: {e}")
+        log_printf("[ERROR] Erro ao obter dados do dashboard: %s", e)
         import traceback
         traceback.print_exc()
         return jsonify({'error': 'Erro interno do servidor', 'details': str(e)}), 500
@@ -527,7 +541,7 @@ def get_companies():
         request_api_key = request.headers.get('X-API-Key')
         
         if api_bypass_key and request_api_key == api_bypass_key:
-            print("[DEBUG] API Bypass autorizado - simulando admin_operacao")
+            log_print("[DEBUG] API Bypass autorizado - simulando admin_operacao")
             # Simular usuário admin_operacao para teste
             user = {'role': 'interno_unique', 'perfil_principal': 'admin_operacao'}
         else:
@@ -541,13 +555,13 @@ def get_companies():
         # Para admin_operacao, buscar todas as empresas dos dados ativos
         perfil_principal = user.get('perfil_principal', '')
         if perfil_principal == 'admin_operacao':
-            print("[DEBUG] Admin operação - buscando todas as empresas dos dados")
+            log_print("[DEBUG] Admin operação - buscando todas as empresas dos dados")
             # Primeiro tentar buscar com limit para identificar colunas disponíveis
             query = supabase_admin.table('vw_importacoes_6_meses_abertos_dash').select('*').limit(1).execute()
             
             if query.data:
                 colunas_disponiveis = list(query.data[0].keys())
-                print(f"[DEBUG] Colunas disponíveis na view: {colunas_disponiveis}")
+                log_printf("[DEBUG] Colunas disponíveis na view: %s", colunas_disponiveis)
                 
                 # Identificar a coluna de razão social
                 razao_col = None
@@ -559,7 +573,7 @@ def get_companies():
                 if not razao_col:
                     razao_col = 'cnpj_importador'  # Fallback
                 
-                print(f"[DEBUG] Usando coluna para razao social: {razao_col}")
+                log_printf("[DEBUG] Usando coluna para razao social: %s", razao_col)
                 
                 # Buscar dados completos usando 'importador' como nome da empresa
                 query_full = supabase_admin.table('vw_importacoes_6_meses_abertos_dash').select('cnpj_importador, importador').execute()
@@ -574,7 +588,7 @@ def get_companies():
                 
                 empresas = [{'cnpj': cnpj, 'nome': razao} for cnpj, razao in empresas_dict.items()]
             else:
-                print("[DEBUG] Nenhum dado encontrado na view")
+                log_print("[DEBUG] Nenhum dado encontrado na view")
                 empresas = []
             
         else:
@@ -598,14 +612,14 @@ def get_companies():
         # Ordenar por nome
         empresas.sort(key=lambda x: x['nome'])
         
-        print(f"[DEBUG] Encontradas {len(empresas)} empresas para filtro")
+        log_printf("[DEBUG] Encontradas %s empresas para filtro", len(empresas))
         return jsonify({
             'success': True,
             'empresas': empresas
         })
         
     except Exception as e:
-        print(f"[ERROR] Erro ao buscar empresas: {e}")
+        log_printf("[ERROR] Erro ao buscar empresas: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @dash_importacoes_resumido_bp.route('/api/companies-info')
@@ -617,7 +631,7 @@ def get_companies_info():
         request_api_key = request.headers.get('X-API-Key')
         
         if api_bypass_key and request_api_key == api_bypass_key:
-            print("[DEBUG] API Bypass autorizado - simulando admin_operacao")
+            log_print("[DEBUG] API Bypass autorizado - simulando admin_operacao")
             user = {'role': 'interno_unique', 'perfil_principal': 'admin_operacao'}
         else:
             if 'user' not in session:
@@ -630,7 +644,7 @@ def get_companies_info():
         # Lógica de carregamento baseada na quantidade de empresas
         if perfil_principal == 'admin_operacao':
             # Admin com acesso a todas as empresas - sempre obrigar filtro
-            print("[DEBUG] Admin operação - obrigando seleção de filtro")
+            log_print("[DEBUG] Admin operação - obrigando seleção de filtro")
             return jsonify({
                 'success': True,
                 'require_filter': True,
@@ -646,7 +660,7 @@ def get_companies_info():
             company_count = len(user_cnpjs) if user_cnpjs else 0
             
             if company_count == 0:
-                print(f"[DEBUG] Usuário sem empresas vinculadas")
+                log_print(f"[DEBUG] Usuário sem empresas vinculadas")
                 return jsonify({
                     'success': True,
                     'require_filter': False,
@@ -657,7 +671,7 @@ def get_companies_info():
                 })
             
             elif company_count == 1:
-                print(f"[DEBUG] Usuário com 1 empresa - carregamento automático")
+                log_print(f"[DEBUG] Usuário com 1 empresa - carregamento automático")
                 return jsonify({
                     'success': True,
                     'require_filter': False,
@@ -669,7 +683,7 @@ def get_companies_info():
                 })
             
             else:
-                print(f"[DEBUG] Usuário com {company_count} empresas - obrigando filtro")
+                log_printf("[DEBUG] Usuário com %s empresas - obrigando filtro", company_count)
                 return jsonify({
                     'success': True,
                     'require_filter': True,
@@ -680,14 +694,14 @@ def get_companies_info():
                 })
         
     except Exception as e:
-        print(f"[ERROR] Erro ao buscar informações das empresas: {e}")
+        log_printf("[ERROR] Erro ao buscar informações das empresas: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @dash_importacoes_resumido_bp.route('/debug-view')
 def debug_view():
     """Endpoint de debug para testar a view diretamente."""
     try:
-        print("[DEBUG_VIEW] Testando acesso direto à view...")
+        log_print("[DEBUG_VIEW] Testando acesso direto à view...")
         
         # Verificar bypass
         api_bypass_key = os.getenv('API_BYPASS_KEY')
@@ -700,7 +714,7 @@ def debug_view():
         query = supabase_admin.table('vw_importacoes_6_meses_abertos_dash').select('*').limit(5)
         result = query.execute()
         
-        print(f"[DEBUG_VIEW] Resultado da query: {result}")
+        log_printf("[DEBUG_VIEW] Resultado da query: %s", result)
         
         return jsonify({
             'success': True,
@@ -710,7 +724,7 @@ def debug_view():
         })
         
     except Exception as e:
-        print(f"[DEBUG_VIEW] Erro: {e}")
+        log_printf("[DEBUG_VIEW] Erro: %s", e)
         return jsonify({
             'success': False,
             'error': str(e),
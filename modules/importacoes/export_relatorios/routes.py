@@ -13,6 +13,9 @@ from openpyxl import Workbook
 from openpyxl.styles import Font, PatternFill, Alignment
 from openpyxl.utils import get_column_letter
 from io import BytesIO
+from services.export_jobs import export_jobs
+from services.supabase_transport import call_class
+from modules.importacoes.export_relatorios.search_index import INDEX_KEY_COLUMN, get_search_index
 
 # Blueprint acessível por todas as roles
 export_relatorios_bp = Blueprint(
@@ -177,42 +180,52 @@ def parse_br_date(date_str):
     except Exception:
         return None
 
-def build_base_query(user):
-    """Constrói query base com segurança obrigatória por CNPJ do usuário."""
-    # Utiliza view consolidada com colunas atualizadas de status
-    q = supabase_admin.table('vw_importacoes_geral_export').select('*')
-    
-    # SEGURANÇA OBRIGATÓRIA: Sempre filtrar por CNPJs do usuário
+def resolve_user_scope(user):
+    """Escopo de acesso do usuário: ('all' | 'companies' | 'blocked', CNPJs permitidos).
+
+    Fonte única das regras de segurança usadas por build_base_query e is_scope_blocked.
+    """
     user_role = user.get('role', '')
     user_companies = user.get('user_companies') or []
-    perfil_principal = user.get('perfil_principal', '')
-    is_admin_operacao = perfil_principal == 'admin_operacao'
+    is_admin_operacao = user.get('perfil_principal', '') == 'admin_operacao'
     
     # Para clientes, SEMPRE restringir aos CNPJs associados
     if user_role == 'cliente_unique':
         if user_companies:
-            print(f"[EXPORT_REL][SECURITY] Cliente {user.get('id')} restrito aos CNPJs: {user_companies}")
-            q = q.in_('cnpj_importador', user_companies)
-        else:
-            # Se não tem empresas associadas, retorna query vazia por segurança
-            print(f"[EXPORT_REL][SECURITY] Cliente {user.get('id')} sem CNPJs - bloqueando acesso")
-            q = q.limit(0)
+            return 'companies', user_companies
+        # Se não tem empresas associadas, bloqueia por segurança
+        return 'blocked', []
     
     # Para usuários internos com perfil admin_operacao, permitir ver todos os dados
-    elif user_role == 'interno_unique' and is_admin_operacao:
-        print(f"[EXPORT_REL][SECURITY] Usuário admin_operacao {user.get('id')} - acesso completo a todos os dados")
+    if user_role == 'interno_unique' and is_admin_operacao:
+        return 'all', []
     
     # Para usuários internos normais, aplicar filtro se tiverem CNPJs específicos
-    elif user_role == 'interno_unique' and user_companies:
-        print(f"[EXPORT_REL][SECURITY] Usuário interno {user.get('id')} filtrado por CNPJs: {user_companies}")
-        q = q.in_('cnpj_importador', user_companies)
+    if user_role == 'interno_unique' and user_companies:
+        return 'companies', user_companies
     
     # Admins podem acessar todos os dados (sem filtro adicional)
-    elif user_role == 'admin':
-        print(f"[EXPORT_REL][SECURITY] Admin {user.get('id')} - acesso completo")
+    if user_role == 'admin':
+        return 'all', []
     
+    # Usuários sem role definida ou roles desconhecidas = acesso negado
+    return 'blocked', []
+
+def build_base_query(user, columns='*'):
+    """Constrói query base com segurança obrigatória por CNPJ do usuário."""
+    # Utiliza view consolidada com colunas atualizadas de status
+    q = supabase_admin.table('vw_importacoes_geral_export').select(columns)
+    
+    # SEGURANÇA OBRIGATÓRIA: Sempre filtrar por CNPJs do usuário
+    scope, companies = resolve_user_scope(user)
+    user_role = user.get('role', '')
+    
+    if scope == 'companies':
+        print(f"[EXPORT_REL][SECURITY] Usuário {user.get('id')} ({user_role}) restrito aos CNPJs: {companies}")
+        q = q.in_('cnpj_importador', companies)
+    elif scope == 'all':
+        print(f"[EXPORT_REL][SECURITY] Usuário {user.get('id')} ({user_role}) - acesso completo a todos os dados")
     else:
-        # Usuários sem role definida ou roles desconhecidas = acesso negado
         print(f"[EXPORT_REL][SECURITY] Usuário {user.get('id')} com role '{user_role}' - acesso negado")
         q = q.limit(0)
     
@@ -422,12 +435,6 @@ def post_fetch_filter(rows, filters):
         print(f"[EXPORT_REL][FILTRO_DATAS] has_identifier={has_identifier} dt_start={dt_start} dt_end={dt_end} antes={before} depois={after}")
     return rows
 
-def paginate(rows, page, page_size):
-    total = len(rows)
-    start = (page - 1) * page_size
-    end = start + page_size
-    return rows[start:end], total
-
 def get_documentos_by_ref_unique(ref_unique_list):
     """
     Busca documentos ativos para uma lista de ref_unique.
@@ -494,6 +501,56 @@ def extract_filters(req_json):
             filters[extra] = req_json.get(extra)
     return filters
 
+# Tempo máximo que uma página aguarda a construção do índice
+SEARCH_WAIT_TIMEOUT = 60
+# O índice lê só a chave e as colunas usadas por validate_user_data_access e post_fetch_filter
+INDEX_COLUMNS = ','.join([
+    INDEX_KEY_COLUMN, 'cnpj_importador', 'data_abertura', 'data_registro',
+    'data_embarque', 'data_chegada', 'data_desembaraco',
+])
+# Opções de filtro: linhas lidas por campo (consulta só da coluna, sem o índice)
+FILTER_OPTIONS_SCAN_LIMIT = 5000
+
+def is_scope_blocked(user):
+    """Usuários que build_base_query bloqueia com limit(0)"""
+    return resolve_user_scope(user)[0] == 'blocked'
+
+def get_user_search_index(user, filters):
+    """Índice de resultados para o escopo do usuário e os filtros informados"""
+    # Determinar limite baseado em se há filtros aplicados
+    # Se não há filtros (exceto page/page_size), buscar tudo disponível
+    has_filters = any(k not in ['page', 'page_size', 'export'] and v for k, v in filters.items())
+    query_limit = 50000 if has_filters else 200000  # 200K para busca sem filtros
+    blocked = is_scope_blocked(user)
+    
+    def fetch_chunk(last_key, size):
+        if blocked:
+            return []
+        q = build_base_query(user, INDEX_COLUMNS)
+        q = apply_query_filters(q, filters, user)
+        if last_key is not None:
+            q = q.lt(INDEX_KEY_COLUMN, last_key)
+        # Construção do índice (até 200K linhas em blocos): leitura pesada
+        with call_class('report'):
+            return q.order(INDEX_KEY_COLUMN, desc=True).limit(size).execute().data or []
+    
+    def accept_rows(rows):
+        # VALIDAÇÃO DE SEGURANÇA e pós-filtro de datas, bloco a bloco
+        return post_fetch_filter(validate_user_data_access(rows, user), filters)
+    
+    return get_search_index(dict(user), filters, query_limit, fetch_chunk, accept_rows)
+
+def fetch_rows_by_ids(user, page_ids):
+    """Linhas completas de uma página do índice, na ordem dos IDs"""
+    if not page_ids or is_scope_blocked(user):
+        return []
+    q = build_base_query(user).in_(INDEX_KEY_COLUMN, page_ids)
+    with call_class('report'):
+        rows = q.limit(len(page_ids)).execute().data or []
+    # VALIDAÇÃO DE SEGURANÇA também nas linhas completas
+    by_id = {r.get(INDEX_KEY_COLUMN): r for r in validate_user_data_access(rows, user)}
+    return [by_id[row_id] for row_id in page_ids if row_id in by_id]
+
 @export_relatorios_bp.route('/api/search_processos', methods=['POST'])
 def search_processos():
     """
@@ -515,31 +572,21 @@ def search_processos():
     filters = extract_filters(payload)
     page = int(filters.get('page') or 1)
     page_size = min(int(filters.get('page_size') or 500), 5000)
-    print(f"[EXPORT_REL] Busca iniciada user={user.get('id')} role={user.get('role')} page={page} page_size={page_size}")
+    cursor = payload.get('cursor')
+    print(f"[EXPORT_REL] Busca iniciada user={user.get('id')} role={user.get('role')} page={page} page_size={page_size} cursor={cursor}")
     try:
-        q = build_base_query(user)
-        q = apply_query_filters(q, filters, user)
+        index = get_user_search_index(user, filters)
         
-        # Determinar limite baseado em se há filtros aplicados
-        # Se não há filtros (exceto page/page_size), buscar tudo disponível
-        has_filters = any(k not in ['page', 'page_size', 'export'] and v for k, v in filters.items())
-        query_limit = 50000 if has_filters else 200000  # 200K para busca sem filtros
-        
-        print(f"[EXPORT_REL] has_filters={has_filters}, query_limit={query_limit}")
-        raw = q.limit(query_limit).execute()
-        rows = raw.data or []
-        print(f"[EXPORT_REL] Registros retornados antes pós-filtro: {len(rows)}")
-        
-        # VALIDAÇÃO DE SEGURANÇA: Verificar se todos os registros pertencem ao usuário
-        rows = validate_user_data_access(rows, user)
-        print(f"[EXPORT_REL] Após validação de segurança: {len(rows)}")
+        # Primeira página assim que houver linhas suficientes; as demais saem do índice
+        if cursor:
+            page_ids, next_cursor = index.page_after(cursor, page_size, SEARCH_WAIT_TIMEOUT)
+        else:
+            page_ids, next_cursor = index.page_number(page, page_size, SEARCH_WAIT_TIMEOUT)
         
-        rows = post_fetch_filter(rows, filters)
-        print(f"[EXPORT_REL] Após pós-filtro: {len(rows)}")
+        # O índice guarda só os IDs: as linhas da página são buscadas por ID
+        page_rows = fetch_rows_by_ids(user, page_ids)
         
         # OTIMIZAÇÃO: Buscar documentos APENAS para a página atual
-        page_rows, total = paginate(rows, page, page_size)
-        
         if page_rows:
             ref_unique_list = [r.get('ref_unique') for r in page_rows if r.get('ref_unique')]
             print(f"[EXPORT_REL] Buscando documentos para {len(ref_unique_list)} processos na página")
@@ -550,6 +597,7 @@ def search_processos():
                 ref = row.get('ref_unique')
                 row['documentos'] = documentos_map.get(ref, [])
         
+        index_status = index.status()
         duration = (datetime.now() - started_at).total_seconds()
         return jsonify({
             'success': True,
@@ -557,7 +605,10 @@ def search_processos():
             'page': page,
             'page_size': page_size,
             'returned': len(page_rows),
-            'total_count': total,
+            'total_count': index_status['indexed'],
+            'index_complete': index_status['complete'],
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None,
             'columns': TABLE_COLUMNS,
             'rows': page_rows
         })
@@ -568,78 +619,149 @@ def search_processos():
         traceback.print_exc()
         return jsonify({'success': False, 'error': str(e)}), 500
 
+EXPORT_FORMATS = {
+    'csv': ('csv', 'text/csv; charset=utf-8'),
+    'excel': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+
+
+def fetch_export_rows(user, filters):
+    """Busca, valida e pós-filtra as linhas de uma exportação.
+
+    Retorna (rows, final_columns, despesas_categories).
+    """
+    # Determinar limite baseado em se há filtros aplicados
+    has_filters = any(k not in ['page', 'page_size', 'export'] and v for k, v in filters.items())
+    max_rows = 100000 if has_filters else 500000  # 500K para export sem filtros
+    
+    print(f"[EXPORT_REL] Export iniciado user={user.get('id')} has_filters={has_filters} max_rows={max_rows}")
+    q = build_base_query(user)
+    q = apply_query_filters(q, filters, user)
+    
+    # OTIMIZAÇÃO: Buscar sem a coluna 'documentos' para ganhar performance
+    # A busca de documentos é cara e não será incluída na exportação
+    print(f"[EXPORT_REL] Buscando até {max_rows} registros (documentos excluídos para performance)")
+    # Export síncrono também usa o timeout longo (nos jobs a classe já vem de export_jobs)
+    with call_class('export'):
+        raw = q.limit(max_rows + 1).execute()
+    rows = raw.data or []
+    print(f"[EXPORT_REL] Query retornou {len(rows)} registros")
+    
+    # VALIDAÇÃO DE SEGURANÇA: Verificar se todos os registros pertencem ao usuário
+    rows = validate_user_data_access(rows, user)
+    print(f"[EXPORT_REL] Após validação de segurança: {len(rows)}")
+    
+    rows = post_fetch_filter(rows, filters)
+    print(f"[EXPORT_REL] Após pós-filtro: {len(rows)}")
+    
+    # Validar limite e avisar se foi truncado
+    if len(rows) > max_rows:
+        print(f"[EXPORT_REL] AVISO: Resultado truncado de {len(rows)} para {max_rows}")
+        rows = rows[:max_rows]
+    
+    # Colunas a usar (documentos é buscado sob demanda na página)
+    # Excluir 'despesas_processo' pois será expandida em colunas separadas
+    columns_to_export = [c for c in TABLE_COLUMNS if c not in ['documentos', 'despesas_processo']]
+    
+    # Extrair categorias únicas de despesas para criar colunas dinâmicas
+    despesas_categories = extract_despesas_categories(rows)
+    despesas_columns = [f'despesa_{cat}' for cat in despesas_categories]
+    print(f"[EXPORT_REL] Categorias de despesas encontradas: {despesas_categories}")
+    
+    # Colunas finais: colunas base + colunas de despesas expandidas
+    final_columns = columns_to_export + despesas_columns
+    return rows, final_columns, despesas_categories
+
+
+def iter_export_values(rows, final_columns, despesas_categories):
+    """Valores de cada linha na ordem de final_columns (despesas expandidas)"""
+    for r in rows:
+        # Expandir despesas para esta linha
+        despesas_expanded = expand_despesas_to_columns(r, despesas_categories)
+        yield [
+            despesas_expanded.get(col, '') if col.startswith('despesa_') else serialize_cell_value(r.get(col))
+            for col in final_columns
+        ]
+
+
+def write_export_csv(output, rows, final_columns, despesas_categories, progress=None):
+    """Grava o CSV (separador ';') em um arquivo texto"""
+    writer = csv.writer(output, delimiter=';')
+    writer.writerow(final_columns)
+    for idx, values in enumerate(iter_export_values(rows, final_columns, despesas_categories), 1):
+        writer.writerow(values)
+        if progress and idx % 1000 == 0:
+            progress(idx, len(rows))
+    if progress:
+        progress(len(rows), len(rows))
+
+
+def build_export_workbook(rows, final_columns, despesas_categories, progress=None):
+    """Monta o workbook Excel com cabeçalho estilizado"""
+    print(f"[EXPORT_REL] Gerando Excel com {len(rows)} registros e {len(final_columns)} colunas")
+    
+    # Criar workbook Excel
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Processos"
+    
+    # Estilização do cabeçalho
+    header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+    header_font = Font(bold=True, color="FFFFFF", size=11)
+    header_alignment = Alignment(horizontal="center", vertical="center")
+    
+    # Estilo diferenciado para colunas de despesas
+    despesa_header_fill = PatternFill(start_color="70AD47", end_color="70AD47", fill_type="solid")
+    
+    # Escrever cabeçalho
+    for col_idx, col_name in enumerate(final_columns, 1):
+        cell = ws.cell(row=1, column=col_idx)
+        cell.value = col_name
+        # Usar cor verde para colunas de despesas
+        if col_name.startswith('despesa_'):
+            cell.fill = despesa_header_fill
+        else:
+            cell.fill = header_fill
+        cell.font = header_font
+        cell.alignment = header_alignment
+    
+    # Escrever dados
+    print(f"[EXPORT_REL] Escrevendo dados no Excel...")
+    for row_idx, values in enumerate(iter_export_values(rows, final_columns, despesas_categories), 2):
+        if row_idx % 5000 == 0:
+            print(f"[EXPORT_REL] Progresso: {row_idx}/{len(rows)} registros")
+        if progress and row_idx % 1000 == 0:
+            progress(row_idx - 1, len(rows))
+        ws.append(values)
+    
+    # Ajustar largura das colunas
+    for col_idx in range(1, len(final_columns) + 1):
+        ws.column_dimensions[get_column_letter(col_idx)].width = 15
+    
+    if progress:
+        progress(len(rows), len(rows), 'Salvando arquivo')
+    return wb
+
+
 @export_relatorios_bp.route('/api/export_csv', methods=['POST'])
 @login_required
 def export_csv():
     """
     Exporta CSV com os filtros informados (limite de segurança).
     Otimizado para lidar com grandes volumes (20k+) de registros.
+    Para volumes grandes prefira /api/export_jobs (geração em segundo plano).
     """
     started_at = datetime.now()
     user = session.get('user', {})
     payload = request.get_json(silent=True) or {}
     filters = extract_filters(payload)
     
-    # Determinar limite baseado em se há filtros aplicados
-    has_filters = any(k not in ['page', 'page_size', 'export'] and v for k, v in filters.items())
-    max_rows = 100000 if has_filters else 500000  # 500K para export sem filtros
-    
-    print(f"[EXPORT_REL] Export CSV iniciado user={user.get('id')} has_filters={has_filters} max_rows={max_rows}")
     try:
-        q = build_base_query(user)
-        q = apply_query_filters(q, filters, user)
-        
-        # OTIMIZAÇÃO: Buscar sem a coluna 'documentos' para ganhar performance
-        # A busca de documentos é cara e não será incluída na exportação
-        print(f"[EXPORT_REL] Buscando até {max_rows} registros (documentos excluídos para performance)")
-        raw = q.limit(max_rows + 1).execute()
-        rows = raw.data or []
-        print(f"[EXPORT_REL] Query retornou {len(rows)} registros")
-        
-        # VALIDAÇÃO DE SEGURANÇA: Verificar se todos os registros pertencem ao usuário
-        rows = validate_user_data_access(rows, user)
-        print(f"[EXPORT_REL] Após validação de segurança: {len(rows)}")
-        
-        rows = post_fetch_filter(rows, filters)
-        print(f"[EXPORT_REL] Após pós-filtro: {len(rows)}")
+        rows, final_columns, despesas_categories = fetch_export_rows(user, filters)
         
-        # Validar limite e avisar se foi truncado
-        if len(rows) > max_rows:
-            print(f"[EXPORT_REL] AVISO: Resultado truncado de {len(rows)} para {max_rows}")
-            rows = rows[:max_rows]
-        
-        # Colunas a usar (documentos é buscado sob demanda na página)
-        # Excluir 'despesas_processo' pois será expandida em colunas separadas
-        columns_to_export = [c for c in TABLE_COLUMNS if c not in ['documentos', 'despesas_processo']]
-        
-        # Extrair categorias únicas de despesas para criar colunas dinâmicas
-        despesas_categories = extract_despesas_categories(rows)
-        despesas_columns = [f'despesa_{cat}' for cat in despesas_categories]
-        print(f"[EXPORT_REL] Categorias de despesas encontradas: {despesas_categories}")
-        
-        # Colunas finais: colunas base + colunas de despesas expandidas
-        final_columns = columns_to_export + despesas_columns
-        
-        # Gerar CSV em stream
+        # Gerar CSV em memória
         output = io.StringIO()
-        writer = csv.writer(output, delimiter=';')
-        
-        # Usar colunas finais expandidas
-        writer.writerow(final_columns)
-        
-        for r in rows:
-            # Expandir despesas para esta linha
-            despesas_expanded = expand_despesas_to_columns(r, despesas_categories)
-            
-            row_values = []
-            for col in final_columns:
-                if col.startswith('despesa_'):
-                    row_values.append(despesas_expanded.get(col, ''))
-                else:
-                    row_values.append(serialize_cell_value(r.get(col)))
-            
-            writer.writerow(row_values)
-        
+        write_export_csv(output, rows, final_columns, despesas_categories)
         csv_data = output.getvalue()
         output.close()
         
@@ -665,101 +787,16 @@ def export_excel():
     """
     Exporta Excel (XLSX) com os filtros informados (limite de segurança).
     Otimizado para lidar com grandes volumes (20k+) de registros.
+    Para volumes grandes prefira /api/export_jobs (geração em segundo plano).
     """
     started_at = datetime.now()
     user = session.get('user', {})
     payload = request.get_json(silent=True) or {}
     filters = extract_filters(payload)
     
-    # Determinar limite baseado em se há filtros aplicados
-    has_filters = any(k not in ['page', 'page_size', 'export'] and v for k, v in filters.items())
-    max_rows = 100000 if has_filters else 500000  # 500K para export sem filtros
-    
-    print(f"[EXPORT_REL] Export Excel iniciado user={user.get('id')} has_filters={has_filters} max_rows={max_rows}")
     try:
-        q = build_base_query(user)
-        q = apply_query_filters(q, filters, user)
-        
-        # OTIMIZAÇÃO: Buscar sem a coluna 'documentos' para ganhar performance
-        # A busca de documentos é cara e não será incluída na exportação
-        print(f"[EXPORT_REL] Buscando até {max_rows} registros (documentos excluídos para performance)")
-        raw = q.limit(max_rows + 1).execute()
-        rows = raw.data or []
-        print(f"[EXPORT_REL] Query retornou {len(rows)} registros")
-        
-        # VALIDAÇÃO DE SEGURANÇA: Verificar se todos os registros pertencem ao usuário
-        rows = validate_user_data_access(rows, user)
-        print(f"[EXPORT_REL] Após validação de segurança: {len(rows)}")
-        
-        rows = post_fetch_filter(rows, filters)
-        print(f"[EXPORT_REL] Após pós-filtro: {len(rows)}")
-        
-        # Validar limite e avisar se foi truncado
-        if len(rows) > max_rows:
-            print(f"[EXPORT_REL] AVISO: Resultado truncado de {len(rows)} para {max_rows}")
-            rows = rows[:max_rows]
-        
-        # Colunas a usar (documentos é buscado sob demanda na página)
-        # Excluir 'despesas_processo' pois será expandida em colunas separadas
-        columns_to_export = [c for c in TABLE_COLUMNS if c not in ['documentos', 'despesas_processo']]
-        
-        # Extrair categorias únicas de despesas para criar colunas dinâmicas
-        despesas_categories = extract_despesas_categories(rows)
-        despesas_columns = [f'despesa_{cat}' for cat in despesas_categories]
-        print(f"[EXPORT_REL] Categorias de despesas encontradas: {despesas_categories}")
-        
-        # Colunas finais: colunas base + colunas de despesas expandidas
-        final_columns = columns_to_export + despesas_columns
-        
-        print(f"[EXPORT_REL] Gerando Excel com {len(rows)} registros e {len(final_columns)} colunas")
-        
-        # Criar workbook Excel
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Processos"
-        
-        # Estilização do cabeçalho
-        header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-        header_font = Font(bold=True, color="FFFFFF", size=11)
-        header_alignment = Alignment(horizontal="center", vertical="center")
-        
-        # Estilo diferenciado para colunas de despesas
-        despesa_header_fill = PatternFill(start_color="70AD47", end_color="70AD47", fill_type="solid")
-        
-        # Escrever cabeçalho
-        for col_idx, col_name in enumerate(final_columns, 1):
-            cell = ws.cell(row=1, column=col_idx)
-            cell.value = col_name
-            # Usar cor verde para colunas de despesas
-            if col_name.startswith('despesa_'):
-                cell.fill = despesa_header_fill
-            else:
-                cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = header_alignment
-        
-        # Escrever dados em batch para otimizar
-        print(f"[EXPORT_REL] Escrevendo dados no Excel...")
-        for row_idx, row_data in enumerate(rows, 2):
-            if row_idx % 5000 == 0:
-                print(f"[EXPORT_REL] Progresso: {row_idx}/{len(rows)} registros")
-            
-            # Expandir despesas para esta linha
-            despesas_expanded = expand_despesas_to_columns(row_data, despesas_categories)
-            
-            for col_idx, col_name in enumerate(final_columns, 1):
-                cell = ws.cell(row=row_idx, column=col_idx)
-                
-                # Se for coluna de despesa, pegar do dicionário expandido
-                if col_name.startswith('despesa_'):
-                    value = despesas_expanded.get(col_name, '')
-                    cell.value = value
-                else:
-                    cell.value = serialize_cell_value(row_data.get(col_name))
-        
-        # Ajustar largura das colunas
-        for col_idx in range(1, len(final_columns) + 1):
-            ws.column_dimensions[get_column_letter(col_idx)].width = 15
+        rows, final_columns, despesas_categories = fetch_export_rows(user, filters)
+        wb = build_export_workbook(rows, final_columns, despesas_categories)
         
         # Salvar em BytesIO
         print(f"[EXPORT_REL] Salvando arquivo Excel...")
@@ -787,11 +824,55 @@ def export_excel():
         traceback.print_exc()
         return jsonify({'success': False, 'error': str(e), 'duration': f"{duration:.2f}s"}), 500
 
+@export_relatorios_bp.route('/api/export_jobs', methods=['POST'])
+@login_required
+def submit_export_job():
+    """
+    Enfileira a exportação (formato 'csv' ou 'excel') para geração em segundo plano.
+    Retorna o job; o progresso chega pelo evento SocketIO 'export_job_progress'
+    e também por GET /background/export-jobs/<job_id>.
+    """
+    user = dict(session.get('user', {}))
+    payload = request.get_json(silent=True) or {}
+    formato = (payload.get('formato') or 'csv').lower()
+    if formato not in EXPORT_FORMATS:
+        return jsonify({'success': False, 'error': 'Formato inválido (use csv ou excel)'}), 400
+    filters = extract_filters(payload)
+    extension, mimetype = EXPORT_FORMATS[formato]
+    
+    def _build(path, progress):
+        progress(0, None, 'Buscando registros')
+        rows, final_columns, despesas_categories = fetch_export_rows(user, filters)
+        progress(0, len(rows), 'Gerando arquivo')
+        if formato == 'csv':
+            with open(path, 'w', encoding='utf-8', newline='') as output:
+                write_export_csv(output, rows, final_columns, despesas_categories, progress)
+        else:
+            build_export_workbook(rows, final_columns, despesas_categories, progress).save(path)
+        return {'rows': len(rows)}
+    
+    # A impressão digital inclui os CNPJs permitidos: a mesma busca com outro escopo não reaproveita o arquivo
+    fingerprint_params = {
+        'formato': formato,
+        'filters': filters,
+        'scope': sorted(user.get('user_companies') or []),
+        'role': user.get('role'),
+    }
+    try:
+        job, reused = export_jobs.submit(
+            user.get('id'), f'export_relatorios.{formato}', fingerprint_params, _build,
+            filename=f"export_processos_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}",
+            mimetype=mimetype
+        )
+    except RuntimeError as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+    return jsonify({'success': True, 'job': job.to_dict(reused)}), (200 if reused else 202)
+
 @export_relatorios_bp.route('/api/filter_options', methods=['GET'])
 def get_filter_options():
     """
     Retorna opções disponíveis para campos categóricos (dropdowns/checkboxes).
-    Usa cache e limita quantidade para performance.
+    Cada campo é lido em uma consulta limitada só daquela coluna, no escopo do usuário.
     """
     # Verificar bypass key ou sessão
     api_bypass_key = os.getenv('API_BYPASS_KEY')
@@ -817,13 +898,16 @@ def get_filter_options():
         }
         
         result = {}
+        blocked = is_scope_blocked(user)
         
         for field, config in categorical_fields.items():
-            # Buscar todos os valores e filtrar em Python (mais simples para valores distintos)
-            q = build_base_query(user)
-            
-            # Limitar a busca inicial
-            response = q.limit(5000).execute()
+            if blocked:
+                result[field] = {'values': [], 'count': 0, 'limited': False}
+                continue
+            # Só a coluna do campo, sem nulos, limitada (mesmo escopo de acesso da busca)
+            q = build_base_query(user, field).not_.is_(field, 'null')
+            with call_class('report'):
+                response = q.limit(FILTER_OPTIONS_SCAN_LIMIT).execute()
             
             # Extrair valores únicos
             values = []
@@ -840,7 +924,7 @@ def get_filter_options():
             values.sort()
             
             result[field] = {
-                'values': values[:config['limit']],
+                'values': values,
                 'count': len(values),
                 'limited': len(values) >= config['limit']
             }
@@ -0,0 +1,178 @@
+"""
+Índice de resultados da busca de relatórios.
+
+A busca baixava o conjunto filtrado inteiro, validava/pós-filtrava em Python
+e fatiava a lista a cada clique de página. Aqui cada combinação (escopo do
+usuário + filtros) gera um índice: a view é lida em blocos por cursor
+(ref_unique desc) trazendo só a chave e as colunas usadas pela validação de
+segurança e pelo pós-filtro; cada bloco passa por essas etapas e apenas os
+IDs aprovados são guardados, em ordem. A primeira página é respondida assim
+que houver IDs suficientes enquanto o restante do índice é construído em
+segundo plano; as linhas de cada página são buscadas por ID
+(`.in_(INDEX_KEY_COLUMN, page_ids)`), então o índice não mantém linhas
+completas em memória.
+
+Usage:
+    index = get_search_index(user, filters, max_rows, fetch_chunk, accept_rows)
+    page_ids, next_cursor = index.page_after(cursor, page_size, wait_timeout=30)
+"""
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+import time
+
+from services.single_flight import query_fingerprint
+
+INDEX_SOURCE = 'vw_importacoes_geral_export'
+INDEX_KEY_COLUMN = 'ref_unique'
+INDEX_CHUNK_SIZE = int(os.getenv('EXPORT_REL_INDEX_CHUNK', '5000'))
+INDEX_TTL_SECONDS = int(os.getenv('EXPORT_REL_INDEX_TTL', '300'))
+INDEX_MAX_ENTRIES = int(os.getenv('EXPORT_REL_INDEX_MAX_ENTRIES', '32'))
+INDEX_MAX_WORKERS = int(os.getenv('EXPORT_REL_INDEX_WORKERS', '4'))
+
+# Chaves da requisição que não mudam o conjunto de resultados
+PAGING_KEYS = ('page', 'page_size', 'cursor', 'export')
+
+_executor = ThreadPoolExecutor(max_workers=INDEX_MAX_WORKERS, thread_name_prefix='export-rel-index')
+
+
+class SearchIndex:
+    """IDs ordenados (ref_unique desc) das linhas aprovadas e a posição de cada ID"""
+
+    def __init__(self, key, max_rows):
+        self.key = key
+        self.max_rows = max_rows
+        self.ids = []
+        self.positions = {}
+        self.scanned = 0
+        self.complete = False
+        self.error = None
+        self.created_at = time.time()
+        self.built_at = None
+        self._cond = threading.Condition()
+
+    def is_fresh(self):
+        return (time.time() - self.created_at) < INDEX_TTL_SECONDS
+
+    def _append(self, rows):
+        with self._cond:
+            for row in rows:
+                row_id = row.get(INDEX_KEY_COLUMN)
+                if row_id is None or row_id in self.positions:
+                    continue
+                self.positions[row_id] = len(self.ids)
+                self.ids.append(row_id)
+            self._cond.notify_all()
+
+    def _finish(self, error=None):
+        with self._cond:
+            self.complete = True
+            self.error = error
+            self.built_at = time.time()
+            self._cond.notify_all()
+
+    def build(self, fetch_chunk, accept_rows):
+        """Lê blocos com fetch_chunk(last_key, size) e anexa os IDs das linhas aprovadas por accept_rows(rows)"""
+        started = time.time()
+        last_key = None
+        try:
+            while self.scanned < self.max_rows:
+                size = min(INDEX_CHUNK_SIZE, self.max_rows - self.scanned)
+                chunk = fetch_chunk(last_key, size)
+                if not chunk:
+                    break
+                self.scanned += len(chunk)
+                last_key = chunk[-1].get(INDEX_KEY_COLUMN)
+                self._append(accept_rows(chunk))
+                if len(chunk) < size or last_key is None:
+                    break
+            self._finish()
+            print(f"[EXPORT_REL][INDEX] Índice concluído: {len(self.ids)} de {self.scanned} linhas lidas em {time.time() - started:.2f}s")
+        except Exception as e:
+            print(f"[EXPORT_REL][INDEX][ERRO] {e}")
+            self._finish(error=e)
+
+    def wait_for(self, count, timeout):
+        """Aguarda até haver count IDs (ou o fim da construção)"""
+        deadline = time.time() + timeout
+        with self._cond:
+            while not self.complete and len(self.ids) < count:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            if self.error is not None and not self.ids:
+                raise self.error
+
+    def page_after(self, cursor, size, wait_timeout):
+        """IDs da página por cursor (ref_unique da última linha da página anterior)"""
+        start = 0
+        if cursor:
+            position = self.positions.get(cursor)
+            if position is None:
+                # Cursor ainda não indexado: aguarda o término para localizá-lo
+                self.wait_for(float('inf'), wait_timeout)
+                position = self.positions.get(cursor)
+                if position is None:
+                    return [], None
+            start = position + 1
+        return self._slice(start, size, wait_timeout)
+
+    def page_number(self, page, size, wait_timeout):
+        """IDs da página por número (compatibilidade com a paginação numérica da tela)"""
+        return self._slice((max(page, 1) - 1) * size, size, wait_timeout)
+
+    def _slice(self, start, size, wait_timeout):
+        # Uma linha a mais indica se existe próxima página
+        self.wait_for(start + size + 1, wait_timeout)
+        ids = self.ids[start:start + size]
+        has_more = len(self.ids) > start + size or not self.complete
+        next_cursor = ids[-1] if ids and has_more else None
+        return ids, next_cursor
+
+    def status(self):
+        return {
+            'indexed': len(self.ids),
+            'scanned': self.scanned,
+            'complete': self.complete,
+            'truncated': self.complete and self.scanned >= self.max_rows,
+        }
+
+
+_indexes = OrderedDict()
+_lock = threading.Lock()
+
+
+def index_key(user, filters):
+    """Impressão digital do conjunto de resultados: filtros + escopo de acesso do usuário"""
+    search_filters = {k: v for k, v in filters.items() if k not in PAGING_KEYS and v not in (None, '')}
+    return query_fingerprint(
+        INDEX_SOURCE, search_filters,
+        role=user.get('role'),
+        perfil=user.get('perfil_principal'),
+        companies=sorted(user.get('user_companies') or []),
+    )
+
+
+def get_search_index(user, filters, max_rows, fetch_chunk, accept_rows):
+    """Índice vigente para (usuário, filtros); cria e agenda a construção se necessário"""
+    key = index_key(user, filters)
+    with _lock:
+        index = _indexes.get(key)
+        if index is not None and index.is_fresh() and index.error is None:
+            _indexes.move_to_end(key)
+            return index
+        index = SearchIndex(key, max_rows)
+        _indexes[key] = index
+        _indexes.move_to_end(key)
+        while len(_indexes) > INDEX_MAX_ENTRIES:
+            _indexes.popitem(last=False)
+    _executor.submit(index.build, fetch_chunk, accept_rows)
+    return index
+
+
+def invalidate_search_indexes():
+    with _lock:
+        _indexes.clear()
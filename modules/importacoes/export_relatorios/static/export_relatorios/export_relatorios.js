@@ -17,6 +17,7 @@ document.addEventListener('DOMContentLoaded',()=>{
   let lastColumns = [];   // Guarda colunas retornadas
   let currentPage = 1;
   let totalPages = 1;
+  let pageCursors = {}; // página -> cursor (ref_unique da última linha da página anterior)
   let pageSize = 500; // default
 
   // Campos que suportam busca múltipla
@@ -399,6 +400,7 @@ document.addEventListener('DOMContentLoaded',()=>{
 
   async function executarBusca(){
     currentPage = 1; // reset
+    pageCursors = {};
     await buscarPagina();
   }
 
@@ -428,21 +430,26 @@ document.addEventListener('DOMContentLoaded',()=>{
       const res = await fetch('/export_relatorios/api/search_processos',{
         method:'POST',
         headers:{'Content-Type':'application/json','X-API-Key':window.API_BYPASS_KEY||''},
-        body:JSON.stringify(filtros)
+        body:JSON.stringify({...filtros, cursor: pageCursors[currentPage] || null})
       });
       const data = await res.json();
       if(!data.success) throw new Error(data.error||'Erro desconhecido');
       
-      statusEl.textContent=`${data.total_count} registros encontrados em ${data.duration.toFixed(2)}s`; 
+      // Enquanto o índice é construído o total ainda é parcial
+      const totalLabel = data.index_complete ? `${data.total_count}` : `${data.total_count}+`;
+      statusEl.textContent=`${totalLabel} registros encontrados em ${data.duration.toFixed(2)}s`; 
       lastColumns = data.columns;
       renderTable(data.columns, data.rows);
       
       // Paginação
       const total = data.total_count;
-      totalPages = Math.max(1, Math.ceil(total / data.page_size));
+      if(data.next_cursor) pageCursors[data.page + 1] = data.next_cursor;
+      totalPages = data.index_complete
+        ? Math.max(1, Math.ceil(total / data.page_size))
+        : Math.max(data.page + (data.has_more ? 1 : 0), Math.ceil(total / data.page_size));
       currentPageEl.textContent = data.page;
-      totalPagesEl.textContent = totalPages;
-      totalRegistrosEl.textContent = `${data.returned}/${total}`;
+      totalPagesEl.textContent = data.index_complete ? totalPages : `${totalPages}+`;
+      totalRegistrosEl.textContent = `${data.returned}/${totalLabel}`;
       paginacao.classList.remove('hidden');
       
       // Habilitar/desabilitar ambos os botões de exportação
@@ -491,60 +498,79 @@ document.addEventListener('DOMContentLoaded',()=>{
     }
   }
 
-  async function exportarCsv(){
-    if(!lastFilters) return;
-    statusEl.textContent='Gerando CSV...';
-    const filtros = {...lastFilters};
-    delete filtros.page; delete filtros.page_size; // exporta tudo dentro do limite server-side
-    try{
-      const res = await fetch('/export_relatorios/api/export_csv',{
-        method:'POST',
-        headers:{'Content-Type':'application/json','X-API-Key':window.API_BYPASS_KEY||''},
-        body:JSON.stringify(filtros)
-      });
-      if(!res.ok){
-        const js = await res.json().catch(()=>({error:'Erro ao gerar CSV'}));
-        throw new Error(js.error||res.statusText);
-      }
-      const blob = await res.blob();
-      const url = URL.createObjectURL(blob);
-      const a = document.createElement('a');
-      a.href=url; a.download=res.headers.get('Content-Disposition')?.split('filename=')[1]||'export.csv';
-      document.body.appendChild(a); a.click(); a.remove();
-      URL.revokeObjectURL(url);
-      statusEl.textContent='CSV pronto.';
-    }catch(e){
-      statusEl.textContent='Erro exportação: '+e.message;
-    }
+  // Exportação em segundo plano: o servidor devolve um job e o progresso chega pelo
+  // evento SocketIO 'export_job_progress' (com polling de reserva) até o link de download.
+  function acompanharExportacao(job, label){
+    return new Promise((resolve, reject) => {
+      let finalizado = false;
+      let pollTimer = null;
+
+      const aplicar = (estado) => {
+        if(finalizado || !estado || estado.job_id !== job.job_id) return;
+        if(estado.status === 'done'){
+          finalizado = true;
+          encerrar();
+          statusEl.textContent = `${label} pronto${estado.result && estado.result.rows !== undefined ? ` (${estado.result.rows} registros)` : ''}.`;
+          window.location.href = estado.download_url;
+          resolve(estado);
+        } else if(estado.status === 'error'){
+          finalizado = true;
+          encerrar();
+          reject(new Error(estado.error || 'Falha na exportação'));
+        } else {
+          const pct = estado.progress !== null && estado.progress !== undefined ? ` ${estado.progress}%` : '';
+          statusEl.textContent = `Gerando ${label}...${pct}${estado.message ? ' - ' + estado.message : ''}`;
+        }
+      };
+
+      const onSocket = (estado) => aplicar(estado);
+      const encerrar = () => {
+        if(pollTimer) clearInterval(pollTimer);
+        if(window.socket) window.socket.off('export_job_progress', onSocket);
+      };
+
+      if(window.socket) window.socket.on('export_job_progress', onSocket);
+      pollTimer = setInterval(async () => {
+        try{
+          const res = await fetch(`/background/export-jobs/${job.job_id}`);
+          const js = await res.json();
+          if(js.success) aplicar(js.job);
+        }catch(e){ console.warn('[EXPORT_REL] Falha no polling da exportação', e); }
+      }, 3000);
+      aplicar(job);
+    });
   }
 
-  async function exportarExcel(){
+  async function exportarEmSegundoPlano(formato, label){
     if(!lastFilters) return;
-    statusEl.textContent='Gerando Excel...';
-    const filtros = {...lastFilters};
+    statusEl.textContent=`Gerando ${label}...`;
+    const filtros = {...lastFilters, formato};
     delete filtros.page; delete filtros.page_size; // exporta tudo dentro do limite server-side
     try{
-      const res = await fetch('/export_relatorios/api/export_excel',{
+      const res = await fetch('/export_relatorios/api/export_jobs',{
         method:'POST',
         headers:{'Content-Type':'application/json','X-API-Key':window.API_BYPASS_KEY||''},
         body:JSON.stringify(filtros)
       });
-      if(!res.ok){
-        const js = await res.json().catch(()=>({error:'Erro ao gerar Excel'}));
+      const js = await res.json().catch(()=>({error:`Erro ao gerar ${label}`}));
+      if(!res.ok || !js.success){
         throw new Error(js.error||res.statusText);
       }
-      const blob = await res.blob();
-      const url = URL.createObjectURL(blob);
-      const a = document.createElement('a');
-      a.href=url; a.download=res.headers.get('Content-Disposition')?.split('filename=')[1]||'export.xlsx';
-      document.body.appendChild(a); a.click(); a.remove();
-      URL.revokeObjectURL(url);
-      statusEl.textContent='Excel pronto.';
+      if(js.job.reused) console.log('[EXPORT_REL] Reaproveitando exportação recente', js.job.job_id);
+      await acompanharExportacao(js.job, label);
     }catch(e){
       statusEl.textContent='Erro exportação: '+e.message;
     }
   }
 
+  function exportarCsv(){
+    return exportarEmSegundoPlano('csv', 'CSV');
+  }
+
+  function exportarExcel(){
+    return exportarEmSegundoPlano('excel', 'Excel');
+  }
+
   // Função para criar skeleton loading
   function createSkeletonLoading() {
     const container = document.getElementById('advanced-filters-container');
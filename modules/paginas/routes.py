@@ -1,6 +1,13 @@
 from flask import Blueprint, request, jsonify, session, render_template, redirect, url_for, flash
 from extensions import supabase, supabase_admin
 from routes.auth import login_required
+from services.supabase_transport import check_health, transport_stats
+from services.retry_utils import retry_policy_stats
+from services.boot import boot
+from log_config import logging_stats
+from services.mail_queue import mail_queue
+from services.webhook_dispatcher import webhook_dispatcher
+from services.named_queries import get_query_metrics
 import logging
 
 # Configurar logging
@@ -117,18 +124,21 @@ def health_check():
     Endpoint de verificação de saúde do sistema
     """
     try:
-        # Verificar conexão com o banco
-        db_status = 'ok'
-        try:
-            response = supabase.table('users').select('id').limit(1).execute()
-            if not hasattr(response, 'data'):
-                db_status = 'error'
-        except Exception:
-            db_status = 'error'
+        # Verificar conexão com o banco (resultado em cache por alguns segundos)
+        health = check_health(supabase, force=request.args.get('force') == '1')
+        db_status = 'ok' if health['ok'] else 'error'
         
         return jsonify({
             'status': 'ok',
             'database': db_status,
+            'database_latency_ms': health['latency_ms'],
+            'transport': transport_stats(),
+            'retry_policies': retry_policy_stats(),
+            'boot': boot.report(),
+            'logging': logging_stats(),
+            'mail': mail_queue.stats(),
+            'webhooks': webhook_dispatcher.stats(),
+            'named_queries': get_query_metrics(),
             'timestamp': session.get('last_activity'),
             'authenticated': 'user' in session
         })
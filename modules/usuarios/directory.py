@@ -0,0 +1,377 @@
+"""
+Diretório de usuários do módulo de administração.
+
+A listagem de usuários era um cache de 300s por worker, reconstruído com
+leituras completas de users/user_empresas/cad_clientes_sistema/user_whatsapp
+e descartado inteiro a cada edição. Aqui o diretório fica indexado por id e
+cada alteração recarrega apenas o usuário afetado. Para que todos os workers
+do gunicorn enxerguem a mudança, cada alteração é anotada em um diário
+(arquivo local, append) e os outros workers reaplicam as entradas novas na
+próxima leitura; um snapshot em disco evita a carga completa na subida de
+cada worker.
+
+O snapshot contém os registros completos dos usuários: o diretório
+(USERS_DIRECTORY_DIR) é criado com permissão 0700 e os arquivos com 0600.
+A reconstrução completa não trunca o diário (outro worker pode estar
+anotando): troca o arquivo por um novo sob flock exclusivo, e os workers
+percebem a troca pelo inode. Módulos que alteram dados do usuário fora daqui
+(ex.: user_whatsapp no agente) chamam notify_user_changed(user_id).
+
+Usage:
+    user_directory = UserDirectory(carregar_usuarios)
+    user_directory.refresh_user(user_id)       # após salvar/vincular empresa/WhatsApp
+    user_directory.remove_user(user_id)        # após excluir
+    page = user_directory.search(q='maria', role='cliente_unique', page=1, page_size=50)
+
+    notify_user_changed(user_id)               # alteração feita em outro módulo
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+import unicodedata
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows (desenvolvimento local, processo único)
+    fcntl = None
+
+DIRECTORY_DIR = os.getenv('USERS_DIRECTORY_DIR', os.path.join(tempfile.gettempdir(), 'portal_users_directory'))
+# Reconstrução completa periódica (rede de segurança para alterações feitas fora do módulo)
+DIRECTORY_REBUILD_SECONDS = int(os.getenv('USERS_DIRECTORY_REBUILD_SECONDS', '3600'))
+# Intervalo mínimo entre leituras do diário
+JOURNAL_POLL_SECONDS = float(os.getenv('USERS_DIRECTORY_POLL_SECONDS', '1'))
+SNAPSHOT_EVERY_CHANGES = 50
+
+SNAPSHOT_PATH = os.path.join(DIRECTORY_DIR, 'snapshot.json')
+JOURNAL_PATH = os.path.join(DIRECTORY_DIR, 'journal.log')
+JOURNAL_LOCK_PATH = os.path.join(DIRECTORY_DIR, 'journal.lock')
+
+
+def _ensure_directory():
+    os.makedirs(DIRECTORY_DIR, mode=0o700, exist_ok=True)
+    os.chmod(DIRECTORY_DIR, 0o700)
+
+
+def _open_private(path, append=False):
+    """Abre para escrita (criando com 0600) um arquivo do diretório"""
+    if append:
+        return os.fdopen(os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600), 'ab')
+    return os.fdopen(os.open(path, os.O_WRONLY | os.O_TRUNC | os.O_CREAT, 0o600), 'w', encoding='utf-8')
+
+
+@contextmanager
+def _journal_lock(exclusive):
+    """flock do diário: compartilhado para anotar, exclusivo para trocar o arquivo"""
+    _ensure_directory()
+    fd = os.open(JOURNAL_LOCK_PATH, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+    finally:
+        os.close(fd)
+
+
+def _journal_stat():
+    """(inode, tamanho) do diário atual; (None, 0) se não existir"""
+    try:
+        st = os.stat(JOURNAL_PATH)
+    except OSError:
+        return None, 0
+    return st.st_ino, st.st_size
+
+
+def _append_journal(user_id, op, pid):
+    """Anota uma alteração; retorna (inode, posição final) do diário"""
+    try:
+        line = json.dumps({'user_id': user_id, 'op': op, 'pid': pid, 'ts': time.time()}) + '\n'
+        with _journal_lock(exclusive=False):
+            # Uma única escrita em modo append: linhas de workers diferentes não se misturam
+            with _open_private(JOURNAL_PATH, append=True) as fh:
+                fh.write(line.encode('utf-8'))
+                fh.flush()
+                return os.fstat(fh.fileno()).st_ino, fh.tell()
+    except OSError as e:
+        print(f"[USERS_DIRECTORY] Falha ao gravar diário: {e}")
+        return None
+
+
+def notify_user_changed(user_id):
+    """Avisa todos os workers (inclusive o atual) que o usuário mudou fora do módulo de usuários"""
+    if user_id:
+        _append_journal(user_id, 'upsert', None)
+
+
+def _fold(text):
+    """Minúsculas sem acentos, para busca"""
+    text = unicodedata.normalize('NFKD', str(text or '').lower())
+    return ''.join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def _sort_key(user):
+    return _fold(user.get('name') or user.get('nome') or '')
+
+
+class UserDirectory:
+    """Usuários indexados por id, com atualização pontual e diário compartilhado"""
+
+    def __init__(self, loader):
+        # loader(user_ids=None) -> lista de usuários enriquecidos (empresas, WhatsApp, perfis)
+        self.loader = loader
+        self._users = {}
+        self._search_text = {}
+        self._ordered = None
+        self._built_at = 0.0
+        self._journal_pos = 0
+        self._journal_ino = None
+        self._last_poll = 0.0
+        self._changes_since_snapshot = 0
+        self._lock = threading.RLock()
+
+    # ---- carga ----
+
+    def _index(self, user):
+        user_id = user.get('id')
+        self._users[user_id] = user
+        self._search_text[user_id] = _fold(' '.join(str(user.get(f) or '') for f in ('name', 'nome', 'email')))
+        self._ordered = None
+
+    def _drop(self, user_id):
+        self._users.pop(user_id, None)
+        self._search_text.pop(user_id, None)
+        self._ordered = None
+
+    def _load_snapshot(self):
+        try:
+            with open(SNAPSHOT_PATH, encoding='utf-8') as fh:
+                snapshot = json.load(fh)
+        except (OSError, ValueError):
+            return False
+        if time.time() - snapshot.get('built_at', 0) >= DIRECTORY_REBUILD_SECONDS:
+            return False
+        journal_ino, journal_size = _journal_stat()
+        if snapshot.get('journal_ino') != journal_ino or snapshot.get('journal_pos', 0) > journal_size:
+            # Diário trocado depois do snapshot: snapshot não é confiável
+            return False
+        self._users, self._search_text, self._ordered = {}, {}, None
+        for user in snapshot.get('users', []):
+            self._index(user)
+        self._built_at = snapshot['built_at']
+        self._journal_ino = journal_ino
+        self._journal_pos = snapshot.get('journal_pos', 0)
+        print(f"[USERS_DIRECTORY] Snapshot carregado: {len(self._users)} usuários")
+        return True
+
+    def _write_snapshot(self):
+        try:
+            _ensure_directory()
+            partial = f'{SNAPSHOT_PATH}.{os.getpid()}.part'
+            with _open_private(partial) as fh:
+                json.dump({
+                    'built_at': self._built_at,
+                    'journal_ino': self._journal_ino,
+                    'journal_pos': self._journal_pos,
+                    'users': list(self._users.values()),
+                }, fh, default=str)
+            os.replace(partial, SNAPSHOT_PATH)
+            self._changes_since_snapshot = 0
+        except OSError as e:
+            print(f"[USERS_DIRECTORY] Falha ao gravar snapshot: {e}")
+
+    def _rotate_journal(self):
+        """Troca o diário por um arquivo vazio (sem truncar o que outro worker possa estar anotando)"""
+        try:
+            with _journal_lock(exclusive=True):
+                partial = f'{JOURNAL_PATH}.{os.getpid()}.part'
+                _open_private(partial).close()
+                os.replace(partial, JOURNAL_PATH)
+        except OSError as e:
+            print(f"[USERS_DIRECTORY] Falha ao reiniciar diário: {e}")
+        # Posição 0: entradas anotadas durante a carga são reaplicadas (recarga idempotente)
+        self._journal_ino, self._journal_pos = _journal_stat()[0], 0
+
+    def rebuild(self):
+        """Carga completa a partir do banco; troca o diário (os outros workers percebem pelo inode)"""
+        with self._lock:
+            started = time.time()
+            self._rotate_journal()
+            users = self.loader()
+            self._users, self._search_text, self._ordered = {}, {}, None
+            for user in users:
+                if isinstance(user, dict) and user.get('id'):
+                    self._index(user)
+            self._built_at = time.time()
+            self._write_snapshot()
+            print(f"[USERS_DIRECTORY] Diretório reconstruído: {len(self._users)} usuários em {time.time() - started:.2f}s")
+
+    def _is_fresh(self):
+        return bool(self._built_at) and time.time() - self._built_at < DIRECTORY_REBUILD_SECONDS
+
+    def _ensure_loaded(self):
+        if self._is_fresh():
+            self._apply_journal()
+            if self._is_fresh():
+                return
+        with self._lock:
+            if self._is_fresh():
+                return
+            if not self._load_snapshot():
+                self.rebuild()
+            self._apply_journal(force=True)
+
+    # ---- diário ----
+
+    def _apply_journal(self, force=False):
+        """Recarrega os usuários alterados por outros workers desde a última leitura"""
+        now = time.time()
+        if not force and now - self._last_poll < JOURNAL_POLL_SECONDS:
+            return
+        self._last_poll = now
+        journal_ino, size = _journal_stat()
+        if journal_ino == self._journal_ino and size == self._journal_pos:
+            return
+        with self._lock:
+            if journal_ino != self._journal_ino or size < self._journal_pos:
+                # Outro worker reconstruiu o diretório (diário novo): vale o snapshot novo
+                self._built_at = 0.0
+                return
+            try:
+                with open(JOURNAL_PATH, 'rb') as fh:
+                    fh.seek(self._journal_pos)
+                    data = fh.read()
+            except OSError:
+                return
+            # Apenas linhas completas (outro worker pode estar escrevendo)
+            complete = data[:data.rfind(b'\n') + 1]
+            self._journal_pos += len(complete)
+            lines = complete.decode('utf-8', errors='replace').splitlines()
+            changed, removed = set(), set()
+            for line in lines:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get('pid') == os.getpid():
+                    continue
+                user_id = entry.get('user_id')
+                if entry.get('op') in ('rebuild', 'invalidate'):
+                    self._built_at = 0.0
+                    return
+                if entry.get('op') == 'delete':
+                    removed.add(user_id)
+                    changed.discard(user_id)
+                else:
+                    changed.add(user_id)
+                    removed.discard(user_id)
+            for user_id in removed:
+                self._drop(user_id)
+        if changed:
+            # Consulta ao banco fora do lock: leituras não esperam a recarga
+            self._reload(list(changed))
+
+    def _reload(self, user_ids):
+        """Busca os usuários no banco (sem o lock) e reindexa (com o lock)"""
+        found = {u.get('id'): u for u in self.loader(user_ids=user_ids) if isinstance(u, dict)}
+        with self._lock:
+            for user_id in user_ids:
+                if user_id in found:
+                    self._index(found[user_id])
+                else:
+                    self._drop(user_id)
+
+    # ---- alterações ----
+
+    def refresh_user(self, user_id):
+        """Recarrega um usuário após salvar, vincular empresas, perfis ou WhatsApp"""
+        if not user_id:
+            return
+        try:
+            if self._built_at:
+                self._reload([user_id])
+            with self._lock:
+                self._record(user_id, 'upsert')
+        except Exception as e:
+            # Sem a atualização pontual, a próxima leitura recarrega tudo
+            print(f"[USERS_DIRECTORY] Falha ao atualizar usuário {user_id}: {e}")
+            self.invalidate()
+
+    def remove_user(self, user_id):
+        with self._lock:
+            self._drop(user_id)
+            self._record(user_id, 'delete')
+
+    def _record(self, user_id, op):
+        _append_journal(user_id, op, os.getpid())
+        self._changes_since_snapshot += 1
+        if self._is_fresh() and self._changes_since_snapshot >= SNAPSHOT_EVERY_CHANGES:
+            # Snapshot só depois de aplicar o diário inteiro, para a posição gravada ser coerente
+            self._apply_journal(force=True)
+            journal_ino, journal_size = _journal_stat()
+            if self._is_fresh() and journal_ino == self._journal_ino:
+                self._journal_pos = max(self._journal_pos, journal_size)
+                self._write_snapshot()
+
+    def invalidate(self):
+        """Força carga completa na próxima leitura (em todos os workers)"""
+        with self._lock:
+            self._built_at = 0.0
+            try:
+                os.remove(SNAPSHOT_PATH)
+            except OSError:
+                pass
+            _append_journal(None, 'invalidate', os.getpid())
+
+    # ---- leitura ----
+
+    def list_users(self):
+        """Todos os usuários, ordenados por nome"""
+        self._ensure_loaded()
+        with self._lock:
+            if self._ordered is None:
+                self._ordered = sorted(self._users.values(), key=_sort_key)
+            return self._ordered
+
+    def get(self, user_id):
+        self._ensure_loaded()
+        return self._users.get(user_id)
+
+    def search(self, q=None, role=None, ativo=None, page=1, page_size=50):
+        """Filtra (texto em nome/e-mail, perfil, ativo) e pagina no servidor"""
+        users = self.list_users()
+        termo = _fold(q).strip() if q else ''
+        if termo or role or ativo is not None:
+            filtered = []
+            for user in users:
+                if role and user.get('role') != role:
+                    continue
+                if ativo is not None and bool(user.get('ativo', True)) != ativo:
+                    continue
+                if termo and termo not in self._search_text.get(user.get('id'), ''):
+                    continue
+                filtered.append(user)
+            users = filtered
+        total = len(users)
+        page = max(int(page or 1), 1)
+        page_size = max(int(page_size or 50), 1)
+        start = (page - 1) * page_size
+        return {
+            'items': users[start:start + page_size],
+            'total': total,
+            'page': page,
+            'page_size': page_size,
+            'pages': (total + page_size - 1) // page_size,
+        }
+
+    def status(self):
+        return {
+            'users': len(self._users),
+            'built_at': self._built_at,
+            'age_seconds': time.time() - self._built_at if self._built_at else None,
+            'rebuild_seconds': DIRECTORY_REBUILD_SECONDS,
+            'journal_pos': self._journal_pos,
+            'journal_ino': self._journal_ino,
+        }
@@ -23,7 +23,9 @@ def get_users_table():
     
     print(f"[DEBUG] Usando users (FLASK_ENV={flask_env}, FLASK_DEBUG={flask_debug})")
     return 'users'
-from services.retry_utils import run_with_retries
+from services.retry_utils import run_with_retries, get_policy
+from services.bulk_write import bulk_write, fetch_in
+from modules.usuarios.directory import UserDirectory
 from services.webhook_service import notify_new_whatsapp_number
 
 def verificar_numero_whatsapp_unico(numero, user_id_excluir=None):
@@ -112,32 +114,20 @@ bp = Blueprint('usuarios', __name__,
 
 VALID_ROLES = ['admin', 'interno_unique', 'cliente_unique']
 
-# Cache simples em memória para usuários (TTL: 5 minutos)
-_users_cache = {'data': None, 'timestamp': 0, 'ttl': 300}
-
 def get_cached_users():
-    """Retorna usuários do cache se válido, senão recarrega"""
-    current_time = time.time()
-    
-    if (_users_cache['data'] is not None and 
-        current_time - _users_cache['timestamp'] < _users_cache['ttl']):
-        print(f"[DEBUG] Usando cache de usuários ({len(_users_cache['data'])} usuários)")
-        return _users_cache['data']
-    
-    print("[DEBUG] Cache expirado ou inexistente, recarregando usuários...")
-    users = carregar_usuarios()
-    
-    # Atualizar cache
-    _users_cache['data'] = users
-    _users_cache['timestamp'] = current_time
-    
-    return users
+    """Retorna a lista de usuários do diretório (ordenada por nome)"""
+    return user_directory.list_users()
 
-def invalidate_users_cache():
-    """Invalida o cache de usuários"""
-    global _users_cache
-    _users_cache = {'data': None, 'timestamp': 0, 'ttl': 300}
-    print("[DEBUG] Cache de usuários invalidado")
+def invalidate_users_cache(user_id=None):
+    """Atualiza o diretório de usuários.
+    
+    Com user_id recarrega apenas aquele usuário; sem, força a carga completa.
+    """
+    if user_id:
+        user_directory.refresh_user(user_id)
+    else:
+        user_directory.invalidate()
+        print("[DEBUG] Diretório de usuários invalidado")
 
 def is_master_admin_required():
     """Decorador para verificar se o usuário é Master Admin (admin + master_admin)"""
@@ -274,43 +264,43 @@ def can_assign_perfil(editor_user, perfil_id):
     print(f"[PERFIL_ASSIGNMENT_CHECK] Usuário sem permissões de atribuição de perfis")
     return False
 
-def retry_supabase_operation(operation, max_retries=2, delay=0.5):
-    """Backwards-compatible wrapper that now delegates to centralized retry utility."""
-    return run_with_retries(
-        'usuarios.retry_op',
-        operation,
-        max_attempts=max_retries,
-        base_delay_seconds=delay,
-        should_retry=lambda e: 'server disconnected' in str(e).lower() or 'timeout' in str(e).lower() or 'connection' in str(e).lower()
-    )
-
-def verificar_empresa_ja_associada(user_id, cnpj):
-    """Verifica se uma empresa já está associada ao usuário"""
-    def _verificar():
-        empresas_response = supabase_admin.table('clientes_agentes').select('empresa').eq('user_id', user_id).execute()
-        
-        if not empresas_response.data:
-            return False
-            
-        empresas = empresas_response.data[0].get('empresa', [])
-        if isinstance(empresas, str):
-            try:
-                empresas = json.loads(empresas)
-            except json.JSONDecodeError:
-                empresas = [empresas] if empresas else []
-        elif not isinstance(empresas, list):
-            empresas = []
-            
-        return cnpj in empresas
+def retry_supabase_operation(operation, max_retries=2, delay=0.5, policy='supabase.read'):
+    """Backwards-compatible wrapper that now delegates to the named retry policies."""
+    return get_policy(policy).run('usuarios.retry_op', operation, max_attempts=max_retries, base_delay=delay)
+
+def buscar_empresas_associadas(user_id):
+    """Retorna (registro_existe, lista de CNPJs) do usuário em clientes_agentes"""
+    def _buscar():
+        return supabase_admin.table('clientes_agentes').select('empresa').eq('user_id', user_id).execute()
+    
+    empresas_response = retry_supabase_operation(_buscar)
+    if not empresas_response.data:
+        return False, []
     
+    empresas = empresas_response.data[0].get('empresa') or []
+    if isinstance(empresas, str):
+        try:
+            empresas = json.loads(empresas)
+        except json.JSONDecodeError:
+            empresas = [empresas] if empresas else []
+    elif not isinstance(empresas, list):
+        empresas = []
+    return True, empresas
+
+def verificar_empresa_ja_associada(user_id, *cnpjs):
+    """Verifica se alguma das formas do CNPJ já está associada ao usuário (uma única consulta)"""
     try:
-        return retry_supabase_operation(_verificar)
+        _, empresas = buscar_empresas_associadas(user_id)
+        return any(cnpj in empresas for cnpj in cnpjs)
     except Exception as e:
         print(f"[DEBUG] Erro ao verificar empresa associada: {str(e)}")
         return False
 
-def carregar_usuarios():
-    """Função auxiliar otimizada para carregar usuários do banco de dados"""
+def carregar_usuarios(user_ids=None):
+    """Função auxiliar otimizada para carregar usuários do banco de dados.
+    
+    Com user_ids carrega apenas esses usuários (atualização pontual do diretório).
+    """
     try:
         print("[DEBUG] Iniciando busca otimizada de usuários")
         start_time = time.time()
@@ -320,7 +310,10 @@ def carregar_usuarios():
         
         # 1. Buscar todos os usuários ordenados por nome
         def _buscar_usuarios():
-            return supabase_admin.table(get_users_table()).select('*').order('name').execute()
+            query = supabase_admin.table(get_users_table()).select('*')
+            if user_ids:
+                query = query.in_('id', user_ids)
+            return query.order('name').execute()
         
         users_response = retry_supabase_operation(_buscar_usuarios)
         
@@ -341,13 +334,19 @@ def carregar_usuarios():
         # 2. Buscar todas as associações de empresas na nova estrutura
         def _buscar_todas_empresas():
             # Buscar apenas os vínculos ativos
-            return supabase_admin.table('user_empresas').select('user_id, cliente_sistema_id, ativo').eq('ativo', True).execute()
+            query = supabase_admin.table('user_empresas').select('user_id, cliente_sistema_id, ativo').eq('ativo', True)
+            if user_ids:
+                query = query.in_('user_id', user_ids)
+            return query.execute()
         
         empresas_response = retry_supabase_operation(_buscar_todas_empresas)
         
         # 3. Buscar todas as empresas do sistema para poder fazer o mapeamento
         def _buscar_clientes_sistema():
-            return supabase_admin.table('cad_clientes_sistema').select('id, nome_cliente, cnpjs, ativo').eq('ativo', True).execute()
+            query = supabase_admin.table('cad_clientes_sistema').select('id, nome_cliente, cnpjs, ativo').eq('ativo', True)
+            if user_ids:
+                query = query.in_('id', list({v['cliente_sistema_id'] for v in empresas_response.data or []}) or [0])
+            return query.execute()
         
         clientes_response = retry_supabase_operation(_buscar_clientes_sistema)
         
@@ -386,7 +385,10 @@ def carregar_usuarios():
         
         # 4. Buscar números de WhatsApp de todos os usuários
         def _buscar_whatsapp():
-            return supabase_admin.table('user_whatsapp').select('*').execute()
+            query = supabase_admin.table('user_whatsapp').select('*')
+            if user_ids:
+                query = query.in_('user_id', user_ids)
+            return query.execute()
         
         whatsapp_response = retry_supabase_operation(_buscar_whatsapp)
         
@@ -546,6 +548,9 @@ def carregar_usuarios():
         print(traceback.format_exc())
         raise e
 
+# Diretório de usuários compartilhado entre workers (atualização pontual por usuário)
+user_directory = UserDirectory(carregar_usuarios)
+
 @bp.route('/')
 @login_required
 @role_required(['admin'])
@@ -581,7 +586,7 @@ def index():
 def refresh():
     """Endpoint para forçar atualização da lista de usuários invalidando cache"""
     try:
-        invalidate_users_cache()
+        user_directory.rebuild()
         users = get_cached_users()
         flash('Lista de usuários atualizada com sucesso!', 'success')
         
@@ -716,7 +721,7 @@ def salvar_usuario():
             
             if response.data:
                 print(f"[DEBUG] Usuário atualizado com sucesso")
-                invalidate_users_cache()
+                invalidate_users_cache(user_id)
                 
                 # TODO: Atualizar cargo/telefone em tabela separada se necessário
                 
@@ -765,7 +770,7 @@ def salvar_usuario():
                     
                     if response.data:
                         print(f"[DEBUG] Usuário criado/atualizado com sucesso: {response.data}")
-                        invalidate_users_cache()
+                        invalidate_users_cache(auth_user_id)
                         
                         # TODO: Salvar cargo/telefone em tabela separada se necessário
                         
@@ -914,8 +919,8 @@ def deletar_usuario(user_id):
         print(f"[DEBUG] Etapa 4: Finalizando exclusão...")
         
         # Invalidar cache após exclusão
-        invalidate_users_cache()
-        print(f"[DEBUG] ✅ Cache de usuários invalidado")
+        user_directory.remove_user(user_id)
+        print(f"[DEBUG] ✅ Usuário removido do diretório")
         
         success_message = f'Usuário {user_name} deletado com sucesso (cascata completa)'
         print(f"[DEBUG] === EXCLUSÃO EM CASCATA CONCLUÍDA COM SUCESSO ===")
@@ -988,14 +993,16 @@ def api_empresas():
 @login_required
 @role_required(['admin'])
 def api_usuarios():
-    """API para retornar todos os usuários"""
+    """API para retornar os usuários.
+    
+    Sem parâmetros retorna a lista completa (formato original). Com q, role,
+    ativo, page ou page_size filtra e pagina no servidor:
+    {'items': [...], 'total', 'page', 'page_size', 'pages'}.
+    """
     try:
-        users = get_cached_users()
-        
-        # Simplificar estrutura para API (incluindo role e outros campos necessários)
-        usuarios_api = []
-        for user in users:
-            usuarios_api.append({
+        def _to_api(user):
+            # Simplificar estrutura para API (incluindo role e outros campos necessários)
+            return {
                 'id': user.get('id'),
                 'nome': user.get('nome') or user.get('name'),  # Tentar nome e name
                 'email': user.get('email'),
@@ -1004,9 +1011,22 @@ def api_usuarios():
                 'ativo': user.get('ativo', True),
                 'agent_info': user.get('agent_info', {'empresas': []}),
                 'whatsapp_numbers': user.get('whatsapp_numbers', [])
-            })
+            }
         
-        return jsonify(usuarios_api)
+        search_params = ('q', 'role', 'ativo', 'page', 'page_size')
+        if not any(param in request.args for param in search_params):
+            return jsonify([_to_api(user) for user in get_cached_users()])
+        
+        ativo = request.args.get('ativo')
+        resultado = user_directory.search(
+            q=request.args.get('q'),
+            role=request.args.get('role') or None,
+            ativo=None if ativo in (None, '', 'all') else ativo.lower() in ('1', 'true', 'sim'),
+            page=request.args.get('page', 1, type=int),
+            page_size=min(request.args.get('page_size', 50, type=int), 500)
+        )
+        resultado['items'] = [_to_api(user) for user in resultado['items']]
+        return jsonify(resultado)
         
     except Exception as e:
         print(f"[DEBUG] Erro na API de usuários: {str(e)}")
@@ -1032,43 +1052,51 @@ def associar_empresas(user_id):
         # Limpar associações existentes da nova estrutura
         supabase_admin.from_('user_empresas').delete().eq('user_id', user_id).execute()
         
-        # Processar empresas recebidas
-        vinculos_criados = 0
-        erros = []
-        
-        for empresa_info in empresas_data:
-            try:
-                # Se recebemos um ID, usar diretamente
-                if isinstance(empresa_info, dict) and 'id' in empresa_info:
-                    cliente_sistema_id = empresa_info['id']
-                elif isinstance(empresa_info, int):
-                    cliente_sistema_id = empresa_info
-                elif isinstance(empresa_info, str):
-                    # Se é string, pode ser CNPJ - precisamos converter para ID
-                    cnpj = empresa_info.strip()
-                    empresa_response = supabase_admin.table('cad_clientes_sistema').select('id').eq('cnpjs', cnpj).eq('ativo', True).execute()
-                    
-                    if not empresa_response.data:
-                        erros.append(f"Empresa não encontrada para CNPJ: {cnpj}")
-                        continue
-                    
-                    cliente_sistema_id = empresa_response.data[0]['id']
-                else:
-                    erros.append(f"Formato de empresa inválido: {empresa_info}")
-                    continue
-                
-                # Criar vínculo na nova estrutura
-                supabase_admin.from_('user_empresas').insert({
-                    'user_id': user_id,
-                    'cliente_sistema_id': cliente_sistema_id,
-                    'ativo': True,
-                    'observacoes': 'Migrado do sistema anterior'
-                }).execute()
-                
-                vinculos_criados += 1
-                
-            except Exception as e:
-                erros.append(f"Erro ao processar empresa {empresa_info}: {str(e)}")
+        # Resolver CNPJs para IDs de cad_clientes_sistema com uma única consulta
+        cnpjs_informados = list({e.strip() for e in empresas_data if isinstance(e, str) and e.strip()})
+        cliente_por_cnpj = {}
+        if cnpjs_informados:
+            clientes_response = supabase_admin.table('cad_clientes_sistema')\
+                .select('id, cnpjs')\
+                .overlaps('cnpjs', cnpjs_informados)\
+                .eq('ativo', True)\
+                .execute()
+            for cliente in clientes_response.data or []:
+                for cnpj in cliente.get('cnpjs') or []:
+                    cliente_por_cnpj.setdefault(cnpj, cliente['id'])
+        
+        def _validar_vinculo(empresa_info):
+            # Se recebemos um ID, usar diretamente
+            if isinstance(empresa_info, dict) and 'id' in empresa_info:
+                cliente_sistema_id = empresa_info['id']
+            elif isinstance(empresa_info, int):
+                cliente_sistema_id = empresa_info
+            elif isinstance(empresa_info, str):
+                # Se é string, pode ser CNPJ - convertido para ID pela consulta acima
+                cnpj = empresa_info.strip()
+                cliente_sistema_id = cliente_por_cnpj.get(cnpj)
+                if cliente_sistema_id is None:
+                    return None, f"Empresa não encontrada para CNPJ: {cnpj}"
+            else:
+                return None, f"Formato de empresa inválido: {empresa_info}"
+            return {
+                'user_id': user_id,
+                'cliente_sistema_id': cliente_sistema_id,
+                'ativo': True,
+                'observacoes': 'Migrado do sistema anterior'
+            }, None
+        
+        # Criar vínculos na nova estrutura em lote
+        resultado = bulk_write(
+            'user_empresas', empresas_data, _validar_vinculo,
+            key_fields=('user_id', 'cliente_sistema_id'),
+            label='usuarios.associar_empresas'
+        )
+        vinculos_criados = resultado.counts().get('criado', 0)
+        erros = [
+            item['error'] if item['status'] == 'invalido' else f"Erro ao processar empresa {empresas_data[item['index']]}: {item['error']}"
+            for item in resultado.by_status('invalido', 'erro')
+        ]
         
         # Manter compatibilidade com sistema antigo (tabela clientes_agentes)
         # Isso será removido futuramente
@@ -1104,7 +1132,7 @@ def associar_empresas(user_id):
             print(f"[DEBUG] Erro na compatibilidade com sistema antigo: {e}")
         
         # Invalidar cache
-        invalidate_users_cache()
+        invalidate_users_cache(user_id)
         
         # Resposta
         if empresas_data:  # Se havia empresas para associar
@@ -1222,6 +1250,41 @@ def formatar_cnpj(cnpj_limpo):
         return cnpj_limpo
     return f"{cnpj_limpo[:2]}.{cnpj_limpo[2:5]}.{cnpj_limpo[5:8]}/{cnpj_limpo[8:12]}-{cnpj_limpo[12:14]}"
 
+def validar_cnpjs_lote(cnpjs):
+    """Confere os CNPJs na base com uma consulta in_ (formatados e sem formatação).
+    
+    Retorna (válidos sem formatação, inválidos como recebidos), na ordem de entrada.
+    """
+    limpos = []
+    for cnpj in cnpjs:
+        # Garantir que cnpj é uma string (listas: primeiro elemento)
+        if isinstance(cnpj, list):
+            cnpj = cnpj[0] if cnpj else ""
+        limpos.append(limpar_cnpj(cnpj))
+    
+    candidatos = set()
+    for cnpj_limpo in limpos:
+        if cnpj_limpo:
+            candidatos.add(cnpj_limpo)
+            candidatos.add(formatar_cnpj(cnpj_limpo))
+    
+    encontrados = set()
+    if candidatos:
+        rows = run_with_retries(
+            'usuarios.validar_cnpjs_lote',
+            lambda: fetch_in('vw_aux_cnpj_importador', 'cnpj', sorted(candidatos), 'cnpj'),
+            max_attempts=2
+        )
+        encontrados = {limpar_cnpj(row.get('cnpj')) for row in rows}
+    
+    validos, invalidos = [], []
+    for original, cnpj_limpo in zip(cnpjs, limpos):
+        if cnpj_limpo and cnpj_limpo in encontrados:
+            validos.append(cnpj_limpo)
+        else:
+            invalidos.append(original)
+    return validos, invalidos
+
 @bp.route('/api/empresas/buscar', methods=['POST'])
 @login_required
 @role_required(['admin'])
@@ -1333,7 +1396,7 @@ def definir_lista_empresas(user_id):
                 return response
             
             try:
-                remove_response = retry_supabase_operation(_remover_todas_empresas)
+                remove_response = retry_supabase_operation(_remover_todas_empresas, policy='supabase.write')
                 if hasattr(remove_response, 'error') and remove_response.error:
                     raise Exception(f"Erro do Supabase: {remove_response.error}")
                 
@@ -1346,39 +1409,14 @@ def definir_lista_empresas(user_id):
                 print(f"[DEBUG] Erro ao remover empresas: {str(e)}")
                 return jsonify({'success': False, 'error': f'Erro ao remover empresas: {str(e)}'})
         
-        # Se há CNPJs, validar e definir a lista
-        cnpjs_validos = []
-        cnpjs_invalidos = []
-        
-        for cnpj in cnpjs:
-            # Garantir que cnpj é uma string
-            if isinstance(cnpj, list):
-                # Se for lista, pegar primeiro elemento
-                cnpj_str = str(cnpj[0]) if cnpj else ""
-            else:
-                cnpj_str = str(cnpj)
-            
-            cnpj_limpo = limpar_cnpj(cnpj_str)
-            
-            # Verificar se empresa existe na base
-            def _verificar_cnpj():
-                cnpj_formatado = formatar_cnpj(cnpj_limpo)
-                # Tentar primeiro com formatação
-                response = supabase_admin.table('vw_aux_cnpj_importador').select('cnpj').eq('cnpj', cnpj_formatado).execute()
-                if response.data:
-                    return response
-                # Se não encontrar, tentar sem formatação
-                return supabase_admin.table('vw_aux_cnpj_importador').select('cnpj').eq('cnpj', cnpj_limpo).execute()
-            
-            try:
-                cnpj_response = retry_supabase_operation(_verificar_cnpj)
-                if cnpj_response.data:
-                    cnpjs_validos.append(cnpj_limpo)
-                else:
-                    cnpjs_invalidos.append(cnpj)
-            except Exception as e:
-                print(f"[DEBUG] Erro ao verificar CNPJ {cnpj}: {str(e)}")
-                cnpjs_invalidos.append(cnpj)
+        # Se há CNPJs, validar o lote inteiro com uma consulta e definir a lista
+        try:
+            cnpjs_validos, cnpjs_invalidos = validar_cnpjs_lote(cnpjs)
+        except Exception as e:
+            print(f"[DEBUG] Erro ao verificar CNPJs: {str(e)}")
+            cnpjs_validos, cnpjs_invalidos = [], list(cnpjs)
+        # Sem repetições, mantendo a ordem recebida
+        cnpjs_validos = list(dict.fromkeys(cnpjs_validos))
         
         print(f"[DEBUG] CNPJs válidos: {len(cnpjs_validos)}")
         print(f"[DEBUG] CNPJs inválidos: {len(cnpjs_invalidos)}")
@@ -1402,7 +1440,7 @@ def definir_lista_empresas(user_id):
                             'empresa': cnpjs_validos
                         }).execute()
                 
-                update_response = retry_supabase_operation(_definir_lista)
+                update_response = retry_supabase_operation(_definir_lista, policy='supabase.write')
                 
                 if hasattr(update_response, 'error') and update_response.error:
                     raise Exception(f"Erro do Supabase: {update_response.error}")
@@ -1464,58 +1502,27 @@ def adicionar_empresas_lote(user_id):
             return jsonify({'success': False, 'error': 'Usuário não encontrado'})
         
         # Buscar empresas atuais do usuário
-        def _buscar_empresas_atuais():
-            return supabase_admin.table('clientes_agentes').select('empresa').eq('user_id', user_id).execute()
-        
         try:
-            empresas_response = retry_supabase_operation(_buscar_empresas_atuais)
-            empresas_atuais = []
-            
-            if empresas_response.data and len(empresas_response.data) > 0:
-                empresas_data = empresas_response.data[0].get('empresa', [])
-                if isinstance(empresas_data, str):
-                    try:
-                        empresas_atuais = json.loads(empresas_data)
-                    except json.JSONDecodeError:
-                        empresas_atuais = [empresas_data] if empresas_data else []
-                elif isinstance(empresas_data, list):
-                    empresas_atuais = empresas_data
+            registro_existe, empresas_atuais = buscar_empresas_associadas(user_id)
         except Exception as e:
             print(f"[DEBUG] Erro ao buscar empresas atuais: {str(e)}")
-            empresas_atuais = []
+            registro_existe, empresas_atuais = False, []
         
-        # Verificar quais CNPJs existem na base
-        cnpjs_validos = []
-        cnpjs_invalidos = []
+        # Separar os já associados e validar o restante do lote com uma única consulta
         cnpjs_ja_existentes = []
-        
+        cnpjs_novos = []
         for cnpj in cnpjs:
             cnpj_limpo = limpar_cnpj(cnpj)
-            
-            # Verificar se já está associado
             if cnpj_limpo in empresas_atuais or cnpj in empresas_atuais:
                 cnpjs_ja_existentes.append(cnpj)
-                continue
-            
-            # Verificar se empresa existe na base
-            def _verificar_cnpj():
-                cnpj_formatado = formatar_cnpj(cnpj_limpo)
-                # Tentar primeiro com formatação
-                response = supabase_admin.table('vw_aux_cnpj_importador').select('cnpj').eq('cnpj', cnpj_formatado).execute()
-                if response.data:
-                    return response
-                # Se não encontrar, tentar sem formatação
-                return supabase_admin.table('vw_aux_cnpj_importador').select('cnpj').eq('cnpj', cnpj_limpo).execute()
-            
-            try:
-                cnpj_response = retry_supabase_operation(_verificar_cnpj)
-                if cnpj_response.data:
-                    cnpjs_validos.append(cnpj_limpo)
-                else:
-                    cnpjs_invalidos.append(cnpj)
-            except Exception as e:
-                print(f"[DEBUG] Erro ao verificar CNPJ {cnpj}: {str(e)}")
-                cnpjs_invalidos.append(cnpj)
+            else:
+                cnpjs_novos.append(cnpj)
+        
+        try:
+            cnpjs_validos, cnpjs_invalidos = validar_cnpjs_lote(cnpjs_novos)
+        except Exception as e:
+            print(f"[DEBUG] Erro ao verificar CNPJs: {str(e)}")
+            cnpjs_validos, cnpjs_invalidos = [], list(cnpjs_novos)
         
         print(f"[DEBUG] CNPJs válidos: {len(cnpjs_validos)}")
         print(f"[DEBUG] CNPJs inválidos: {len(cnpjs_invalidos)}")
@@ -1529,7 +1536,7 @@ def adicionar_empresas_lote(user_id):
                 todas_empresas = list(set(empresas_atuais + cnpjs_validos))
                 
                 def _atualizar_empresas():
-                    if empresas_response.data and len(empresas_response.data) > 0:
+                    if registro_existe:
                         # Update do registro existente
                         return supabase_admin.table('clientes_agentes').update({
                             'empresa': todas_empresas
@@ -1541,7 +1548,7 @@ def adicionar_empresas_lote(user_id):
                             'empresa': todas_empresas
                         }).execute()
                 
-                update_response = retry_supabase_operation(_atualizar_empresas)
+                update_response = retry_supabase_operation(_atualizar_empresas, policy='supabase.write')
                 
                 if hasattr(update_response, 'error') and update_response.error:
                     raise Exception(f"Erro do Supabase: {update_response.error}")
@@ -1613,7 +1620,7 @@ def adicionar_empresa_usuario(user_id):
             return jsonify({'success': False, 'error': 'Erro ao verificar dados do usuário'})
         
         # Verificar se empresa já está associada (check rápido)
-        if verificar_empresa_ja_associada(user_id, cnpj_formatado) or verificar_empresa_ja_associada(user_id, cnpj_limpo):
+        if verificar_empresa_ja_associada(user_id, cnpj_formatado, cnpj_limpo):
             return jsonify({'success': False, 'error': 'Empresa já está associada ao usuário'})
         
         # Verificar se a empresa existe na base de dados
@@ -1680,7 +1687,7 @@ def adicionar_empresa_usuario(user_id):
                         'updated_at': datetime.datetime.now().isoformat()
                     }).execute()
             
-            retry_supabase_operation(_atualizar_empresas)
+            retry_supabase_operation(_atualizar_empresas, policy='supabase.write')
             
             return jsonify({
                 'success': True, 
@@ -1813,7 +1820,7 @@ def remover_empresa_usuario(user_id):
                     'updated_at': datetime.datetime.now().isoformat()
                 }).eq('user_id', user_id).execute()
             
-            retry_supabase_operation(_atualizar_empresas)
+            retry_supabase_operation(_atualizar_empresas, policy='supabase.write')
             
             return jsonify({'success': True, 'message': 'Empresa removida com sucesso'})
             
@@ -2011,11 +2018,12 @@ def obter_dados_usuario(user_id):
 @role_required(['admin'])
 def performance_stats():
     """Endpoint para estatísticas de performance do módulo de usuários"""
+    directory_status = user_directory.status()
     cache_info = {
-        'users_cache_active': _users_cache['data'] is not None,
-        'users_cache_size': len(_users_cache['data']) if _users_cache['data'] else 0,
-        'users_cache_age_seconds': time.time() - _users_cache['timestamp'],
-        'users_cache_ttl_seconds': _users_cache['ttl'],
+        'users_cache_active': directory_status['built_at'] > 0,
+        'users_cache_size': directory_status['users'],
+        'users_cache_age_seconds': directory_status['age_seconds'],
+        'users_cache_ttl_seconds': directory_status['rebuild_seconds'],
         'valid_roles': VALID_ROLES
     }
     
@@ -2023,11 +2031,11 @@ def performance_stats():
         'success': True,
         'cache_info': cache_info,
         'optimizations': [
-            'Cache em memória implementado (TTL: 5 minutos)',
+            'Diretório de usuários com atualização pontual compartilhada entre workers',
             'Busca de empresas em lotes (batch de 50)',
             'Retry reduzido para 2 tentativas com delay menor',
             'Suporte a interno_unique com regras de cliente',
-            'Invalidação automática do cache após mudanças'
+            'Busca e paginação no servidor em /usuarios/api/usuarios'
         ],
         'timestamp': datetime.datetime.now().isoformat()
     })
@@ -2168,7 +2176,7 @@ def vincular_empresa(user_id):
             'ativo': True
         }).execute()
         
-        invalidate_users_cache()
+        invalidate_users_cache(user_id)
         
         return jsonify({
             'success': True,
@@ -2201,7 +2209,7 @@ def desvincular_empresa(user_id):
         # Remover vínculo
         result = supabase_admin.from_('user_empresas').delete().eq('user_id', user_id).eq('cliente_sistema_id', cliente_sistema_id).execute()
         
-        invalidate_users_cache()
+        invalidate_users_cache(user_id)
         
         return jsonify({
             'success': True,
@@ -2378,6 +2386,8 @@ def adicionar_whatsapp(user_id):
             print(f"[USUARIOS] ❌ Erro ao enviar webhook: {str(webhook_error)}")
             # Não falhar a operação por causa do webhook
         
+        invalidate_users_cache(user_id)
+        
         return jsonify({
             'success': True,
             'message': 'WhatsApp adicionado com sucesso',
@@ -2399,6 +2409,9 @@ def remover_whatsapp(whatsapp_id):
     try:
         result = supabase_admin.from_('user_whatsapp').delete().eq('id', whatsapp_id).execute()
         
+        for removido in result.data or []:
+            invalidate_users_cache(removido.get('user_id'))
+        
         return jsonify({
             'success': True,
             'message': 'WhatsApp removido com sucesso'
@@ -2434,6 +2447,8 @@ def definir_whatsapp_principal(whatsapp_id):
         # Definir este como principal
         supabase_admin.from_('user_whatsapp').update({'principal': True}).eq('id', whatsapp_id).execute()
         
+        invalidate_users_cache(user_id)
+        
         return jsonify({
             'success': True,
             'message': 'WhatsApp definido como principal'
@@ -2676,7 +2691,7 @@ def api_update_user(user_id):
             return jsonify({'success': False, 'message': 'Erro ao atualizar usuário'}), 400
         
         # Invalidar cache
-        invalidate_users_cache()
+        invalidate_users_cache(user_id)
         
         print(f"[USUARIOS] ✅ Usuário atualizado com sucesso")
         print(f"[USUARIOS] 🔒 EMAIL PRESERVATION: Email '{current_user_email}' permaneceu inalterado (segurança de autenticação)")
@@ -2746,6 +2761,8 @@ def api_update_user_empresas(user_id):
                     }).execute()
                     print(f"[DEBUG] Criando associação empresa {empresa_id}: {create_result}")
         
+        invalidate_users_cache(user_id)
+        
         return jsonify({'success': True, 'message': 'Empresas atualizadas com sucesso'})
         
     except Exception as e:
@@ -2853,6 +2870,8 @@ def api_update_user_whatsapp(user_id):
                 print(f"[USUARIOS] ❌ Erro ao inserir {whatsapp_validado['numero']}: {insert_error}")
                 continue
         
+        invalidate_users_cache(user_id)
+        
         return jsonify({
             'success': True,
             'message': f'{len(novos_numeros)} números WhatsApp salvos com sucesso',
@@ -3618,7 +3637,7 @@ def api_update_users_perfis(user_id):
                 raise table_error
         
         # Invalidar cache de usuários
-        invalidate_users_cache()
+        invalidate_users_cache(user_id)
         
         return jsonify({
             'success': True,
@@ -4,6 +4,7 @@ Rotas do módulo de Usuários Online (Admin)
 from flask import Blueprint, render_template, session, redirect, url_for, jsonify, request
 from extensions import supabase_admin
 from .services import online_user_service
+from middleware.page_tracking import page_tracking
 import logging
 
 logger = logging.getLogger(__name__)
@@ -93,7 +94,8 @@ def api_online_users():
         return jsonify({
             'users': users,
             'count': len(users),
-            'stats': stats
+            'stats': stats,
+            'tracking': page_tracking.stats()
         })
     
     except Exception as e:
@@ -9,7 +9,7 @@ import logging
 import re
 import traceback
 import os
-from services.retry_utils import run_with_retries
+from services.retry_utils import run_with_policy
 from services.data_cache import data_cache
 
 # Configurar logging
@@ -209,12 +209,10 @@ def global_data():
             def _run_importacoes():
                 return query.execute()
 
-            result = run_with_retries(
+            result = run_with_policy(
+                'supabase.read',
                 'api.global_data.importacoes',
-                _run_importacoes,
-                max_attempts=3,
-                base_delay_seconds=0.8,
-                should_retry=lambda e: 'Server disconnected' in str(e) or 'timeout' in str(e).lower()
+                _run_importacoes
             )
             importacoes_data = result.data or []
 
@@ -254,12 +252,10 @@ def global_data():
             try:
                 def _run_users():
                     return supabase_admin.table('users').select('*').execute()
-                usuarios_response = run_with_retries(
+                usuarios_response = run_with_policy(
+                    'supabase.read',
                     'api.global_data.users',
-                    _run_users,
-                    max_attempts=3,
-                    base_delay_seconds=0.8,
-                    should_retry=lambda e: 'Server disconnected' in str(e) or 'timeout' in str(e).lower()
+                    _run_users
                 )
                 payload['usuarios'] = usuarios_response.data or []
             except Exception as e:
@@ -270,12 +266,10 @@ def global_data():
         try:
             def _run_companies():
                 return supabase.table('importacoes_processos_aberta').select('cnpj_importador, importador').execute()
-            companies_query = run_with_retries(
+            companies_query = run_with_policy(
+                'supabase.read',
                 'api.global_data.companies',
-                _run_companies,
-                max_attempts=3,
-                base_delay_seconds=0.8,
-                should_retry=lambda e: 'Server disconnected' in str(e) or 'timeout' in str(e).lower()
+                _run_companies
             )
             if companies_query.data:
                 companies_df = pd.DataFrame(companies_query.data)
@@ -293,8 +293,7 @@ def login():
                         },
                         'created_at': now_timestamp,
                         'last_activity': now_timestamp,
-                        'permissions_cache': {},  # Cache para otimizar verificações futuras
-                        'data_loading_status': 'loading'  # Status do carregamento de dados
+                        'permissions_cache': {}  # Cache para otimizar verificações futuras
                     })
                     
                     # Carregar perfis do usuário
@@ -318,26 +317,22 @@ def login():
                     # Pré-carregar dados em background
                     try:
                         print(f"[AUTH] Iniciando pré-carregamento de dados para usuário {user_id}")
-                        session['data_loading_status'] = 'loading'
-                        session['data_loading_step'] = 'Carregando dados do ano atual...'
                         
-                        # Pré-carregar dados APENAS no cache do servidor (não na sessão)
-                        raw_data = data_cache.preload_user_data(
+                        # Pré-carregar dados APENAS no cache do servidor (não na sessão);
+                        # o login segue imediatamente e os consumidores aguardam o ticket.
+                        # O estado do carregamento é o do ticket (/api/preload-status)
+                        session['preload_ticket'] = data_cache.start_preload(
                             user_id=user_id,
                             user_role=user.get('role'),
-                            user_companies=user_companies
+                            user_companies=user_companies,
+                            user_data=session['user']
                         )
-                        
-                        # NÃO armazenar na sessão (muito grande para cookies)
-                        # Os dados ficam apenas no cache do servidor
-                        session['data_loading_status'] = 'completed'
-                        session['data_loading_step'] = 'Dados carregados com sucesso!'
-                        session['cache_ready'] = True  # Flag para indicar que o cache está pronto
-                        print(f"[AUTH] Pré-carregamento concluído para usuário {user_id} - {len(raw_data)} registros em cache")
+                        session['cache_ready'] = False
+                        print(f"[AUTH] Pré-carregamento disparado para usuário {user_id} - ticket {session['preload_ticket']}")
                         
                     except Exception as preload_error:
                         print(f"[AUTH] Erro no pré-carregamento: {preload_error}")
-                        session['data_loading_status'] = 'error'
+                        session['data_loading_status'] = 'failed'
                         session['data_loading_step'] = 'Erro ao carregar dados, mas você pode continuar'
                         session['cache_ready'] = False
                     
@@ -1,5 +1,7 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, session, send_file
 from extensions import supabase_admin
+from modules.auth.routes import login_required
+from services.export_jobs import export_jobs
 import requests
 import os
 
@@ -60,3 +62,36 @@ def health_check():
         'status': 'healthy',
         'service': 'background_tasks'
     })
+
+@bp.route('/export-jobs')
+@login_required
+def list_export_jobs():
+    """
+    Lista as exportações em segundo plano do usuário logado
+    """
+    jobs = export_jobs.list_for_user(session.get('user_id'))
+    return jsonify({'success': True, 'jobs': [job.to_dict() for job in jobs]})
+
+@bp.route('/export-jobs/<job_id>')
+@login_required
+def get_export_job(job_id):
+    """
+    Estado de uma exportação em segundo plano (alternativa ao evento SocketIO)
+    """
+    job = export_jobs.get(job_id, user_id=session.get('user_id'))
+    if job is None:
+        return jsonify({'success': False, 'error': 'Exportação não encontrada'}), 404
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+@bp.route('/export-jobs/<job_id>/download')
+@login_required
+def download_export_job(job_id):
+    """
+    Download do artefato gerado (enquanto não expirar)
+    """
+    job = export_jobs.get(job_id, user_id=session.get('user_id'))
+    if job is None or job.is_expired():
+        return jsonify({'success': False, 'error': 'Exportação não encontrada ou expirada'}), 404
+    if job.status != 'done' or not os.path.exists(job.artifact_path):
+        return jsonify({'success': False, 'error': 'Exportação ainda não concluída', 'job': job.to_dict()}), 409
+    return send_file(job.artifact_path, mimetype=job.mimetype, as_attachment=True, download_name=job.filename)
@@ -7,6 +7,7 @@ from services.data_cache import data_cache
 import pandas as pd
 from datetime import datetime, timedelta
 import numpy as np
+from log_config import log_print, log_printf
 
 bp = Blueprint('dashboard', __name__)
 
@@ -142,7 +143,7 @@ def dashboard_data_api(permissions=None):
                         'values': [float(x) if not pd.isna(x) else 0.0 for x in df_monthly['valor_total'].tolist()]
                     }
                     
-                    print(f"[DASHBOARD] Monthly chart data: {len(charts['monthly']['periods'])} periods")
+                    log_printf("[DASHBOARD] Monthly chart data: %s periods", len(charts['monthly']['periods']))
                 else:
                     charts['monthly'] = {'periods': [], 'processes': [], 'values': []}
                 
@@ -164,12 +165,12 @@ def dashboard_data_api(permissions=None):
                 # Distribuição por Modal
                 if 'modal' in df.columns:
                     modal_dist = df['modal'].value_counts().head(10)
-                    print(f"[DASHBOARD] Modal distribution: {modal_dist.to_dict()}")
+                    log_printf("[DASHBOARD] Modal distribution: %s", modal_dist.to_dict())
                     charts['canal'] = {
                         'labels': [str(x) for x in modal_dist.index.tolist()],
                         'values': [int(x) if not pd.isna(x) else 0 for x in modal_dist.values.tolist()]
                     }
-                    print(f"[DASHBOARD] Canal chart data: {charts['canal']}")
+                    log_printf("[DASHBOARD] Canal chart data: %s", charts['canal'])
                 else:
                     charts['canal'] = {'labels': [], 'values': []}
                 
@@ -227,7 +228,7 @@ def dashboard_data_api(permissions=None):
                 recent_ops = recent_ops_data
                 
             else:
-                print("[DASHBOARD] DataFrame vazio, não há dados para processar")
+                log_print("[DASHBOARD] DataFrame vazio, não há dados para processar")
                 # Cache vazio, usar valores padrão
                 kpis = {
                     'total_processos': 0, 'total_despesas': 0, 'modal_aereo': 0,
@@ -244,7 +245,7 @@ def dashboard_data_api(permissions=None):
                 recent_ops = []
                 
         else:
-            print("[DASHBOARD] Cache não disponível, tentando recarregar...")
+            log_print("[DASHBOARD] Cache não disponível, tentando recarregar...")
             
             # Tentar recarregar o cache antes de usar fallback
             try:
@@ -252,7 +253,7 @@ def dashboard_data_api(permissions=None):
                 cache_reloaded = data_cache.preload_user_data(user_id, user_data)
                 if cache_reloaded:
                     cached_data = data_cache.get_cache(user_id, 'raw_data')
-                    print(f"[DASHBOARD] Cache recarregado com sucesso: {len(cached_data) if cached_data else 0} registros")
+                    log_printf("[DASHBOARD] Cache recarregado com sucesso: %s registros", len(cached_data) if cached_data else 0)
                     
                     if cached_data and isinstance(cached_data, list) and len(cached_data) > 0:
                         # Processar cache recarregado igual ao processo normal do cache
@@ -281,12 +282,12 @@ def dashboard_data_api(permissions=None):
                             # Distribuição por Modal
                             if 'modal' in df.columns:
                                 modal_dist = df['modal'].value_counts().head(10)
-                                print(f"[DASHBOARD] Reloaded cache modal distribution: {modal_dist.to_dict()}")
+                                log_printf("[DASHBOARD] Reloaded cache modal distribution: %s", modal_dist.to_dict())
                                 charts['canal'] = {
                                     'labels': [str(x) for x in modal_dist.index.tolist()],
                                     'values': [int(x) if not pd.isna(x) else 0 for x in modal_dist.values.tolist()]
                                 }
-                                print(f"[DASHBOARD] Reloaded cache canal chart: {charts['canal']}")
+                                log_printf("[DASHBOARD] Reloaded cache canal chart: %s", charts['canal'])
                             else:
                                 charts['canal'] = {'labels': [], 'values': []}
                             
@@ -356,14 +357,14 @@ def dashboard_data_api(permissions=None):
                             })
                         
             except Exception as reload_error:
-                print(f"[DASHBOARD] Erro ao recarregar cache: {reload_error}")
+                log_printf("[DASHBOARD] Erro ao recarregar cache: %s", reload_error)
             
-            print("[DASHBOARD] Cache não disponível, buscando dados diretamente do Supabase")
+            log_print("[DASHBOARD] Cache não disponível, buscando dados diretamente do Supabase")
             try:
                 # Buscar dados diretamente da tabela principal usando supabase_admin
                 # para evitar problemas com RLS
                 user_role = user_data.get('role')
-                print(f"[DASHBOARD] User role: {user_role}")
+                log_printf("[DASHBOARD] User role: %s", user_role)
                 
                 query = supabase_admin.table('importacoes_processos_aberta').select('*')
                 
@@ -372,13 +373,13 @@ def dashboard_data_api(permissions=None):
                     # Obter lista de empresas do cliente via API utility
                     from routes.api import get_user_companies
                     user_companies = get_user_companies(user_data)
-                    print(f"[DASHBOARD] Empresas do cliente: {user_companies}")
+                    log_printf("[DASHBOARD] Empresas do cliente: %s", user_companies)
                     
                     if user_companies:
-                        print(f"[DASHBOARD] Aplicando filtro IN para empresas: {user_companies}")
+                        log_printf("[DASHBOARD] Aplicando filtro IN para empresas: %s", user_companies)
                         query = query.in_('cnpj_importador', user_companies)
                     else:
-                        print("[DASHBOARD] Nenhuma empresa encontrada, aplicando filtro impossível")
+                        log_print("[DASHBOARD] Nenhuma empresa encontrada, aplicando filtro impossível")
                         query = query.eq('cnpj_importador', 'NENHUMA_EMPRESA_ENCONTRADA')
                 elif user_role == 'interno_unique':
                     # Verificar se é admin operacional que deve ter filtragem por empresa
@@ -388,32 +389,32 @@ def dashboard_data_api(permissions=None):
                         # Admin operação deve ver apenas suas empresas associadas
                         from routes.api import get_user_companies
                         user_companies = get_user_companies(user_data)
-                        print(f"[DASHBOARD] Empresas do admin operação: {user_companies}")
+                        log_printf("[DASHBOARD] Empresas do admin operação: %s", user_companies)
                         
                         if user_companies:
-                            print(f"[DASHBOARD] Aplicando filtro IN para admin operação: {user_companies}")
+                            log_printf("[DASHBOARD] Aplicando filtro IN para admin operação: %s", user_companies)
                             query = query.in_('cnpj_importador', user_companies)
                         else:
-                            print("[DASHBOARD] Admin operação sem empresas, aplicando filtro impossível")
+                            log_print("[DASHBOARD] Admin operação sem empresas, aplicando filtro impossível")
                             query = query.eq('cnpj_importador', 'NENHUMA_EMPRESA_ENCONTRADA')
                     else:
-                        print(f"[DASHBOARD] Usuário interno ({user_perfil_principal}) vê todas as empresas")
+                        log_printf("[DASHBOARD] Usuário interno (%s) vê todas as empresas", user_perfil_principal)
                 else:
-                    print("[DASHBOARD] Usuário admin vê todas as empresas")
+                    log_print("[DASHBOARD] Usuário admin vê todas as empresas")
                 
                 result = query.execute()
                 fresh_data = result.data if result.data else []
-                print(f"[DASHBOARD] Dados frescos obtidos: {len(fresh_data)} registros")
+                log_printf("[DASHBOARD] Dados frescos obtidos: %s registros", len(fresh_data))
                 
                 # Log alguns CNPJs para debug
                 if fresh_data:
                     cnpjs_encontrados = [r.get('cnpj_importador') for r in fresh_data[:5]]
-                    print(f"[DASHBOARD] Primeiros 5 CNPJs encontrados: {cnpjs_encontrados}")
+                    log_printf("[DASHBOARD] Primeiros 5 CNPJs encontrados: %s", cnpjs_encontrados)
                 else:
-                    print("[DASHBOARD] Nenhum dado encontrado - possível problema de filtro")
+                    log_print("[DASHBOARD] Nenhum dado encontrado - possível problema de filtro")
                 
                 if fresh_data:
-                    print(f"[DASHBOARD] Dados frescos obtidos: {len(fresh_data)} registros")
+                    log_printf("[DASHBOARD] Dados frescos obtidos: %s registros", len(fresh_data))
                     # Processar dados frescos igual ao cache
                     df = pd.DataFrame(fresh_data)
                     
@@ -439,12 +440,12 @@ def dashboard_data_api(permissions=None):
                     # Distribuição por Modal
                     if 'modal' in df.columns:
                         modal_dist = df['modal'].value_counts().head(10)
-                        print(f"[DASHBOARD] Fresh data modal distribution: {modal_dist.to_dict()}")
+                        log_printf("[DASHBOARD] Fresh data modal distribution: %s", modal_dist.to_dict())
                         charts['canal'] = {
                             'labels': [str(x) for x in modal_dist.index.tolist()],
                             'values': [int(x) if not pd.isna(x) else 0 for x in modal_dist.values.tolist()]
                         }
-                        print(f"[DASHBOARD] Fresh data canal chart: {charts['canal']}")
+                        log_printf("[DASHBOARD] Fresh data canal chart: %s", charts['canal'])
                     else:
                         charts['canal'] = {'labels': [], 'values': []}
                     
@@ -500,19 +501,19 @@ def dashboard_data_api(permissions=None):
                     recent_ops = recent_ops_data
                     
                 else:
-                    print("[DASHBOARD] Nenhum dado encontrado na tabela")
+                    log_print("[DASHBOARD] Nenhum dado encontrado na tabela")
                     # Usar fallback das views antigas
                     raise Exception("Sem dados frescos, usar views")
                     
             except Exception as e:
-                print(f"[DASHBOARD] Erro ao buscar dados frescos ou fallback para views: {e}")
+                log_printf("[DASHBOARD] Erro ao buscar dados frescos ou fallback para views: %s", e)
                 # Usar fallback das views antigas
             # Fallback para views do banco (mantém funcionamento atual)
             try:
                 stats = supabase.table('vw_dashboard_kpis').select('*').limit(1).execute().data
                 stats = stats[0] if stats else {}
             except Exception as e:
-                print(f"[DASHBOARD] Erro ao buscar KPIs: {e}")
+                log_printf("[DASHBOARD] Erro ao buscar KPIs: %s", e)
                 stats = {}
             
             kpis = {
@@ -534,7 +535,7 @@ def dashboard_data_api(permissions=None):
                     .select('periodo, total_processos, total_despesas')\
                     .order('periodo').execute().data or []
             except Exception as e:
-                print(f"[DASHBOARD] Erro ao buscar evolução mensal: {e}")
+                log_printf("[DASHBOARD] Erro ao buscar evolução mensal: %s", e)
                 mensal = []
             charts['monthly'] = {
                 'periods': [r.get('periodo') for r in mensal],
@@ -544,16 +545,16 @@ def dashboard_data_api(permissions=None):
             
             # Gráfico de Canal (Modal) a partir da tabela principal
             try:
-                print("[DASHBOARD] Buscando dados de modal para gráfico de canal...")
+                log_print("[DASHBOARD] Buscando dados de modal para gráfico de canal...")
                 user_role = user_data.get('role')
-                print(f"[DASHBOARD] User role para modal: {user_role}")
+                log_printf("[DASHBOARD] User role para modal: %s", user_role)
                 
                 modal_query = supabase_admin.table('importacoes_processos_aberta').select('modal')
                 
                 # Aplicar filtros baseados no role do usuário
                 if user_role == 'cliente_unique':
                     user_companies = get_user_companies(user_data)
-                    print(f"[DASHBOARD] Empresas para modal: {user_companies}")
+                    log_printf("[DASHBOARD] Empresas para modal: %s", user_companies)
                     
                     if user_companies:
                         modal_query = modal_query.in_('cnpj_importador', user_companies)
@@ -564,7 +565,7 @@ def dashboard_data_api(permissions=None):
                     
                     if user_perfil_principal == 'admin_operacao':
                         user_companies = get_user_companies(user_data)
-                        print(f"[DASHBOARD] Empresas para modal (admin operação): {user_companies}")
+                        log_printf("[DASHBOARD] Empresas para modal (admin operação): %s", user_companies)
                         
                         if user_companies:
                             modal_query = modal_query.in_('cnpj_importador', user_companies)
@@ -573,35 +574,35 @@ def dashboard_data_api(permissions=None):
                 
                 modal_result = modal_query.execute()
                 modal_data = modal_result.data if modal_result.data else []
-                print(f"[DASHBOARD] Dados de modal obtidos: {len(modal_data)} registros")
+                log_printf("[DASHBOARD] Dados de modal obtidos: %s registros", len(modal_data))
                 
                 if modal_data:
                     # Processar dados de modal
                     df_modal = pd.DataFrame(modal_data)
                     modal_dist = df_modal['modal'].value_counts().head(10)
-                    print(f"[DASHBOARD] Views modal distribution: {modal_dist.to_dict()}")
+                    log_printf("[DASHBOARD] Views modal distribution: %s", modal_dist.to_dict())
                     charts['canal'] = {
                         'labels': [str(x) for x in modal_dist.index.tolist()],
                         'values': [int(x) if not pd.isna(x) else 0 for x in modal_dist.values.tolist()]
                     }
-                    print(f"[DASHBOARD] Views canal chart: {charts['canal']}")
+                    log_printf("[DASHBOARD] Views canal chart: %s", charts['canal'])
                 else:
                     charts['canal'] = {'labels': [], 'values': []}
-                    print("[DASHBOARD] Nenhum dado de modal encontrado")
+                    log_print("[DASHBOARD] Nenhum dado de modal encontrado")
             except Exception as e:
-                print(f"[DASHBOARD] Erro ao buscar dados de modal: {e}")
+                log_printf("[DASHBOARD] Erro ao buscar dados de modal: %s", e)
                 charts['canal'] = {'labels': [], 'values': []}
             
             # Gráfico de URF a partir da tabela principal
             try:
-                print("[DASHBOARD] Buscando dados de País Procedência...")
+                log_print("[DASHBOARD] Buscando dados de País Procedência...")
                 pais_query = supabase_admin.table('importacoes_processos_aberta').select('pais_procedencia')
                 
                 # Aplicar filtros baseados no role do usuário
                 if user_role == 'cliente_unique':
                     from routes.api import get_user_companies
                     user_companies = get_user_companies(user_data)
-                    print(f"[DASHBOARD] Empresas para País Procedência: {user_companies}")
+                    log_printf("[DASHBOARD] Empresas para País Procedência: %s", user_companies)
                     
                     if user_companies:
                         pais_query = pais_query.in_('cnpj_importador', user_companies)
@@ -613,7 +614,7 @@ def dashboard_data_api(permissions=None):
                     if user_perfil_principal == 'admin_operacao':
                         from routes.api import get_user_companies
                         user_companies = get_user_companies(user_data)
-                        print(f"[DASHBOARD] Empresas para País Procedência (admin operação): {user_companies}")
+                        log_printf("[DASHBOARD] Empresas para País Procedência (admin operação): %s", user_companies)
                         
                         if user_companies:
                             pais_query = pais_query.in_('cnpj_importador', user_companies)
@@ -622,7 +623,7 @@ def dashboard_data_api(permissions=None):
                 
                 pais_result = pais_query.execute()
                 pais_data = pais_result.data if pais_result.data else []
-                print(f"[DASHBOARD] Dados de País Procedência obtidos: {len(pais_data)} registros")
+                log_printf("[DASHBOARD] Dados de País Procedência obtidos: %s registros", len(pais_data))
                 
                 if pais_data:
                     df_pais = pd.DataFrame(pais_data)
@@ -635,19 +636,19 @@ def dashboard_data_api(permissions=None):
                 else:
                     charts['urf'] = {'labels': [], 'values': []}
             except Exception as e:
-                print(f"[DASHBOARD] Erro ao buscar dados de País Procedência: {e}")
+                log_printf("[DASHBOARD] Erro ao buscar dados de País Procedência: %s", e)
                 charts['urf'] = {'labels': [], 'values': []}
             
             # Gráfico de Materiais a partir da tabela principal
             try:
-                print("[DASHBOARD] Buscando dados de materiais...")
+                log_print("[DASHBOARD] Buscando dados de materiais...")
                 material_query = supabase_admin.table('importacoes_processos_aberta').select('mercadoria').neq('status_processo', 'Despacho Cancelado')
                 
                 # Aplicar filtros baseados no role do usuário
                 if user_role == 'cliente_unique':
                     from routes.api import get_user_companies
                     user_companies = get_user_companies(user_data)
-                    print(f"[DASHBOARD] Empresas para materiais: {user_companies}")
+                    log_printf("[DASHBOARD] Empresas para materiais: %s", user_companies)
                     
                     if user_companies:
                         material_query = material_query.in_('cnpj_importador', user_companies)
@@ -656,7 +657,7 @@ def dashboard_data_api(permissions=None):
                 
                 material_result = material_query.execute()
                 material_data = material_result.data if material_result.data else []
-                print(f"[DASHBOARD] Dados de materiais obtidos: {len(material_data)} registros")
+                log_printf("[DASHBOARD] Dados de materiais obtidos: %s registros", len(material_data))
                 
                 if material_data:
                     df_materiais = pd.DataFrame(material_data)
@@ -675,7 +676,7 @@ def dashboard_data_api(permissions=None):
                 else:
                     charts['top_material'] = {'labels': [], 'values': []}
             except Exception as e:
-                print(f"[DASHBOARD] Erro ao buscar dados de materiais: {e}")
+                log_printf("[DASHBOARD] Erro ao buscar dados de materiais: %s", e)
                 charts['top_material'] = {'labels': [], 'values': []}
             
             # Evolução semanal vazia para manter compatibilidade
@@ -705,7 +706,7 @@ def dashboard_data_api(permissions=None):
                     recent_ops = mapped_ops
                     
             except Exception as e:
-                print(f"[DASHBOARD] Erro ao buscar últimas operações: {e}")
+                log_printf("[DASHBOARD] Erro ao buscar últimas operações: %s", e)
                 recent_ops = []
         
         # Estruturar dados no formato esperado pelo JavaScript
@@ -722,7 +723,7 @@ def dashboard_data_api(permissions=None):
         })
         
     except Exception as e:
-        print(f"[DASHBOARD] Erro na API dashboard-data: {str(e)}")
+        log_printf("[DASHBOARD] Erro na API dashboard-data: %s", str(e))
         return jsonify({
             'success': False,
             'error': str(e),
@@ -6,7 +6,8 @@ from permissions import check_permission
 from datetime import datetime, timedelta
 import pandas as pd
 import numpy as np
-from services.data_cache import DataCacheService
+from services.datasets import dataset_cache, IMPORTACOES_6_MESES_DASHBOARD_V2
+from log_config import log_print, log_printf
 
 bp = Blueprint('dashboard_v2', __name__, url_prefix='/dashboard-v2')
 
@@ -19,7 +20,7 @@ def monthly_chart():
         granularidade = request.args.get('granularidade', 'mensal')
         user_data = session.get('user', {})
         user_id = user_data.get('id')
-        data = data_cache.get_cache(user_id, 'dashboard_v2_data')
+        data = dataset_cache.get(user_id, IMPORTACOES_6_MESES_DASHBOARD_V2)
         if not data:
             return jsonify({'success': False, 'error': 'Dados não encontrados.', 'data': {}})
         df = pd.DataFrame(data)
@@ -49,12 +50,9 @@ def monthly_chart():
         }
         return jsonify({'success': True, 'data': clean_data_for_json(chart_data)})
     except Exception as e:
-        print(f"[DASHBOARD_V2] Erro ao gerar monthly_chart: {str(e)}")
+        log_printf("[DASHBOARD_V2] Erro ao gerar monthly_chart: %s", str(e))
         return jsonify({'success': False, 'error': str(e), 'data': {}}), 500
 
-# Instanciar o serviço de cache
-data_cache = DataCacheService()
-
 def clean_data_for_json(data):
     """Remove valores NaN e converte para tipos JSON-safe"""
     if isinstance(data, dict):
@@ -83,7 +81,7 @@ def index():
 def load_data():
     """Carregar dados da view vw_importacoes_6_meses"""
     try:
-        print("[DASHBOARD_V2] Iniciando carregamento de dados da view...")
+        log_print("[DASHBOARD_V2] Iniciando carregamento de dados da view...")
         
         # Obter dados do usuário
         user_data = session.get('user', {})
@@ -91,11 +89,10 @@ def load_data():
         user_id = user_data.get('id')
         
         # Verificar se já existe cache
-        cache_key = f"dashboard_v2_data_{user_id}"
-        cached_data = data_cache.get_cache(user_id, 'dashboard_v2_data')
+        cached_data = dataset_cache.get(user_id, IMPORTACOES_6_MESES_DASHBOARD_V2)
         
         if cached_data:
-            print(f"[DASHBOARD_V2] Cache encontrado: {len(cached_data)} registros")
+            log_printf("[DASHBOARD_V2] Cache encontrado: %s registros", len(cached_data))
             # Armazenar apenas um flag na sessão
             session['dashboard_v2_loaded'] = True
             return jsonify({
@@ -106,10 +103,12 @@ def load_data():
         
         # Query base da view
         query = supabase_admin.table('vw_importacoes_6_meses').select('*')
+        scope = None
         
         # Filtrar por empresa se for cliente ou admin operação
         if user_role == 'cliente_unique':
             user_companies = get_user_companies(user_data)
+            scope = user_companies or []
             if user_companies:
                 query = query.in_('cnpj_importador', user_companies)
             else:
@@ -120,28 +119,39 @@ def load_data():
             
             if user_perfil_principal == 'admin_operacao':
                 user_companies = get_user_companies(user_data)
+                scope = user_companies or []
                 if user_companies:
                     query = query.in_('cnpj_importador', user_companies)
                 else:
                     # Admin operação sem empresas não deve ver nada
                     query = query.eq('cnpj_importador', 'NENHUMA_EMPRESA_ENCONTRADA')
         
+        # Dataset da mesma view já carregado (ex.: materiais) com escopo compatível
+        served = dataset_cache.get(user_id, IMPORTACOES_6_MESES_DASHBOARD_V2, scope=scope)
+        if served:
+            session['dashboard_v2_loaded'] = True
+            return jsonify({
+                'success': True,
+                'data': served,
+                'total_records': len(served)
+            })
+        
         # Executar query
         result = query.execute()
         
         if not result.data:
-            print("[DASHBOARD_V2] Nenhum dado encontrado")
+            log_print("[DASHBOARD_V2] Nenhum dado encontrado")
             return jsonify({
                 'success': False,
                 'error': 'Nenhum dado encontrado',
                 'data': []
             })
         
-        print(f"[DASHBOARD_V2] Dados carregados: {len(result.data)} registros")
+        log_printf("[DASHBOARD_V2] Dados carregados: %s registros", len(result.data))
         
         # Armazenar dados no cache do servidor
-        data_cache.set_cache(user_id, 'dashboard_v2_data', result.data)
-        print(f"[DASHBOARD_V2] Cache armazenado para user_id: {user_id} com {len(result.data)} registros")
+        dataset_cache.set(user_id, IMPORTACOES_6_MESES_DASHBOARD_V2, result.data, scope=scope)
+        log_printf("[DASHBOARD_V2] Cache armazenado para user_id: %s com %s registros", user_id, len(result.data))
         
         # Armazenar apenas um flag na sessão
         session['dashboard_v2_loaded'] = True
@@ -153,7 +163,7 @@ def load_data():
         })
         
     except Exception as e:
-        print(f"[DASHBOARD_V2] Erro ao carregar dados: {str(e)}")
+        log_printf("[DASHBOARD_V2] Erro ao carregar dados: %s", str(e))
         return jsonify({
             'success': False,
             'error': str(e),
@@ -170,7 +180,7 @@ def dashboard_kpis():
         user_data = session.get('user', {})
         user_id = user_data.get('id')
         
-        data = data_cache.get_cache(user_id, 'dashboard_v2_data')
+        data = dataset_cache.get(user_id, IMPORTACOES_6_MESES_DASHBOARD_V2)
         
         if not data:
             return jsonify({
@@ -260,7 +270,7 @@ def dashboard_kpis():
         })
         
     except Exception as e:
-        print(f"[DASHBOARD_V2] Erro ao calcular KPIs: {str(e)}")
+        log_printf("[DASHBOARD_V2] Erro ao calcular KPIs: %s", str(e))
         return jsonify({
             'success': False,
             'error': str(e),
@@ -277,7 +287,7 @@ def dashboard_charts():
         user_data = session.get('user', {})
         user_id = user_data.get('id')
         
-        data = data_cache.get_cache(user_id, 'dashboard_v2_data')
+        data = dataset_cache.get(user_id, IMPORTACOES_6_MESES_DASHBOARD_V2)
         
         if not data:
             return jsonify({
@@ -314,20 +324,20 @@ def dashboard_charts():
             status_chart = {'labels': [], 'values': []}
 
         # Gráfico de Barras Agrupadas: Processos e Custo Total por Modal
-        print(f"[DASHBOARD_V2] Grouped Modal Chart - Colunas disponíveis: {df.columns.tolist()}")
-        print(f"[DASHBOARD_V2] Grouped Modal Chart - Verificando colunas: modal={('modal' in df.columns)}, custo_total={('custo_total' in df.columns)}")
+        log_printf("[DASHBOARD_V2] Grouped Modal Chart - Colunas disponíveis: %s", df.columns.tolist())
+        log_printf("[DASHBOARD_V2] Grouped Modal Chart - Verificando colunas: modal=%s, custo_total=%s", 'modal' in df.columns, 'custo_total' in df.columns)
         
         if 'modal' in df.columns and 'custo_total' in df.columns:
-            print(f"[DASHBOARD_V2] Grouped Modal Chart - Valores únicos de modal: {df['modal'].unique()}")
-            print(f"[DASHBOARD_V2] Grouped Modal Chart - Valores de custo_total (primeiros 5): {df['custo_total'].head().tolist()}")
-            print(f"[DASHBOARD_V2] Grouped Modal Chart - Total de registros: {len(df)}")
+            log_printf("[DASHBOARD_V2] Grouped Modal Chart - Valores únicos de modal: %s", df['modal'].unique())
+            log_printf("[DASHBOARD_V2] Grouped Modal Chart - Valores de custo_total (primeiros 5): %s", df['custo_total'].head().tolist())
+            log_printf("[DASHBOARD_V2] Grouped Modal Chart - Total de registros: %s", len(df))
             
             modal_group = df.groupby('modal').agg({
                 'ref_unique': 'count',
                 'custo_total': 'sum'
             }).reset_index()
             
-            print(f"[DASHBOARD_V2] Grouped Modal Chart - Resultado do groupby: {modal_group.to_dict('records')}")
+            log_printf("[DASHBOARD_V2] Grouped Modal Chart - Resultado do groupby: %s", modal_group.to_dict('records'))
             
             grouped_modal_chart = {
                 'labels': modal_group['modal'].tolist(),
@@ -335,9 +345,9 @@ def dashboard_charts():
                 'custos': modal_group['custo_total'].tolist()
             }
             
-            print(f"[DASHBOARD_V2] Grouped Modal Chart - Dados finais: {grouped_modal_chart}")
+            log_printf("[DASHBOARD_V2] Grouped Modal Chart - Dados finais: %s", grouped_modal_chart)
         else:
-            print(f"[DASHBOARD_V2] Grouped Modal Chart - Colunas não encontradas, retornando vazio")
+            log_print(f"[DASHBOARD_V2] Grouped Modal Chart - Colunas não encontradas, retornando vazio")
             grouped_modal_chart = {'labels': [], 'processos': [], 'custos': []}
 
         # Gráfico País Procedência (usando coluna normalizada)
@@ -380,7 +390,7 @@ def dashboard_charts():
         })
         
     except Exception as e:
-        print(f"[DASHBOARD_V2] Erro ao gerar gráficos: {str(e)}")
+        log_printf("[DASHBOARD_V2] Erro ao gerar gráficos: %s", str(e))
         return jsonify({
             'success': False,
             'error': str(e),
@@ -397,7 +407,7 @@ def recent_operations():
         user_data = session.get('user', {})
         user_id = user_data.get('id')
         
-        data = data_cache.get_cache(user_id, 'dashboard_v2_data')
+        data = dataset_cache.get(user_id, IMPORTACOES_6_MESES_DASHBOARD_V2)
         
         if not data:
             return jsonify({
@@ -449,7 +459,7 @@ def recent_operations():
         })
         
     except Exception as e:
-        print(f"[DASHBOARD_V2] Erro ao obter operações recentes: {str(e)}")
+        log_printf("[DASHBOARD_V2] Erro ao obter operações recentes: %s", str(e))
         return jsonify({
             'success': False,
             'error': str(e),
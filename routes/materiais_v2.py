@@ -3,19 +3,18 @@ from datetime import datetime, timedelta
 from extensions import supabase, supabase_admin
 from routes.auth import login_required, role_required
 from routes.api import get_user_companies
-from services.data_cache import DataCacheService
+from services.single_flight import single_flight, query_fingerprint, copy_rows
+from services.datasets import dataset_cache, IMPORTACOES_6_MESES
 import pandas as pd
 import numpy as np
 import pandas as pd
 import numpy as np
 
-data_cache = DataCacheService()
-
 bp = Blueprint('materiais_v2', __name__, url_prefix='/materiais-v2')
 
 def get_or_reload_cache(user_id, user_role):
     """Função helper para obter cache ou recarregar se não existir"""
-    data = data_cache.get_cache(user_id, 'dashboard_v2_data')
+    data = dataset_cache.get(user_id, IMPORTACOES_6_MESES)
     
     if not data:
         print(f"[MATERIAIS_V2] Cache não encontrado para user_id: {user_id}, recarregando...")
@@ -24,6 +23,7 @@ def get_or_reload_cache(user_id, user_role):
         from routes.api import get_user_companies
         
         query = supabase_admin.table('vw_importacoes_6_meses').select('*')
+        user_companies = None
         
         if user_role == 'cliente_unique':
             # Obter dados do usuário da sessão para passar para get_user_companies
@@ -32,11 +32,18 @@ def get_or_reload_cache(user_id, user_role):
             if user_companies:
                 query = query.in_('cnpj_importador', user_companies)
         
-        result = query.execute()
+        # Outro dataset da mesma view com escopo que contém o do usuário atende sem query
+        data = dataset_cache.get(user_id, IMPORTACOES_6_MESES, scope=user_companies or None)
+        if data:
+            return data
+        
+        # Requisições concorrentes com o mesmo filtro compartilham uma única query
+        fingerprint = query_fingerprint('vw_importacoes_6_meses', {'cnpj_importador': user_companies or None})
+        rows = single_flight.do(fingerprint, lambda: query.execute().data or [], copy=copy_rows)
         
-        if result.data:
-            data = result.data
-            data_cache.set_cache(user_id, 'dashboard_v2_data', data)
+        if rows:
+            data = rows
+            dataset_cache.set(user_id, IMPORTACOES_6_MESES, data, scope=user_companies or None)
             print(f"[MATERIAIS_V2] Cache recarregado: {len(data)} registros")
     
     return data
@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, request, session, send_file
 from extensions import supabase
 from routes.auth import login_required, role_required
+from middleware.page_tracking import no_page_tracking
 import tempfile
 import os
 from datetime import datetime
@@ -41,6 +42,7 @@ def index():
                          end_date=end_date)
 
 @bp.route('/relatorios/pdf')
+@no_page_tracking
 @login_required
 def generate_pdf():
     user_role = session['user']['role']
@@ -0,0 +1,144 @@
+"""
+Servidor SMTP local para testar o envio de e-mails sem um relay real.
+
+Aceita qualquer usuário/senha (AUTH PLAIN/LOGIN), não oferece STARTTLS e
+grava cada mensagem recebida como .eml no diretório indicado (além de
+mostrar remetente/destinatários/assunto no terminal). Com --fail-every N
+derruba a conexão a cada N mensagens, para exercitar a reconexão e o
+retry da fila de entrega (services/mail_queue.py).
+
+Uso:
+    python scripts/debug_smtp_server.py --port 1025 --dir /tmp/portal_mails
+
+    # no .env do portal
+    SMTP_HOST=localhost
+    SMTP_PORT=1025
+    SMTP_USE_TLS=false
+    SMTP_USER=teste
+    SMTP_PASSWORD=teste
+"""
+
+import argparse
+import email
+import os
+import socketserver
+import threading
+import time
+import uuid
+
+
+class DebugSMTPHandler(socketserver.StreamRequestHandler):
+    """Uma conexão SMTP: comandos linha a linha, DATA até a linha com '.'"""
+
+    def send(self, line):
+        self.wfile.write((line + '\r\n').encode('utf-8'))
+
+    def handle(self):
+        self.mail_from = None
+        self.rcpt_to = []
+        self.send('220 debug-smtp ESMTP pronto')
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            line = raw.decode('utf-8', errors='replace').rstrip('\r\n')
+            command = line.split(' ', 1)[0].upper()
+            argument = line[len(command):].strip()
+            if command in ('EHLO', 'HELO'):
+                if command == 'EHLO':
+                    self.send('250-debug-smtp')
+                    self.send('250-AUTH PLAIN LOGIN')
+                    self.send('250 8BITMIME')
+                else:
+                    self.send('250 debug-smtp')
+            elif command == 'AUTH':
+                if argument.upper().startswith('LOGIN'):
+                    self.send('334 VXNlcm5hbWU6')
+                    self.rfile.readline()
+                    self.send('334 UGFzc3dvcmQ6')
+                    self.rfile.readline()
+                elif argument.upper() == 'PLAIN':
+                    self.send('334 ')
+                    self.rfile.readline()
+                self.send('235 Autenticado')
+            elif command == 'MAIL':
+                self.mail_from = argument.split(':', 1)[-1].strip()
+                self.rcpt_to = []
+                self.send('250 OK')
+            elif command == 'RCPT':
+                self.rcpt_to.append(argument.split(':', 1)[-1].strip())
+                self.send('250 OK')
+            elif command == 'DATA':
+                self.send('354 Termine com <CRLF>.<CRLF>')
+                self.receive_data()
+                if self.server.should_fail():
+                    print('[DEBUG_SMTP] Derrubando a conexão (--fail-every)')
+                    return
+                self.send('250 OK mensagem aceita')
+            elif command == 'RSET':
+                self.mail_from, self.rcpt_to = None, []
+                self.send('250 OK')
+            elif command == 'NOOP':
+                self.send('250 OK')
+            elif command == 'QUIT':
+                self.send('221 Até logo')
+                return
+            else:
+                self.send('502 Comando não implementado')
+
+    def receive_data(self):
+        lines = []
+        while True:
+            raw = self.rfile.readline()
+            if not raw or raw in (b'.\r\n', b'.\n'):
+                break
+            if raw.startswith(b'..'):
+                raw = raw[1:]
+            lines.append(raw)
+        content = b''.join(lines)
+        message = email.message_from_bytes(content)
+        path = os.path.join(self.server.directory, f"{time.strftime('%Y%m%d-%H%M%S')}_{uuid.uuid4().hex[:8]}.eml")
+        with open(path, 'wb') as f:
+            f.write(content)
+        print(f"[DEBUG_SMTP] {self.mail_from} -> {', '.join(self.rcpt_to)} | {message.get('Subject')} | {path}")
+
+
+class DebugSMTPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, directory, fail_every=0):
+        super().__init__(address, DebugSMTPHandler)
+        self.directory = directory
+        self.fail_every = fail_every
+        self.received = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def should_fail(self):
+        with self._lock:
+            self.received += 1
+            return bool(self.fail_every) and self.received % self.fail_every == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Servidor SMTP local para testes')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1025)
+    parser.add_argument('--dir', default=os.path.join(os.getcwd(), 'debug_mails'))
+    parser.add_argument('--fail-every', type=int, default=0,
+                        help='derruba a conexão a cada N mensagens (testa reconexão/retry)')
+    args = parser.parse_args()
+
+    server = DebugSMTPServer((args.host, args.port), args.dir, fail_every=args.fail_every)
+    print(f"[DEBUG_SMTP] Escutando em {args.host}:{args.port} - mensagens em {args.dir}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
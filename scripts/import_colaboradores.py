@@ -2,10 +2,15 @@
 from __future__ import annotations
 
 import argparse
+import hashlib
 import json
 import os
+import threading
+import time
 import unicodedata
+import uuid
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass, field
 from datetime import date, datetime
 from pathlib import Path
@@ -419,57 +424,6 @@ def build_historico_entries(
     return entries
 
 
-def sync_historico_entries(
-    client: Client,
-    colaborador_id: str,
-    entries: List[Dict[str, object]],
-) -> None:
-    if not entries:
-        return
-    response = (
-        client.table("rh_historico_colaborador")
-        .select("id, tipo_evento, data_evento")
-        .eq("colaborador_id", colaborador_id)
-        .execute()
-    )
-    existing = {
-        (item["tipo_evento"], item["data_evento"]): item["id"]
-        for item in (response.data or [])
-    }
-    for entry in entries:
-        key = (entry["tipo_evento"], entry["data_evento"])
-        payload = entry.copy()
-        payload.pop("colaborador_id", None)
-        if key in existing:
-            client.table("rh_historico_colaborador").update(payload).eq("id", existing[key]).execute()
-        else:
-            client.table("rh_historico_colaborador").insert(entry).execute()
-
-
-def sync_exame_event(
-    client: Client,
-    colaborador_id: str,
-    event: Optional[Dict[str, object]],
-) -> None:
-    if not event:
-        return
-    response = (
-        client.table("rh_eventos_colaborador")
-        .select("id, data_inicio")
-        .eq("colaborador_id", colaborador_id)
-        .eq("tipo_evento", "Exame Peri\u00f3dico")
-        .execute()
-    )
-    existing = response.data or []
-    match = next((item for item in existing if item.get("data_inicio") == event["data_inicio"]), None)
-    payload = event.copy()
-    payload.pop("colaborador_id", None)
-    if match:
-        client.table("rh_eventos_colaborador").update(payload).eq("id", match["id"]).execute()
-    else:
-        client.table("rh_eventos_colaborador").insert(event).execute()
-
-
 def resolve_lookup_id(lookup: Dict[str, Dict[str, str]], value: Optional[str], label: str) -> Optional[str]:
     if not value:
         return None
@@ -493,75 +447,268 @@ def maybe_create_exame_event(colaborador_id: str, row: RowData) -> Optional[Dict
     }
 
 
-def run_import(client: Client, prepared: PreparedData, dry_run: bool) -> Dict[str, object]:
+COLABORADOR_COLUMNS = (
+    "id, cpf, nome_completo, data_nascimento, data_admissao, status, "
+    "matricula, genero, escolaridade, pis_pasep, data_desligamento"
+)
+IN_CHUNK_SIZE = 200
+EXAME_TIPO = "Exame Peri\u00f3dico"
+
+
+def chunked(values: List, size: int) -> Iterable[List]:
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def fetch_in(client: Client, table: str, columns: str, column: str, values: Iterable, **eq) -> List[Dict[str, object]]:
+    """Rows whose `column` is in `values`, one `in_` query per chunk of values."""
+    distinct = list(dict.fromkeys(v for v in values if v is not None))
+    rows: List[Dict[str, object]] = []
+    for chunk in chunked(distinct, IN_CHUNK_SIZE):
+        query = client.table(table).select(columns).in_(column, chunk)
+        for key, value in eq.items():
+            query = query.eq(key, value)
+        rows.extend(query.execute().data or [])
+    return rows
+
+
+def upsert_grouped(client: Client, table: str, rows: List[Dict[str, object]], on_conflict: str) -> List[Dict[str, object]]:
+    """Bulk upsert, one request per set of columns (PostgREST requires uniform keys)."""
+    groups: Dict[Tuple[str, ...], List[Dict[str, object]]] = defaultdict(list)
+    for row in rows:
+        groups[tuple(sorted(row))].append(row)
+    written: List[Dict[str, object]] = []
+    for group in groups.values():
+        response = client.table(table).upsert(group, on_conflict=on_conflict).execute()
+        written.extend(response.data or [])
+    return written
+
+
+def source_fingerprint(path: Path) -> str:
+    digest = hashlib.sha1()
+    with path.open("rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Checkpoint:
+    """CPFs already imported from a given spreadsheet, persisted after every batch."""
+
+    def __init__(self, path: Optional[Path], fingerprint: str, resume: bool):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.done: set = set()
+        self._lock = threading.Lock()
+        if path and resume and path.exists():
+            data = json.loads(path.read_text(encoding="utf-8"))
+            if data.get("fingerprint") == fingerprint:
+                self.done = set(data.get("done", []))
+                print(f"Retomando importacao: {len(self.done)} colaboradores ja importados")
+            else:
+                print("Checkpoint pertence a outra planilha; importando do inicio")
+
+    def mark(self, cpfs: Iterable[str]) -> None:
+        with self._lock:
+            self.done.update(cpfs)
+            if not self.path:
+                return
+            partial = self.path.with_suffix(self.path.suffix + ".part")
+            partial.write_text(
+                json.dumps({"fingerprint": self.fingerprint, "done": sorted(self.done)}),
+                encoding="utf-8",
+            )
+            os.replace(partial, self.path)
+
+    def clear(self) -> None:
+        if self.path and self.path.exists():
+            self.path.unlink()
+
+
+def _history_key(entry: Dict[str, object]) -> Tuple[object, object, object]:
+    return (entry["colaborador_id"], entry["tipo_evento"], entry["data_evento"])
+
+
+def import_batch(
+    client: Client,
+    batch: List[List[RowData]],
+    departamento_lookup: Dict[str, Dict[str, str]],
+    cargo_lookup: Dict[str, Dict[str, str]],
+) -> Dict[str, int]:
+    """Import one batch of collaborators (rows grouped by CPF) with bulk requests."""
+    masters = [rows[-1] for rows in batch]
+    existing = {
+        item["cpf"]: item["id"]
+        for item in fetch_in(client, "rh_colaboradores", "id, cpf", "cpf", [m.cpf for m in masters])
+    }
+
+    # Resolve every foreign key before writing anything for the batch
+    historico_por_cpf = {
+        rows[-1].cpf: build_historico_entries("", rows, departamento_lookup, cargo_lookup) for rows in batch
+    }
+
+    written = upsert_grouped(
+        client,
+        "rh_colaboradores",
+        [create_colaborador_payload(master, for_update=True) for master in masters],
+        on_conflict="cpf",
+    )
+    ids = {item["cpf"]: item["id"] for item in written}
+    missing = [m.cpf for m in masters if m.cpf not in ids]
+    if missing:
+        raise RuntimeError(f"Upsert nao retornou {len(missing)} colaboradores")
+
+    # Historico: existing events keyed by (colaborador, tipo, data); new ones get client-side ids
+    historico_existente = {
+        _history_key(item): item["id"]
+        for item in fetch_in(
+            client, "rh_historico_colaborador", "id, colaborador_id, tipo_evento, data_evento",
+            "colaborador_id", ids.values(),
+        )
+    }
+    historicos: Dict[Tuple[object, object, object], Dict[str, object]] = {}
+    for cpf, entries in historico_por_cpf.items():
+        for entry in entries:
+            entry["colaborador_id"] = ids[cpf]
+            key = _history_key(entry)
+            # Same event twice in the batch: the last one wins, as a second upsert would
+            entry["id"] = historico_existente.get(key) or historicos.get(key, {}).get("id") or str(uuid.uuid4())
+            historicos[key] = entry
+    upsert_grouped(client, "rh_historico_colaborador", list(historicos.values()), on_conflict="id")
+
+    exames_existentes = {
+        (item["colaborador_id"], item["data_inicio"]): item["id"]
+        for item in fetch_in(
+            client, "rh_eventos_colaborador", "id, colaborador_id, data_inicio",
+            "colaborador_id", ids.values(), tipo_evento=EXAME_TIPO,
+        )
+    }
+    exames: List[Dict[str, object]] = []
+    for master in masters:
+        event = maybe_create_exame_event(ids[master.cpf], master)
+        if event:
+            event["id"] = exames_existentes.get((event["colaborador_id"], event["data_inicio"])) or str(uuid.uuid4())
+            exames.append(event)
+    upsert_grouped(client, "rh_eventos_colaborador", exames, on_conflict="id")
+
+    created = sum(1 for m in masters if m.cpf not in existing)
+    return {"criados": created, "atualizados": len(masters) - created, "historicos": len(historicos), "exames": len(exames)}
+
+
+def build_diff_report(
+    client: Client,
+    prepared: PreparedData,
+    grouped: Dict[str, List[RowData]],
+    departamento_lookup: Dict[str, Dict[str, str]],
+    cargo_lookup: Dict[str, Dict[str, str]],
+) -> Dict[str, object]:
+    """Compare the spreadsheet against the database without writing anything."""
+    masters = [rows[-1] for rows in grouped.values()]
+    existing = {
+        item["cpf"]: item
+        for item in fetch_in(client, "rh_colaboradores", COLABORADOR_COLUMNS, "cpf", [m.cpf for m in masters])
+    }
+    # Dry run nao cria departamentos/cargos: os novos da planilha contam como resolvidos
+    departamentos_previstos = {**{key: {"id": None} for key in prepared.departamentos}, **departamento_lookup}
+    cargos_previstos = {**{key: {"id": None} for key in prepared.cargos}, **cargo_lookup}
+    novos: List[str] = []
+    alterados: Dict[str, Dict[str, Dict[str, object]]] = {}
+    sem_alteracao = 0
+    erros: Dict[str, str] = {}
+    for rows in grouped.values():
+        master = rows[-1]
+        try:
+            build_historico_entries("", rows, departamentos_previstos, cargos_previstos)
+        except ValueError as exc:
+            erros[master.cpf] = str(exc)
+        current = existing.get(master.cpf)
+        if current is None:
+            novos.append(master.cpf)
+            continue
+        payload = create_colaborador_payload(master, for_update=True)
+        changes = {
+            column: {"atual": current.get(column), "planilha": value}
+            for column, value in payload.items()
+            if str(current.get(column) or "") != str(value or "")
+        }
+        if changes:
+            alterados[master.cpf] = changes
+        else:
+            sem_alteracao += 1
+
+    return {
+        "total_registros_planilha": len(prepared.rows),
+        "colaboradores_unicos": len(grouped),
+        "colaboradores_novos": novos,
+        "colaboradores_alterados": alterados,
+        "colaboradores_sem_alteracao": sem_alteracao,
+        "erros": erros,
+        "departamentos_novos": [name for key, name in prepared.departamentos.items() if key not in departamento_lookup],
+        "cargos_novos": [name for key, (name, _) in prepared.cargos.items() if key not in cargo_lookup],
+        "duplicados_por_cpf": {cpf: [r.index for r in rows] for cpf, rows in prepared.duplicates.items()},
+    }
+
+
+def run_import(
+    client: Client,
+    prepared: PreparedData,
+    dry_run: bool,
+    checkpoint: Optional[Checkpoint] = None,
+    batch_size: int = 200,
+    workers: int = 4,
+) -> Dict[str, object]:
+    started = time.time()
     departamento_lookup = ensure_departamentos(client, prepared, dry_run)
     cargo_lookup = ensure_cargos(client, prepared, dry_run)
 
     grouped = group_rows_by_cpf(prepared)
     total = len(grouped)
-    processed = 0
-    created = 0
-    updated = 0
-    failures: List[Tuple[str, str]] = []
 
     if dry_run:
-        summary = {
-            "total_registros_planilha": len(prepared.rows),
-            "colaboradores_unicos": total,
-            "departamentos_novos": [name for key, name in prepared.departamentos.items() if key not in departamento_lookup],
-            "cargos_novos": [name for key, (name, _) in prepared.cargos.items() if key not in cargo_lookup],
-            "duplicados_por_cpf": {cpf: [r.index for r in rows] for cpf, rows in prepared.duplicates.items()},
+        report = build_diff_report(client, prepared, grouped, departamento_lookup, cargo_lookup)
+        print(json.dumps(report, indent=2, ensure_ascii=False, default=str))
+        return report
+
+    checkpoint = checkpoint or Checkpoint(None, "", resume=False)
+    pendentes = [rows for rows in grouped.values() if rows[-1].cpf not in checkpoint.done]
+    skipped = total - len(pendentes)
+    batches = list(chunked(pendentes, batch_size))
+    totals = {"criados": 0, "atualizados": 0, "historicos": 0, "exames": 0}
+    failures: List[Tuple[str, str]] = []
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {
+            executor.submit(import_batch, client, batch, departamento_lookup, cargo_lookup): batch
+            for batch in batches
         }
-        print(json.dumps(summary, indent=2, ensure_ascii=False))
-        return summary
-
-    for _, rows in grouped.items():
-        rows_sorted = sorted(rows, key=lambda r: r.data_admissao or "")
-        master = rows_sorted[-1]
-        payload_insert = create_colaborador_payload(master)
-        payload_update = create_colaborador_payload(master, for_update=True)
-        created_new = False
-        colaborador_id: Optional[str] = None
-        try:
-            existing = (
-                client.table("rh_colaboradores")
-                .select("id")
-                .eq("cpf", master.cpf)
-                .execute()
-            )
-            if existing.data:
-                colaborador_id = existing.data[0]["id"]
-                client.table("rh_colaboradores").update(payload_update).eq("id", colaborador_id).execute()
-                updated += 1
-            else:
-                response = client.table("rh_colaboradores").insert(payload_insert).execute()
-                if not response.data:
-                    raise RuntimeError("Insert returned no data")
-                colaborador_id = response.data[0]["id"]
-                created += 1
-                created_new = True
-
-            historicos = build_historico_entries(colaborador_id, rows_sorted, departamento_lookup, cargo_lookup)
-            sync_historico_entries(client, colaborador_id, historicos)
-
-            exame_evento = maybe_create_exame_event(colaborador_id, master)
-            sync_exame_event(client, colaborador_id, exame_evento)
-            processed += 1
-        except Exception as exc:  # pragma: no cover
-            failures.append((master.nome, str(exc)))
-            if created_new and colaborador_id:
-                client.table("rh_colaboradores").delete().eq("id", colaborador_id).execute()
+        for future in as_completed(futures):
+            batch = futures[future]
+            try:
+                result = future.result()
+            except Exception as exc:  # pragma: no cover
+                # Batch is not checkpointed: a resumed run retries it (writes are upserts)
+                failures.extend((rows[-1].nome, str(exc)) for rows in batch)
+                continue
+            for key, value in result.items():
+                totals[key] += value
+            checkpoint.mark(rows[-1].cpf for rows in batch)
+            print(f"Lote concluido: {len(checkpoint.done)}/{total} colaboradores")
 
+    processed = totals["criados"] + totals["atualizados"]
     print(
-        f"Processados: {processed}/{total} | Criados: {created} | Atualizados: {updated} | Falhas: {len(failures)}"
+        f"Processados: {processed}/{total} | Criados: {totals['criados']} | Atualizados: {totals['atualizados']} "
+        f"| Ja importados: {skipped} | Falhas: {len(failures)} | {time.time() - started:.1f}s"
     )
     if failures:
         for nome, motivo in failures:
             print(f"[ERRO] {nome}: {motivo}")
+    else:
+        checkpoint.clear()
     return {
         "processados": processed,
-        "criados": created,
-        "atualizados": updated,
+        "criados": totals["criados"],
+        "atualizados": totals["atualizados"],
+        "ja_importados": skipped,
         "falhas": failures,
     }
 
@@ -569,7 +716,11 @@ def run_import(client: Client, prepared: PreparedData, dry_run: bool) -> Dict[st
 def build_argument_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="Importa colaboradores para o Supabase")
     parser.add_argument("--path", required=True, help="Caminho do arquivo Excel")
-    parser.add_argument("--dry-run", action="store_true", help="Executa apenas validacoes sem inserir dados")
+    parser.add_argument("--dry-run", action="store_true", help="Executa apenas validacoes e gera o relatorio de diferencas")
+    parser.add_argument("--batch-size", type=int, default=200, help="Colaboradores por lote de gravacao")
+    parser.add_argument("--workers", type=int, default=4, help="Lotes gravados em paralelo")
+    parser.add_argument("--checkpoint", help="Arquivo de checkpoint (padrao: <planilha>.checkpoint.json)")
+    parser.add_argument("--resume", action="store_true", help="Retoma a partir do checkpoint de uma execucao anterior")
     return parser
 
 
@@ -589,7 +740,9 @@ def main() -> None:
         raise FileNotFoundError(f"Arquivo nao encontrado: {data_path}")
 
     prepared = load_dataframe(data_path)
-    run_import(client, prepared, args.dry_run)
+    checkpoint_path = Path(args.checkpoint) if args.checkpoint else data_path.with_name(data_path.name + ".checkpoint.json")
+    checkpoint = Checkpoint(checkpoint_path, source_fingerprint(data_path), args.resume)
+    run_import(client, prepared, args.dry_run, checkpoint, args.batch_size, args.workers)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,161 @@
+"""
+Codemod: troca print(...) por log_print/log_printf (log_config).
+
+- print(f"[TAG] texto {valor}") com um único f-string sem format spec vira
+  log_printf("[TAG] texto %s", valor): a mensagem só é montada se for gravada
+- os demais print(...) viram log_print(...) (mesma assinatura de print)
+- com --lazy-logger, logger.debug(f"...")/info/warning/error/exception com um
+  único f-string viram logger.debug("... %s", valor)
+
+O import "from log_config import ..." é adicionado após os imports do topo.
+Sem --write apenas mostra quantas chamadas seriam alteradas.
+
+Uso:
+    python scripts/route_prints_to_logging.py services/data_cache.py extensions.py
+    python scripts/route_prints_to_logging.py --write services/data_cache.py
+    python scripts/route_prints_to_logging.py --write --lazy-logger services/perfil_access_service.py
+"""
+
+import argparse
+import ast
+import sys
+
+LOGGER_METHODS = ('debug', 'info', 'warning', 'error', 'exception', 'critical')
+LOGGER_NAMES = ('logger', 'log', 'logging')
+CONVERSIONS = {-1: '%s', 115: '%s', 114: '%r', 97: '%a'}  # sem conversão, !s, !r, !a
+
+
+def _literal(text):
+    """Literal Python entre aspas duplas preservando acentos/emojis"""
+    escaped = (text.replace('\\', '\\\\').replace('"', '\\"')
+               .replace('\n', '\\n').replace('\r', '\\r').replace('\t', '\\t'))
+    return f'"{escaped}"'
+
+
+def _printf_parts(node):
+    """(template, [expressões]) de um f-string, ou None se não for convertível"""
+    if not isinstance(node, ast.JoinedStr):
+        return None
+    template = []
+    values = []
+    for part in node.values:
+        if isinstance(part, ast.Constant):
+            template.append(str(part.value).replace('%', '%%'))
+        elif isinstance(part, ast.FormattedValue):
+            if part.format_spec is not None or part.conversion not in CONVERSIONS:
+                return None
+            template.append(CONVERSIONS[part.conversion])
+            values.append(ast.unparse(part.value))
+        else:
+            return None
+    if not values:
+        return None
+    return ''.join(template), values
+
+
+class _Offsets:
+    """Converte (linha, coluna em bytes UTF-8) do ast para offset no buffer"""
+
+    def __init__(self, data):
+        self.starts = [0]
+        for index, byte in enumerate(data):
+            if byte == 0x0A:
+                self.starts.append(index + 1)
+
+    def __call__(self, lineno, col):
+        return self.starts[lineno - 1] + col
+
+
+def transform(source, lazy_logger=False):
+    """Retorna (novo código, nomes importados, chamadas alteradas)"""
+    tree = ast.parse(source)
+    data = source.encode('utf-8')
+    offset = _Offsets(data)
+    edits = []
+    used = set()
+
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call):
+            continue
+        func = node.func
+        if isinstance(func, ast.Name) and func.id == 'print':
+            parts = _printf_parts(node.args[0]) if len(node.args) == 1 and not node.keywords else None
+            if parts:
+                template, values = parts
+                text = f"log_printf({_literal(template)}, {', '.join(values)})"
+                edits.append((offset(node.lineno, node.col_offset), offset(node.end_lineno, node.end_col_offset), text))
+                used.add('log_printf')
+            else:
+                edits.append((offset(func.lineno, func.col_offset), offset(func.end_lineno, func.end_col_offset), 'log_print'))
+                used.add('log_print')
+        elif (lazy_logger and isinstance(func, ast.Attribute) and func.attr in LOGGER_METHODS
+              and isinstance(func.value, ast.Name) and func.value.id in LOGGER_NAMES
+              and len(node.args) == 1):
+            parts = _printf_parts(node.args[0])
+            if parts:
+                template, values = parts
+                arg = node.args[0]
+                text = f"{_literal(template)}, {', '.join(values)}"
+                edits.append((offset(arg.lineno, arg.col_offset), offset(arg.end_lineno, arg.end_col_offset), text))
+
+    # Chamadas aninhadas em outra já reescrita ficam como estão
+    kept = []
+    for edit in sorted(edits):
+        if kept and edit[0] < kept[-1][1]:
+            continue
+        kept.append(edit)
+    if not kept:
+        return source, used, 0
+    changed = len(kept)
+
+    if used and 'from log_config import' not in source:
+        kept.append(_import_edit(tree, offset, data, used))
+
+    for start, end, text in sorted(kept, key=lambda edit: edit[0], reverse=True):
+        data = data[:start] + text.encode('utf-8') + data[end:]
+    return data.decode('utf-8'), used, changed
+
+
+def _import_edit(tree, offset, data, used):
+    """Inserção do import após o bloco de imports do topo do módulo"""
+    anchor = None
+    for statement in tree.body:
+        if isinstance(statement, (ast.Import, ast.ImportFrom)):
+            anchor = statement
+        elif anchor is None and isinstance(statement, ast.Expr) and isinstance(getattr(statement, 'value', None), ast.Constant):
+            anchor = statement  # docstring
+        else:
+            break
+    line = f"from log_config import {', '.join(sorted(used))}\n"
+    if anchor is None:
+        return 0, 0, line
+    position = offset(anchor.end_lineno, anchor.end_col_offset)
+    newline = data.find(b'\n', position)
+    position = len(data) if newline == -1 else newline + 1
+    return position, position, line
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Troca print(...) por log_print/log_printf')
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--write', action='store_true', help='grava as alterações nos arquivos')
+    parser.add_argument('--lazy-logger', action='store_true', help='converte logger.<nível>(f"...") para %%-style')
+    args = parser.parse_args(argv)
+
+    for path in args.files:
+        with open(path, 'r', encoding='utf-8') as f:
+            source = f.read()
+        new_source, used, changed = transform(source, lazy_logger=args.lazy_logger)
+        if not changed:
+            print(f"{path}: nada a alterar")
+            continue
+        compile(new_source, path, 'exec')
+        if args.write:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(new_source)
+        print(f"{path}: {changed} chamadas {'alteradas' if args.write else 'a alterar'}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
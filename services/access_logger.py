@@ -9,6 +9,7 @@ from datetime import datetime, timezone, timedelta
 from flask import request, session, g
 from functools import wraps
 import traceback
+from log_config import log_print, log_printf
 
 try:
     from user_agents import parse
@@ -29,14 +30,14 @@ def _get_supabase_admin():
         # Estratégia 1: Tentar importar do extensions (dentro do contexto Flask)
         from extensions import supabase_admin
         if supabase_admin is not None:
-            print(f"[ACCESS_LOG_LAZY] supabase_admin carregado via extensions: ✅")
+            log_print(f"[ACCESS_LOG_LAZY] supabase_admin carregado via extensions: ✅")
             return supabase_admin
         else:
-            print(f"[ACCESS_LOG_LAZY] supabase_admin é None no extensions - tentando estratégia 2")
+            log_print(f"[ACCESS_LOG_LAZY] supabase_admin é None no extensions - tentando estratégia 2")
     except ImportError as e:
-        print(f"[ACCESS_LOG_LAZY] Erro ao importar do extensions: {e}")
+        log_printf("[ACCESS_LOG_LAZY] Erro ao importar do extensions: %s", e)
     except Exception as e:
-        print(f"[ACCESS_LOG_LAZY] Erro no extensions: {e}")
+        log_printf("[ACCESS_LOG_LAZY] Erro no extensions: %s", e)
     
     # Estratégia 2: Criar cliente direto com as credenciais
     try:
@@ -50,18 +51,18 @@ def _get_supabase_admin():
         supabase_key = os.getenv("SUPABASE_SERVICE_KEY")
         
         if supabase_url and supabase_key:
-            print(f"[ACCESS_LOG_LAZY] Criando cliente direto com credenciais do .env")
+            log_print(f"[ACCESS_LOG_LAZY] Criando cliente direto com credenciais do .env")
             client = create_client(supabase_url, supabase_key)
-            print(f"[ACCESS_LOG_LAZY] Cliente direto criado: ✅")
+            log_print(f"[ACCESS_LOG_LAZY] Cliente direto criado: ✅")
             return client
         else:
-            print(f"[ACCESS_LOG_LAZY] Credenciais não encontradas no ambiente")
+            log_print(f"[ACCESS_LOG_LAZY] Credenciais não encontradas no ambiente")
             return None
             
     except Exception as e:
-        print(f"[ACCESS_LOG_LAZY] Erro ao criar cliente direto: {e}")
+        log_printf("[ACCESS_LOG_LAZY] Erro ao criar cliente direto: %s", e)
         return None
-    print("[ACCESS_LOG_WARNING] Supabase não disponível - logs serão apenas no console")
+    log_print("[ACCESS_LOG_WARNING] Supabase não disponível - logs serão apenas no console")
 
 # Verificação robusta da disponibilidade do Supabase
 def _check_supabase_availability():
@@ -71,22 +72,22 @@ def _check_supabase_availability():
         
         # Verificar se não é None e se tem as credenciais
         if supabase_admin is None:
-            print("[ACCESS_LOG_DEBUG] supabase_admin é None após lazy loading")
+            log_print("[ACCESS_LOG_DEBUG] supabase_admin é None após lazy loading")
             return False
             
         # Verificar credenciais básicas
         if not os.getenv('SUPABASE_URL') or not os.getenv('SUPABASE_SERVICE_KEY'):
-            print("[ACCESS_LOG_DEBUG] Credenciais Supabase não encontradas")
+            log_print("[ACCESS_LOG_DEBUG] Credenciais Supabase não encontradas")
             return False
         
-        print("[ACCESS_LOG_DEBUG] Supabase disponível e funcional")
+        log_print("[ACCESS_LOG_DEBUG] Supabase disponível e funcional")
         return True
         
     except ImportError as e:
-        print(f"[ACCESS_LOG_DEBUG] Falha no import do Supabase: {e}")
+        log_printf("[ACCESS_LOG_DEBUG] Falha no import do Supabase: %s", e)
         return False
     except Exception as e:
-        print(f"[ACCESS_LOG_DEBUG] Erro na verificação do Supabase: {e}")
+        log_printf("[ACCESS_LOG_DEBUG] Erro na verificação do Supabase: %s", e)
         return False
 
 # Verificação real da disponibilidade
@@ -100,11 +101,11 @@ def _create_direct_supabase():
         SUPABASE_URL = os.getenv("SUPABASE_URL")
         SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
         if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
-            print("[ACCESS_LOG_WARNING] SUPABASE_URL ou SUPABASE_SERVICE_KEY não definidos no ambiente")
+            log_print("[ACCESS_LOG_WARNING] SUPABASE_URL ou SUPABASE_SERVICE_KEY não definidos no ambiente")
             return None
         return create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
     except Exception as e:
-        print(f"[ACCESS_LOG_WARNING] Falha ao criar cliente direto: {e}")
+        log_printf("[ACCESS_LOG_WARNING] Falha ao criar cliente direto: %s", e)
         return None
 
 class AccessLogger:
@@ -140,14 +141,14 @@ class AccessLogger:
         self.flask_env = os.getenv('FLASK_ENV', 'production')
         if self.flask_env == 'development':
             self.enabled = False
-            print("[ACCESS_LOG] Logging desabilitado no ambiente de desenvolvimento")
+            log_print("[ACCESS_LOG] Logging desabilitado no ambiente de desenvolvimento")
         
         if not self.enabled:
-            print("[ACCESS_LOG_INIT] ❌ Logging desabilitado via ACCESS_LOGGING_ENABLED")
+            log_print("[ACCESS_LOG_INIT] ❌ Logging desabilitado via ACCESS_LOGGING_ENABLED")
         elif self.console_only:
-            print("[ACCESS_LOG_INIT] ⚠️ Modo console-only ativado (Supabase indisponível)")
+            log_print("[ACCESS_LOG_INIT] ⚠️ Modo console-only ativado (Supabase indisponível)")
         else:
-            print("[ACCESS_LOG_INIT] ✅ Logging completo ativado (Supabase + console)")
+            log_print("[ACCESS_LOG_INIT] ✅ Logging completo ativado (Supabase + console)")
     
     def _safe_execute(self, func, *args, **kwargs):
         """
@@ -160,7 +161,7 @@ class AccessLogger:
             return func(*args, **kwargs)
         except Exception as e:
             # Log do erro apenas no console, nunca re-raise
-            print(f"[ACCESS_LOG_ERROR] {func.__name__}: {str(e)}")
+            log_printf("[ACCESS_LOG_ERROR] %s: %s", func.__name__, str(e))
             return True  # Sempre retorna sucesso para não afetar a aplicação
     
     def _get_client_info_safe(self, request_obj=None):
@@ -255,7 +256,7 @@ class AccessLogger:
                     'session_id': str(session.get('session_id', str(uuid.uuid4())))[:255] if session else str(uuid.uuid4())[:255]
                 }
         except Exception as e:
-            print(f"[ACCESS_LOG] Error getting user info: {str(e)}")
+            log_printf("[ACCESS_LOG] Error getting user info: %s", str(e))
             return {
                 'user_id': None,
                 'user_email': None,
@@ -268,14 +269,11 @@ class AccessLogger:
         """Insere log de forma segura com fallback robusto"""
         try:
             # Log sempre no console primeiro (para debug e fallback)
-            print(f"[ACCESS_LOG] {log_data.get('action_type', 'unknown')} | "
-                  f"user: {log_data.get('user_email', 'anonymous')} | "
-                  f"path: {log_data.get('page_url', 'unknown')} | "
-                  f"ip: {log_data.get('ip_address', 'unknown')}")
+            log_printf("[ACCESS_LOG] %s | user: %s | path: %s | ip: %s", log_data.get('action_type', 'unknown'), log_data.get('user_email', 'anonymous'), log_data.get('page_url', 'unknown'), log_data.get('ip_address', 'unknown'))
             
             # Se console_only, não tentar Supabase
             if self.console_only:
-                print("[ACCESS_LOG_DEBUG] Console-only mode - log salvo apenas no console")
+                log_print("[ACCESS_LOG_DEBUG] Console-only mode - log salvo apenas no console")
                 return True
             
             # Tentar inserir no Supabase
@@ -283,7 +281,7 @@ class AccessLogger:
                 supabase_admin = _get_supabase_admin()
                 
                 if supabase_admin is None:
-                    print("[ACCESS_LOG_WARNING] supabase_admin é None após lazy loading, fallback para console-only")
+                    log_print("[ACCESS_LOG_WARNING] supabase_admin é None após lazy loading, fallback para console-only")
                     self.console_only = True
                     return True
                 
@@ -291,20 +289,20 @@ class AccessLogger:
                 response = supabase_admin.table('access_logs').insert(log_data).execute()
                 
                 if response.data:
-                    print(f"[ACCESS_LOG_DEBUG] ✅ Log inserido no Supabase com sucesso")
+                    log_print(f"[ACCESS_LOG_DEBUG] ✅ Log inserido no Supabase com sucesso")
                     return True
                 else:
-                    print(f"[ACCESS_LOG_WARNING] Resposta vazia do Supabase")
+                    log_print(f"[ACCESS_LOG_WARNING] Resposta vazia do Supabase")
                     return True
                     
             except Exception as e:
-                print(f"[ACCESS_LOG_WARNING] Falha no Supabase, usando console-only: {e}")
+                log_printf("[ACCESS_LOG_WARNING] Falha no Supabase, usando console-only: %s", e)
                 # Marcar como console_only para próximas tentativas
                 self.console_only = True
                 return True
                 
         except Exception as e:
-            print(f"[ACCESS_LOG_ERROR] Erro crítico no logging: {e}")
+            log_printf("[ACCESS_LOG_ERROR] Erro crítico no logging: %s", e)
             return True
     
     def log_access(self, action_type, **kwargs):
@@ -330,7 +328,7 @@ class AccessLogger:
         
         # Pular logging em desenvolvimento apenas se explicitamente configurado
         if self.is_development and not os.getenv('FORCE_LOGGING_IN_DEV'):
-            print(f"[ACCESS_LOG_DEBUG] Pulando log em desenvolvimento: {action_type}")
+            log_printf("[ACCESS_LOG_DEBUG] Pulando log em desenvolvimento: %s", action_type)
             return True
         
         # Skip logging if user info is completely empty and it's not a login/logout action
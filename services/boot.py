@@ -0,0 +1,194 @@
+"""
+Inicialização da aplicação por componentes, com medição de tempo.
+
+O app.py importava e registrava todos os blueprints no import (importações,
+financeiro, RH, analytics, conferência com lexoid/Gemini, pandas/openpyxl/
+scipy...), e cada worker do gunicorn pagava esse custo antes de aceitar
+conexões. Aqui cada grupo de blueprints é um componente com uma função de
+carga, e o modo de boot (env BOOT_MODE) decide quando ele carrega:
+
+- eager (padrão): tudo no import, como antes. É o modo para gunicorn com
+  preload_app (gunicorn.conf.py): o master importa uma vez e os workers
+  herdam a memória por copy-on-write.
+- lazy: componentes core no import; os demais carregam numa thread de
+  aquecimento logo após o boot. Como o Flask não aceita registrar blueprints
+  depois da primeira requisição, a primeira requisição aguarda o fim do
+  aquecimento (ou conclui a carga ela mesma se o aquecimento não rodou).
+
+O tempo de cada fase/componente fica em boot.report() e é impresso ao final.
+
+Usage:
+    from services.boot import boot
+
+    with boot.phase('extensions'):
+        ...
+
+    @boot.component('financeiro', lazy=True)
+    def _load_financeiro(app):
+        from modules.financeiro.routes import register_financeiro_blueprints
+        register_financeiro_blueprints(app)
+
+    boot.finish(app)
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+import os
+import sys
+import threading
+import time
+import traceback
+
+BOOT_MODE = os.getenv('BOOT_MODE', 'eager').lower()
+# Tempo máximo que a primeira requisição aguarda o aquecimento antes de carregar por conta própria
+WARMUP_WAIT_SECONDS = float(os.getenv('BOOT_WARMUP_WAIT_SECONDS', '120'))
+
+
+def register_after_fork(func):
+    """Executa func no processo filho após fork (workers do gunicorn com preload_app)"""
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=func)
+
+
+class BootSequence:
+    """Fases e componentes do boot, com tempos e estado da carga adiada"""
+
+    def __init__(self, mode=BOOT_MODE):
+        self.mode = mode if mode in ('eager', 'lazy') else 'eager'
+        self.started_at = time.time()
+        self.imported_at = None
+        self.ready_at = None
+        self.timings = OrderedDict()
+        self.components = OrderedDict()
+        self.errors = {}
+        self._app = None
+        self._pending_loaded = False
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        register_after_fork(self._after_fork)
+
+    def _after_fork(self):
+        # Locks/eventos herdados do master podem estar em estado inconsistente no filho
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        if self._pending_loaded:
+            self._done.set()
+        elif self._app is not None and self.mode == 'lazy':
+            self.start_warmup()
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        modules_before = len(sys.modules)
+        try:
+            yield
+        finally:
+            self.timings[name] = {
+                'seconds': round(time.perf_counter() - started, 3),
+                'modules_imported': len(sys.modules) - modules_before,
+            }
+
+    def component(self, name, lazy=True, optional=False):
+        """Decorator: registra a função de carga func(app) de um componente.
+
+        - lazy: adiado no modo lazy (no modo eager tudo carrega no import)
+        - optional: falha na carga é registrada e o boot continua
+        """
+        def _register(func):
+            self.components[name] = {'load': func, 'lazy': lazy and self.mode == 'lazy',
+                                     'optional': optional, 'loaded': False}
+            return func
+        return _register
+
+    def _load(self, app, name):
+        component = self.components[name]
+        if component['loaded']:
+            return
+        try:
+            with self.phase(f'component:{name}'):
+                component['load'](app)
+        except Exception as e:
+            self.errors[name] = str(e)
+            print(f"[BOOT] ⚠️ Componente '{name}' não carregado: {e}")
+            if not component['optional']:
+                raise
+            traceback.print_exc()
+        component['loaded'] = True
+
+    def load_core(self, app):
+        """Carrega os componentes que não são adiados (todos no modo eager)"""
+        for name, component in self.components.items():
+            if not component['lazy']:
+                self._load(app, name)
+
+    def load_pending(self, app):
+        """Carrega os componentes adiados (idempotente, uma thread por vez)"""
+        with self._lock:
+            if self._pending_loaded:
+                return
+            with self.phase('deferred'):
+                for name, component in self.components.items():
+                    if component['lazy']:
+                        self._load(app, name)
+            self._pending_loaded = True
+            self.ready_at = time.time()
+            self._done.set()
+            print(f"[BOOT] Componentes adiados carregados - pronto em {self.ready_at - self.started_at:.2f}s")
+
+    def start_warmup(self):
+        thread = threading.Thread(target=self.load_pending, args=(self._app,), name='boot-warmup', daemon=True)
+        thread.start()
+
+    def finish(self, app):
+        """Fim do import do app: imprime o tempo do boot e agenda/instala a carga adiada"""
+        self._app = app
+        self.imported_at = time.time()
+        if not any(c['lazy'] for c in self.components.values()):
+            self._pending_loaded = True
+            self.ready_at = time.time()
+            self._done.set()
+        else:
+            app.wsgi_app = _FirstRequestGate(app.wsgi_app, self)
+            self.start_warmup()
+        print(f"[BOOT] Modo {self.mode}: import concluído em {self.imported_at - self.started_at:.2f}s")
+        for name, timing in self.timings.items():
+            print(f"[BOOT]   {name}: {timing['seconds']:.3f}s ({timing['modules_imported']} módulos)")
+
+    def wait_ready(self):
+        """Garante os componentes adiados carregados antes de despachar uma requisição"""
+        if self._pending_loaded:
+            return
+        if not self._done.wait(WARMUP_WAIT_SECONDS):
+            print("[BOOT] Aquecimento não concluiu a tempo, carregando componentes na requisição")
+        self.load_pending(self._app)
+
+    def report(self):
+        return {
+            'mode': self.mode,
+            'pid': os.getpid(),
+            'import_seconds': round(self.imported_at - self.started_at, 3) if self.imported_at else None,
+            'ready_seconds': round(self.ready_at - self.started_at, 3) if self.ready_at else None,
+            'ready': self._pending_loaded,
+            'phases': dict(self.timings),
+            'components': {name: {'lazy': c['lazy'], 'loaded': c['loaded']} for name, c in self.components.items()},
+            'errors': dict(self.errors),
+        }
+
+
+class _FirstRequestGate:
+    """WSGI: segura as requisições até os componentes adiados estarem registrados"""
+
+    def __init__(self, wsgi_app, sequence):
+        self.wsgi_app = wsgi_app
+        self.sequence = sequence
+        self.ready = False
+
+    def __call__(self, environ, start_response):
+        if not self.ready:
+            self.sequence.wait_ready()
+            self.ready = True
+        return self.wsgi_app(environ, start_response)
+
+
+# Instância única do processo
+boot = BootSequence()
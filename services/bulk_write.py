@@ -0,0 +1,183 @@
+"""
+Escrita em lote no Supabase com resultado por item.
+
+Operações de lote (metas do ano, CNPJs de um usuário) validavam e gravavam
+item a item, com uma consulta de existência e um execute() por linha. Aqui o
+lote inteiro é validado em memória, as linhas existentes são buscadas com
+filtros in_ (uma consulta por bloco de valores) e a gravação é feita em blocos:
+insert/upsert das linhas novas e um update por grupo de valores para as
+existentes.
+
+Usage:
+    from services.bulk_write import bulk_write
+
+    def validar(item):
+        if not item.get('ano'):
+            return None, 'ano obrigatório'
+        return {'ano': str(item['ano']), 'mes': item['mes'], 'meta': item['meta']}, None
+
+    result = bulk_write('fin_metas_projecoes', itens, validar,
+                        key_fields=('ano', 'mes'), on_existing='update', update_fields=('meta',))
+    result.counts()   # {'criado': 10, 'atualizado': 2}
+    result.items      # [{'index': 0, 'status': 'criado', 'data': {...}}, ...]
+"""
+
+from collections import Counter, OrderedDict
+from typing import Callable, Iterable, List, Optional, Sequence
+import os
+import time
+
+from extensions import supabase_admin
+from log_config import log_printf
+from services.retry_utils import run_with_policy
+
+# Valores por filtro in_ (a query string do PostgREST tem limite de tamanho)
+IN_CHUNK_SIZE = int(os.getenv('BULK_IN_CHUNK_SIZE', '200'))
+WRITE_CHUNK_SIZE = int(os.getenv('BULK_WRITE_CHUNK_SIZE', '500'))
+
+CREATED = 'criado'
+UPDATED = 'atualizado'
+EXISTING = 'ja_existente'
+INVALID = 'invalido'
+DUPLICATE = 'duplicado'
+ERROR = 'erro'
+
+
+def _execute(label, query, write=False):
+    return run_with_policy('supabase.write' if write else 'supabase.read', label, query.execute)
+
+
+def chunked(values: Sequence, size: int):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def fetch_in(table: str, column: str, values: Iterable, select: str = '*',
+             apply_filters: Optional[Callable] = None, label: str = 'bulk.fetch') -> List[dict]:
+    """Linhas cujo column está em values, com um in_ por bloco de IN_CHUNK_SIZE valores"""
+    distinct = list(OrderedDict.fromkeys(v for v in values if v is not None))
+    rows = []
+    for chunk in chunked(distinct, IN_CHUNK_SIZE):
+        query = supabase_admin.table(table).select(select).in_(column, chunk)
+        if apply_filters:
+            query = apply_filters(query)
+        rows.extend(_execute(label, query).data or [])
+    return rows
+
+
+class BulkResult:
+    """Resultado por item (na ordem de entrada) de uma escrita em lote"""
+
+    def __init__(self, size):
+        self.items = [None] * size
+
+    def set(self, index, status, data=None, error=None):
+        self.items[index] = {'index': index, 'status': status, 'data': data, 'error': error}
+
+    def counts(self):
+        return dict(Counter(item['status'] for item in self.items if item))
+
+    def by_status(self, *statuses):
+        return [item for item in self.items if item and item['status'] in statuses]
+
+    def written(self):
+        """Linhas gravadas (criadas ou atualizadas), como devolvidas pelo banco"""
+        return [item['data'] for item in self.by_status(CREATED, UPDATED) if item['data'] is not None]
+
+    @property
+    def has_invalid(self):
+        return bool(self.by_status(INVALID))
+
+
+def bulk_write(table: str, items: Sequence, validate: Callable, key_fields: Sequence[str] = (),
+               on_existing: str = 'skip', update_fields: Sequence[str] = (), id_field: str = 'id',
+               all_or_nothing: bool = False, chunk_size: int = WRITE_CHUNK_SIZE,
+               label: Optional[str] = None) -> BulkResult:
+    """Valida e grava um lote de itens.
+
+    - validate: callable(item) -> (linha, None) ou (None, mensagem de erro)
+    - key_fields: colunas que identificam uma linha existente (sem elas, tudo é inserido)
+    - on_existing: 'skip' (marca ja_existente) ou 'update' (atualiza update_fields)
+    - all_or_nothing: com algum item inválido nada é gravado
+    Itens repetidos no lote (mesma chave) ficam como duplicado; vale o primeiro.
+    """
+    label = label or f'bulk.{table}'
+    started = time.time()
+    result = BulkResult(len(items))
+
+    # 1. Validação em memória
+    valid = OrderedDict()  # chave -> (índice, linha)
+    for index, item in enumerate(items):
+        try:
+            row, error = validate(item)
+        except Exception as e:
+            row, error = None, str(e)
+        if error or row is None:
+            result.set(index, INVALID, error=error or 'Item inválido')
+            continue
+        key = tuple(str(row.get(f)) for f in key_fields) if key_fields else index
+        if key in valid:
+            result.set(index, DUPLICATE, data=row, error='Item repetido no lote')
+            continue
+        valid[key] = (index, row)
+
+    if all_or_nothing and result.has_invalid:
+        return result
+
+    # 2. Linhas existentes: in_ por coluna da chave, conferência exata em Python
+    existing = {}
+    if key_fields and valid:
+        rows = [row for _, row in valid.values()]
+        lead, others = key_fields[0], key_fields[1:]
+
+        def _filters(query):
+            for field in others:
+                query = query.in_(field, list({row.get(field) for row in rows}))
+            return query
+
+        select = ','.join(OrderedDict.fromkeys([id_field, *key_fields]))
+        for found in fetch_in(table, lead, [row.get(lead) for row in rows], select,
+                              apply_filters=_filters, label=f'{label}.existing'):
+            existing.setdefault(tuple(str(found.get(f)) for f in key_fields), found)
+
+    to_insert = []
+    to_update = OrderedDict()  # valores de update -> [(índice, id, linha)]
+    for key, (index, row) in valid.items():
+        found = existing.get(key)
+        if found is None:
+            to_insert.append((index, row))
+        elif on_existing == 'update':
+            values = tuple((f, row.get(f)) for f in update_fields)
+            to_update.setdefault(values, []).append((index, found[id_field], row))
+        else:
+            result.set(index, EXISTING, data=found)
+
+    # 3. Inserts em blocos
+    for chunk in chunked(to_insert, chunk_size):
+        try:
+            response = _execute(f'{label}.insert', supabase_admin.table(table).insert([row for _, row in chunk]), write=True)
+            data = response.data or []
+            for position, (index, row) in enumerate(chunk):
+                result.set(index, CREATED, data=data[position] if position < len(data) else row)
+        except Exception as e:
+            log_printf("[BULK_WRITE] Erro ao inserir bloco em %s: %s", table, e)
+            for index, _ in chunk:
+                result.set(index, ERROR, error=str(e))
+
+    # 4. Updates agrupados por valores (um execute por grupo/bloco de ids)
+    for values, group in to_update.items():
+        for chunk in chunked(group, IN_CHUNK_SIZE):
+            try:
+                response = _execute(f'{label}.update', supabase_admin.table(table)
+                                    .update(dict(values))
+                                    .in_(id_field, [row_id for _, row_id, _ in chunk]), write=True)
+                by_id = {str(r.get(id_field)): r for r in response.data or []}
+                for index, row_id, row in chunk:
+                    result.set(index, UPDATED, data=by_id.get(str(row_id), row))
+            except Exception as e:
+                log_printf("[BULK_WRITE] Erro ao atualizar bloco em %s: %s", table, e)
+                for index, _, _ in chunk:
+                    result.set(index, ERROR, error=str(e))
+
+    log_printf("[BULK_WRITE] %s: %s itens em %.2fs - %s", table, len(items), time.time() - started, result.counts())
+    return result
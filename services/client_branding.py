@@ -3,6 +3,7 @@ Utilitário compartilhado para branding dinâmico do cliente.
 Centraliza a lógica de obtenção de logo e nome da empresa baseado no usuário logado.
 """
 from extensions import supabase_admin
+from log_config import log_printf
 
 DEFAULT_BRANDING = {
     'name': 'Unique',
@@ -37,9 +38,9 @@ def get_client_branding(user_email=None):
             if row.get('logo_url'):
                 client_branding['logo_url'] = row.get('logo_url')
                 
-        print(f"[DEBUG] Branding selecionado para {user_email}: {client_branding}")
+        log_printf("[DEBUG] Branding selecionado para %s: %s", user_email, client_branding)
         
     except Exception as e:
-        print(f"[DEBUG] Erro ao obter branding do cliente: {e}")
+        log_printf("[DEBUG] Erro ao obter branding do cliente: %s", e)
     
     return client_branding
@@ -6,13 +6,45 @@ Sistema centralizado para cache de dados do usuário
 from datetime import datetime, timedelta
 from extensions import supabase
 import traceback
+import os
+import threading
+import uuid
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+from log_config import log_print, log_printf
+from services.supabase_transport import call_class
+
+# Pool compartilhado do pipeline de pré-carregamento (sob gevent as threads viram greenlets)
+PRELOAD_MAX_WORKERS = int(os.getenv('PRELOAD_MAX_WORKERS', '8'))
+PRELOAD_WAIT_TIMEOUT = float(os.getenv('PRELOAD_WAIT_TIMEOUT', '30'))
+_preload_executor = ThreadPoolExecutor(max_workers=PRELOAD_MAX_WORKERS, thread_name_prefix='preload')
+
+# Etapas adicionais executadas junto com o pré-carregamento (registradas pelos módulos)
+_preload_stages = []
+
+def register_preload_stage(name, func, applies_to=None):
+    """Registra uma etapa extra do pré-carregamento de login.
+
+    - name: identificador da etapa (para logs/status)
+    - func: callable(user_data) executado em background
+    - applies_to: predicado opcional callable(user_data) -> bool
+    """
+    for stage in _preload_stages:
+        if stage['name'] == name:
+            stage.update({'func': func, 'applies_to': applies_to})
+            return
+    _preload_stages.append({'name': name, 'func': func, 'applies_to': applies_to})
 
 class DataCacheService:
     def __init__(self):
         self.cache = {}
         self.cache_timestamp = {}
         self.cache_duration = 1800  # 30 minutos (mais tempo para navegação entre abas)
+        self.preload_tickets = {}
+        self.user_preload_ticket = {}
+        # Protege tickets e o conjunto de etapas de cada ticket (RLock: add_done_callback
+        # de um future já concluído chama o callback na mesma thread)
+        self._preload_lock = threading.RLock()
     
     def get_cache_key(self, user_id, data_type):
         """Gera chave única para o cache"""
@@ -32,14 +64,14 @@ class DataCacheService:
         cache_key = self.get_cache_key(user_id, data_type)
         self.cache[cache_key] = data
         self.cache_timestamp[cache_key] = datetime.now()
-        print(f"[CACHE] Dados armazenados: {cache_key} - {len(data) if isinstance(data, list) else 'dict'} registros")
+        log_printf("[CACHE] Dados armazenados: %s - %s registros", cache_key, len(data) if isinstance(data, list) else 'dict')
     
     def get_cache(self, user_id, data_type):
         """Recupera dados do cache"""
         cache_key = self.get_cache_key(user_id, data_type)
         
         if self.is_cache_valid(cache_key):
-            print(f"[CACHE] Cache válido encontrado: {cache_key} - {len(self.cache[cache_key]) if isinstance(self.cache[cache_key], list) else 'dict'} registros")
+            log_printf("[CACHE] Cache válido encontrado: %s - %s registros", cache_key, len(self.cache[cache_key]) if isinstance(self.cache[cache_key], list) else 'dict')
             return self.cache[cache_key]
         
         # Log mais detalhado para debug
@@ -47,9 +79,9 @@ class DataCacheService:
             cache_time = self.cache_timestamp[cache_key]
             now = datetime.now()
             elapsed = (now - cache_time).seconds
-            print(f"[CACHE] Cache expirado: {cache_key} - Tempo decorrido: {elapsed}s (limite: {self.cache_duration}s)")
+            log_printf("[CACHE] Cache expirado: %s - Tempo decorrido: %ss (limite: %ss)", cache_key, elapsed, self.cache_duration)
         else:
-            print(f"[CACHE] Cache não encontrado: {cache_key}")
+            log_printf("[CACHE] Cache não encontrado: %s", cache_key)
         
         return None
     
@@ -61,7 +93,7 @@ class DataCacheService:
             del self.cache[key]
             del self.cache_timestamp[key]
         
-        print(f"[CACHE] Cache limpo para usuário: {user_id}")
+        log_printf("[CACHE] Cache limpo para usuário: %s", user_id)
     
     def _get_user_companies_new_structure(self, user_id):
         """Busca empresas do usuário na nova estrutura de tabelas"""
@@ -69,7 +101,7 @@ class DataCacheService:
             from extensions import supabase_admin
             import re
             
-            print(f"[PRELOAD] Buscando empresas para user_id: {user_id}")
+            log_printf("[PRELOAD] Buscando empresas para user_id: %s", user_id)
             
             # Buscar vínculos do usuário
             user_empresas_response = supabase_admin.table('user_empresas')\
@@ -79,11 +111,11 @@ class DataCacheService:
                 .execute()
             
             if not user_empresas_response.data:
-                print(f"[PRELOAD] Nenhum vínculo encontrado")
+                log_print(f"[PRELOAD] Nenhum vínculo encontrado")
                 return []
             
             cliente_sistema_ids = [v['cliente_sistema_id'] for v in user_empresas_response.data]
-            print(f"[PRELOAD] IDs das empresas: {cliente_sistema_ids}")
+            log_printf("[PRELOAD] IDs das empresas: %s", cliente_sistema_ids)
             
             # Buscar dados das empresas
             empresas_response = supabase_admin.table('cad_clientes_sistema')\
@@ -93,7 +125,7 @@ class DataCacheService:
                 .execute()
             
             if not empresas_response.data:
-                print(f"[PRELOAD] Nenhuma empresa encontrada")
+                log_print(f"[PRELOAD] Nenhuma empresa encontrada")
                 return []
             
             # Extrair CNPJs
@@ -102,7 +134,7 @@ class DataCacheService:
                 cnpjs_array = empresa.get('cnpjs', [])
                 nome = empresa.get('nome_cliente', 'N/A')
                 
-                print(f"[PRELOAD] Empresa: {nome}, CNPJs: {cnpjs_array}")
+                log_printf("[PRELOAD] Empresa: %s, CNPJs: %s", nome, cnpjs_array)
                 
                 if isinstance(cnpjs_array, list):
                     for cnpj in cnpjs_array:
@@ -112,39 +144,181 @@ class DataCacheService:
                                 all_cnpjs.append(normalized_cnpj)
             
             unique_cnpjs = list(set(all_cnpjs))
-            print(f"[PRELOAD] CNPJs únicos encontrados: {unique_cnpjs}")
+            log_printf("[PRELOAD] CNPJs únicos encontrados: %s", unique_cnpjs)
             
             return unique_cnpjs
             
         except Exception as e:
-            print(f"[PRELOAD] Erro ao buscar empresas: {str(e)}")
+            log_printf("[PRELOAD] Erro ao buscar empresas: %s", str(e))
             import traceback
             traceback.print_exc()
             return []
     
-    def preload_user_data(self, user_id, user_role, user_companies=None):
-        """Pré-carrega todos os dados do usuário usando nova estrutura de empresas"""
-        print(f"[PRELOAD] === INICIANDO PRÉ-CARREGAMENTO ===")
-        print(f"[PRELOAD] Usuário: {user_id}, Role: {user_role}")
-        print(f"[PRELOAD] Empresas fornecidas: {user_companies}")
-        print(f"[PRELOAD] Tipo empresas: {type(user_companies)}")
+    def start_preload(self, user_id, user_role, user_companies=None, user_data=None):
+        """Dispara o pré-carregamento em background e retorna o ticket imediatamente.
+
+        Se já existe um pré-carregamento em andamento para o usuário, o mesmo
+        ticket é reaproveitado (evita cargas duplicadas em logins simultâneos).
+        """
+        with self._preload_lock:
+            current = self.user_preload_ticket.get(user_id)
+            if current and self.preload_tickets.get(current, {}).get('status') == 'loading':
+                log_printf("[PRELOAD] Reaproveitando ticket em andamento: %s", current)
+                return current
+
+            self._prune_preload_tickets()
+
+            ticket = uuid.uuid4().hex
+            record = {
+                'ticket': ticket,
+                'user_id': user_id,
+                'status': 'loading',
+                'stages': [],
+                'started_at': datetime.now(),
+                'finished_at': None,
+                'futures': {},
+                # Enquanto as etapas iniciais são agendadas o ticket não pode ser finalizado
+                'scheduling': True
+            }
+            self.preload_tickets[ticket] = record
+            self.user_preload_ticket[user_id] = ticket
+
+        user_snapshot = dict(user_data or {})
+        user_snapshot.setdefault('id', user_id)
+        user_snapshot.setdefault('role', user_role)
+
+        self._add_preload_future(record, 'raw_data', _preload_executor.submit(
+            self.preload_user_data, user_id, user_role, user_companies, record))
+        for stage in list(_preload_stages):
+            applies_to = stage.get('applies_to')
+            try:
+                if applies_to and not applies_to(user_snapshot):
+                    continue
+            except Exception as e:
+                log_printf("[PRELOAD] Erro ao avaliar etapa %s: %s", stage['name'], str(e))
+                continue
+            self._add_preload_future(record, stage['name'], _preload_executor.submit(self._run_preload_stage, stage, user_snapshot))
+
+        with self._preload_lock:
+            record['scheduling'] = False
+            self._finish_preload_ticket(record)
+
+        log_printf("[PRELOAD] Ticket %s criado para usuário %s - etapas: %s", ticket, user_id, record['stages'])
+        return ticket
+
+    def _add_preload_future(self, record, name, future):
+        """Inclui uma etapa no ticket; o ticket só termina quando todas as etapas terminarem"""
+        with self._preload_lock:
+            record['futures'][name] = future
+            record['stages'].append(name)
+        future.add_done_callback(lambda _future: self._finish_preload_ticket(record))
+
+    def _run_preload_stage(self, stage, user_data):
+        """Executa uma etapa registrada isolando erros"""
+        log_printf("[PRELOAD] Executando etapa '%s' para usuário %s", stage['name'], user_data.get('id'))
+        return stage['func'](user_data)
+
+    def _finish_preload_ticket(self, record):
+        """Consolida o status do ticket quando todas as etapas terminam"""
+        with self._preload_lock:
+            if record['status'] != 'loading' or record['scheduling']:
+                return
+            futures = dict(record['futures'])
+            if not all(f.done() for f in futures.values()):
+                return
+            failed = [name for name, f in futures.items() if f.exception() is not None]
+            record['finished_at'] = datetime.now()
+            record['status'] = 'failed' if failed else 'completed'
+            record['errors'] = {name: str(futures[name].exception()) for name in failed}
+        for name in failed:
+            log_printf("[PRELOAD] Etapa '%s' falhou: %s", name, futures[name].exception())
+        elapsed = (record['finished_at'] - record['started_at']).total_seconds()
+        log_print(f"[PRELOAD] Ticket {record['ticket']} {record['status']} em {elapsed:.2f}s")
+
+    def _prune_preload_tickets(self):
+        """Remove tickets finalizados mais antigos que a duração do cache"""
+        limit = datetime.now() - timedelta(seconds=self.cache_duration)
+        for ticket, record in list(self.preload_tickets.items()):
+            if record['status'] != 'loading' and record['finished_at'] and record['finished_at'] < limit:
+                self.preload_tickets.pop(ticket, None)
+                if self.user_preload_ticket.get(record['user_id']) == ticket:
+                    self.user_preload_ticket.pop(record['user_id'], None)
+
+    def get_preload_status(self, ticket):
+        """Retorna o status público de um ticket de pré-carregamento"""
+        record = self.preload_tickets.get(ticket)
+        if not record:
+            return None
+        with self._preload_lock:
+            futures = dict(record['futures'])
+        return {
+            'ticket': ticket,
+            'status': record['status'],
+            'stages': {name: self._stage_status(f) for name, f in futures.items()},
+            'errors': record.get('errors', {}),
+            'started_at': record['started_at'].isoformat(),
+            'finished_at': record['finished_at'].isoformat() if record['finished_at'] else None
+        }
+
+    @staticmethod
+    def _stage_status(future):
+        if not future.done():
+            return 'loading'
+        return 'failed' if future.exception() is not None else 'done'
+
+    def wait_for_preload(self, user_id, ticket=None, timeout=None):
+        """Aguarda o pré-carregamento em andamento do usuário (se houver).
+
+        Retorna o status final do ticket ('completed', 'failed', 'loading' em
+        caso de timeout) ou None quando não há pré-carregamento registrado.
+        """
+        ticket = ticket or self.user_preload_ticket.get(user_id)
+        record = self.preload_tickets.get(ticket) if ticket else None
+        if not record:
+            return None
+        if record['status'] == 'loading':
+            timeout = PRELOAD_WAIT_TIMEOUT if timeout is None else timeout
+            log_printf("[PRELOAD] Aguardando ticket %s (timeout %ss)", ticket, timeout)
+            deadline = datetime.now() + timedelta(seconds=timeout)
+            # Etapas derivadas (dashboard/materiais) entram no ticket depois dos dados brutos
+            while record['status'] == 'loading':
+                with self._preload_lock:
+                    pending = [f for f in record['futures'].values() if not f.done()]
+                remaining = (deadline - datetime.now()).total_seconds()
+                if not pending or remaining <= 0:
+                    break
+                wait_futures(pending, timeout=remaining)
+        return record['status']
+
+    def preload_user_data(self, user_id, user_role, user_companies=None, record=None):
+        """Pré-carrega todos os dados do usuário usando nova estrutura de empresas
+
+        Com record (ticket de start_preload) o pré-processamento de dashboard e
+        materiais vira etapa do ticket; sem ele roda na própria chamada.
+        """
+        log_print(f"[PRELOAD] === INICIANDO PRÉ-CARREGAMENTO ===")
+        log_printf("[PRELOAD] Usuário: %s, Role: %s", user_id, user_role)
+        log_printf("[PRELOAD] Empresas fornecidas: %s", user_companies)
+        log_printf("[PRELOAD] Tipo empresas: %s", type(user_companies))
         
         try:
             # Se não foram fornecidas empresas, buscar na nova estrutura
             if not user_companies and user_role in ['cliente_unique', 'interno_unique']:
-                print(f"[PRELOAD] Buscando empresas na nova estrutura...")
+                log_print(f"[PRELOAD] Buscando empresas na nova estrutura...")
                 user_companies = self._get_user_companies_new_structure(user_id)
-                print(f"[PRELOAD] Empresas encontradas na nova estrutura: {user_companies}")
+                log_printf("[PRELOAD] Empresas encontradas na nova estrutura: %s", user_companies)
             
             # Usar um período mais amplo para garantir que os dados sejam encontrados
             # Buscar dados dos últimos 12 meses para ter certeza de incluir tudo
             data_limite = (datetime.now() - timedelta(days=365)).strftime('%Y-%m-%d')
             
-            print(f"[PRELOAD] Período: desde {data_limite} (últimos 365 dias)")
+            log_printf("[PRELOAD] Período: desde %s (últimos 365 dias)", data_limite)
             
             # IMPORTANTE: Usar supabase_admin para evitar problemas com RLS
             from extensions import supabase_admin
             
+            check_sample = False
+            
             # Construir query base - buscar todos os dados sem filtro de data inicialmente
             query = supabase_admin.table('importacoes_processos_aberta').select(
                 'id, status_processo, canal, data_chegada, '
@@ -156,65 +330,81 @@ class DataCacheService:
             # Não aplicar filtro de data por enquanto - buscar todos os dados
             # .gte('data_abertura', data_limite)
             
-            print(f"[PRELOAD] Query base configurada sem filtro de data")
+            log_print(f"[PRELOAD] Query base configurada sem filtro de data")
             
             # Aplicar filtros baseados no role do usuário
             if user_role == 'cliente_unique':
                 if not user_companies:
-                    print(f"[PRELOAD] Cliente sem empresas - sem dados")
+                    log_print(f"[PRELOAD] Cliente sem empresas - sem dados")
                     self.set_cache(user_id, 'raw_data', [])
                     return []
                 
-                print(f"[PRELOAD] Filtro empresas cliente: {user_companies}")
-                print(f"[PRELOAD] Empresas após normalização: {user_companies}")
+                log_printf("[PRELOAD] Filtro empresas cliente: %s", user_companies)
+                log_printf("[PRELOAD] Empresas após normalização: %s", user_companies)
                 
-                # Verificar se há CNPJs na base que batem com as empresas
-                sample_query = supabase_admin.table('importacoes_processos_aberta').select('cnpj_importador').limit(10).execute()
-                sample_cnpjs = [r['cnpj_importador'] for r in sample_query.data] if sample_query.data else []
-                print(f"[PRELOAD] Sample CNPJs na base: {sample_cnpjs[:5]}")
+                # Verificar se há CNPJs na base que batem com as empresas (após a query principal)
+                check_sample = True
                 
                 # Aplicar filtro IN para empresas do cliente
                 query = query.in_('cnpj_importador', user_companies)
             elif user_role == 'interno_unique':
                 if user_companies:
-                    print(f"[PRELOAD] Filtro empresas interno_unique: {user_companies}")
+                    log_printf("[PRELOAD] Filtro empresas interno_unique: %s", user_companies)
                     query = query.in_('cnpj_importador', user_companies)
                 else:
-                    print(f"[PRELOAD] interno_unique sem empresas específicas - acesso total")
+                    log_print(f"[PRELOAD] interno_unique sem empresas específicas - acesso total")
             else:
-                print(f"[PRELOAD] Role {user_role} - acesso sem filtro de empresa")
+                log_printf("[PRELOAD] Role %s - acesso sem filtro de empresa", user_role)
             
             # Executar query
-            print(f"[PRELOAD] Executando query...")
-            result = query.order('data_abertura', desc=True).execute()
+            log_print(f"[PRELOAD] Executando query...")
+            with call_class('report'):
+                result = query.order('data_abertura', desc=True).execute()
             
             raw_data = result.data if result.data else []
-            print(f"[PRELOAD] Dados brutos carregados: {len(raw_data)} registros")
+            log_printf("[PRELOAD] Dados brutos carregados: %s registros", len(raw_data))
+            
+            if check_sample:
+                try:
+                    # Inline: aguardar um filho no mesmo pool limitado esgota os slots em rajadas de login
+                    sample_query = supabase_admin.table('importacoes_processos_aberta').select('cnpj_importador').limit(10).execute()
+                    sample_cnpjs = [r['cnpj_importador'] for r in sample_query.data] if sample_query.data else []
+                    log_printf("[PRELOAD] Sample CNPJs na base: %s", sample_cnpjs[:5])
+                except Exception as sample_error:
+                    log_printf("[PRELOAD] Erro na amostra de CNPJs: %s", str(sample_error))
             
             # Log alguns registros para debug
             if raw_data:
-                print(f"[PRELOAD] Primeiros 3 CNPJs encontrados: {[r.get('cnpj_importador') for r in raw_data[:3]]}")
+                log_printf("[PRELOAD] Primeiros 3 CNPJs encontrados: %s", [r.get('cnpj_importador') for r in raw_data[:3]])
             else:
-                print(f"[PRELOAD] Nenhum dado encontrado - possível problema de filtro")
+                log_print(f"[PRELOAD] Nenhum dado encontrado - possível problema de filtro")
             
             # Armazenar dados brutos no cache
             self.set_cache(user_id, 'raw_data', raw_data)
             
-            # Pré-processar dados para diferentes views
-            self._preprocess_dashboard_data(user_id, raw_data)
-            self._preprocess_materiais_data(user_id, raw_data)
+            # Pré-processar dados derivados (dashboard e materiais em paralelo, como etapas do ticket)
+            if record is not None:
+                self._add_preload_future(record, 'dashboard_data', _preload_executor.submit(
+                    self._preprocess_dashboard_data, user_id, raw_data))
+                self._add_preload_future(record, 'materiais_data', _preload_executor.submit(
+                    self._preprocess_materiais_data, user_id, raw_data))
+            else:
+                self._preprocess_dashboard_data(user_id, raw_data)
+                self._preprocess_materiais_data(user_id, raw_data)
             
-            print(f"[PRELOAD] === PRÉ-CARREGAMENTO CONCLUÍDO ===")
+            log_print(f"[PRELOAD] === PRÉ-CARREGAMENTO CONCLUÍDO ===")
             return raw_data
             
         except Exception as e:
-            print(f"[ERROR PRELOAD] {str(e)}")
-            print(f"[ERROR PRELOAD] Traceback: {traceback.format_exc()}")
-            return []
+            # Propaga: com ticket a etapa 'raw_data' fica 'failed' com o erro;
+            # chamadas diretas tratam a exceção no chamador
+            log_printf("[ERROR PRELOAD] %s", str(e))
+            log_printf("[ERROR PRELOAD] Traceback: %s", traceback.format_exc())
+            raise
     
     def _preprocess_dashboard_data(self, user_id, raw_data):
         """Pré-processa dados para o dashboard"""
-        print(f"[PRELOAD] Processando dados do dashboard...")
+        log_print(f"[PRELOAD] Processando dados do dashboard...")
         
         # Calcular KPIs
         total_processos = len(raw_data)
@@ -249,11 +439,11 @@ class DataCacheService:
         self.set_cache(user_id, 'dashboard_kpis', dashboard_kpis)
         self.set_cache(user_id, 'dashboard_modais', dashboard_modais)
         
-        print(f"[PRELOAD] Dashboard processado - {total_processos} processos")
+        log_printf("[PRELOAD] Dashboard processado - %s processos", total_processos)
     
     def _preprocess_materiais_data(self, user_id, raw_data):
         """Pré-processa dados para materiais"""
-        print(f"[PRELOAD] Processando dados de materiais...")
+        log_print(f"[PRELOAD] Processando dados de materiais...")
         
         # Filtrar apenas registros com material
         materiais_data = [p for p in raw_data if p.get('mercadoria') and p.get('mercadoria').strip()]
@@ -313,7 +503,7 @@ class DataCacheService:
         self.set_cache(user_id, 'materiais_modais', materiais_modais)
         self.set_cache(user_id, 'materiais_raw', materiais_data[:100])  # Primeiros 100 para tabela
         
-        print(f"[PRELOAD] Materiais processados - {total_processos} processos com material")
+        log_printf("[PRELOAD] Materiais processados - %s processos com material", total_processos)
 
 # Instância global do cache
 data_cache = DataCacheService()
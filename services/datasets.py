@@ -0,0 +1,196 @@
+"""
+Registro de datasets em cache.
+
+Datasets diferentes eram gravados sob o mesmo nome livre no cache (ex.:
+'dashboard_v2_data' guardava tanto vw_importacoes_6_meses quanto
+vw_importacoes_6_meses_abertos_dash enriquecida), e a primeira tela a carregar
+decidia o que as outras recebiam. Aqui cada dataset declara origem (view),
+projeção, etapas de enriquecimento, regra de tenancy e versão de schema; a
+chave do cache é derivada desse descritor. Um dataset já carregado que seja
+superconjunto de outro (mesma view, mais colunas/enriquecimentos, escopo de
+empresas que contém o pedido) atende o pedido menor sem nova consulta.
+
+Usage:
+    from services.datasets import dataset_cache, IMPORTACOES_ABERTOS
+
+    rows = dataset_cache.get(user_id, IMPORTACOES_ABERTOS, scope=cnpjs)
+    if rows is None:
+        rows = carregar()
+        dataset_cache.set(user_id, IMPORTACOES_ABERTOS, rows, scope=cnpjs)
+
+    # Ao mudar as colunas/enriquecimento de um dataset, incremente version:
+    # a chave muda e entradas antigas deixam de ser servidas.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+from log_config import log_printf
+from services.single_flight import copy_rows
+
+DATASET_CACHE_TTL = int(os.getenv('DATASET_CACHE_TTL', '1800'))
+
+# Escopo não informado: vale o escopo gravado pela mesma regra de tenancy
+UNSPECIFIED = object()
+
+
+class Dataset:
+    """Descritor de um dataset em cache"""
+
+    def __init__(self, name, source, projection='*', enrichments=(), tenancy='empresas_usuario',
+                 tenancy_column='cnpj_importador', version=1):
+        self.name = name
+        self.source = source
+        self.projection = projection
+        self.enrichments = tuple(enrichments)
+        # Regra que define o escopo de empresas (mesma regra + mesmo usuário => mesmo escopo)
+        self.tenancy = tenancy
+        self.tenancy_column = tenancy_column
+        self.version = version
+        self.key = self._build_key()
+
+    @property
+    def columns(self):
+        """Colunas projetadas (None para '*')"""
+        if self.projection == '*':
+            return None
+        return frozenset(c.strip() for c in self.projection.split(',') if c.strip())
+
+    def _build_key(self):
+        descriptor = json.dumps({
+            'source': self.source,
+            'projection': sorted(self.columns) if self.columns is not None else '*',
+            'enrichments': self.enrichments,
+            'tenancy': [self.tenancy, self.tenancy_column],
+        }, sort_keys=True)
+        digest = hashlib.sha1(descriptor.encode('utf-8')).hexdigest()[:12]
+        return f'dataset:{self.name}:v{self.version}:{digest}'
+
+    def covers(self, other):
+        """True se as linhas deste dataset contêm tudo o que other precisa"""
+        if self is other:
+            return True
+        if self.source != other.source or self.tenancy_column != other.tenancy_column:
+            return False
+        if not set(other.enrichments) <= set(self.enrichments):
+            return False
+        mine, theirs = self.columns, other.columns
+        return mine is None or (theirs is not None and theirs <= mine)
+
+    def __repr__(self):
+        return f'<Dataset {self.key}>'
+
+
+_registry = {}
+
+
+def register_dataset(dataset):
+    """Registra (ou substitui) um descritor pelo nome"""
+    _registry[dataset.name] = dataset
+    return dataset
+
+
+def get_dataset(name):
+    return _registry[name]
+
+
+def _normalize_scope(scope):
+    # None = todas as empresas; caso contrário conjunto de CNPJs
+    return None if scope is None else frozenset(str(c) for c in scope)
+
+
+class DatasetCache:
+    """Linhas por (usuário, chave do dataset), com reaproveitamento de superconjuntos"""
+
+    def __init__(self, ttl=DATASET_CACHE_TTL):
+        self.ttl = ttl
+        self._entries = {}  # (user_id, key) -> {'rows', 'scope', 'dataset', 'stored_at'}
+        self._lock = threading.Lock()
+
+    def set(self, user_id, dataset, rows, scope=None):
+        with self._lock:
+            self._entries[(str(user_id), dataset.key)] = {
+                'rows': rows,
+                'scope': _normalize_scope(scope),
+                'dataset': dataset,
+                'stored_at': time.time(),
+            }
+        log_printf("[DATASET] Armazenado %s para usuário %s - %s registros", dataset.key, user_id, len(rows))
+
+    def _live(self, entry):
+        return entry is not None and time.time() - entry['stored_at'] < self.ttl
+
+    def get(self, user_id, dataset, scope=UNSPECIFIED):
+        """Linhas do dataset para o usuário, ou None.
+
+        - scope: CNPJs que o chamador pode ver (None = todas). Sem scope, só
+          atendem entradas gravadas com a mesma regra de tenancy.
+        """
+        user_id = str(user_id)
+        requested = UNSPECIFIED if scope is UNSPECIFIED else _normalize_scope(scope)
+        with self._lock:
+            entry = self._entries.get((user_id, dataset.key))
+            if self._live(entry) and (requested is UNSPECIFIED or entry['scope'] == requested):
+                return entry['rows']
+            candidates = [e for (uid, _), e in self._entries.items()
+                          if uid == user_id and e['dataset'] is not dataset and self._live(e)
+                          and e['dataset'].covers(dataset)]
+        for candidate in candidates:
+            rows = self._derive(candidate, dataset, requested)
+            if rows is not None:
+                log_printf("[DATASET] %s atendido por %s - %s registros", dataset.key, candidate['dataset'].key, len(rows))
+                self.set(user_id, dataset, rows, scope=candidate['scope'] if requested is UNSPECIFIED else requested)
+                return rows
+        return None
+
+    def _derive(self, entry, dataset, requested):
+        source = entry['dataset']
+        if requested is UNSPECIFIED:
+            if source.tenancy != dataset.tenancy:
+                return None
+            rows = entry['rows']
+        elif entry['scope'] == requested:
+            rows = entry['rows']
+        elif requested is not None and (entry['scope'] is None or requested <= entry['scope']):
+            # Superconjunto de empresas: filtra pela coluna de tenancy
+            column = dataset.tenancy_column
+            rows = [row for row in entry['rows'] if str(row.get(column)) in requested]
+        else:
+            return None
+        columns = dataset.columns
+        if columns is not None and source.columns != columns:
+            return [{c: row.get(c) for c in columns} for row in rows]
+        return copy_rows(rows)
+
+    def invalidate(self, user_id, dataset=None):
+        """Remove um dataset (ou todos) do usuário"""
+        user_id = str(user_id)
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == user_id and (dataset is None or k[1] == dataset.key)]:
+                del self._entries[key]
+
+    def status(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'datasets': sorted({k[1] for k in self._entries}),
+            }
+
+
+# Datasets de importações usados pelos dashboards
+IMPORTACOES_6_MESES = register_dataset(Dataset(
+    'importacoes_6_meses', 'vw_importacoes_6_meses', tenancy='empresas_cliente'))
+IMPORTACOES_6_MESES_DASHBOARD_V2 = register_dataset(Dataset(
+    'importacoes_6_meses_dashboard_v2', 'vw_importacoes_6_meses', tenancy='empresas_cliente_admin_operacao'))
+IMPORTACOES_ABERTOS = register_dataset(Dataset(
+    'importacoes_abertos', 'vw_importacoes_6_meses_abertos_dash', tenancy='empresas_exceto_admin_operacao'))
+IMPORTACOES_ABERTOS_ENRIQUECIDO = register_dataset(Dataset(
+    'importacoes_abertos_enriquecido', 'vw_importacoes_6_meses_abertos_dash',
+    enrichments=('despesas', 'armazenagem_kingspan', 'produtos_detalhados'),
+    tenancy='empresas_exceto_admin'))
+
+# Instância global compartilhada pelos módulos
+dataset_cache = DatasetCache()
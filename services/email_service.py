@@ -1,12 +1,19 @@
-"""Serviço simples para envio de e-mails via SMTP."""
+"""Serviço simples para envio de e-mails via SMTP.
+
+Por padrão a mensagem é montada na requisição e entregue em segundo plano
+pela fila de services/mail_queue.py (conexão SMTP persistente, retry e
+spool local). SMTP_ASYNC=false volta à entrega síncrona.
+"""
 
 import os
-import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.utils import formataddr
 from typing import Iterable, List, Optional
 
+from log_config import log_print, log_printf
+from services.mail_queue import Relay, mail_queue
+
 
 class EmailService:
     """Gerencia o envio de e-mails usando configurações de ambiente."""
@@ -21,6 +28,11 @@ class EmailService:
         self.default_sender = os.getenv("SMTP_DEFAULT_SENDER", self.username or "")
         self.from_name = os.getenv("SMTP_FROM_NAME", "UniSystem Portal")
         self.timeout = int(os.getenv("SMTP_TIMEOUT", "30"))
+        self.async_delivery = os.getenv("SMTP_ASYNC", "true").lower() == "true"
+        self.relay = Relay(self.host, self.port, self.username, self.password,
+                           use_tls=self.use_tls, timeout=self.timeout)
+        if self.is_configured and self.async_delivery:
+            mail_queue.start(self.relay)
 
     @property
     def is_configured(self) -> bool:
@@ -37,18 +49,24 @@ class EmailService:
         subject: str,
         html_body: str,
         text_body: Optional[str] = None,
+        sync: Optional[bool] = None,
     ) -> bool:
+        """Monta e envia a mensagem.
+
+        Na entrega em segundo plano (padrão) retorna True quando a mensagem foi
+        aceita na fila; com sync=True retorna o resultado do envio.
+        """
         if not self.is_configured:
-            print("[EMAIL] Configuração SMTP ausente ou desabilitada. Notificação ignorada.")
+            log_print("[EMAIL] Configuração SMTP ausente ou desabilitada. Notificação ignorada.")
             return False
 
         destinatarios = self._normalize_recipients(recipients)
         if not destinatarios:
-            print("[EMAIL] Nenhum destinatário informado. Notificação ignorada.")
+            log_print("[EMAIL] Nenhum destinatário informado. Notificação ignorada.")
             return False
 
-        print(
-            "[EMAIL] Preparando envio",
+        log_printf(
+            "[EMAIL] Preparando envio %s",
             {
                 "host": self.host,
                 "port": self.port,
@@ -68,19 +86,14 @@ class EmailService:
             mensagem.attach(MIMEText(text_body, "plain", "utf-8"))
         mensagem.attach(MIMEText(html_body, "html", "utf-8"))
 
+        if sync is None:
+            sync = not self.async_delivery
+        if sync:
+            return mail_queue.deliver_now(self.relay, mensagem["From"], destinatarios,
+                                          mensagem.as_string(), subject=subject)
         try:
-            with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as server:
-                print("[EMAIL] Conexão SMTP estabelecida, iniciando handshake.")
-                if self.use_tls:
-                    print("[EMAIL] Iniciando STARTTLS.")
-                    server.starttls()
-                    print("[EMAIL] Canal TLS ativo.")
-                print("[EMAIL] Efetuando autenticação SMTP.")
-                server.login(self.username, self.password)
-                print("[EMAIL] Autenticação concluída, enviando mensagem.")
-                server.sendmail(mensagem["From"], destinatarios, mensagem.as_string())
-            print(f"[EMAIL] Notificação enviada para {destinatarios} - Assunto: {subject}")
+            mail_queue.enqueue(self.relay, mensagem["From"], destinatarios, mensagem.as_string(), subject=subject)
             return True
         except Exception as exc:
-            print(f"[EMAIL] Falha ao enviar notificação: {exc}")
+            log_printf("[EMAIL] Falha ao enfileirar notificação: %s", exc)
             return False
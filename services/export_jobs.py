@@ -0,0 +1,337 @@
+"""
+Fila de exportações em segundo plano.
+
+Exportações grandes (Excel/CSV de relatórios, bases financeiras) rodavam dentro
+da requisição, presas ao timeout de 120s do gunicorn e ocupando o worker do
+início ao fim. Aqui o envio devolve um job_id; um pool limitado de workers
+gera o arquivo em um diretório de artefatos (com TTL) e o progresso é
+enviado por SocketIO para a sala do usuário (`user:<id>`), além de ficar
+disponível por polling. Pedidos idênticos do mesmo usuário (mesma impressão
+digital de filtros) reaproveitam o job em andamento ou o artefato recente.
+
+O registro dos jobs fica no próprio diretório de artefatos (<job_id>.json ao
+lado do arquivo), para que status e download funcionem em qualquer worker do
+gunicorn - não só no que gerou o arquivo. Com mais de um container, aponte
+EXPORT_ARTIFACT_DIR para um volume compartilhado. Os eventos chegam aos
+sockets de todos os workers quando SOCKETIO_MESSAGE_QUEUE está configurado
+(ver app.py).
+
+Usage:
+    from services.export_jobs import export_jobs
+
+    def build(path, progress):
+        with open(path, 'w', encoding='utf-8') as fh:
+            ...
+            progress(done, total)
+        return {'rows': done}
+
+    job, reused = export_jobs.submit(user_id, 'export_relatorios.csv', filters, build,
+                                     filename='export.csv', mimetype='text/csv')
+    job.to_dict(reused)  # {'job_id', 'status', 'progress', 'download_url', ...}
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+
+from log_config import log_printf
+from services.single_flight import query_fingerprint
+from services.supabase_transport import call_class
+
+EXPORT_JOB_WORKERS = int(os.getenv('EXPORT_JOB_WORKERS', '2'))
+EXPORT_JOB_MAX_PENDING = int(os.getenv('EXPORT_JOB_MAX_PENDING', '20'))
+EXPORT_ARTIFACT_TTL = int(os.getenv('EXPORT_ARTIFACT_TTL', '3600'))
+EXPORT_ARTIFACT_DIR = os.getenv('EXPORT_ARTIFACT_DIR', os.path.join(tempfile.gettempdir(), 'portal_exports'))
+# Job ativo sem atualização há mais que isso teve o worker encerrado no meio
+EXPORT_JOB_STALE_AFTER = int(os.getenv('EXPORT_JOB_STALE_AFTER', '1800'))
+# Intervalo mínimo entre eventos de progresso enviados ao cliente (e gravações do registro)
+PROGRESS_EMIT_INTERVAL = 0.5
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+
+class ExportJob:
+    """Estado de uma exportação; o arquivo final fica em artifact_path"""
+
+    RECORD_FIELDS = ('job_id', 'user_id', 'kind', 'fingerprint', 'filename', 'mimetype', 'status', 'done',
+                     'total', 'message', 'error', 'result', 'created_at', 'finished_at', 'updated_at')
+
+    def __init__(self, user_id, kind, fingerprint, filename, mimetype, base_url='/background/export-jobs',
+                 directory=EXPORT_ARTIFACT_DIR, job_id=None):
+        self.job_id = job_id or uuid.uuid4().hex
+        self.user_id = user_id
+        self.kind = kind
+        self.fingerprint = fingerprint
+        self.filename = filename
+        self.mimetype = mimetype
+        self.status = 'queued'
+        self.done = 0
+        self.total = None
+        self.message = None
+        self.error = None
+        self.result = {}
+        self.created_at = time.time()
+        self.finished_at = None
+        self.updated_at = self.created_at
+        self.artifact_path = os.path.join(directory, self.job_id)
+        self.record_path = self.artifact_path + '.json'
+        self.base_url = base_url
+        self._last_emit = 0.0
+
+    def to_record(self):
+        return {field: getattr(self, field) for field in self.RECORD_FIELDS}
+
+    @classmethod
+    def from_record(cls, record, base_url, directory):
+        job = cls(record['user_id'], record['kind'], record['fingerprint'], record['filename'], record['mimetype'],
+                  base_url=base_url, directory=directory, job_id=record['job_id'])
+        for field in cls.RECORD_FIELDS:
+            if field in record:
+                setattr(job, field, record[field])
+        # Worker encerrado no meio da geração: o job nunca vai terminar
+        if job.status in ACTIVE_STATUSES and time.time() - (job.updated_at or job.created_at) > EXPORT_JOB_STALE_AFTER:
+            job.status = 'error'
+            job.error = 'Exportação interrompida (worker reiniciado), solicite novamente'
+            job.finished_at = job.updated_at
+        return job
+
+    @property
+    def expires_at(self):
+        return (self.finished_at or self.created_at) + EXPORT_ARTIFACT_TTL
+
+    def is_expired(self, now=None):
+        return self.status not in ACTIVE_STATUSES and (now or time.time()) >= self.expires_at
+
+    def percent(self):
+        if self.status == 'done':
+            return 100
+        if self.total:
+            return min(99, int(self.done * 100 / self.total))
+        return None
+
+    def to_dict(self, reused=False):
+        return {
+            'job_id': self.job_id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': self.percent(),
+            'done': self.done,
+            'total': self.total,
+            'message': self.message,
+            'error': self.error,
+            'filename': self.filename,
+            'result': self.result,
+            'reused': reused,
+            'download_url': f'{self.base_url}/{self.job_id}/download' if self.status == 'done' else None,
+            'expires_at': self.expires_at if self.status == 'done' else None,
+        }
+
+
+class ExportJobQueue:
+    """Pool limitado de workers + registro de jobs por usuário/impressão digital
+
+    O registro é persistido em <directory>/<job_id>.json (e um índice por
+    usuário/impressão digital), lido por todos os workers; a memória local
+    guarda apenas os jobs que este worker está executando.
+
+    Outras filas (ex.: conferência de invoices) criam a própria instância com
+    base_url das rotas de status/download e o nome do evento SocketIO.
+    """
+
+    def __init__(self, max_workers=EXPORT_JOB_WORKERS, max_pending=EXPORT_JOB_MAX_PENDING,
+                 base_url='/background/export-jobs', event='export_job_progress', name='export'):
+        self.max_pending = max_pending
+        self.base_url = base_url
+        self.event = event
+        self.directory = os.path.join(EXPORT_ARTIFACT_DIR, name)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f'{name}-job')
+        self._jobs: Dict[str, ExportJob] = {}
+        self._lock = threading.Lock()
+
+    # ---- registro compartilhado ----
+
+    def _ensure_directory(self):
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+
+    def _write_json(self, path, data):
+        self._ensure_directory()
+        partial = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        fd = os.open(partial, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+            json.dump(data, fh, ensure_ascii=False, default=str)
+        os.replace(partial, path)
+
+    def _read_json(self, path):
+        try:
+            with open(path, encoding='utf-8') as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def _index_path(self, user_id, fingerprint):
+        digest = hashlib.sha1(f'{user_id}:{fingerprint}'.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f'fp-{digest}.idx')
+
+    def _persist(self, job: ExportJob):
+        job.updated_at = time.time()
+        try:
+            self._write_json(job.record_path, job.to_record())
+        except OSError as e:
+            log_printf("[EXPORT_JOBS] Erro ao gravar registro do job %s: %s", job.job_id, e)
+
+    def _load(self, job_id: str) -> Optional[ExportJob]:
+        if not job_id or not all(c in '0123456789abcdef' for c in job_id):
+            return None
+        record = self._read_json(os.path.join(self.directory, f'{job_id}.json'))
+        if not record:
+            return None
+        return ExportJob.from_record(record, self.base_url, self.directory)
+
+    def _records(self):
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        jobs = []
+        for name in names:
+            if name.endswith('.json'):
+                job = self._load(name[:-5])
+                if job is not None:
+                    jobs.append(job)
+        return jobs
+
+    # ---- API ----
+
+    def submit(self, user_id, kind: str, params: Optional[dict], builder: Callable[[str, Callable], Any],
+               filename: str, mimetype: str):
+        """Enfileira (ou reaproveita) uma exportação e retorna (job, reaproveitado).
+
+        - params: filtros que definem o conteúdo; formam a impressão digital junto com kind
+        - builder: callable(path, progress) que grava o arquivo em path e opcionalmente
+          retorna um dict de metadados (ex.: {'rows': 1234}); progress(done, total=None, message=None)
+        """
+        fingerprint = query_fingerprint(kind, params or {})
+        index_path = self._index_path(user_id, fingerprint)
+        self.prune()
+        with self._lock:
+            existing = self.get((self._read_json(index_path) or {}).get('job_id', ''))
+            if existing is not None and existing.status != 'error' and not existing.is_expired():
+                if existing.status in ACTIVE_STATUSES or os.path.exists(existing.artifact_path):
+                    log_printf("[EXPORT_JOBS] Reaproveitando job %s (%s) para usuário %s", existing.job_id, kind, user_id)
+                    return existing, True
+            pending = sum(1 for job in self._jobs.values() if job.status in ACTIVE_STATUSES)
+            if pending >= self.max_pending:
+                raise RuntimeError('Fila de exportações cheia, tente novamente em alguns minutos')
+            job = ExportJob(user_id, kind, fingerprint, filename, mimetype, base_url=self.base_url,
+                            directory=self.directory)
+            self._jobs[job.job_id] = job
+            self._persist(job)
+            try:
+                self._write_json(index_path, {'job_id': job.job_id})
+            except OSError as e:
+                log_printf("[EXPORT_JOBS] Erro ao gravar índice do job %s: %s", job.job_id, e)
+        self._executor.submit(self._run, job, builder)
+        log_printf("[EXPORT_JOBS] Job %s (%s) enfileirado para usuário %s", job.job_id, kind, user_id)
+        self._emit(job, force=True)
+        return job, False
+
+    def get(self, job_id: str, user_id=None) -> Optional[ExportJob]:
+        """Job pelo id (de qualquer worker); com user_id, apenas se pertencer ao usuário"""
+        job = self._jobs.get(job_id) or self._load(job_id)
+        if job is None or (user_id is not None and str(job.user_id) != str(user_id)):
+            return None
+        return job
+
+    def list_for_user(self, user_id):
+        jobs = {job.job_id: job for job in self._records() if str(job.user_id) == str(user_id)}
+        # Jobs deste worker: estado em memória é o mais recente
+        jobs.update({job.job_id: job for job in list(self._jobs.values()) if str(job.user_id) == str(user_id)})
+        return sorted(jobs.values(), key=lambda job: job.created_at, reverse=True)
+
+    def prune(self):
+        """Remove jobs, registros e artefatos expirados (de todos os workers)"""
+        now = time.time()
+        with self._lock:
+            for job in [job for job in self._jobs.values() if job.status not in ACTIVE_STATUSES]:
+                self._jobs.pop(job.job_id, None)
+        for job in self._records():
+            if not job.is_expired(now):
+                continue
+            paths = [job.artifact_path, job.record_path]
+            index_path = self._index_path(job.user_id, job.fingerprint)
+            # O índice pode já apontar para um job mais novo da mesma impressão digital
+            if (self._read_json(index_path) or {}).get('job_id') == job.job_id:
+                paths.append(index_path)
+            for path in paths:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    log_printf("[EXPORT_JOBS] Erro ao remover %s: %s", path, e)
+
+    def _run(self, job: ExportJob, builder):
+        job.status = 'running'
+        started = time.time()
+        self._emit(job, force=True)
+
+        def progress(done, total=None, message=None):
+            job.done = done
+            if total is not None:
+                job.total = total
+            if message is not None:
+                job.message = message
+            self._emit(job)
+
+        try:
+            self._ensure_directory()
+            partial_path = job.artifact_path + '.part'
+            # Consultas da exportação usam o timeout longo da classe 'export'
+            with call_class('export'):
+                result = builder(partial_path, progress)
+            os.chmod(partial_path, 0o600)
+            os.replace(partial_path, job.artifact_path)
+            job.result = result or {}
+            job.status = 'done'
+            job.message = None
+            log_printf("[EXPORT_JOBS] Job %s (%s) concluído em %.2fs - %s", job.job_id, job.kind, time.time() - started, job.result)
+        except Exception as e:
+            job.status = 'error'
+            job.error = str(e)
+            log_printf("[EXPORT_JOBS] Job %s (%s) falhou: %s", job.job_id, job.kind, e)
+            traceback.print_exc()
+            try:
+                os.remove(job.artifact_path + '.part')
+            except OSError:
+                pass
+        finally:
+            job.finished_at = time.time()
+            self._emit(job, force=True)
+            with self._lock:
+                self._jobs.pop(job.job_id, None)
+
+    def _emit(self, job: ExportJob, force=False):
+        """Grava o estado no registro e envia para a sala SocketIO do usuário (melhor esforço)"""
+        now = time.time()
+        if not force and now - job._last_emit < PROGRESS_EMIT_INTERVAL:
+            return
+        job._last_emit = now
+        self._persist(job)
+        try:
+            import extensions
+            socketio = getattr(extensions, 'socketio', None)
+            if socketio is not None:
+                socketio.emit(self.event, job.to_dict(), to=f'user:{job.user_id}')
+        except Exception as e:
+            log_printf("[EXPORT_JOBS] Falha ao emitir progresso do job %s: %s", job.job_id, e)
+
+
+# Instância global compartilhada pelos módulos de exportação
+export_jobs = ExportJobQueue()
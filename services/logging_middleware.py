@@ -6,6 +6,8 @@ import os
 from flask import request, session, g
 import time
 from services.access_logger import access_logger
+from services.profiling import profiler
+from services.query_tracing import query_tracer
 
 class RobustLoggingMiddleware:
     """
@@ -44,6 +46,8 @@ class RobustLoggingMiddleware:
             if self.enabled:
                 app.before_request(self.before_request)
                 app.after_request(self.after_request)
+                app.teardown_request(self.teardown_request)
+                profiler.init_app(app)
                 print("[LOGGING_MIDDLEWARE] Middleware de logging inicializado")
             else:
                 print("[LOGGING_MIDDLEWARE] Middleware de logging não inicializado (desabilitado)")
@@ -53,6 +57,12 @@ class RobustLoggingMiddleware:
     
     def before_request(self):
         """Executado antes de cada request - deve ser ultra rápido"""
+        try:
+            # Tempos por endpoint (e amostragem, se habilitada) valem também em desenvolvimento
+            profiler.start_request()
+            query_tracer.start_request()
+        except Exception:
+            pass
         try:
             # Pular em desenvolvimento se não forçado
             if (self.enabled and 
@@ -65,6 +75,11 @@ class RobustLoggingMiddleware:
     
     def after_request(self, response):
         """Executado após cada request - nunca pode falhar"""
+        try:
+            query_tracer.finish_request(response)
+            profiler.finish_request(response)
+        except Exception:
+            pass
         try:
             if (self.enabled and 
                 hasattr(g, 'access_log_should_log') and 
@@ -76,6 +91,14 @@ class RobustLoggingMiddleware:
             pass
         return response  # SEMPRE retorna a resposta original
     
+    def teardown_request(self, exc=None):
+        """Fecha a medição de requisições que terminaram em exceção (sem after_request)"""
+        try:
+            query_tracer.finish_request()
+            profiler.finish_request(error=exc is not None)
+        except Exception:
+            pass
+    
     def _should_log_request(self):
         """Determina se deve fazer log da requisição - apenas páginas importantes"""
         try:
@@ -0,0 +1,425 @@
+"""Fila de entrega de e-mails com conexão SMTP persistente.
+
+O EmailService abria uma conexão SMTP nova (conexão, STARTTLS, login) para
+cada mensagem, dentro da requisição: concluir um evento de RH esperava
+segundos pelo handshake. Aqui a requisição apenas enfileira a mensagem; uma
+thread de entrega (greenlet sob gevent) reaproveita uma conexão autenticada
+por relay, envia em lote o que estiver na fila, reconecta quando o servidor
+derruba a conexão e tenta de novo com backoff. Mensagens que esgotam as
+tentativas (ou são recusadas em definitivo) vão para o spool local de
+dead-letter, de onde podem ser reenviadas; mensagens ainda na fila quando o
+processo encerra são gravadas no spool de pendentes e reenfileiradas no
+próximo boot.
+
+Para testar localmente sem um servidor real:
+    python scripts/debug_smtp_server.py --port 1025
+    SMTP_HOST=localhost SMTP_PORT=1025 SMTP_USE_TLS=false SMTP_USER=x SMTP_PASSWORD=x
+
+Usage:
+    from services.mail_queue import mail_queue
+
+    mail_queue.enqueue(relay, from_addr, recipients, message_str, subject=subject)
+    mail_queue.stats()
+    mail_queue.requeue_dead_letters()
+"""
+
+import atexit
+import heapq
+import json
+import os
+import queue
+import smtplib
+import tempfile
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from log_config import log_printf
+
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", "20"))
+# Tempo que a thread de entrega espera por mais mensagens antes de enviar um lote
+MAIL_BATCH_WINDOW = float(os.getenv("MAIL_BATCH_WINDOW", "0.5"))
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", "5"))
+MAIL_RETRY_BASE_DELAY = float(os.getenv("MAIL_RETRY_BASE_DELAY", "5"))
+MAIL_RETRY_MAX_DELAY = float(os.getenv("MAIL_RETRY_MAX_DELAY", "600"))
+# Conexão ociosa por mais que isso é verificada (NOOP) antes de reutilizar
+SMTP_IDLE_CHECK_SECONDS = float(os.getenv("SMTP_IDLE_CHECK_SECONDS", "60"))
+# Conexão ociosa por mais que isso é fechada pela thread de entrega
+SMTP_IDLE_CLOSE_SECONDS = float(os.getenv("SMTP_IDLE_CLOSE_SECONDS", "240"))
+SMTP_MAX_MESSAGES_PER_CONNECTION = int(os.getenv("SMTP_MAX_MESSAGES_PER_CONNECTION", "100"))
+MAIL_SPOOL_DIR = os.getenv("MAIL_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "portal_mail_spool"))
+
+
+def _connection_lost(exc: Exception) -> bool:
+    """Conexão caída (reconecta e reenvia na hora); SMTPException também é OSError"""
+    if isinstance(exc, smtplib.SMTPServerDisconnected):
+        return True
+    return isinstance(exc, OSError) and not isinstance(exc, smtplib.SMTPException)
+
+
+class Relay:
+    """Configuração de um servidor SMTP (chave da conexão persistente)"""
+
+    def __init__(self, host: str, port: int, username: Optional[str], password: Optional[str],
+                 use_tls: bool = True, timeout: int = 30) -> None:
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+
+    @property
+    def key(self) -> tuple:
+        return (self.host, self.port, self.username, self.use_tls)
+
+    def to_dict(self) -> Dict[str, Any]:
+        # Sem a senha: vai para o spool em disco
+        return {"host": self.host, "port": self.port, "username": self.username,
+                "use_tls": self.use_tls, "timeout": self.timeout}
+
+
+class OutboundMessage:
+    """Mensagem pronta (MIME serializado) e estado de entrega"""
+
+    def __init__(self, relay: Relay, from_addr: str, recipients: List[str], content: str,
+                 subject: str = "", message_id: Optional[str] = None, attempts: int = 0) -> None:
+        self.id = message_id or uuid.uuid4().hex
+        self.relay = relay
+        self.from_addr = from_addr
+        self.recipients = recipients
+        self.content = content
+        self.subject = subject
+        self.attempts = attempts
+        self.last_error: Optional[str] = None
+        self.created_at = time.time()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"id": self.id, "relay": self.relay.to_dict(), "from": self.from_addr,
+                "to": self.recipients, "subject": self.subject, "attempts": self.attempts,
+                "last_error": self.last_error, "created_at": self.created_at}
+
+
+class SMTPConnection:
+    """Conexão autenticada reutilizada entre mensagens do mesmo relay"""
+
+    def __init__(self, relay: Relay) -> None:
+        self.relay = relay
+        self._server: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+        self._sent = 0
+        self.connects = 0
+
+    def _open(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.relay.host, self.relay.port, timeout=self.relay.timeout)
+        try:
+            server.ehlo()
+            if self.relay.use_tls:
+                server.starttls()
+                server.ehlo()
+            if self.relay.username:
+                server.login(self.relay.username, self.relay.password or "")
+        except Exception:
+            self._quit(server)
+            raise
+        self.connects += 1
+        self._sent = 0
+        log_printf("[EMAIL] Conexão SMTP aberta com %s:%s", self.relay.host, self.relay.port)
+        return server
+
+    def _usable(self) -> bool:
+        if self._server is None:
+            return False
+        if self._sent >= SMTP_MAX_MESSAGES_PER_CONNECTION:
+            return False
+        if time.time() - self._last_used < SMTP_IDLE_CHECK_SECONDS:
+            return True
+        try:
+            return self._server.noop()[0] == 250
+        except Exception:
+            return False
+
+    def send(self, message: OutboundMessage) -> None:
+        """Envia pela conexão atual; se ela caiu, reconecta e tenta mais uma vez"""
+        for attempt in (1, 2):
+            if not self._usable():
+                self.close()
+                self._server = self._open()
+            try:
+                refused = self._server.sendmail(message.from_addr, message.recipients, message.content)
+                self._sent += 1
+                self._last_used = time.time()
+                if refused:
+                    log_printf("[EMAIL] Destinatários recusados em %s: %s", message.id, refused)
+                return
+            except Exception as exc:
+                if not _connection_lost(exc):
+                    raise
+                self.close()
+                if attempt == 2:
+                    raise
+
+    def close_if_idle(self) -> None:
+        if self._server is not None and time.time() - self._last_used > SMTP_IDLE_CLOSE_SECONDS:
+            self.close()
+
+    def close(self) -> None:
+        if self._server is not None:
+            self._quit(self._server)
+            self._server = None
+
+    @staticmethod
+    def _quit(server: smtplib.SMTP) -> None:
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+
+def _is_permanent(exc: Exception) -> bool:
+    """Recusas 5xx (destinatário inválido, autenticação negada) não adiantam repetir"""
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return all(500 <= code < 600 for code, _ in exc.recipients.values())
+    code = getattr(exc, "smtp_code", None)
+    return isinstance(code, int) and 500 <= code < 600
+
+
+class MailQueue:
+    """Fila em memória + thread de entrega + spool local"""
+
+    def __init__(self, spool_dir: str = MAIL_SPOOL_DIR) -> None:
+        self.spool_dir = spool_dir
+        self._queue: "queue.Queue[OutboundMessage]" = queue.Queue()
+        self._delayed: List[tuple] = []  # heap de (quando, seq, mensagem)
+        self._delayed_lock = threading.Lock()
+        self._seq = 0
+        self._connections: Dict[tuple, SMTPConnection] = {}
+        self._passwords: Dict[tuple, Optional[str]] = {}
+        self._worker_pid: Optional[int] = None
+        self._start_lock = threading.Lock()
+        self._metrics = {"queued": 0, "sent": 0, "retried": 0, "dead_lettered": 0, "batches": 0}
+        atexit.register(self._spool_pending)
+
+    # ---- envio ----
+
+    def start(self, relay: Relay) -> None:
+        """Inicia a thread de entrega (e reenfileira pendentes do spool) para o relay"""
+        self._passwords[relay.key] = relay.password
+        self._ensure_worker()
+
+    def enqueue(self, relay: Relay, from_addr: str, recipients: List[str], content: str,
+                subject: str = "") -> OutboundMessage:
+        message = OutboundMessage(relay, from_addr, recipients, content, subject=subject)
+        self._passwords[relay.key] = relay.password
+        self._ensure_worker()
+        self._queue.put(message)
+        self._metrics["queued"] += 1
+        log_printf("[EMAIL] Mensagem %s enfileirada para %s - Assunto: %s", message.id, recipients, subject)
+        return message
+
+    def deliver_now(self, relay: Relay, from_addr: str, recipients: List[str], content: str,
+                    subject: str = "") -> bool:
+        """Entrega síncrona por uma conexão própria (sem passar pela fila)"""
+        message = OutboundMessage(relay, from_addr, recipients, content, subject=subject)
+        connection = SMTPConnection(relay)
+        try:
+            connection.send(message)
+            self._metrics["sent"] += 1
+            return True
+        except Exception as exc:
+            message.last_error = str(exc)
+            log_printf("[EMAIL] Falha ao enviar notificação: %s", exc)
+            return False
+        finally:
+            connection.close()
+
+    # ---- thread de entrega ----
+
+    def _ensure_worker(self) -> None:
+        # Após fork (workers do gunicorn) a thread do pai não existe no filho
+        if self._worker_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._worker_pid == os.getpid():
+                return
+            self._connections = {}
+            self._worker_pid = os.getpid()
+            threading.Thread(target=self._run, name="mail-delivery", daemon=True).start()
+            self._load_pending()
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                for connection in self._connections.values():
+                    connection.close_if_idle()
+                continue
+            self._metrics["batches"] += 1
+            for message in batch:
+                self._deliver(message)
+
+    def _next_batch(self) -> List[OutboundMessage]:
+        batch = self._due_retries()
+        timeout = 1.0 if not batch else MAIL_BATCH_WINDOW
+        try:
+            batch.append(self._queue.get(timeout=timeout))
+        except queue.Empty:
+            return batch
+        # Junta o que chegar na janela para enviar pela mesma conexão
+        deadline = time.time() + MAIL_BATCH_WINDOW
+        while len(batch) < MAIL_BATCH_SIZE:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        batch.sort(key=lambda message: message.relay.key)
+        return batch
+
+    def _due_retries(self) -> List[OutboundMessage]:
+        now = time.time()
+        due = []
+        with self._delayed_lock:
+            while self._delayed and self._delayed[0][0] <= now:
+                due.append(heapq.heappop(self._delayed)[2])
+        return due
+
+    def _connection(self, relay: Relay) -> SMTPConnection:
+        connection = self._connections.get(relay.key)
+        if connection is None:
+            connection = self._connections[relay.key] = SMTPConnection(relay)
+        return connection
+
+    def _deliver(self, message: OutboundMessage) -> None:
+        message.attempts += 1
+        try:
+            self._connection(message.relay).send(message)
+            self._metrics["sent"] += 1
+            log_printf("[EMAIL] Notificação enviada para %s - Assunto: %s", message.recipients, message.subject)
+        except Exception as exc:
+            message.last_error = str(exc)
+            if _is_permanent(exc) or message.attempts >= MAIL_MAX_ATTEMPTS:
+                log_printf("[EMAIL] Falha definitiva ao enviar %s após %s tentativa(s): %s",
+                           message.id, message.attempts, exc)
+                self._dead_letter(message)
+                return
+            delay = min(MAIL_RETRY_MAX_DELAY, MAIL_RETRY_BASE_DELAY * (2 ** (message.attempts - 1)))
+            log_printf("[EMAIL] Falha ao enviar %s (tentativa %s), nova tentativa em %ss: %s",
+                       message.id, message.attempts, delay, exc)
+            self._metrics["retried"] += 1
+            with self._delayed_lock:
+                self._seq += 1
+                heapq.heappush(self._delayed, (time.time() + delay, self._seq, message))
+
+    # ---- spool local ----
+
+    def _spool_path(self, kind: str) -> str:
+        # Mensagens completas (destinatários, conteúdo): spool restrito ao usuário do processo
+        path = os.path.join(self.spool_dir, kind)
+        for directory in (self.spool_dir, path):
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+            os.chmod(directory, 0o700)
+        return path
+
+    @staticmethod
+    def _open_private(path: str):
+        return os.fdopen(os.open(path, os.O_WRONLY | os.O_TRUNC | os.O_CREAT, 0o600), "w", encoding="utf-8")
+
+    def _write_spool(self, kind: str, message: OutboundMessage) -> None:
+        directory = self._spool_path(kind)
+        with self._open_private(os.path.join(directory, f"{message.id}.eml")) as f:
+            f.write(message.content)
+        with self._open_private(os.path.join(directory, f"{message.id}.json")) as f:
+            json.dump(message.to_dict(), f, ensure_ascii=False)
+
+    def _dead_letter(self, message: OutboundMessage) -> None:
+        self._metrics["dead_lettered"] += 1
+        try:
+            self._write_spool("dead", message)
+        except Exception as exc:
+            log_printf("[EMAIL] Erro ao gravar dead-letter %s: %s", message.id, exc)
+
+    def _read_spool(self, kind: str) -> List[OutboundMessage]:
+        directory = os.path.join(self.spool_dir, kind)
+        if not os.path.isdir(directory):
+            return []
+        messages = []
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(".json"):
+                continue
+            meta_path = os.path.join(directory, name)
+            eml_path = meta_path[:-5] + ".eml"
+            claimed_path = f"{meta_path}.{os.getpid()}"
+            try:
+                # Rename atômico: com vários workers só um deles fica com a mensagem
+                os.rename(meta_path, claimed_path)
+            except OSError:
+                continue
+            meta_path = claimed_path
+            try:
+                with open(meta_path, encoding="utf-8") as f:
+                    meta = json.load(f)
+                with open(eml_path, encoding="utf-8") as f:
+                    content = f.read()
+                relay = Relay(password=self._passwords.get(
+                    (meta["relay"]["host"], meta["relay"]["port"], meta["relay"]["username"], meta["relay"]["use_tls"])),
+                    **meta["relay"])
+                messages.append(OutboundMessage(relay, meta["from"], meta["to"], content,
+                                                subject=meta.get("subject", ""), message_id=meta["id"]))
+                os.remove(meta_path)
+                os.remove(eml_path)
+            except Exception as exc:
+                log_printf("[EMAIL] Erro ao ler spool %s: %s", meta_path, exc)
+        return messages
+
+    def _load_pending(self) -> None:
+        for message in self._read_spool("pending"):
+            self._queue.put(message)
+            log_printf("[EMAIL] Mensagem pendente %s reenfileirada do spool", message.id)
+
+    def _spool_pending(self) -> None:
+        """Ao encerrar o processo, grava o que não foi entregue para o próximo boot"""
+        pending = []
+        while True:
+            try:
+                pending.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        with self._delayed_lock:
+            pending.extend(item[2] for item in self._delayed)
+            self._delayed = []
+        for message in pending:
+            try:
+                self._write_spool("pending", message)
+            except Exception:
+                pass
+
+    def requeue_dead_letters(self, password_for: Optional[Dict[tuple, str]] = None) -> int:
+        """Reenfileira as mensagens do dead-letter (tentativas zeradas)"""
+        if password_for:
+            self._passwords.update(password_for)
+        messages = self._read_spool("dead")
+        if messages:
+            self._ensure_worker()
+        for message in messages:
+            self._queue.put(message)
+        return len(messages)
+
+    def stats(self) -> Dict[str, Any]:
+        dead_dir = os.path.join(self.spool_dir, "dead")
+        dead = len([n for n in os.listdir(dead_dir) if n.endswith(".json")]) if os.path.isdir(dead_dir) else 0
+        with self._delayed_lock:
+            waiting_retry = len(self._delayed)
+        return dict(self._metrics, pending=self._queue.qsize(), waiting_retry=waiting_retry,
+                    dead_letter_spool=dead,
+                    connections={f"{key[0]}:{key[1]}": c.connects for key, c in self._connections.items()})
+
+
+# Instância única do processo
+mail_queue = MailQueue()
@@ -0,0 +1,262 @@
+"""
+Registro de consultas analíticas nomeadas executadas via RPC `execute_sql`.
+
+Cada consulta é declarada uma única vez com parâmetros tipados; o texto SQL
+é sempre o mesmo para a mesma combinação de filtros e os valores seguem
+separados em `params` (nunca interpolados no SQL). Chamadas repetidas com
+os mesmos parâmetros normalizados são respondidas por um cache com TTL,
+chamadas idênticas concorrentes são coalescidas e a latência de cada
+consulta fica registrada em um histograma.
+
+Usage:
+    from services.named_queries import register_query, run_query, run_queries
+
+    register_query(
+        'operacional.modal_distribution',
+        "SELECT modal, COUNT(*) AS total FROM importacoes_processos_operacional {where} GROUP BY modal",
+        params={'year': int, 'companies': list},
+        filters={
+            'year': "EXTRACT(year FROM data_registro::date) = %(year)s",
+            'companies': "cliente IN ({companies})",
+        },
+        ttl=120,
+    )
+    rows = run_query('operacional.modal_distribution', year=2025, companies=['ACME'])
+    results = run_queries({'modal': ('operacional.modal_distribution', {'year': 2025})})
+"""
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+import json
+import os
+import threading
+import time
+
+from services.single_flight import single_flight
+
+NAMED_QUERY_CACHE_MAX_ENTRIES = int(os.getenv('NAMED_QUERY_CACHE_MAX_ENTRIES', '512'))
+NAMED_QUERY_MAX_WORKERS = int(os.getenv('NAMED_QUERY_MAX_WORKERS', '8'))
+
+# Limites superiores (ms) dos buckets do histograma de latência
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float('inf'))
+
+_executor = ThreadPoolExecutor(max_workers=NAMED_QUERY_MAX_WORKERS, thread_name_prefix='named-query')
+
+
+class NamedQuery:
+    """Declaração de uma consulta: SQL base, parâmetros tipados e filtros opcionais.
+
+    - sql: texto com os marcadores opcionais {where} ("WHERE a AND b") e
+      {and_filters} ("AND a AND b") preenchidos pelos filtros ativos
+    - params: {nome: tipo} com tipo em int, float, str, bool ou list
+    - filters: {nome_param: fragmento SQL} incluído quando o parâmetro não é
+      None/False; listas usam {nome} para expandir os placeholders
+    - ttl: segundos de cache do resultado (0 desativa)
+    - sql_arg: nome do argumento SQL esperado pela RPC
+    """
+
+    def __init__(self, name: str, sql: str, params: Optional[Dict[str, type]] = None,
+                 filters: Optional[Dict[str, str]] = None, ttl: int = 60,
+                 sql_arg: str = 'sql_query', rpc: str = 'execute_sql'):
+        self.name = name
+        self.sql = sql
+        self.params = params or {}
+        self.filters = filters or {}
+        self.ttl = ttl
+        self.sql_arg = sql_arg
+        self.rpc = rpc
+
+    def normalize(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        """Valida e converte os parâmetros para os tipos declarados"""
+        unknown = set(values) - set(self.params)
+        if unknown:
+            raise ValueError(f"{self.name}: parâmetros não declarados: {sorted(unknown)}")
+        normalized = {}
+        for name, kind in self.params.items():
+            value = values.get(name)
+            if value is None or value == '':
+                normalized[name] = None
+                continue
+            try:
+                if kind is list:
+                    items = value if isinstance(value, (list, tuple, set)) else [value]
+                    normalized[name] = sorted({str(item) for item in items if item is not None})
+                elif kind is bool:
+                    normalized[name] = bool(value)
+                else:
+                    normalized[name] = kind(value)
+            except (TypeError, ValueError) as exc:
+                raise ValueError(f"{self.name}: parâmetro '{name}' inválido ({value!r}): {exc}")
+        return normalized
+
+    def render(self, normalized: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        """Monta o SQL final (apenas placeholders) e o dicionário de parâmetros"""
+        clauses = []
+        bound = {}
+        for name, fragment in self.filters.items():
+            value = normalized.get(name)
+            if value is None or value is False or value == []:
+                continue
+            if isinstance(value, list):
+                placeholders = ','.join(f"%({name}_{i})s" for i in range(len(value)))
+                fragment = fragment.replace('{' + name + '}', placeholders)
+                for i, item in enumerate(value):
+                    bound[f'{name}_{i}'] = item
+            elif not isinstance(value, bool):
+                bound[name] = value
+            clauses.append(fragment)
+        for name, value in normalized.items():
+            if name not in self.filters and value is not None:
+                bound[name] = value
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        and_filters = f"AND {' AND '.join(clauses)}" if clauses else ''
+        sql = self.sql.replace('{where}', where).replace('{and_filters}', and_filters)
+        return sql, bound
+
+
+class _LatencyHistogram:
+    """Contadores por consulta; atualizados por várias threads (pool de run_queries)"""
+
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS_MS)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.errors = 0
+        self.cache_hits = 0
+        self._lock = threading.Lock()
+
+    def observe(self, elapsed_ms: float, error: bool = False):
+        with self._lock:
+            self.count += 1
+            self.total_ms += elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+            if error:
+                self.errors += 1
+            for i, limit in enumerate(LATENCY_BUCKETS_MS):
+                if elapsed_ms <= limit:
+                    self.buckets[i] += 1
+                    break
+
+    def hit(self):
+        with self._lock:
+            self.cache_hits += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        labels = [('+Inf' if limit == float('inf') else f'{limit}ms') for limit in LATENCY_BUCKETS_MS]
+        with self._lock:
+            return {
+                'count': self.count,
+                'avg_ms': round(self.total_ms / self.count, 1) if self.count else None,
+                'max_ms': round(self.max_ms, 1),
+                'errors': self.errors,
+                'cache_hits': self.cache_hits,
+                'buckets': dict(zip(labels, self.buckets)),
+            }
+
+
+_registry: Dict[str, NamedQuery] = {}
+_cache: 'OrderedDict[str, Tuple[float, Any]]' = OrderedDict()
+_metrics: Dict[str, _LatencyHistogram] = {}
+_lock = threading.Lock()
+
+
+def register_query(name: str, sql: str, **options) -> NamedQuery:
+    """Declara (ou redeclara) uma consulta nomeada"""
+    query = NamedQuery(name, sql, **options)
+    _registry[name] = query
+    with _lock:
+        _metrics.setdefault(name, _LatencyHistogram())
+    return query
+
+
+def _cache_get(key: str):
+    with _lock:
+        entry = _cache.get(key)
+        if not entry:
+            return None
+        expires_at, rows = entry
+        if expires_at < time.time():
+            _cache.pop(key, None)
+            return None
+        _cache.move_to_end(key)
+        return entry
+
+
+def _cache_set(key: str, rows: Any, ttl: int):
+    with _lock:
+        _cache[key] = (time.time() + ttl, rows)
+        _cache.move_to_end(key)
+        while len(_cache) > NAMED_QUERY_CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+
+
+def run_query(name: str, use_cache: bool = True, **params) -> Any:
+    """Executa uma consulta nomeada e retorna `data` da RPC"""
+    from extensions import supabase_admin
+
+    query = _registry.get(name)
+    if query is None:
+        raise KeyError(f"Consulta nomeada não registrada: {name}")
+
+    normalized = query.normalize(params)
+    cache_key = f"{name}:{json.dumps(normalized, sort_keys=True, default=str)}"
+    histogram = _metrics[name]
+
+    if use_cache and query.ttl > 0:
+        cached = _cache_get(cache_key)
+        if cached is not None:
+            histogram.hit()
+            return cached[1]
+
+    sql, bound = query.render(normalized)
+
+    def _execute():
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = supabase_admin.rpc(query.rpc, {query.sql_arg: sql, 'params': bound}).execute()
+            failed = False
+        finally:
+            histogram.observe((time.perf_counter() - started) * 1000, error=failed)
+        rows = result.data or []
+        if query.ttl > 0:
+            _cache_set(cache_key, rows, query.ttl)
+        return rows
+
+    return single_flight.do(f'named_query:{cache_key}', _execute)
+
+
+def run_queries(calls: Dict[str, Tuple[str, Dict[str, Any]]],
+                on_error: Optional[Callable[[str, BaseException], Any]] = None) -> Dict[str, Any]:
+    """Despacha consultas independentes em paralelo.
+
+    - calls: {alias: (nome_da_consulta, params)}
+    - on_error: callable(alias, exc) cujo retorno substitui o resultado; sem ele a exceção é propagada
+    """
+    futures = {alias: _executor.submit(run_query, name, **(params or {})) for alias, (name, params) in calls.items()}
+    results = {}
+    for alias, future in futures.items():
+        try:
+            results[alias] = future.result()
+        except Exception as exc:
+            if on_error is None:
+                raise
+            results[alias] = on_error(alias, exc)
+    return results
+
+
+def invalidate_query_cache(prefix: Optional[str] = None):
+    """Remove resultados em cache (todos ou de consultas com o prefixo informado)"""
+    with _lock:
+        for key in list(_cache.keys()):
+            if prefix is None or key.startswith(prefix):
+                _cache.pop(key, None)
+
+
+def get_query_metrics() -> Dict[str, Any]:
+    """Histogramas de latência por consulta nomeada"""
+    with _lock:
+        histograms = sorted(_metrics.items())
+    return {name: histogram.snapshot() for name, histogram in histograms}
@@ -63,8 +63,8 @@ class PerfilAccessService:
         user_email = user.get('email')
         user_perfis_info = user.get('user_perfis_info', [])
         
-        logger.debug(f"[ACCESS_SERVICE] Verificando módulos acessíveis para {user_email}")
-        logger.debug(f"[ACCESS_SERVICE] Role: {user_role}, Perfil Principal: {user_perfil_principal}")
+        logger.debug("[ACCESS_SERVICE] Verificando módulos acessíveis para %s", user_email)
+        logger.debug("[ACCESS_SERVICE] Role: %s, Perfil Principal: %s", user_role, user_perfil_principal)
         
         # Master Admins: admin + master_admin - acesso total
         if user_role == 'admin' and user_perfil_principal == 'master_admin':
@@ -77,7 +77,7 @@ class PerfilAccessService:
                 'rh_recrutamento', 'rh_desempenho',
                 'analytics_portal', 'analytics_agente'  # Analytics disponíveis para todos os admins
             ]
-            logger.debug(f"[ACCESS_SERVICE] Master Admin (master_admin) - módulos disponíveis: {accessible_modules}")
+            logger.debug("[ACCESS_SERVICE] Master Admin (master_admin) - módulos disponíveis: %s", accessible_modules)
             return accessible_modules
         
         # Module Admins: interno_unique + admin_operacao/admin_financeiro/admin_recursos_humanos
@@ -93,7 +93,7 @@ class PerfilAccessService:
                     # Future modules ready for implementation:
                     'consultoria', 'exportacao'
                 ])
-                logger.debug(f"[ACCESS_SERVICE] Module Admin (admin_operacao) - módulos disponíveis: {list(accessible_modules)}")
+                logger.debug("[ACCESS_SERVICE] Module Admin (admin_operacao) - módulos disponíveis: %s", list(accessible_modules))
                 
             elif user_perfil_principal == 'admin_financeiro':
                 # Admin de Financeiro - APENAS módulos financeiros + gestão de usuários + Analytics
@@ -102,7 +102,7 @@ class PerfilAccessService:
                     'despesas_anual', 'faturamento_anual', 'usuarios', 'analytics',
                     'analytics_portal', 'analytics_agente'  # Analytics disponíveis para todos os admins
                 ])
-                logger.debug(f"[ACCESS_SERVICE] Module Admin (admin_financeiro) - módulos disponíveis: {list(accessible_modules)}")
+                logger.debug("[ACCESS_SERVICE] Module Admin (admin_financeiro) - módulos disponíveis: %s", list(accessible_modules))
             
             elif user_perfil_principal == 'admin_recursos_humanos':
                 # Admin de RH - APENAS módulos de RH + gestão de usuários + Analytics
@@ -111,7 +111,7 @@ class PerfilAccessService:
                     'rh_estrutura_departamentos', 'rh_recrutamento', 'rh_desempenho', 'usuarios', 'analytics',
                     'analytics_portal', 'analytics_agente'  # Analytics disponíveis para todos os admins
                 ])
-                logger.debug(f"[ACCESS_SERVICE] Module Admin (admin_recursos_humanos) - módulos disponíveis: {list(accessible_modules)}")
+                logger.debug("[ACCESS_SERVICE] Module Admin (admin_recursos_humanos) - módulos disponíveis: %s", list(accessible_modules))
             
             return list(accessible_modules)
         
@@ -130,7 +130,7 @@ class PerfilAccessService:
                         # Aplicar mapeamento de módulos se necessário
                         modulo_mapeado = PerfilAccessService.MODULE_MAPPING.get(modulo_codigo, modulo_codigo)
                         accessible_modules.add(modulo_mapeado)
-                        logger.debug(f"[ACCESS_SERVICE] Adicionado módulo: {modulo_codigo} → {modulo_mapeado} (perfil: {perfil_nome})")
+                        logger.debug("[ACCESS_SERVICE] Adicionado módulo: %s → %s (perfil: %s)", modulo_codigo, modulo_mapeado, perfil_nome)
                         
                         # Rastrear páginas para determinar acesso adicional a módulos
                         modulo_paginas = modulo.get('paginas', [])
@@ -154,7 +154,7 @@ class PerfilAccessService:
                         if pagina_codigo in PerfilAccessService.PAGE_TO_ENDPOINT_MAPPING:
                             endpoint_module = PerfilAccessService.PAGE_TO_ENDPOINT_MAPPING[pagina_codigo]
                             accessible_modules.add(endpoint_module)
-                            logger.debug(f"[ACCESS_SERVICE] Adicionado módulo por página: {pagina_codigo} → {endpoint_module}")
+                            logger.debug("[ACCESS_SERVICE] Adicionado módulo por página: %s → %s", pagina_codigo, endpoint_module)
                         
                         # Adicionar módulos gerais para compatibilidade com sidebar/menu (com contexto)
                         if pagina_codigo == 'dashboard_executivo':
@@ -191,7 +191,7 @@ class PerfilAccessService:
                             logger.debug(f"[ACCESS_SERVICE] Adicionado módulo geral: ajuste_status")
             
             accessible_modules = list(accessible_modules)
-            logger.debug(f"[ACCESS_SERVICE] Basic Users ({user_perfil_principal}) - módulos acessíveis finais: {accessible_modules}")
+            logger.debug("[ACCESS_SERVICE] Basic Users (%s) - módulos acessíveis finais: %s", user_perfil_principal, accessible_modules)
             return accessible_modules
         
         # Specific Profile Users: Users with specific profile names as perfil_principal
@@ -215,7 +215,7 @@ class PerfilAccessService:
                             # Apply module mapping
                             modulo_mapeado = PerfilAccessService.MODULE_MAPPING.get(modulo_codigo, modulo_codigo)
                             accessible_modules.add(modulo_mapeado)
-                            logger.debug(f"[ACCESS_SERVICE] Adicionado módulo do perfis_json: {modulo_codigo} → {modulo_mapeado}")
+                            logger.debug("[ACCESS_SERVICE] Adicionado módulo do perfis_json: %s → %s", modulo_codigo, modulo_mapeado)
                             
                             # Add specific page modules and sidebar compatibility
                             modulo_paginas = modulo.get('paginas', [])
@@ -225,7 +225,7 @@ class PerfilAccessService:
                                 if pagina_codigo in PerfilAccessService.PAGE_TO_ENDPOINT_MAPPING:
                                     endpoint_module = PerfilAccessService.PAGE_TO_ENDPOINT_MAPPING[pagina_codigo]
                                     accessible_modules.add(endpoint_module)
-                                    logger.debug(f"[ACCESS_SERVICE] Adicionado módulo por página: {pagina_codigo} → {endpoint_module}")
+                                    logger.debug("[ACCESS_SERVICE] Adicionado módulo por página: %s → %s", pagina_codigo, endpoint_module)
                                 
                                 # Add sidebar compatibility modules with module context
                                 if pagina_codigo == 'relatorio':
@@ -253,10 +253,10 @@ class PerfilAccessService:
                     break
             
             if found_in_database:
-                logger.debug(f"[ACCESS_SERVICE] Profile {user_perfil_principal} found in database - using dynamic access")
+                logger.debug("[ACCESS_SERVICE] Profile %s found in database - using dynamic access", user_perfil_principal)
             else:
                 # FALLBACK: Use hardcoded profile access patterns for legacy profiles
-                logger.debug(f"[ACCESS_SERVICE] Profile {user_perfil_principal} not found in database - checking legacy mappings")
+                logger.debug("[ACCESS_SERVICE] Profile %s not found in database - checking legacy mappings", user_perfil_principal)
                 profile_access_map = {
                     'financeiro_fluxo_de_caixa': {
                         'modules': ['financeiro', 'fluxo_de_caixa'],
@@ -272,16 +272,16 @@ class PerfilAccessService:
                 if user_perfil_principal in profile_access_map:
                     profile_config = profile_access_map[user_perfil_principal]
                     accessible_modules.update(profile_config['modules'])
-                    logger.debug(f"[ACCESS_SERVICE] Using legacy mapping for {user_perfil_principal}: {profile_config['modules']}")
+                    logger.debug("[ACCESS_SERVICE] Using legacy mapping for %s: %s", user_perfil_principal, profile_config['modules'])
                 else:
-                    logger.debug(f"[ACCESS_SERVICE] No access found for profile {user_perfil_principal} - user may need profile assignment")
+                    logger.debug("[ACCESS_SERVICE] No access found for profile %s - user may need profile assignment", user_perfil_principal)
             
             accessible_modules = list(accessible_modules)
-            logger.debug(f"[ACCESS_SERVICE] Specific Profile User ({user_role}/{user_perfil_principal}) - módulos acessíveis finais: {accessible_modules}")
+            logger.debug("[ACCESS_SERVICE] Specific Profile User (%s/%s) - módulos acessíveis finais: %s", user_role, user_perfil_principal, accessible_modules)
             return accessible_modules
         
         # Fallback - sem acesso
-        logger.debug(f"[ACCESS_SERVICE] Sem acesso definido para role={user_role}, perfil_principal={user_perfil_principal}")
+        logger.debug("[ACCESS_SERVICE] Sem acesso definido para role=%s, perfil_principal=%s", user_role, user_perfil_principal)
         return []
     
     @staticmethod
@@ -300,12 +300,12 @@ class PerfilAccessService:
         user_perfil_principal = user.get('perfil_principal', 'basico')
         user_perfis_info = user.get('user_perfis_info', [])
         
-        logger.debug(f"[ACCESS_SERVICE] Verificando páginas acessíveis no módulo {modulo_codigo}")
-        logger.debug(f"[ACCESS_SERVICE] Role: {user_role}, Perfil Principal: {user_perfil_principal}")
+        logger.debug("[ACCESS_SERVICE] Verificando páginas acessíveis no módulo %s", modulo_codigo)
+        logger.debug("[ACCESS_SERVICE] Role: %s, Perfil Principal: %s", user_role, user_perfil_principal)
         
         # Master Admins: admin + master_admin - acesso total
         if user_role == 'admin' and user_perfil_principal == 'master_admin':
-            logger.debug(f"[ACCESS_SERVICE] Master Admin (master_admin) - todas as páginas disponíveis no módulo {modulo_codigo}")
+            logger.debug("[ACCESS_SERVICE] Master Admin (master_admin) - todas as páginas disponíveis no módulo %s", modulo_codigo)
             return ['*']
         
         # Module Admins: interno_unique + admin_operacao/admin_financeiro
@@ -349,10 +349,10 @@ class PerfilAccessService:
                 user_manages_module = True
             
             if user_manages_module:
-                logger.debug(f"[ACCESS_SERVICE] Module Admin ({user_perfil_principal}) - acesso total ao módulo {modulo_codigo}")
+                logger.debug("[ACCESS_SERVICE] Module Admin (%s) - acesso total ao módulo %s", user_perfil_principal, modulo_codigo)
                 return ['*']
             else:
-                logger.debug(f"[ACCESS_SERVICE] Module Admin ({user_perfil_principal}) - sem acesso ao módulo {modulo_codigo}")
+                logger.debug("[ACCESS_SERVICE] Module Admin (%s) - sem acesso ao módulo %s", user_perfil_principal, modulo_codigo)
                 return []
         
         # Basic Users: acesso baseado em perfis
@@ -375,7 +375,7 @@ class PerfilAccessService:
                         
                         # Se lista vazia ou contém '*', acesso a todas as páginas
                         if not modulo_paginas or '*' in modulo_paginas:
-                            logger.debug(f"[ACCESS_SERVICE] Perfil {perfil_nome} permite todas as páginas do módulo {modulo_codigo}")
+                            logger.debug("[ACCESS_SERVICE] Perfil %s permite todas as páginas do módulo %s", perfil_nome, modulo_codigo)
                             return ['*']
                         
                         # Adicionar páginas específicas
@@ -385,14 +385,14 @@ class PerfilAccessService:
                                 pagina_codigo = pagina.get('codigo')
                                 if pagina_codigo:
                                     accessible_pages.add(pagina_codigo)
-                                    logger.debug(f"[ACCESS_SERVICE] Adicionada página: {pagina_codigo} (perfil: {perfil_nome})")
+                                    logger.debug("[ACCESS_SERVICE] Adicionada página: %s (perfil: %s)", pagina_codigo, perfil_nome)
                             else:
                                 # Se é string, usar diretamente
                                 accessible_pages.add(pagina)
-                                logger.debug(f"[ACCESS_SERVICE] Adicionada página: {pagina} (perfil: {perfil_nome})")
+                                logger.debug("[ACCESS_SERVICE] Adicionada página: %s (perfil: %s)", pagina, perfil_nome)
             
             accessible_pages = list(accessible_pages)
-            logger.debug(f"[ACCESS_SERVICE] Basic Users - páginas acessíveis no módulo {modulo_codigo}: {accessible_pages}")
+            logger.debug("[ACCESS_SERVICE] Basic Users - páginas acessíveis no módulo %s: %s", modulo_codigo, accessible_pages)
             return accessible_pages
         
         # Specific Profile Users: Handle users with specific profile names as perfil_principal
@@ -421,7 +421,7 @@ class PerfilAccessService:
                             
                             # If empty list or contains '*', access to all pages
                             if not modulo_paginas or '*' in modulo_paginas:
-                                logger.debug(f"[ACCESS_SERVICE] Perfil {perfil_nome} permite todas as páginas do módulo {modulo_codigo}")
+                                logger.debug("[ACCESS_SERVICE] Perfil %s permite todas as páginas do módulo %s", perfil_nome, modulo_codigo)
                                 return ['*']
                             
                             # Add specific pages
@@ -430,19 +430,19 @@ class PerfilAccessService:
                                     pagina_codigo = pagina.get('codigo')
                                     if pagina_codigo:
                                         accessible_pages.add(pagina_codigo)
-                                        logger.debug(f"[ACCESS_SERVICE] Adicionada página: {pagina_codigo} (perfil: {perfil_nome})")
+                                        logger.debug("[ACCESS_SERVICE] Adicionada página: %s (perfil: %s)", pagina_codigo, perfil_nome)
                                 else:
                                     accessible_pages.add(pagina)
-                                    logger.debug(f"[ACCESS_SERVICE] Adicionada página: {pagina} (perfil: {perfil_nome})")
+                                    logger.debug("[ACCESS_SERVICE] Adicionada página: %s (perfil: %s)", pagina, perfil_nome)
                     break
             
             if found_in_database:
                 accessible_pages = list(accessible_pages)
-                logger.debug(f"[ACCESS_SERVICE] Database-driven access for {user_role}/{user_perfil_principal} in {modulo_codigo}: {accessible_pages}")
+                logger.debug("[ACCESS_SERVICE] Database-driven access for %s/%s in %s: %s", user_role, user_perfil_principal, modulo_codigo, accessible_pages)
                 return accessible_pages
             else:
                 # FALLBACK: Use hardcoded mappings for legacy profiles only
-                logger.debug(f"[ACCESS_SERVICE] Profile {user_perfil_principal} not found in database - checking legacy page mappings")
+                logger.debug("[ACCESS_SERVICE] Profile %s not found in database - checking legacy page mappings", user_perfil_principal)
                 profile_page_access_map = {
                     'financeiro_fluxo_de_caixa': {
                         'financeiro': ['fluxo_caixa'],
@@ -463,14 +463,14 @@ class PerfilAccessService:
                     module_access = profile_config.get(modulo_codigo, [])
                     
                     if module_access:
-                        logger.debug(f"[ACCESS_SERVICE] Legacy mapping for {user_perfil_principal} in {modulo_codigo}: {module_access}")
+                        logger.debug("[ACCESS_SERVICE] Legacy mapping for %s in %s: %s", user_perfil_principal, modulo_codigo, module_access)
                         return module_access
                 
-                logger.debug(f"[ACCESS_SERVICE] No page access found for profile {user_perfil_principal} in module {modulo_codigo}")
+                logger.debug("[ACCESS_SERVICE] No page access found for profile %s in module %s", user_perfil_principal, modulo_codigo)
                 return []
         
         # Fallback - sem acesso
-        logger.debug(f"[ACCESS_SERVICE] Sem acesso definido para role={user_role}, perfil_principal={user_perfil_principal}")
+        logger.debug("[ACCESS_SERVICE] Sem acesso definido para role=%s, perfil_principal=%s", user_role, user_perfil_principal)
         return []
     
     @staticmethod
@@ -528,7 +528,7 @@ class PerfilAccessService:
         # Basic Users: sem capacidades administrativas
         # (capabilities já inicializadas com False)
         
-        logger.debug(f"[ACCESS_SERVICE] Capacidades administrativas para {user_email}: {capabilities}")
+        logger.debug("[ACCESS_SERVICE] Capacidades administrativas para %s: %s", user_email, capabilities)
         return capabilities
     
     @staticmethod
@@ -562,7 +562,7 @@ class PerfilAccessService:
                         can_access = True
                         break
         
-        logger.debug(f"[ACCESS_SERVICE] Usuário pode acessar módulo {modulo_codigo}: {can_access}")
+        logger.debug("[ACCESS_SERVICE] Usuário pode acessar módulo %s: %s", modulo_codigo, can_access)
         return can_access
     
     @staticmethod
@@ -579,7 +579,7 @@ class PerfilAccessService:
         """
         # Primeiro verificar se tem acesso ao módulo
         if not PerfilAccessService.user_can_access_module(modulo_codigo):
-            logger.debug(f"[ACCESS_SERVICE] Acesso negado - sem acesso ao módulo {modulo_codigo}")
+            logger.debug("[ACCESS_SERVICE] Acesso negado - sem acesso ao módulo %s", modulo_codigo)
             return False
         
         # Verificar acesso à página específica
@@ -587,12 +587,12 @@ class PerfilAccessService:
         
         # Se tem acesso a todas as páginas
         if '*' in accessible_pages:
-            logger.debug(f"[ACCESS_SERVICE] Acesso permitido - todas as páginas do módulo {modulo_codigo}")
+            logger.debug("[ACCESS_SERVICE] Acesso permitido - todas as páginas do módulo %s", modulo_codigo)
             return True
         
         # Verificar página específica
         can_access = pagina_codigo in accessible_pages
-        logger.debug(f"[ACCESS_SERVICE] Usuário pode acessar página {pagina_codigo} do módulo {modulo_codigo}: {can_access}")
+        logger.debug("[ACCESS_SERVICE] Usuário pode acessar página %s do módulo %s: %s", pagina_codigo, modulo_codigo, can_access)
         return can_access
     
     @staticmethod
@@ -604,7 +604,7 @@ class PerfilAccessService:
             dict: Estrutura de menu com apenas itens acessíveis
         """
         user = session.get('user', {})
-        logger.debug(f"[ACCESS_SERVICE] Gerando menu filtrado para {user.get('email')}")
+        logger.debug("[ACCESS_SERVICE] Gerando menu filtrado para %s", user.get('email'))
         
         # Estrutura completa do menu (definir conforme sua estrutura atual)
         complete_menu = {
@@ -731,7 +731,7 @@ class PerfilAccessService:
                             filtered_modulo['paginas'][pagina_codigo] = pagina_info
                 
                 filtered_menu[modulo_codigo] = filtered_modulo
-                logger.debug(f"[ACCESS_SERVICE] Módulo {modulo_codigo} adicionado ao menu filtrado")
+                logger.debug("[ACCESS_SERVICE] Módulo %s adicionado ao menu filtrado", modulo_codigo)
         
-        logger.debug(f"[ACCESS_SERVICE] Menu filtrado gerado com {len(filtered_menu)} módulos")
+        logger.debug("[ACCESS_SERVICE] Menu filtrado gerado com %s módulos", len(filtered_menu))
         return filtered_menu
@@ -0,0 +1,413 @@
+"""
+Perfil de desempenho por endpoint.
+
+Até aqui só havia medições avulsas (X-Export-Duration nas exportações,
+prints [PRELOAD] no DataCacheService). Este módulo mede toda requisição e,
+sob demanda, amostra a pilha de execução:
+
+- histograma de latência por endpoint, com o tempo separado em espera do
+  banco (chamadas Supabase pelo pool de services/supabase_transport.py),
+  serialização (render_template / jsonify) e Python (o restante: CPU da view
+  e esperas que não passam pelo pool)
+- amostragem de pilha por SIGPROF (tempo de CPU, intervalo
+  PROFILING_INTERVAL_MS) apenas nas requisições escolhidas: endpoints
+  habilitados (env PROFILING_ENDPOINTS ou painel /desempenho) ou header
+  X-Profile: 1 enviado por administrador. O resultado vai para
+  PROFILING_DIR no formato "folded" (flamegraph.pl, speedscope)
+
+Os ganchos de requisição ficam no RobustLoggingMiddleware; o painel de
+administração (modules/desempenho) lista os endpoints mais lentos.
+
+Usage:
+    from services.profiling import profiler
+
+    profiler.enable_endpoint('dashboard_v2.index')
+    profiler.slowest(limit=20)
+    profiler.recent_profiles()
+"""
+
+from contextvars import ContextVar
+from collections import Counter, deque
+import os
+import re
+import signal
+import sys
+import tempfile
+import threading
+import time
+
+from flask import request, session, before_render_template, template_rendered
+from flask.json.provider import DefaultJSONProvider
+
+PROFILING_SAMPLER = os.getenv('PROFILING_SAMPLER', '1').lower() in ('1', 'true', 'yes', 'on')
+PROFILING_INTERVAL_MS = float(os.getenv('PROFILING_INTERVAL_MS', '5'))
+PROFILING_DIR = os.getenv('PROFILING_DIR', os.path.join(tempfile.gettempdir(), 'unique_profiles'))
+PROFILING_MAX_FILES = int(os.getenv('PROFILING_MAX_FILES', '200'))
+PROFILING_ENDPOINTS = [e.strip() for e in os.getenv('PROFILING_ENDPOINTS', '').split(',') if e.strip()]
+PROFILING_HEADER = 'X-Profile'
+MAX_STACK_DEPTH = 128
+
+# Limites superiores dos buckets do histograma (ms); o último recebe o resto
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float('inf'))
+
+_current = ContextVar('profiling_request', default=None)
+
+
+class RequestTiming:
+    """Tempos acumulados de uma requisição"""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.db_s = 0.0
+        self.db_calls = 0
+        self.serialization_s = 0.0
+        self.render_started = []
+        self.session = None
+
+    def breakdown(self):
+        total_s = time.perf_counter() - self.started
+        python_s = max(total_s - self.db_s - self.serialization_s, 0.0)
+        return total_s, self.db_s, python_s, self.serialization_s
+
+
+def record_db_wait(elapsed):
+    """Chamado pelo transporte do Supabase ao fim de cada chamada HTTP"""
+    timing = _current.get()
+    if timing is not None:
+        timing.db_s += elapsed
+        timing.db_calls += 1
+
+
+def _add_serialization(elapsed):
+    timing = _current.get()
+    if timing is not None:
+        timing.serialization_s += elapsed
+
+
+class _TimedJSONProvider(DefaultJSONProvider):
+    """Provider JSON padrão do Flask, medindo o tempo de dumps (jsonify)"""
+
+    def dumps(self, obj, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            _add_serialization(time.perf_counter() - started)
+
+
+def _on_before_render(sender, template, context, **extra):
+    timing = _current.get()
+    if timing is not None:
+        timing.render_started.append(time.perf_counter())
+
+
+def _on_rendered(sender, template, context, **extra):
+    timing = _current.get()
+    if timing is not None and timing.render_started:
+        _add_serialization(time.perf_counter() - timing.render_started.pop())
+
+
+class EndpointHistogram:
+    """Latências de um endpoint em buckets fixos, com somas por componente"""
+
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS_MS)
+        self.count = 0
+        self.errors = 0
+        self.total_s = 0.0
+        self.db_s = 0.0
+        self.python_s = 0.0
+        self.serialization_s = 0.0
+        self.db_calls = 0
+        self.max_s = 0.0
+
+    def add(self, total_s, db_s, python_s, serialization_s, db_calls, error):
+        total_ms = total_s * 1000
+        for index, limit in enumerate(LATENCY_BUCKETS_MS):
+            if total_ms <= limit:
+                self.buckets[index] += 1
+                break
+        self.count += 1
+        self.errors += 1 if error else 0
+        self.total_s += total_s
+        self.db_s += db_s
+        self.python_s += python_s
+        self.serialization_s += serialization_s
+        self.db_calls += db_calls
+        self.max_s = max(self.max_s, total_s)
+
+    def percentile(self, fraction):
+        """Limite superior do bucket que contém o percentil (ms)"""
+        if not self.count:
+            return 0.0
+        threshold = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= threshold:
+                limit = LATENCY_BUCKETS_MS[index]
+                return round(self.max_s * 1000, 1) if limit == float('inf') else limit
+        return round(self.max_s * 1000, 1)
+
+    def to_dict(self):
+        count = self.count or 1
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'avg_ms': round(self.total_s * 1000 / count, 1),
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'max_ms': round(self.max_s * 1000, 1),
+            'db_ms': round(self.db_s * 1000 / count, 1),
+            'python_ms': round(self.python_s * 1000 / count, 1),
+            'serialization_ms': round(self.serialization_s * 1000 / count, 1),
+            'db_calls': round(self.db_calls / count, 1),
+            'buckets': {('+inf' if limit == float('inf') else f'{limit:g}'): n
+                        for limit, n in zip(LATENCY_BUCKETS_MS, self.buckets)},
+        }
+
+
+class ProfileSession:
+    """Amostras de pilha de uma requisição perfilada"""
+
+    def __init__(self, endpoint, reason, task):
+        self.endpoint = endpoint
+        self.reason = reason
+        self.task = task
+        self.samples = Counter()
+        self.started_at = time.time()
+
+    def add(self, frame):
+        stack = []
+        while frame is not None and len(stack) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            stack.append(f'{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})')
+            frame = frame.f_back
+        if stack:
+            self.samples[';'.join(reversed(stack))] += 1
+
+
+_cwd = os.getcwd()
+
+
+def _short_path(filename):
+    if filename.startswith(_cwd):
+        return filename[len(_cwd):].lstrip(os.sep)
+    marker = filename.rfind('site-packages')
+    return filename[marker + 14:] if marker != -1 else filename
+
+
+class StackSampler:
+    """Amostragem por SIGPROF das requisições ativas.
+
+    Com gevent todas as requisições rodam em greenlets da thread principal: a
+    amostra vale para a sessão cujo greenlet está em execução no sinal. Sem
+    gevent (servidor de desenvolvimento com threads) a pilha de cada thread
+    perfilada é lida de sys._current_frames().
+    """
+
+    def __init__(self, interval_ms=PROFILING_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self.installed = False
+        self.greenlets = False
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def install(self):
+        if self.installed or not hasattr(signal, 'SIGPROF'):
+            return self.installed
+        try:
+            signal.signal(signal.SIGPROF, self._handle)
+        except ValueError:
+            # signal.signal só pode ser chamado da thread principal
+            print("[PROFILING] Amostragem indisponível: app não importado na thread principal")
+            return False
+        try:
+            from gevent import monkey
+            self.greenlets = monkey.is_module_patched('threading')
+        except ImportError:
+            self.greenlets = False
+        self.installed = True
+        return True
+
+    def current_task(self):
+        if self.greenlets:
+            import greenlet
+            return greenlet.getcurrent()
+        return threading.get_ident()
+
+    def start(self, session):
+        with self._lock:
+            self._active[id(session)] = session
+            if len(self._active) == 1:
+                signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self, session):
+        with self._lock:
+            self._active.pop(id(session), None)
+            if not self._active:
+                signal.setitimer(signal.ITIMER_PROF, 0, 0)
+
+    def _handle(self, signum, frame):
+        sessions = list(self._active.values())
+        if not sessions:
+            return
+        if self.greenlets:
+            current = self.current_task()
+            for session in sessions:
+                if session.task is current:
+                    session.add(frame)
+            return
+        frames = sys._current_frames()
+        for session in sessions:
+            session.add(frames.get(session.task))
+
+
+class Profiler:
+    """Histogramas por endpoint e amostragem sob demanda"""
+
+    def __init__(self):
+        self.endpoints = set(PROFILING_ENDPOINTS)
+        self.sampler = StackSampler()
+        self.directory = PROFILING_DIR
+        self._histograms = {}
+        self._profiles = deque(maxlen=50)
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Instala a medição de serialização e o handler de amostragem"""
+        if type(app.json) is DefaultJSONProvider:
+            provider = _TimedJSONProvider(app)
+            provider.__dict__.update(app.json.__dict__)
+            app.json = provider
+        before_render_template.connect(_on_before_render, app)
+        template_rendered.connect(_on_rendered, app)
+        if PROFILING_SAMPLER and self.sampler.install():
+            print(f"[PROFILING] Amostragem disponível ({PROFILING_INTERVAL_MS:g}ms, endpoints: {sorted(self.endpoints) or 'nenhum'})")
+
+    # ---- endpoints habilitados ----
+
+    def enable_endpoint(self, endpoint):
+        self.endpoints.add(endpoint)
+
+    def disable_endpoint(self, endpoint):
+        self.endpoints.discard(endpoint)
+
+    def _profile_reason(self, endpoint):
+        if not self.sampler.installed:
+            return None
+        if endpoint in self.endpoints:
+            return 'endpoint'
+        if request.headers.get(PROFILING_HEADER, '').lower() in ('1', 'true') and session.get('user_role') == 'admin':
+            return 'header'
+        return None
+
+    # ---- ciclo da requisição ----
+
+    def start_request(self):
+        endpoint = request.endpoint or 'unmatched'
+        timing = RequestTiming(endpoint)
+        reason = self._profile_reason(endpoint)
+        if reason:
+            timing.session = ProfileSession(endpoint, reason, self.sampler.current_task())
+            self.sampler.start(timing.session)
+        _current.set(timing)
+
+    def finish_request(self, response=None, error=False):
+        timing = _current.get()
+        if timing is None:
+            return response
+        _current.set(None)
+        if timing.session is not None:
+            self.sampler.stop(timing.session)
+        total_s, db_s, python_s, serialization_s = timing.breakdown()
+        if response is not None:
+            error = error or response.status_code >= 500
+        if not _is_static(timing.endpoint):
+            with self._lock:
+                histogram = self._histograms.get(timing.endpoint)
+                if histogram is None:
+                    histogram = self._histograms[timing.endpoint] = EndpointHistogram()
+                histogram.add(total_s, db_s, python_s, serialization_s, timing.db_calls, error)
+        if timing.session is not None:
+            filename = self._write_profile(timing.session, total_s)
+            if response is not None:
+                response.headers['Server-Timing'] = (
+                    f'db;dur={db_s * 1000:.1f}, python;dur={python_s * 1000:.1f}, '
+                    f'serialization;dur={serialization_s * 1000:.1f}, total;dur={total_s * 1000:.1f}')
+                if filename:
+                    response.headers['X-Profile-File'] = filename
+        return response
+
+    # ---- perfis gravados ----
+
+    def _write_profile(self, profile, total_s):
+        if not profile.samples:
+            return None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            safe_endpoint = re.sub(r'[^A-Za-z0-9_.-]', '_', profile.endpoint)
+            filename = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(profile.started_at))}_{safe_endpoint}_{os.getpid()}.folded"
+            with open(os.path.join(self.directory, filename), 'w', encoding='utf-8') as f:
+                for stack, count in profile.samples.most_common():
+                    f.write(f'{stack} {count}\n')
+            self._profiles.appendleft({
+                'file': filename,
+                'endpoint': profile.endpoint,
+                'reason': profile.reason,
+                'samples': sum(profile.samples.values()),
+                'duration_ms': round(total_s * 1000, 1),
+                'created_at': profile.started_at,
+            })
+            self._rotate()
+            return filename
+        except Exception as e:
+            print(f"[PROFILING] Falha ao gravar perfil de {profile.endpoint}: {e}")
+            return None
+
+    def _rotate(self):
+        files = sorted(f for f in os.listdir(self.directory) if f.endswith('.folded'))
+        for old in files[:-PROFILING_MAX_FILES]:
+            try:
+                os.remove(os.path.join(self.directory, old))
+            except OSError:
+                pass
+
+    def profile_path(self, filename):
+        """Caminho de um perfil gravado (None se o nome não for um arquivo do diretório)"""
+        if os.path.basename(filename) != filename or not filename.endswith('.folded'):
+            return None
+        path = os.path.join(self.directory, filename)
+        return path if os.path.isfile(path) else None
+
+    def recent_profiles(self):
+        return list(self._profiles)
+
+    # ---- consulta ----
+
+    def slowest(self, limit=20, order_by='p95_ms'):
+        with self._lock:
+            rows = [dict(endpoint=endpoint, **histogram.to_dict()) for endpoint, histogram in self._histograms.items()]
+        for row in rows:
+            row['profiling'] = row['endpoint'] in self.endpoints
+        rows.sort(key=lambda row: (row.get(order_by, 0), row['avg_ms']), reverse=True)
+        return rows[:limit]
+
+    def stats(self):
+        return {
+            'pid': os.getpid(),
+            'sampler': self.sampler.installed,
+            'interval_ms': PROFILING_INTERVAL_MS,
+            'endpoints_profiled': sorted(self.endpoints),
+            'endpoints_measured': len(self._histograms),
+            'directory': self.directory,
+        }
+
+
+def _is_static(endpoint):
+    return endpoint == 'static' or endpoint.endswith('.static')
+
+
+# Instância única do processo
+profiler = Profiler()
@@ -0,0 +1,205 @@
+"""
+Rastreamento das consultas ao Supabase por requisição.
+
+Vários handlers fazem consultas em sequência, e algumas são N+1 (uma
+consulta por ref_unique em calculate_custo_from_vw_despesas, uma URL
+assinada por documento, uma verificação por CNPJ...). Cada chamada
+PostgREST feita pelo pool de services/supabase_transport.py é registrada
+aqui com tabela, filtros, linhas, bytes e latência, dentro da requisição
+Flask em curso. Consultas com o mesmo formato (método, tabela, colunas e
+operadores dos filtros, sem os valores) repetidas QUERY_TRACE_N1_THRESHOLD
+vezes na mesma requisição são sinalizadas como N+1.
+
+Ao fim da requisição:
+- N+1 é impresso com a tag [QUERY_TRACE] e acumulado por endpoint
+  (query_tracer.offenders(), listado em /desempenho)
+- em modo debug (ou QUERY_TRACE_HEADER=1) a resposta recebe o header
+  X-Query-Trace com o resumo
+
+Usage:
+    from services.query_tracing import query_tracer
+
+    query_tracer.current()    # consultas da requisição em curso
+    query_tracer.offenders()  # endpoints com N+1 recorrente
+"""
+
+from contextvars import ContextVar
+from urllib.parse import unquote
+import os
+import threading
+
+from flask import current_app, request
+
+QUERY_TRACE_N1_THRESHOLD = int(os.getenv('QUERY_TRACE_N1_THRESHOLD', '3'))
+QUERY_TRACE_HEADER = os.getenv('QUERY_TRACE_HEADER', '0').lower() in ('1', 'true', 'yes', 'on')
+# Limite de consultas guardadas por requisição (as demais só entram nos totais)
+QUERY_TRACE_MAX_CALLS = int(os.getenv('QUERY_TRACE_MAX_CALLS', '500'))
+
+REST_PREFIX = '/rest/v1/'
+# Parâmetros PostgREST que não são filtros
+NON_FILTER_PARAMS = ('select', 'order', 'limit', 'offset', 'on_conflict', 'columns')
+
+_current = ContextVar('query_trace', default=None)
+
+
+def _parse_filters(params):
+    """Filtros PostgREST (coluna=op.valor) e o formato sem os valores"""
+    filters = []
+    shape = []
+    for key, value in params.multi_items():
+        if key in NON_FILTER_PARAMS:
+            continue
+        operator = value.split('.', 1)[0] if '.' in value else ''
+        if key in ('or', 'and') or not operator.isalpha():
+            operator = ''
+        filters.append(f'{key}={value[:200]}')
+        shape.append(f'{key}:{operator}' if operator else key)
+    return filters, tuple(sorted(shape))
+
+
+def _row_count(response_headers):
+    """Linhas retornadas segundo o Content-Range do PostgREST (ex.: 0-24/*)"""
+    content_range = response_headers.get('content-range', '')
+    span = content_range.split('/', 1)[0]
+    if '-' not in span:
+        return 0 if span == '*' else None
+    start, _, end = span.partition('-')
+    try:
+        return int(end) - int(start) + 1
+    except ValueError:
+        return None
+
+
+class RequestTrace:
+    """Consultas de uma requisição"""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.calls = []
+        self.total_calls = 0
+        self.total_ms = 0.0
+        self.total_bytes = 0
+        self.shapes = {}
+        self._lock = threading.Lock()
+
+    def add(self, call, shape):
+        with self._lock:
+            self.total_calls += 1
+            self.total_ms += call['ms']
+            self.total_bytes += call['bytes']
+            group = self.shapes.setdefault(shape, {'count': 0, 'ms': 0.0, 'table': call['table'], 'method': call['method']})
+            group['count'] += 1
+            group['ms'] += call['ms']
+            if len(self.calls) < QUERY_TRACE_MAX_CALLS:
+                self.calls.append(call)
+
+    def n_plus_one(self):
+        return [
+            {'method': group['method'], 'table': group['table'], 'shape': list(shape[2]),
+             'count': group['count'], 'total_ms': round(group['ms'], 1)}
+            for shape, group in self.shapes.items()
+            if group['count'] >= QUERY_TRACE_N1_THRESHOLD
+        ]
+
+    def summary(self):
+        return {
+            'endpoint': self.endpoint,
+            'queries': self.total_calls,
+            'db_ms': round(self.total_ms, 1),
+            'bytes': self.total_bytes,
+            'n_plus_one': self.n_plus_one(),
+        }
+
+
+class QueryTracer:
+    """Registro das consultas por requisição e agregado de N+1 por endpoint"""
+
+    def __init__(self):
+        self._offenders = {}  # (endpoint, method, table, shape) -> contadores
+        self._lock = threading.Lock()
+
+    # ---- ciclo da requisição (chamado pelo RobustLoggingMiddleware) ----
+
+    def start_request(self):
+        _current.set(RequestTrace(request.endpoint or 'unmatched'))
+
+    def finish_request(self, response=None):
+        trace = _current.get()
+        if trace is None:
+            return response
+        _current.set(None)
+        if not trace.total_calls:
+            return response
+        offenders = trace.n_plus_one()
+        if offenders:
+            self._record_offenders(trace.endpoint, offenders)
+            for offender in offenders:
+                print(f"[QUERY_TRACE] N+1 em {trace.endpoint}: {offender['count']}x {offender['method']} "
+                      f"{offender['table']} ({', '.join(offender['shape']) or 'sem filtros'}) - {offender['total_ms']}ms")
+        if response is not None and (QUERY_TRACE_HEADER or current_app.debug):
+            response.headers['X-Query-Trace'] = self._header(trace, offenders)
+        return response
+
+    def _header(self, trace, offenders):
+        parts = [f'queries={trace.total_calls}', f'db_ms={trace.total_ms:.1f}', f'bytes={trace.total_bytes}']
+        for offender in offenders:
+            parts.append(f"n+1={offender['table']}({','.join(offender['shape'])})x{offender['count']}")
+        return '; '.join(parts)
+
+    def _record_offenders(self, endpoint, offenders):
+        with self._lock:
+            for offender in offenders:
+                key = (endpoint, offender['method'], offender['table'], tuple(offender['shape']))
+                stats = self._offenders.setdefault(key, {'requests': 0, 'queries': 0, 'total_ms': 0.0, 'max_repeat': 0})
+                stats['requests'] += 1
+                stats['queries'] += offender['count']
+                stats['total_ms'] += offender['total_ms']
+                stats['max_repeat'] = max(stats['max_repeat'], offender['count'])
+
+    # ---- registro (chamado pelo transporte) ----
+
+    def record(self, http_request, status_code, response_headers, elapsed, bytes_read):
+        trace = _current.get()
+        if trace is None:
+            return
+        path = unquote(http_request.url.path)
+        if REST_PREFIX not in path:
+            return
+        table = path.split(REST_PREFIX, 1)[1]
+        filters, filter_shape = _parse_filters(http_request.url.params)
+        select = http_request.url.params.get('select', '')
+        call = {
+            'method': http_request.method,
+            'table': table,
+            'select': select[:200],
+            'filters': filters,
+            'status': status_code,
+            'rows': _row_count(response_headers) if response_headers is not None else None,
+            'bytes': bytes_read,
+            'ms': round(elapsed * 1000, 1),
+        }
+        trace.add(call, (http_request.method, table, filter_shape, select))
+
+    # ---- consulta ----
+
+    def current(self):
+        """Consultas e resumo da requisição em curso (None fora de requisição)"""
+        trace = _current.get()
+        if trace is None:
+            return None
+        return dict(trace.summary(), calls=list(trace.calls))
+
+    def offenders(self, limit=30):
+        with self._lock:
+            rows = [
+                {'endpoint': endpoint, 'method': method, 'table': table, 'shape': list(shape),
+                 'requests': stats['requests'], 'avg_repeat': round(stats['queries'] / stats['requests'], 1),
+                 'max_repeat': stats['max_repeat'], 'total_ms': round(stats['total_ms'], 1)}
+                for (endpoint, method, table, shape), stats in self._offenders.items()
+            ]
+        rows.sort(key=lambda row: row['total_ms'], reverse=True)
+        return rows[:limit]
+
+
+# Instância única do processo
+query_tracer = QueryTracer()
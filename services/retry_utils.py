@@ -2,14 +2,264 @@
 Retry utilities to make Supabase calls resilient to transient errors like
 "Server disconnected" or timeouts without changing existing behavior.
 
+Retries are driven by named policies:
+- jittered exponential backoff, sleeping cooperatively under gevent
+- errors classified by exception type / HTTP status (message matching only as
+  a fallback for errors the SDK wraps as plain exceptions)
+- a retry budget per policy: retries are allowed up to a fraction of recent
+  calls, so an outage does not turn every request into max_attempts requests
+- optional hedging for idempotent reads: if the first attempt is slow, a
+  second one is started and the first result wins
+- per-policy metrics via retry_policy_stats()
+
 Usage:
-    from services.retry_utils import run_with_retries
+    from services.retry_utils import run_with_policy, run_with_retries
+    result = run_with_policy('supabase.read', 'logos-clientes', lambda: supabase_admin.table(...).execute())
+
+    # Legacy signature (runs under the 'default' policy, retrying any Exception)
     result = run_with_retries('logos-clientes', lambda: supabase_admin.table(...).execute())
 """
 
-from typing import Callable, Tuple, Type, Any, Optional
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional, Tuple, Type
+import contextvars
+import os
+import random
+import threading
 import time
 
+RETRYABLE_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+RETRYABLE_MESSAGES = ('server disconnected', 'timeout', 'timed out', 'connection reset', 'connection aborted')
+
+BUDGET_WINDOW_SECONDS = float(os.getenv('RETRY_BUDGET_WINDOW', '10'))
+HEDGE_MAX_WORKERS = int(os.getenv('RETRY_HEDGE_WORKERS', '16'))
+
+_hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_MAX_WORKERS, thread_name_prefix='retry-hedge')
+
+
+def _transient_types() -> Tuple[Type[BaseException], ...]:
+    types = [ConnectionError, TimeoutError]
+    try:
+        import httpx
+        types += [httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError]
+    except ImportError:
+        pass
+    try:
+        import requests
+        types += [requests.exceptions.ConnectionError, requests.exceptions.Timeout]
+    except ImportError:
+        pass
+    return tuple(types)
+
+
+TRANSIENT_EXCEPTIONS = _transient_types()
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    response = getattr(exc, 'response', None)
+    status = getattr(response, 'status_code', None) or getattr(exc, 'status_code', None)
+    if status is None:
+        # postgrest APIError: code carries the HTTP status when the failure is not a Postgres error
+        code = getattr(exc, 'code', None)
+        if isinstance(code, (int, str)) and str(code).isdigit() and len(str(code)) == 3:
+            status = int(code)
+    return status
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Default classification: network/timeout errors and retryable HTTP statuses"""
+    try:
+        from services.supabase_transport import SupabaseUnavailable
+        if isinstance(exc, SupabaseUnavailable):
+            # Circuit breaker open: retrying only adds load
+            return False
+    except ImportError:
+        pass
+    if isinstance(exc, TRANSIENT_EXCEPTIONS):
+        return True
+    status = _status_code(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    message = str(exc).lower()
+    return any(fragment in message for fragment in RETRYABLE_MESSAGES)
+
+
+def _sleep(seconds: float) -> None:
+    """Sleep that yields to other greenlets under gevent"""
+    try:
+        import gevent
+        from gevent import monkey
+        if monkey.is_module_patched('time'):
+            gevent.sleep(seconds)
+            return
+    except ImportError:
+        pass
+    time.sleep(seconds)
+
+
+class RetryBudget:
+    """Retries allowed in a sliding window: max(min_retries, ratio * calls)"""
+
+    def __init__(self, ratio: float = 0.2, min_retries: int = 10, window: float = BUDGET_WINDOW_SECONDS):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._calls: deque = deque()
+        self._retries: deque = deque()
+        self._lock = threading.Lock()
+
+    def _trim(self, now: float) -> None:
+        limit = now - self.window
+        for events in (self._calls, self._retries):
+            while events and events[0] < limit:
+                events.popleft()
+
+    def record_call(self) -> None:
+        with self._lock:
+            now = time.time()
+            self._trim(now)
+            self._calls.append(now)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            now = time.time()
+            self._trim(now)
+            if len(self._retries) >= max(self.min_retries, self.ratio * len(self._calls)):
+                return False
+            self._retries.append(now)
+            return True
+
+
+class RetryPolicy:
+    """Named retry policy.
+
+    - max_attempts: total attempts including the first
+    - base_delay / max_delay / multiplier: exponential backoff with full jitter
+    - classify: predicate deciding whether an error is retryable
+    - hedge_after: seconds before starting a hedged attempt (idempotent reads only)
+    """
+
+    def __init__(self, name: str, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0,
+                 multiplier: float = 2.0, classify: Callable[[BaseException], bool] = is_transient,
+                 budget: Optional[RetryBudget] = None, hedge_after: Optional[float] = None):
+        self.name = name
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.classify = classify
+        self.budget = budget or RetryBudget()
+        self.hedge_after = hedge_after
+        self.metrics = {'calls': 0, 'successes': 0, 'failures': 0, 'retries': 0,
+                        'retries_denied': 0, 'hedges': 0, 'hedge_wins': 0, 'total_s': 0.0}
+        self._metrics_lock = threading.Lock()
+
+    def backoff(self, attempt: int, base_delay: Optional[float] = None) -> float:
+        base = self.base_delay if base_delay is None else base_delay
+        ceiling = min(self.max_delay, base * (self.multiplier ** (attempt - 1)))
+        return random.uniform(0, ceiling)
+
+    def _count(self, **increments) -> None:
+        with self._metrics_lock:
+            for key, value in increments.items():
+                self.metrics[key] += value
+
+    def run(self, label: str, func: Callable[[], Any], max_attempts: Optional[int] = None,
+            base_delay: Optional[float] = None, classify: Optional[Callable[[BaseException], bool]] = None) -> Any:
+        """Run func under this policy; max_attempts/base_delay/classify override it for this call"""
+        max_attempts = max_attempts or self.max_attempts
+        classify = classify or self.classify
+        started = time.perf_counter()
+        self.budget.record_call()
+        self._count(calls=1)
+        attempt = 1
+        try:
+            while True:
+                try:
+                    result = self._attempt(func)
+                    self._count(successes=1)
+                    return result
+                except Exception as exc:
+                    retry_allowed = classify(exc)
+                    print(f"[RETRY] {label} attempt {attempt}/{max_attempts} failed: {exc}")
+                    if not retry_allowed or attempt >= max_attempts:
+                        raise
+                    if not self.budget.try_spend():
+                        self._count(retries_denied=1)
+                        print(f"[RETRY] {label} retry budget of policy '{self.name}' exhausted")
+                        raise
+                    self._count(retries=1)
+                    _sleep(self.backoff(attempt, base_delay))
+                    attempt += 1
+        except Exception:
+            self._count(failures=1)
+            raise
+        finally:
+            self._count(total_s=time.perf_counter() - started)
+
+    def _attempt(self, func: Callable[[], Any]) -> Any:
+        if not self.hedge_after:
+            return func()
+        # Each attempt runs in its own copy of the caller's context (call class, etc.)
+        primary = _hedge_executor.submit(contextvars.copy_context().run, func)
+        done, _ = wait([primary], timeout=self.hedge_after)
+        if done:
+            return primary.result()
+        self._count(hedges=1)
+        hedge = _hedge_executor.submit(contextvars.copy_context().run, func)
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self._count(hedge_wins=1)
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def stats(self) -> Dict[str, Any]:
+        with self._metrics_lock:
+            metrics = dict(self.metrics)
+        total_s = metrics.pop('total_s')
+        metrics['avg_ms'] = round(total_s * 1000 / metrics['calls'], 1) if metrics['calls'] else 0.0
+        metrics.update(max_attempts=self.max_attempts, hedge_after=self.hedge_after)
+        return metrics
+
+
+_policies: Dict[str, RetryPolicy] = {}
+
+
+def register_policy(policy: RetryPolicy) -> RetryPolicy:
+    _policies[policy.name] = policy
+    return policy
+
+
+def get_policy(name: str) -> RetryPolicy:
+    return _policies[name]
+
+
+def retry_policy_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: policy.stats() for name, policy in _policies.items()}
+
+
+# Default policies
+register_policy(RetryPolicy('default', max_attempts=3, base_delay=0.75))
+register_policy(RetryPolicy('supabase.read', max_attempts=3, base_delay=0.5))
+register_policy(RetryPolicy('supabase.read.hedged', max_attempts=3, base_delay=0.5,
+                            hedge_after=float(os.getenv('RETRY_HEDGE_AFTER_SECONDS', '2.5'))))
+register_policy(RetryPolicy('supabase.write', max_attempts=3, base_delay=0.5,
+                            budget=RetryBudget(ratio=0.1, min_retries=5)))
+
+
+def run_with_policy(policy: Any, label: str, func: Callable[[], Any]) -> Any:
+    """Run a callable under a named (or given) retry policy"""
+    if isinstance(policy, str):
+        policy = get_policy(policy)
+    return policy.run(label, func)
+
 
 def run_with_retries(label: str,
                      func: Callable[[], Any],
@@ -17,34 +267,21 @@ def run_with_retries(label: str,
                      base_delay_seconds: float = 0.75,
                      retry_exceptions: Tuple[Type[BaseException], ...] = (Exception,),
                      should_retry: Optional[Callable[[BaseException], bool]] = None) -> Any:
-    """Run a callable with small exponential backoff retries.
+    """Run a callable with jittered exponential backoff retries.
 
     - label: short label for logs
     - func: no-arg callable that executes the operation and returns the result
     - max_attempts: total attempts including the first
-    - base_delay_seconds: initial delay; grows linearly per attempt
+    - base_delay_seconds: initial backoff ceiling; doubles per attempt
     - retry_exceptions: tuple of exception types to catch and retry
     - should_retry: optional predicate to further filter retryable errors
+      (without it every error in retry_exceptions is retried, as before the
+      policies; pass should_retry=is_transient to opt into classification)
     """
-    attempt = 1
-    last_exc: Optional[BaseException] = None
-    while attempt <= max_attempts:
-        try:
-            return func()
-        except retry_exceptions as exc:  # type: ignore
-            last_exc = exc
-            msg = str(exc)
-            retry_allowed = True if should_retry is None else should_retry(exc)
-            print(f"[RETRY] {label} attempt {attempt}/{max_attempts} failed: {msg}")
-            if not retry_allowed or attempt == max_attempts:
-                break
-            delay = base_delay_seconds * attempt
-            try:
-                time.sleep(delay)
-            except Exception:
-                pass
-            attempt += 1
-    # Exhausted retries
-    if last_exc:
-        raise last_exc
-    raise RuntimeError(f"{label} failed without exception but returned no result")
+    def _classify(exc: BaseException) -> bool:
+        if not isinstance(exc, retry_exceptions):
+            return False
+        return True if should_retry is None else should_retry(exc)
+
+    return get_policy('default').run(label, func, max_attempts=max_attempts,
+                                     base_delay=base_delay_seconds, classify=_classify)
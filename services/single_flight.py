@@ -0,0 +1,128 @@
+"""
+Coalescência de requisições (single-flight) para cargas idênticas e concorrentes.
+
+Quando várias requisições pedem o mesmo conjunto de dados ao mesmo tempo
+(ex.: /load-data, /kpis e /charts disparados juntos, ou vários usuários
+logando às 8h), apenas a primeira executa a consulta; as demais aguardam
+e recebem o mesmo resultado. A chave é uma impressão digital da consulta
+(tabela, filtros, projeção), portanto vale entre usuários.
+
+Sob Gunicorn com workers gevent o módulo threading é monkey-patched, então
+o Event usado aqui cede o controle cooperativamente enquanto aguarda.
+
+Usage:
+    from services.single_flight import single_flight, query_fingerprint, copy_rows
+
+    key = query_fingerprint('vw_importacoes_6_meses', {'cnpj_importador': cnpjs})
+    rows = single_flight.do(key, lambda: query.execute().data or [], copy=copy_rows)
+"""
+
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+import hashlib
+import json
+import threading
+
+from log_config import log_printf
+
+
+def query_fingerprint(table: str, filters: Optional[dict] = None, projection: str = '*', **extra) -> str:
+    """Gera uma chave estável para (tabela, filtros, projeção).
+
+    Listas de filtros são ordenadas para que a mesma combinação de CNPJs
+    gere a mesma chave independentemente da ordem.
+    """
+    normalized = {}
+    for key, value in (filters or {}).items():
+        if isinstance(value, (list, tuple, set)):
+            value = sorted(str(v) for v in value)
+        normalized[key] = value
+    payload = json.dumps(
+        {'table': table, 'filters': normalized, 'projection': projection, 'extra': extra},
+        sort_keys=True, default=str
+    )
+    return f"{table}:{hashlib.sha1(payload.encode('utf-8')).hexdigest()}"
+
+
+def copy_rows(rows: Any) -> Any:
+    """Cópia rasa das linhas para que cada chamador possa enriquecê-las sem interferir nos outros"""
+    if isinstance(rows, list):
+        return [dict(row) if isinstance(row, dict) else row for row in rows]
+    return rows
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Registro limitado de chamadas em andamento, indexado por chave"""
+
+    def __init__(self, max_keys: int = 1024, wait_timeout: float = 120.0):
+        self.max_keys = max_keys
+        self.wait_timeout = wait_timeout
+        self._calls: 'OrderedDict[str, _Call]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'leaders': 0, 'coalesced': 0, 'bypassed': 0}
+
+    def do(self, key: str, func: Callable[[], Any], copy: Optional[Callable[[Any], Any]] = None) -> Any:
+        """Executa func uma única vez por chave entre chamadas concorrentes.
+
+        - key: chave da consulta (ver query_fingerprint)
+        - func: callable sem argumentos que executa a carga
+        - copy: função opcional aplicada ao resultado entregue aos seguidores
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.stats['coalesced'] += 1
+                leader = False
+            elif len(self._calls) >= self.max_keys:
+                # Registro cheio: executa sem coalescer em vez de crescer sem limite
+                self.stats['bypassed'] += 1
+                call = None
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.stats['leaders'] += 1
+                leader = True
+
+        if call is None:
+            return func()
+
+        if not leader:
+            if not call.event.wait(self.wait_timeout):
+                log_printf("[SINGLE_FLIGHT] Timeout aguardando %s - executando diretamente", key)
+                return func()
+            if call.error is not None:
+                raise call.error
+            return copy(call.result) if copy else call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            if call.waiters:
+                log_printf("[SINGLE_FLIGHT] %s compartilhado com %s requisição(ões)", key, call.waiters)
+            call.event.set()
+
+    def in_flight(self) -> int:
+        """Quantidade de chaves com carga em andamento"""
+        return len(self._calls)
+
+
+# Instância global compartilhada por todos os módulos do worker
+single_flight = SingleFlight()
@@ -0,0 +1,370 @@
+"""
+Transporte HTTP dos clientes Supabase.
+
+Os clientes eram criados com os padrões do SDK (um pool httpx por cliente,
+timeout único) e testados com consultas bloqueantes na subida de cada worker;
+o DEFAULT_TIMEOUT definido em app.py só vale para a biblioteca requests. Aqui
+as sessões PostgREST dos clientes usam um único pool por worker (keep-alive,
+limite de conexões, HTTP/2 quando o pacote h2 está instalado), o timeout é
+escolhido pela classe da chamada (leitura de dashboard, exportação, escrita),
+um circuit breaker corta as chamadas por alguns segundos após falhas seguidas
+e o health check do banco só roda quando alguém pergunta (com cache).
+
+Sem classe explícita, GET é 'read' (timeout curto, QUERY_TIMEOUT). Leituras
+pesadas conhecidas (carga de views grandes de dashboard, índice de busca,
+carga inicial de analytics) marcam 'report' e exportações marcam 'export' no
+ponto de chamada. O breaker só conta falhas de conexão e 502/503/504: timeout
+de leitura indica consulta lenta, não banco fora do ar, e não pode derrubar
+todas as chamadas do worker (inclusive o login).
+
+Usage:
+    from services.supabase_transport import call_class, transport_stats
+
+    with call_class('export'):
+        rows = supabase_admin.table('vw_importacoes_geral_export').select('*').execute().data
+
+    @call_class('export')
+    def gerar_planilha(...):
+        ...
+
+    transport_stats()  # {'pool': {...}, 'calls': {...}, 'breaker': {...}}
+"""
+
+from contextlib import ContextDecorator
+from contextvars import ContextVar
+import importlib.util
+import os
+import threading
+import time
+
+import httpx
+
+from config import Config
+from log_config import log_print, log_printf
+from services.boot import register_after_fork
+from services.profiling import record_db_wait
+from services.query_tracing import query_tracer
+
+# Pool por worker
+POOL_MAX_CONNECTIONS = int(os.getenv('SUPABASE_POOL_MAX_CONNECTIONS', '20'))
+POOL_MAX_KEEPALIVE = int(os.getenv('SUPABASE_POOL_MAX_KEEPALIVE', '10'))
+POOL_KEEPALIVE_EXPIRY = float(os.getenv('SUPABASE_POOL_KEEPALIVE_EXPIRY', '30'))
+# 'auto' usa HTTP/2 se o pacote h2 estiver disponível
+HTTP2_MODE = os.getenv('SUPABASE_HTTP2', 'auto').lower()
+CONNECT_TIMEOUT = float(os.getenv('SUPABASE_CONNECT_TIMEOUT', '5'))
+
+# Timeout de leitura por classe de chamada (segundos)
+CALL_TIMEOUTS = {
+    'read': float(Config.QUERY_TIMEOUT),
+    'report': float(os.getenv('SUPABASE_REPORT_TIMEOUT', '120')),
+    'export': float(Config.EXPORT_TIMEOUT),
+    'write': float(os.getenv('SUPABASE_WRITE_TIMEOUT', '30')),
+    'health': float(os.getenv('SUPABASE_HEALTH_TIMEOUT', '3')),
+}
+WRITE_METHODS = ('POST', 'PATCH', 'PUT', 'DELETE')
+
+# Circuit breaker
+BREAKER_THRESHOLD = int(os.getenv('SUPABASE_BREAKER_THRESHOLD', '5'))
+BREAKER_COOLDOWN = float(os.getenv('SUPABASE_BREAKER_COOLDOWN', '15'))
+BREAKER_STATUS_CODES = (502, 503, 504)
+
+HEALTH_CACHE_SECONDS = float(os.getenv('SUPABASE_HEALTH_CACHE_SECONDS', '30'))
+
+_current_class = ContextVar('supabase_call_class', default=None)
+
+
+class SupabaseUnavailable(httpx.TransportError):
+    """Circuit breaker aberto: chamada recusada sem tocar a rede"""
+
+
+class call_class(ContextDecorator):
+    """Define a classe (e o timeout) das chamadas feitas dentro do bloco/função"""
+
+    def __init__(self, name):
+        if name not in CALL_TIMEOUTS:
+            raise ValueError(f'Classe de chamada desconhecida: {name}')
+        self.name = name
+        self._token = None
+
+    def _recreate_cm(self):
+        # Uma instância por chamada da função decorada (greenlets concorrentes)
+        return call_class(self.name)
+
+    def __enter__(self):
+        self._token = _current_class.set(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        _current_class.reset(self._token)
+        return False
+
+
+class CircuitBreaker:
+    """Abre após BREAKER_THRESHOLD falhas seguidas; após o cooldown deixa uma chamada de teste passar"""
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.times_opened = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.time() - self.opened_at >= self.cooldown:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                log_print("[SUPABASE_TRANSPORT] Circuit breaker fechado")
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def release(self):
+        """Erro que não diz nada sobre a saúde do servidor: libera a chamada de teste"""
+        with self._lock:
+            self.trial_in_flight = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            reopen = self.trial_in_flight
+            self.trial_in_flight = False
+            if reopen or (self.opened_at is None and self.failures >= self.threshold):
+                self.opened_at = time.time()
+                self.times_opened += 1
+                log_printf("[SUPABASE_TRANSPORT] Circuit breaker aberto por %.0fs após %s falhas", self.cooldown, self.failures)
+
+    def to_dict(self):
+        return {
+            'state': self.state,
+            'consecutive_failures': self.failures,
+            'times_opened': self.times_opened,
+            'cooldown_seconds': self.cooldown,
+        }
+
+
+class _TracedStream(httpx.SyncByteStream):
+    """Corpo da resposta que conta os bytes lidos e avisa uma vez ao fechar"""
+
+    def __init__(self, stream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+        self._bytes = 0
+
+    def __iter__(self):
+        for chunk in self._stream:
+            self._bytes += len(chunk)
+            yield chunk
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            on_close, self._on_close = self._on_close, None
+            if on_close is not None:
+                on_close(self._bytes)
+
+
+class PooledTransport(httpx.BaseTransport):
+    """Pool httpx compartilhado com timeout por classe, breaker e métricas"""
+
+    def __init__(self):
+        self.http2 = HTTP2_MODE == 'on' or (HTTP2_MODE == 'auto' and importlib.util.find_spec('h2') is not None)
+        self.limits = httpx.Limits(max_connections=POOL_MAX_CONNECTIONS,
+                                   max_keepalive_connections=POOL_MAX_KEEPALIVE,
+                                   keepalive_expiry=POOL_KEEPALIVE_EXPIRY)
+        self._inner = httpx.HTTPTransport(http2=self.http2, limits=self.limits)
+        self.breaker = CircuitBreaker()
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._calls = {}
+
+    def _classify(self, request):
+        explicit = _current_class.get()
+        if explicit:
+            return explicit
+        return 'write' if request.method in WRITE_METHODS else 'read'
+
+    def handle_request(self, request):
+        klass = self._classify(request)
+        if not self.breaker.allow():
+            self._record(klass, None, error=True, rejected=True)
+            raise SupabaseUnavailable('Supabase indisponível (circuit breaker aberto)', request=request)
+        request.extensions['timeout'] = httpx.Timeout(CALL_TIMEOUTS[klass], connect=CONNECT_TIMEOUT).as_dict()
+        started = time.perf_counter()
+        with self._lock:
+            self._in_flight += 1
+        try:
+            response = self._inner.handle_request(request)
+        except (httpx.ConnectError, httpx.ConnectTimeout):
+            # Servidor inalcançável: conta para o breaker
+            self.breaker.failure()
+            self._record(klass, time.perf_counter() - started, error=True)
+            self._trace(request, None, None, time.perf_counter() - started, 0)
+            raise
+        except (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError):
+            # Timeout de leitura/pool ou conexão interrompida: problema desta consulta
+            self.breaker.release()
+            self._record(klass, time.perf_counter() - started, error=True)
+            self._trace(request, None, None, time.perf_counter() - started, 0)
+            raise
+        except Exception:
+            self.breaker.release()
+            raise
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+        if response.status_code in BREAKER_STATUS_CODES:
+            self.breaker.failure()
+        elif response.status_code >= 500:
+            # Erro da consulta (ex.: statement timeout do Postgres), servidor respondendo
+            self.breaker.release()
+        else:
+            self.breaker.success()
+        self._record(klass, time.perf_counter() - started, error=response.status_code >= 500)
+        # Latência e bytes por consulta incluem a leitura do corpo: registrados ao fechar o stream
+        response.stream = _TracedStream(response.stream, lambda bytes_read: self._trace(
+            request, response.status_code, response.headers, time.perf_counter() - started, bytes_read))
+        return response
+
+    def _trace(self, request, status_code, headers, elapsed, bytes_read):
+        """Espera do banco e consulta na requisição Flask em curso (profiling e query_tracing)"""
+        try:
+            record_db_wait(elapsed)
+            query_tracer.record(request, status_code, headers, elapsed, bytes_read)
+        except Exception as e:
+            log_printf("[SUPABASE_TRANSPORT] Falha ao registrar consulta: %s", e)
+
+    def _record(self, klass, elapsed, error=False, rejected=False):
+        with self._lock:
+            stats = self._calls.setdefault(klass, {'count': 0, 'errors': 0, 'rejected': 0, 'total_s': 0.0, 'max_s': 0.0})
+            stats['count'] += 1
+            if error:
+                stats['errors'] += 1
+            if rejected:
+                stats['rejected'] += 1
+            if elapsed is not None:
+                stats['total_s'] += elapsed
+                stats['max_s'] = max(stats['max_s'], elapsed)
+
+    def pool_stats(self):
+        connections = list(getattr(getattr(self._inner, '_pool', None), 'connections', None) or [])
+        idle = sum(1 for c in connections if getattr(c, 'is_idle', lambda: False)())
+        return {
+            'http2': self.http2,
+            'max_connections': POOL_MAX_CONNECTIONS,
+            'max_keepalive': POOL_MAX_KEEPALIVE,
+            'connections': len(connections),
+            'idle': idle,
+            'in_flight': self._in_flight,
+        }
+
+    def stats(self):
+        with self._lock:
+            calls = {
+                klass: {
+                    'count': s['count'],
+                    'errors': s['errors'],
+                    'rejected': s['rejected'],
+                    'avg_ms': round(s['total_s'] * 1000 / max(s['count'] - s['rejected'], 1), 1),
+                    'max_ms': round(s['max_s'] * 1000, 1),
+                    'timeout_s': CALL_TIMEOUTS[klass],
+                }
+                for klass, s in self._calls.items()
+            }
+        return {'pool': self.pool_stats(), 'calls': calls, 'breaker': self.breaker.to_dict()}
+
+    def close(self):
+        self._inner.close()
+
+    def reset_after_fork(self):
+        """Descarta conexões herdadas do master (preload_app): cada worker abre as suas"""
+        self._inner = httpx.HTTPTransport(http2=self.http2, limits=self.limits)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.breaker._lock = threading.Lock()
+
+
+# Um pool por processo (cada worker do gunicorn tem o seu)
+transport = PooledTransport()
+register_after_fork(transport.reset_after_fork)
+
+
+def _pooled_session(base_url, headers, timeout):
+    try:
+        from postgrest.utils import SyncClient as SessionClass
+    except ImportError:
+        SessionClass = httpx.Client
+    return SessionClass(base_url=base_url, headers=headers, timeout=timeout,
+                        follow_redirects=True, transport=transport)
+
+
+def install(client):
+    """Faz as sessões PostgREST do cliente usarem o pool compartilhado.
+
+    O SDK recria o cliente PostgREST em eventos de autenticação (login,
+    refresh de token); por isso a fábrica do cliente é substituída, e não
+    apenas a sessão atual.
+    """
+    def _swap_session(postgrest):
+        default_session = postgrest.session
+        postgrest.session = _pooled_session(str(default_session.base_url), default_session.headers,
+                                            CALL_TIMEOUTS['read'])
+        default_session.close()
+        return postgrest
+
+    original_factory = getattr(client, '_init_postgrest_client', None)
+    if original_factory is None:
+        # Versão do SDK sem a fábrica: troca apenas a sessão atual
+        _swap_session(client.postgrest)
+        return client
+
+    def _factory(*args, **kwargs):
+        return _swap_session(original_factory(*args, **kwargs))
+
+    client._init_postgrest_client = _factory
+    client._postgrest = None
+    return client
+
+
+def transport_stats():
+    return transport.stats()
+
+
+_health = {'checked_at': 0.0, 'ok': None, 'error': None, 'latency_ms': None}
+_health_lock = threading.Lock()
+
+
+def check_health(client, force=False):
+    """Consulta mínima ao banco, no máximo uma vez a cada HEALTH_CACHE_SECONDS"""
+    with _health_lock:
+        if not force and time.time() - _health['checked_at'] < HEALTH_CACHE_SECONDS:
+            return dict(_health)
+        started = time.perf_counter()
+        try:
+            with call_class('health'):
+                client.table('users').select('id').limit(1).execute()
+            _health.update(ok=True, error=None)
+        except Exception as e:
+            _health.update(ok=False, error=str(e))
+            log_printf("[SUPABASE_TRANSPORT] Health check falhou: %s", e)
+        _health.update(checked_at=time.time(), latency_ms=round((time.perf_counter() - started) * 1000, 1))
+        return dict(_health)
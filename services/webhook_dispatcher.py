@@ -0,0 +1,467 @@
+"""Despacho assíncrono de webhooks (n8n) com coalescência e outbox local.
+
+O WebhookService fazia um requests.post por evento dentro da requisição: uma
+ação administrativa sobre vários números de WhatsApp esperava a latência do
+n8n para cada um. Aqui a requisição apenas registra o evento; uma thread de
+despacho entrega pelo pool de conexões de uma requests.Session persistente,
+com no máximo WEBHOOK_TARGET_CONCURRENCY requisições simultâneas por host.
+
+- Ordem por chave: eventos com a mesma chave (ex.: "whatsapp:<número>") são
+  entregues um de cada vez, na ordem de chegada; o seguinte só sai depois que
+  o anterior foi entregue ou foi para o dead-letter.
+- Coalescência: um evento do mesmo tipo (payload['event']) que o último ainda
+  não despachado da chave (janela de coalescência ou espera de retry) é
+  fundido a ele: vale o payload mais recente e os dicts de 'changes' são
+  combinados. Tipos diferentes nunca são fundidos nem reordenados.
+- Retry com backoff exponencial para timeout, erro de conexão, 5xx, 408 e
+  429 (respeitando Retry-After); outros 4xx vão direto para o dead-letter.
+- Outbox: cada evento é gravado em disco antes de entrar na fila e removido
+  após a entrega. Cada processo grava num diretório próprio (PID + token
+  aleatório) e mantém um flock sobre "<diretório>.lock" enquanto vive; outro
+  processo só recupera o diretório quando consegue esse lock, isto é, quando
+  o dono terminou (o kernel libera o flock), sem depender de PIDs reutilizados.
+- Fila limitada (WEBHOOK_QUEUE_MAX): acima do limite o evento vai para o
+  dead-letter em vez de crescer a memória do worker.
+
+Usage:
+    from services.webhook_dispatcher import webhook_dispatcher
+
+    webhook_dispatcher.enqueue(url, payload, key="whatsapp:4196650141")
+    webhook_dispatcher.stats()
+    webhook_dispatcher.requeue_dead_letters()
+"""
+
+import heapq
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+try:
+    import fcntl
+except ImportError:  # Windows (desenvolvimento local, processo único)
+    fcntl = None
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from log_config import log_printf
+
+WEBHOOK_TIMEOUT = int(os.getenv("WEBHOOK_TIMEOUT", "10"))
+WEBHOOK_QUEUE_MAX = int(os.getenv("WEBHOOK_QUEUE_MAX", "1000"))
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))
+WEBHOOK_TARGET_CONCURRENCY = int(os.getenv("WEBHOOK_TARGET_CONCURRENCY", "2"))
+# Tempo que um evento espera por outros da mesma chave antes de sair
+WEBHOOK_COALESCE_WINDOW = float(os.getenv("WEBHOOK_COALESCE_WINDOW", "2"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "6"))
+WEBHOOK_RETRY_BASE_DELAY = float(os.getenv("WEBHOOK_RETRY_BASE_DELAY", "5"))
+WEBHOOK_RETRY_MAX_DELAY = float(os.getenv("WEBHOOK_RETRY_MAX_DELAY", "900"))
+WEBHOOK_OUTBOX_DIR = os.getenv("WEBHOOK_OUTBOX_DIR", os.path.join(tempfile.gettempdir(), "portal_webhook_outbox"))
+
+_RETRYABLE_STATUS = (408, 425, 429)
+_DEFAULT_HEADERS = {"Content-Type": "application/json"}
+
+
+def _try_lock(path: str, blocking: bool = False):
+    """flock exclusivo sobre path; None se outro processo vivo já o detém"""
+    fh = open(path, "a+")
+    if fcntl is None:
+        return fh
+    try:
+        fcntl.flock(fh.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+    except OSError:
+        fh.close()
+        return None
+    return fh
+
+
+def _same_event(a: "WebhookEvent", b: "WebhookEvent") -> bool:
+    return a.payload.get("event") == b.payload.get("event")
+
+
+def _merge_payload(older: Dict[str, Any], newer: Dict[str, Any]) -> Dict[str, Any]:
+    """Payload mais recente vence; 'changes' dos dois são combinados"""
+    merged = dict(newer)
+    if isinstance(older.get("changes"), dict) and isinstance(newer.get("changes"), dict):
+        merged["changes"] = {**older["changes"], **newer["changes"]}
+    return merged
+
+
+class WebhookEvent:
+    """Evento a entregar e estado de entrega"""
+
+    def __init__(self, url: str, payload: Dict[str, Any], key: Optional[str] = None, context: str = "",
+                 event_id: Optional[str] = None, attempts: int = 0, coalesced: int = 0,
+                 created_at: Optional[float] = None) -> None:
+        self.id = event_id or uuid.uuid4().hex
+        self.url = url
+        self.payload = payload
+        self.key = key
+        self.context = context
+        self.attempts = attempts
+        self.coalesced = coalesced
+        self.last_error: Optional[str] = None
+        self.created_at = created_at or time.time()
+        self.due = self.created_at
+        self.dispatched = False
+
+    @property
+    def target(self) -> str:
+        return urlsplit(self.url).netloc
+
+    @property
+    def coalesce_key(self) -> Optional[tuple]:
+        return (self.url, self.key) if self.key else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"id": self.id, "url": self.url, "payload": self.payload, "key": self.key,
+                "context": self.context, "attempts": self.attempts, "coalesced": self.coalesced,
+                "last_error": self.last_error, "created_at": self.created_at}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "WebhookEvent":
+        return cls(data["url"], data["payload"], key=data.get("key"), context=data.get("context", ""),
+                   event_id=data["id"], attempts=data.get("attempts", 0),
+                   coalesced=data.get("coalesced", 0), created_at=data.get("created_at"))
+
+
+class WebhookDispatcher:
+    """Fila com janela de coalescência + pool de envio + outbox local"""
+
+    def __init__(self, outbox_dir: str = WEBHOOK_OUTBOX_DIR) -> None:
+        self.outbox_dir = outbox_dir
+        self._cond = threading.Condition()
+        self._timers: List[tuple] = []  # heap de (quando, seq, evento): coalescência e retry
+        self._chains: Dict[tuple, deque] = {}  # chave -> eventos em ordem; só o primeiro fica agendado
+        self._ready: Dict[str, deque] = {}
+        self._inflight: Dict[str, int] = {}
+        self._size = 0
+        self._seq = 0
+        self._session: Optional[requests.Session] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._worker_pid: Optional[int] = None
+        self._owner: Optional[str] = None
+        self._owner_lock = None
+        self._start_lock = threading.Lock()
+        self._metrics = {"queued": 0, "coalesced": 0, "sent": 0, "retried": 0,
+                         "dead_lettered": 0, "dropped": 0, "recovered": 0}
+
+    # ---- API ----
+
+    def start(self) -> None:
+        """Inicia a thread de despacho e reenfileira eventos do outbox"""
+        self._ensure_worker()
+
+    def enqueue(self, url: str, payload: Dict[str, Any], key: Optional[str] = None,
+                context: str = "") -> bool:
+        """Registra o evento para entrega; False se a fila estiver cheia"""
+        self._ensure_worker()
+        event = WebhookEvent(url, payload, key=key, context=context)
+        with self._cond:
+            if self._coalesce(event):
+                return True
+            if self._size >= WEBHOOK_QUEUE_MAX:
+                self._metrics["dropped"] += 1
+                event.last_error = "fila de webhooks cheia"
+                log_printf("[WEBHOOK] Fila cheia (%s eventos) - %s enviado ao dead-letter", self._size, event.id)
+                self._write_outbox("dead", event)
+                return False
+            self._metrics["queued"] += 1
+            self._admit(event, time.time() + (WEBHOOK_COALESCE_WINDOW if event.key else 0))
+        log_printf("[WEBHOOK] %s - evento %s enfileirado para %s", context, event.id, url)
+        return True
+
+    def deliver_now(self, url: str, payload: Dict[str, Any], context: str = "") -> bool:
+        """Entrega síncrona (sem fila, sem retry) pela sessão persistente"""
+        event = WebhookEvent(url, payload, context=context)
+        ok, _, _ = self._post(event)
+        return ok
+
+    # ---- fila ----
+
+    def _coalesce(self, event: WebhookEvent) -> bool:
+        key = event.coalesce_key
+        chain = self._chains.get(key) if key else None
+        if not chain:
+            return False
+        pending = chain[-1]
+        if pending.dispatched or not _same_event(pending, event):
+            return False
+        pending.payload = _merge_payload(pending.payload, event.payload)
+        pending.context = event.context
+        pending.coalesced += 1
+        self._metrics["coalesced"] += 1
+        self._write_outbox(self._own_dir(), pending)
+        log_printf("[WEBHOOK] %s - evento combinado com %s (%s)", event.context, pending.id, event.key)
+        return True
+
+    def _admit(self, event: WebhookEvent, when: float) -> None:
+        """Grava no outbox e coloca o evento na fila da sua chave (chamado com self._cond adquirido)"""
+        self._write_outbox(self._own_dir(), event)
+        event.due = when
+        self._size += 1
+        key = event.coalesce_key
+        if key:
+            chain = self._chains.setdefault(key, deque())
+            chain.append(event)
+            if len(chain) > 1:
+                return  # aguarda a entrega dos eventos anteriores da mesma chave
+        self._push(event, when)
+
+    def _push(self, event: WebhookEvent, when: float) -> None:
+        """Chamado com self._cond adquirido"""
+        event.dispatched = False
+        self._seq += 1
+        heapq.heappush(self._timers, (when, self._seq, event))
+        self._cond.notify()
+
+    def _release(self, event: WebhookEvent) -> None:
+        """Libera a chave do evento concluído e agenda o próximo da fila (chamado com self._cond adquirido)"""
+        key = event.coalesce_key
+        chain = self._chains.get(key) if key else None
+        if not chain or chain[0] is not event:
+            return
+        chain.popleft()
+        if chain:
+            following = chain[0]
+            self._push(following, max(following.due, time.time()))
+        else:
+            del self._chains[key]
+
+    def _ensure_worker(self) -> None:
+        # Após fork (workers do gunicorn) a thread e a sessão do pai não servem ao filho
+        if self._worker_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._worker_pid == os.getpid():
+                return
+            self._cond = threading.Condition()
+            self._timers, self._chains, self._ready, self._inflight = [], {}, {}, {}
+            self._size = 0
+            self._acquire_owner()
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=WEBHOOK_WORKERS, pool_maxsize=WEBHOOK_WORKERS)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update(_DEFAULT_HEADERS)
+            self._session = session
+            self._executor = ThreadPoolExecutor(max_workers=WEBHOOK_WORKERS, thread_name_prefix="webhook")
+            self._worker_pid = os.getpid()
+            threading.Thread(target=self._run, name="webhook-dispatch", daemon=True).start()
+            self._load_outbox()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                now = time.time()
+                while self._timers and self._timers[0][0] <= now:
+                    event = heapq.heappop(self._timers)[2]
+                    event.dispatched = True
+                    self._ready.setdefault(event.target, deque()).append(event)
+                for target, events in self._ready.items():
+                    while events and self._inflight.get(target, 0) < WEBHOOK_TARGET_CONCURRENCY:
+                        event = events.popleft()
+                        self._inflight[target] = self._inflight.get(target, 0) + 1
+                        self._executor.submit(self._deliver, event)
+                timeout = 1.0
+                if self._timers:
+                    timeout = min(timeout, max(0.01, self._timers[0][0] - now))
+                self._cond.wait(timeout=timeout)
+
+    def _post(self, event: WebhookEvent) -> tuple:
+        """(sucesso, erro permanente, espera sugerida pelo servidor)"""
+        session = self._session or requests
+        try:
+            response = session.post(event.url, json=event.payload, headers=_DEFAULT_HEADERS,
+                                    timeout=WEBHOOK_TIMEOUT)
+        except requests.exceptions.Timeout:
+            event.last_error = f"timeout após {WEBHOOK_TIMEOUT}s"
+            log_printf("[WEBHOOK] %s - Timeout após %ss", event.context, WEBHOOK_TIMEOUT)
+            return False, False, None
+        except requests.exceptions.RequestException as exc:
+            event.last_error = str(exc)
+            log_printf("[WEBHOOK] %s - Erro de conexão: %s", event.context, exc)
+            return False, False, None
+        if 200 <= response.status_code < 300:
+            log_printf("[WEBHOOK] %s - Sucesso! Status: %s", event.context, response.status_code)
+            return True, False, None
+        event.last_error = f"HTTP {response.status_code}: {response.text[:200]}"
+        log_printf("[WEBHOOK] %s - Falha! Status: %s - Resposta: %s",
+                   event.context, response.status_code, response.text[:500])
+        retry_after = response.headers.get("Retry-After", "")
+        delay = float(retry_after) if retry_after.isdigit() else None
+        permanent = 400 <= response.status_code < 500 and response.status_code not in _RETRYABLE_STATUS
+        return False, permanent, delay
+
+    def _deliver(self, event: WebhookEvent) -> None:
+        event.attempts += 1
+        try:
+            ok, permanent, server_delay = self._post(event)
+        except Exception as exc:
+            event.last_error = str(exc)
+            ok, permanent, server_delay = False, False, None
+            log_printf("[WEBHOOK] %s - Erro inesperado: %s", event.context, exc)
+        with self._cond:
+            self._inflight[event.target] -= 1
+            if ok:
+                self._metrics["sent"] += 1
+                self._remove_outbox(self._own_dir(), event)
+                self._size -= 1
+                self._release(event)
+            elif permanent or event.attempts >= WEBHOOK_MAX_ATTEMPTS:
+                log_printf("[WEBHOOK] Falha definitiva no evento %s após %s tentativa(s): %s",
+                           event.id, event.attempts, event.last_error)
+                self._metrics["dead_lettered"] += 1
+                self._remove_outbox(self._own_dir(), event)
+                self._write_outbox("dead", event)
+                self._size -= 1
+                self._release(event)
+            else:
+                self._retry(event, server_delay)
+            self._cond.notify()
+
+    def _retry(self, event: WebhookEvent, server_delay: Optional[float]) -> None:
+        """Chamado com self._cond adquirido"""
+        self._metrics["retried"] += 1
+        chain = self._chains.get(event.coalesce_key) if event.coalesce_key else None
+        newer = chain[1] if chain and len(chain) > 1 and chain[0] is event else None
+        if newer is not None and _same_event(event, newer):
+            # O próximo evento da chave é do mesmo tipo: ele absorve este e assume a vez
+            newer.payload = _merge_payload(event.payload, newer.payload)
+            self._remove_outbox(self._own_dir(), event)
+            self._write_outbox(self._own_dir(), newer)
+            self._size -= 1
+            self._release(event)
+            return
+        delay = WEBHOOK_RETRY_BASE_DELAY * (2 ** (event.attempts - 1))
+        delay = min(WEBHOOK_RETRY_MAX_DELAY, max(delay, server_delay or 0))
+        log_printf("[WEBHOOK] %s - nova tentativa do evento %s em %ss (tentativa %s)",
+                   event.context, event.id, delay, event.attempts)
+        self._write_outbox(self._own_dir(), event)
+        self._push(event, time.time() + delay)
+
+    # ---- outbox local ----
+
+    def _own_dir(self) -> str:
+        return os.path.join("outbox", self._owner or str(os.getpid()))
+
+    def _acquire_owner(self) -> None:
+        """Diretório de outbox deste processo, protegido por flock enquanto o processo viver"""
+        if self._owner_lock is not None:
+            self._owner_lock.close()  # descritor herdado do pai no fork
+            self._owner_lock = None
+        self._owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        try:
+            root = os.path.join(self.outbox_dir, "outbox")
+            os.makedirs(root, exist_ok=True)
+            self._owner_lock = _try_lock(os.path.join(root, f"{self._owner}.lock"), blocking=True)
+        except Exception as exc:
+            log_printf("[WEBHOOK] Erro ao criar lock do outbox: %s", exc)
+
+    def _write_outbox(self, kind: str, event: WebhookEvent) -> None:
+        try:
+            directory = os.path.join(self.outbox_dir, kind)
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"{event.id}.json")
+            with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+                json.dump(event.to_dict(), f, ensure_ascii=False)
+            os.replace(f"{path}.tmp", path)
+        except Exception as exc:
+            log_printf("[WEBHOOK] Erro ao gravar outbox %s: %s", event.id, exc)
+
+    def _remove_outbox(self, kind: str, event: WebhookEvent) -> None:
+        try:
+            os.remove(os.path.join(self.outbox_dir, kind, f"{event.id}.json"))
+        except OSError:
+            pass
+
+    def _claim(self, directory: str) -> List[WebhookEvent]:
+        """Renomeia o diretório (atômico: só um worker fica com ele) e lê os eventos"""
+        claimed = f"{directory}.claimed.{self._owner or os.getpid()}"
+        try:
+            os.rename(directory, claimed)
+        except OSError:
+            return []
+        events = []
+        for name in sorted(os.listdir(claimed)):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(claimed, name), encoding="utf-8") as f:
+                    events.append(WebhookEvent.from_dict(json.load(f)))
+            except Exception as exc:
+                log_printf("[WEBHOOK] Erro ao ler outbox %s: %s", name, exc)
+        shutil.rmtree(claimed, ignore_errors=True)
+        events.sort(key=lambda event: event.created_at)
+        return events
+
+    def _load_outbox(self) -> None:
+        """Reenfileira eventos de processos encerrados (cujo lock do outbox está livre)"""
+        root = os.path.join(self.outbox_dir, "outbox")
+        if not os.path.isdir(root):
+            return
+        events = []
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            if name.endswith(".lock") and not os.path.exists(path[:-len(".lock")]):
+                # Lock de processo encerrado que não deixou eventos
+                lock = _try_lock(path) if name[:-len(".lock")] != self._owner else None
+                if lock is not None:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                    lock.close()
+                continue
+            owner = name.split(".claimed.")[-1]
+            if owner == self._owner or not os.path.isdir(path):
+                continue
+            lock_path = os.path.join(root, f"{owner}.lock")
+            lock = _try_lock(lock_path)
+            if lock is None:
+                continue  # dono ainda vivo
+            try:
+                events.extend(self._claim(path))
+                try:
+                    os.remove(lock_path)
+                except OSError:
+                    pass
+            finally:
+                lock.close()
+        events.sort(key=lambda event: event.created_at)
+        with self._cond:
+            for event in events:
+                self._metrics["recovered"] += 1
+                self._admit(event, time.time())
+        if events:
+            log_printf("[WEBHOOK] %s evento(s) pendente(s) reenfileirado(s) do outbox", len(events))
+
+    def requeue_dead_letters(self) -> int:
+        """Reenfileira os eventos do dead-letter (tentativas zeradas)"""
+        self._ensure_worker()
+        events = self._claim(os.path.join(self.outbox_dir, "dead"))
+        with self._cond:
+            for event in events:
+                event.attempts = 0
+                self._admit(event, time.time())
+        return len(events)
+
+    def stats(self) -> Dict[str, Any]:
+        dead_dir = os.path.join(self.outbox_dir, "dead")
+        dead = len([n for n in os.listdir(dead_dir) if n.endswith(".json")]) if os.path.isdir(dead_dir) else 0
+        with self._cond:
+            return dict(self._metrics, outstanding=self._size, waiting=len(self._timers),
+                        ready=sum(len(events) for events in self._ready.values()),
+                        inflight={target: count for target, count in self._inflight.items() if count},
+                        dead_letter_outbox=dead)
+
+
+# Instância única do processo
+webhook_dispatcher = WebhookDispatcher()
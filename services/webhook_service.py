@@ -11,15 +11,18 @@ Configuração via .env:
 - N8N_WEBHOOK_TRIGGER_NEW_PRD: URL de produção para novos números WhatsApp
 - N8N_WEBHOOK_TRIGGER_NEW_DEV: URL de desenvolvimento (opcional)
 - WEBHOOK_TIMEOUT: Timeout para requisições (padrão: 10 segundos)
+- WEBHOOK_ASYNC: false para enviar dentro da requisição (padrão: true, fila em segundo plano)
 """
 
 import os
 import re
-import requests
 import json
 from datetime import datetime
 from typing import Dict, Any, Optional, List
 
+from log_config import log_printf
+from services.webhook_dispatcher import webhook_dispatcher
+
 
 class WebhookService:
     """Serviço centralizado para webhooks"""
@@ -36,6 +39,11 @@ class WebhookService:
         # Ambiente
         self.flask_env = os.getenv('FLASK_ENV', '').lower()
         self.is_development = self.flask_env == 'development'
+        
+        # Entrega em segundo plano (coalescência, retry e outbox local)
+        self.async_delivery = os.getenv('WEBHOOK_ASYNC', 'true').lower() == 'true'
+        if self.async_delivery:
+            webhook_dispatcher.start()
     
     def _get_webhook_url(self, webhook_type: str = 'new_whatsapp') -> str:
         """Retorna a URL do webhook baseada no ambiente e tipo"""
@@ -73,36 +81,20 @@ class WebhookService:
         }
     
     def _make_webhook_request(self, url: str, payload: Dict[str, Any], 
-                            context: str = "") -> bool:
-        """Executa requisição webhook com tratamento de erros"""
-        try:
-            print(f"[WEBHOOK] {context} - Enviando para: {url}")
-            print(f"[WEBHOOK] Payload: {json.dumps(payload, indent=2)}")
-            
-            response = requests.post(
-                url, 
-                json=payload, 
-                headers=self.default_headers, 
-                timeout=self.timeout
-            )
-            
-            if response.status_code == 200:
-                print(f"[WEBHOOK] {context} - Sucesso! Status: {response.status_code}")
-                return True
-            else:
-                print(f"[WEBHOOK] {context} - Falha! Status: {response.status_code}")
-                print(f"[WEBHOOK] Resposta: {response.text[:500]}")  # Limitar log
-                return False
-                
-        except requests.exceptions.Timeout:
-            print(f"[WEBHOOK] {context} - Timeout após {self.timeout}s")
-            return False
-        except requests.exceptions.ConnectionError:
-            print(f"[WEBHOOK] {context} - Erro de conexão")
-            return False
-        except Exception as e:
-            print(f"[WEBHOOK] {context} - Erro inesperado: {str(e)}")
-            return False
+                            context: str = "", key: Optional[str] = None,
+                            sync: Optional[bool] = None) -> bool:
+        """
+        Envia o webhook pelo despacho em segundo plano (services/webhook_dispatcher.py).
+        
+        Retorna True quando o evento foi aceito na fila; com sync=True (ou
+        WEBHOOK_ASYNC=false) envia na hora e retorna o resultado da requisição.
+        """
+        if sync is None:
+            sync = not self.async_delivery
+        if sync:
+            log_printf("[WEBHOOK] %s - Enviando para: %s", context, url)
+            return webhook_dispatcher.deliver_now(url, payload, context)
+        return webhook_dispatcher.enqueue(url, payload, key=key, context=context)
     
     def notify_new_whatsapp(self, numero: str, user_data: Optional[Dict] = None, 
                            source: str = "system", test_mode: bool = False) -> bool:
@@ -150,7 +142,8 @@ class WebhookService:
             
             # Enviar webhook
             context = f"Novo WhatsApp ({source})"
-            return self._make_webhook_request(url, payload, context)
+            return self._make_webhook_request(url, payload, context,
+                                              key=f"whatsapp:{phone_numbers['evo']}")
             
         except Exception as e:
             print(f"[WEBHOOK] Erro ao notificar novo WhatsApp: {str(e)}")
@@ -191,7 +184,8 @@ class WebhookService:
                 }
             
             context = "Atualização WhatsApp"
-            return self._make_webhook_request(url, payload, context)
+            return self._make_webhook_request(url, payload, context,
+                                              key=f"whatsapp:{phone_numbers['evo']}")
             
         except Exception as e:
             print(f"[WEBHOOK] Erro ao notificar atualização WhatsApp: {str(e)}")
@@ -229,7 +223,8 @@ class WebhookService:
                 }
             
             context = "Remoção WhatsApp"
-            return self._make_webhook_request(url, payload, context)
+            return self._make_webhook_request(url, payload, context,
+                                              key=f"whatsapp:{phone_numbers['evo']}")
             
         except Exception as e:
             print(f"[WEBHOOK] Erro ao notificar remoção WhatsApp: {str(e)}")
@@ -255,7 +250,7 @@ class WebhookService:
                 'environment': 'development' if self.is_development else 'production'
             }
             
-            success = self._make_webhook_request(url, test_payload, "Teste de conectividade")
+            success = self._make_webhook_request(url, test_payload, "Teste de conectividade", sync=True)
             
             return {
                 'success': success,
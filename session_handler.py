@@ -69,22 +69,11 @@ def init_session_handler(app):
         """
         Define o timeout da sessão no cookie e adiciona cabeçalhos para evitar cache
         """
-        response.headers.add('Cache-Control', 'no-store, no-cache, must-revalidate, post-check=0, pre-check=0')
-        response.headers.add('Pragma', 'no-cache')
-        response.headers.add('Expires', '0')
-        
-        # Adicionar timestamp na resposta para debugging se for JSON
-        if response.content_type == 'application/json' and hasattr(response, 'json'):
-            try:
-                data = response.get_json()
-                if isinstance(data, dict):
-                    # Não modificar diretamente a resposta, mas adicionar informações se for um dict
-                    if 'timestamp' not in data:
-                        data['server_time'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                    if 'session' not in data and 'user' in session:
-                        data['session_valid'] = True
-            except:
-                pass
+        # Respeita a política de cache definida pela view (ex.: 'private, no-cache' + ETag)
+        if 'Cache-Control' not in response.headers:
+            response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, post-check=0, pre-check=0'
+            response.headers['Pragma'] = 'no-cache'
+            response.headers['Expires'] = '0'
                 
         return response
         
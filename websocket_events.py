@@ -56,6 +56,13 @@ def register_events(socketio, supabase_admin):
             user_agent = request.headers.get('User-Agent', '')
             current_timestamp = datetime.now(timezone.utc).isoformat()
             
+            # Sala individual para notificações do próprio usuário (ex.: progresso de exportações)
+            try:
+                from flask_socketio import join_room
+                join_room(f"user:{user_id}")
+            except Exception as room_error:
+                logger.error(f"Erro ao adicionar usuário à sala individual: {str(room_error)}")
+            
             # Armazena mapeamento em memória
             connected_users[request.sid] = {
                 'user_id': user_id,